@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Local history of pyperf results, with regression detection.
+
+Every pyperf JSON recorded here is stored in one SQLite file, together
+with all of its samples. A run is indexed by suite, benchmark, backend,
+git revision and host fingerprint. The fingerprint is a hash of the CPU
+model, CPU count, OS and architecture. The hostname and the Python version
+are stored with the run but kept out of the fingerprint: identical CI
+runners and containers share one history, and an interpreter or library
+upgrade shows up as a step in the same trend.
+
+    python bench_history.py record aes_suite.json --suite aes_suite
+    python bench_history.py record gc_collect.json --suite gc_collect --backend original
+    python bench_history.py compare                      # latest run vs the one before
+    python bench_history.py compare --base v1.2 --head HEAD
+    python bench_history.py trend --benchmark 'aes_c_aesni_*'
+
+compare and trend use a two-sided Mann-Whitney U test on the raw pyperf
+samples. No normality is assumed: benchmark timings are skewed and have
+outliers. A change is flagged when p < --alpha and the median time moved
+by more than --threshold. A slower time is a latency regression. When the
+payload size is known (aes_payload_bytes metadata), the same change is
+also shown as throughput. compare exits with status 1 if anything
+regressed, so scripts can gate on it.
+
+The database is bench_history.sqlite in the current directory, or
+BENCH_HISTORY_DB, or --db.
+"""
+
+import argparse
+import datetime
+import fnmatch
+import hashlib
+import json
+import math
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+
+import pyperf
+
+DEFAULT_DB = "bench_history.sqlite"
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    recorded_at TEXT NOT NULL,
+    suite TEXT NOT NULL,
+    git_rev TEXT,
+    git_dirty INTEGER NOT NULL DEFAULT 0,
+    host TEXT NOT NULL,
+    host_info TEXT NOT NULL,
+    hostname TEXT,
+    python TEXT,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    benchmark TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    payload_bytes INTEGER,
+    metadata TEXT NOT NULL,
+    samples TEXT NOT NULL,
+    median REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_series ON results (benchmark, backend);
+CREATE INDEX IF NOT EXISTS runs_lookup ON runs (suite, host, git_rev);
+"""
+
+
+# ---------------------------------------------------------------------------
+# Store
+# ---------------------------------------------------------------------------
+
+def connect(path):
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+    # Databases written before the hostname column existed
+    if "hostname" not in {row["name"] for row in db.execute("PRAGMA table_info(runs)")}:
+        db.execute("ALTER TABLE runs ADD COLUMN hostname TEXT")
+    return db
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or "unknown"
+
+
+def host_fingerprint():
+    """(short hash, description) of the hardware and OS, not the interpreter"""
+    info = {
+        "cpu": _cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+    }
+    text = json.dumps(info, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:12], text
+
+
+def git_revision(cwd=REPO_DIR):
+    """(full revision, dirty) of the checkout, or (None, False) outside git"""
+    try:
+        rev = subprocess.run(["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return rev, bool(status.strip())
+
+
+def resolve_revision(rev, cwd=REPO_DIR):
+    """Full hash for a ref like HEAD~1 or a tag; rev itself if git cannot resolve it"""
+    try:
+        return subprocess.run(["git", "rev-parse", rev], cwd=cwd, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return rev
+
+
+def record(db, path, suite, backend=None, rev=None):
+    """Store every benchmark of one pyperf JSON file as one run; returns the run id"""
+    bench_suite = pyperf.BenchmarkSuite.load(path)
+    host, host_info = host_fingerprint()
+    if rev is None:
+        rev, dirty = git_revision()
+    else:
+        rev, dirty = resolve_revision(rev), False
+
+    python = None
+    rows = []
+    for bench in bench_suite.get_benchmarks():
+        meta = bench.get_metadata()
+        python = python or meta.get("python_version", "").split(" ")[0] or None
+        samples = list(bench.get_values())
+        rows.append((bench.get_name(), meta.get("aes_backend", backend or suite),
+                     meta.get("aes_payload_bytes"), json.dumps(meta, default=str),
+                     json.dumps(samples), statistics.median(samples)))
+
+    with db:
+        cur = db.execute(
+            "INSERT INTO runs (recorded_at, suite, git_rev, git_dirty, host, host_info, hostname, python,"
+            " source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (datetime.datetime.now().isoformat(timespec="seconds"), suite, rev, int(dirty),
+             host, host_info, platform.node(), python, os.path.abspath(path)))
+        run_id = cur.lastrowid
+        db.executemany(
+            "INSERT INTO results (run_id, benchmark, backend, payload_bytes, metadata, samples, median)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)", [(run_id,) + row for row in rows])
+    return run_id
+
+
+def series(db, host, suite=None, benchmark="*"):
+    """{(suite, benchmark, backend): [rows, oldest first]} recorded on host"""
+    query = ("SELECT runs.id AS run_id, recorded_at, suite, git_rev, git_dirty, python,"
+             " benchmark, backend, payload_bytes, samples, median"
+             " FROM results JOIN runs ON runs.id = results.run_id WHERE host = ?")
+    params = [host]
+    if suite:
+        query += " AND suite = ?"
+        params.append(suite)
+    out = {}
+    for row in db.execute(query + " ORDER BY runs.id", params):
+        if fnmatch.fnmatchcase(row["benchmark"], benchmark):
+            out.setdefault((row["suite"], row["benchmark"], row["backend"]), []).append(row)
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Statistics
+# ---------------------------------------------------------------------------
+
+def mann_whitney_u(a, b):
+    """Two-sided Mann-Whitney U test; returns (U of a, p-value)
+
+    Normal approximation with tie and continuity corrections. That is
+    accurate for pyperf's usual 20+ samples per run. With fewer than ~8
+    samples per side, treat p as rough.
+    """
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 0.0, 1.0
+    ranked = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(ranked)
+    ties = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        t = j - i + 1
+        ties += t ** 3 - t
+        i = j + 1
+    rank_sum = sum(r for r, (_, side) in zip(ranks, ranked) if side == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    var = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if var <= 0:
+        return u, 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(var)
+    return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def compare_samples(base, head, alpha, threshold):
+    """(relative median time change, p-value, verdict) of head against base"""
+    base_median = statistics.median(base)
+    change = statistics.median(head) / base_median - 1 if base_median else 0.0
+    _, p = mann_whitney_u(base, head)
+    if p >= alpha or abs(change) <= threshold:
+        verdict = "same"
+    elif change > 0:
+        verdict = "SLOWER"
+    else:
+        verdict = "faster"
+    return change, p, verdict
+
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def format_change(change, payload_bytes):
+    text = f"{change:+.1%}"
+    if payload_bytes:
+        # Same samples seen as throughput: bytes/time moves the other way
+        text += f" ({1 / (1 + change) - 1:+.1%} MB/s)"
+    return text
+
+
+def short_rev(row):
+    rev = (row["git_rev"] or "-")[:10]
+    return rev + ("+" if row["git_dirty"] else "")
+
+
+def _pick(rows, rev):
+    """Latest row at revision rev (a prefix or resolved ref), or None"""
+    for row in reversed(rows):
+        if row["git_rev"] and (row["git_rev"].startswith(rev) or row["git_rev"] == resolve_revision(rev)):
+            return row
+    return None
+
+
+def cmd_record(db, args):
+    for path in args.json:
+        run_id = record(db, path, args.suite, args.backend, args.rev)
+        count = db.execute("SELECT COUNT(*) FROM results WHERE run_id = ?", (run_id,)).fetchone()[0]
+        print(f"Recorded {count} benchmarks from {path} as run {run_id} ({args.suite})")
+    return 0
+
+
+def cmd_compare(db, args):
+    host, _ = host_fingerprint()
+    regressions = 0
+    lines = []
+    for (suite, benchmark, backend), rows in sorted(series(db, host, args.suite, args.benchmark).items()):
+        head = _pick(rows, args.head) if args.head else rows[-1]
+        if head is None:
+            continue
+        if args.base:
+            base = _pick(rows, args.base)
+        else:
+            older = [row for row in rows if row["run_id"] < head["run_id"]]
+            base = older[-1] if older else None
+        if base is None or base["run_id"] == head["run_id"]:
+            continue
+        change, p, verdict = compare_samples(json.loads(base["samples"]), json.loads(head["samples"]),
+                                             args.alpha, args.threshold)
+        regressions += verdict == "SLOWER"
+        if verdict != "same" or args.verbose:
+            lines.append(f"{verdict:<7} {suite}/{benchmark} [{backend}]: "
+                         f"{format_time(base['median'])} @ {short_rev(base)} -> "
+                         f"{format_time(head['median'])} @ {short_rev(head)}, "
+                         f"{format_change(change, head['payload_bytes'])}, p={p:.2g}")
+    if not lines:
+        print("No significant changes (nothing to compare)" if not args.verbose else "Nothing to compare")
+    for line in lines:
+        print(line)
+    print(f"{regressions} regression(s) at p < {args.alpha} and > {args.threshold:.0%} median change")
+    return 1 if regressions else 0
+
+
+def cmd_trend(db, args):
+    host, _ = host_fingerprint()
+    drifted = 0
+    for (suite, benchmark, backend), rows in sorted(series(db, host, args.suite, args.benchmark).items()):
+        rows = rows[-args.last:]
+        print(f"{suite}/{benchmark} [{backend}]")
+        previous = None
+        for row in rows:
+            samples = json.loads(row["samples"])
+            mark = ""
+            if previous is not None:
+                change, _, verdict = compare_samples(previous, samples, args.alpha, args.threshold)
+                mark = f"{change:+7.1%} {'' if verdict == 'same' else verdict}"
+            print(f"  {row['recorded_at']}  {short_rev(row):<11} py{row['python'] or '?':<8}"
+                  f" {format_time(row['median']):>10}  {mark}")
+            previous = samples
+
+        # Latest run against the pooled samples of the runs before it, which
+        # catches slowdowns too gradual to be significant step by step
+        window = rows[-args.window - 1:-1]
+        if window:
+            pooled = [v for row in window for v in json.loads(row["samples"])]
+            change, p, verdict = compare_samples(pooled, json.loads(rows[-1]["samples"]),
+                                                 args.alpha, args.threshold)
+            if verdict == "SLOWER":
+                drifted += 1
+                print(f"  ! {change:+.1%} vs the previous {len(window)} runs (p={p:.2g})")
+    if drifted:
+        print(f"{drifted} benchmark(s) slower than their trailing window")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark results history and regression detection")
+    parser.add_argument("--db", default=os.environ.get("BENCH_HISTORY_DB", DEFAULT_DB),
+                        help="SQLite file (default: $BENCH_HISTORY_DB or %s)" % DEFAULT_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="Store pyperf JSON results")
+    p.add_argument("json", nargs="+", help="pyperf JSON written with -o")
+    p.add_argument("--suite", required=True, help="Name of the script or suite that produced them")
+    p.add_argument("--backend", help="Backend label when the results carry no aes_backend metadata")
+    p.add_argument("--rev", help="Git revision to file the results under (default: HEAD of the checkout)")
+    p.set_defaults(func=cmd_record)
+
+    for name, func, help_text in (("compare", cmd_compare, "Flag significant changes between two runs"),
+                                  ("trend", cmd_trend, "Per-benchmark history")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--suite", help="Only this suite")
+        p.add_argument("--benchmark", default="*", help="Benchmark name glob (default: *)")
+        p.add_argument("--alpha", type=float, default=0.01, help="Significance level (default: 0.01)")
+        p.add_argument("--threshold", type=float, default=0.05,
+                       help="Smallest relative median change reported (default: 0.05)")
+        p.set_defaults(func=func)
+        if name == "compare":
+            p.add_argument("--base", help="Revision to compare from (default: the run before head)")
+            p.add_argument("--head", help="Revision to compare (default: latest run)")
+            p.add_argument("-v", "--verbose", action="store_true", help="Also list unchanged benchmarks")
+        else:
+            p.add_argument("--last", type=int, default=10, help="Runs shown per benchmark (default: 10)")
+            p.add_argument("--window", type=int, default=5,
+                           help="Earlier runs pooled for the drift check (default: 5)")
+
+    args = parser.parse_args(argv)
+    db = connect(args.db)
+    try:
+        return args.func(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
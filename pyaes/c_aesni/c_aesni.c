@@ -1,8 +1,25 @@
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
-#include <immintrin.h>
+#include <pthread.h>
 #include <stdint.h>
 #include <stdlib.h>
 #include <string.h>
+#include <time.h>
+
+// The hardware kernels are compiled with per-function target attributes
+// instead of -march=native, so one build runs on every x86-64 host and the
+// best kernel is picked at import time (see "Kernel dispatch" below).
+#if defined(__x86_64__) || defined(__i386__)
+#include <immintrin.h>
+#define AES_X86 1
+#define TARGET_AESNI __attribute__((target("aes,ssse3")))
+#define TARGET_VAES __attribute__((target("vaes,avx2,aes,ssse3")))
+#define TARGET_GCM __attribute__((target("pclmul,aes,ssse3")))
+#else
+#define AES_X86 0
+#endif
+
+#define ALIGN16 __attribute__((aligned(16)))
 
 // Error codes
 #define ERR_NULL 1
@@ -14,20 +31,566 @@
 // Block size
 #define BLOCK_SIZE 16
 
-// AES state structure
+// Number of counter blocks kept in flight by the interleaved CTR kernel
+#define CTR_PARALLEL_BLOCKS 8
+
+// Inputs at least this large are processed with the GIL released
+#define GIL_RELEASE_THRESHOLD (16 * 1024)
+
+// Smallest slice handed to a worker thread; smaller inputs use fewer threads
+#define MIN_THREAD_SLICE (256 * 1024)
+
+// Upper bound for the threads= argument
+#define MAX_THREADS 256
+
+// Number of 16-byte blocks the portable kernel pushes through one bitsliced S-box pass
+#define SOFT_PARALLEL_BLOCKS 4
+
+// GCM: IV size that maps directly onto the pre-counter block, and the
+// largest message SP 800-38D allows (2^32 - 2 blocks)
+#define GCM_IV_SIZE 12
+#define GCM_MAX_DATA ((((uint64_t)1 << 32) - 2) * BLOCK_SIZE)
+
+// AES state structure.
+// Round keys are kept as plain bytes so every kernel shares the same
+// schedule; drk holds the equivalent inverse cipher keys (InvMixColumns
+// applied), which is the layout aesdec expects.
 typedef struct {
-    __m128i erk[15];  // Round keys for encryption
-    __m128i drk[15];  // Round keys for decryption
+    ALIGN16 uint8_t erk[15][BLOCK_SIZE];  // Round keys for encryption
+    ALIGN16 uint8_t drk[15][BLOCK_SIZE];  // Round keys for decryption
     unsigned rounds;
 } AESNI_State;
 
-// CTR mode state
+// CTR mode state. The kernels only touch counter; keystream/used hold the
+// rest of a block that a previous call ended in the middle of.
 typedef struct {
     AESNI_State aes_state;
-    uint64_t counter;
+    uint64_t counter;                       // Counter of the next keystream block
+    ALIGN16 uint8_t keystream[BLOCK_SIZE];  // Last keystream block
+    unsigned used;                          // Bytes of keystream already consumed
 } AESNI_CTR_State;
 
+// GCM state. Read-only after initialization (the IV is passed per message),
+// so one object can serve several threads at once.
+typedef struct {
+    AESNI_State aes_state;
+    ALIGN16 uint8_t h[BLOCK_SIZE];  // Hash key E_K(0^128)
+    // H^1..H^8 byte-reflected for the PCLMULQDQ kernel (set when supported)
+    ALIGN16 uint8_t htable[CTR_PARALLEL_BLOCKS][BLOCK_SIZE];
+} AESNI_GCM_State;
+
+// One-shot GCM: encrypt (or decrypt) len bytes and compute the full 16-byte tag
+typedef int (*GCM_CryptFn)(const AESNI_GCM_State *gcm, const uint8_t *iv, size_t iv_len,
+                           const uint8_t *aad, size_t aad_len, const uint8_t *in, uint8_t *out,
+                           size_t len, int decrypt, uint8_t tag[BLOCK_SIZE]);
+
+// ECB/CBC/CFB/OFB state (pyaes block and segment modes)
+typedef struct {
+    AESNI_State aes_state;
+    // CBC: last ciphertext block, CFB: shift register, OFB: last keystream block
+    ALIGN16 uint8_t iv[BLOCK_SIZE];
+    unsigned used;          // OFB: keystream bytes of iv already consumed
+    unsigned segment_size;  // CFB: bytes per segment (1..16)
+} AESNI_Block_State;
+
+// One message of a process_many() batch: its own key and initial counter
+typedef struct {
+    const uint8_t *key;
+    size_t key_len;    // 16, 24 or 32 (checked by the caller)
+    uint64_t counter;
+    const uint8_t *in;
+    uint8_t *out;
+    size_t len;
+} CTR_Message;
+
+// Encrypt or decrypt nblocks whole blocks (ECB); in and out may be the same buffer
+typedef void (*AES_BlocksFn)(const AESNI_State *aes, const uint8_t *in, uint8_t *out, size_t nblocks);
+
+// Kernel descriptor: key schedule, raw block functions, and CTR and GCM
+// implementations for one instruction set
+typedef struct {
+    const char *name;
+    int (*supported)(void);
+    int (*expand_key)(AESNI_State *aes, const uint8_t *key, unsigned Nk, unsigned Nr);
+    AES_BlocksFn encrypt_blocks;
+    AES_BlocksFn decrypt_blocks;
+    int (*ctr_process)(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out, size_t len);
+    int (*ctr_many)(const CTR_Message *msgs, size_t count);
+    GCM_CryptFn gcm_crypt;
+} AES_Kernel;
+
+// Overwrite key material in a way the compiler cannot optimize away
+static void secure_zero(void *p, size_t len) {
+    volatile uint8_t *v = (volatile uint8_t*)p;
+    while (len--) {
+        *v++ = 0;
+    }
+}
+
+// Number of rounds for a key length, 0 if the length is invalid
+static unsigned rounds_for_key(size_t key_len) {
+    if (key_len == 16) return 10;
+    if (key_len == 24) return 12;
+    if (key_len == 32) return 14;
+    return 0;
+}
+
+// ---------------------------------------------------------------------------
+// Portable kernel: constant-time and table-free.
+// The S-box is computed as GF(2^8) inversion (x^254) followed by the affine
+// map, on a bitsliced representation (plane b holds bit b of up to 64
+// bytes), so there are no secret-dependent loads or branches.
+// ---------------------------------------------------------------------------
+
+// Multiply two bitsliced GF(2^8) vectors modulo x^8 + x^4 + x^3 + x + 1
+static void soft_gf_mul(uint64_t r[8], const uint64_t a[8], const uint64_t b[8]) {
+    uint64_t t[15] = {0};
+    int i, j;
+
+    for (i = 0; i < 8; i++) {
+        for (j = 0; j < 8; j++) {
+            t[i + j] ^= a[i] & b[j];
+        }
+    }
+    // x^k = x^(k-4) + x^(k-5) + x^(k-7) + x^(k-8) for k >= 8
+    for (i = 14; i >= 8; i--) {
+        t[i - 4] ^= t[i];
+        t[i - 5] ^= t[i];
+        t[i - 7] ^= t[i];
+        t[i - 8] ^= t[i];
+    }
+    memcpy(r, t, 8 * sizeof(uint64_t));
+}
+
+// Transpose an 8x8 bit matrix (row = byte, column = bit)
+static inline uint64_t soft_transpose8x8(uint64_t x) {
+    uint64_t t;
+
+    t = (x ^ (x >> 7)) & 0x00AA00AA00AA00AAULL;
+    x ^= t ^ (t << 7);
+    t = (x ^ (x >> 14)) & 0x0000CCCC0000CCCCULL;
+    x ^= t ^ (t << 14);
+    t = (x ^ (x >> 28)) & 0x00000000F0F0F0F0ULL;
+    x ^= t ^ (t << 28);
+    return x;
+}
+
+// SubBytes (or InvSubBytes) on n <= 64 bytes in place
+static void soft_sub_bytes(uint8_t *bytes, size_t n, int inverse) {
+    uint8_t lanes[64] = {0};
+    uint64_t x[8] = {0}, x2[8], x3[8], x12[8], t[8];
+    size_t g;
+    int b, k;
+
+    // Bitslice: plane b, bit i = bit b of byte i
+    memcpy(lanes, bytes, n);
+    for (g = 0; g < 8; g++) {
+        uint64_t w = 0;
+        for (k = 0; k < 8; k++) {
+            w |= (uint64_t)lanes[8*g + k] << (8*k);
+        }
+        w = soft_transpose8x8(w);
+        for (b = 0; b < 8; b++) {
+            x[b] |= ((w >> (8*b)) & 0xFF) << (8*g);
+        }
+    }
+
+    if (inverse) {
+        // Inverse affine map: b_i = s_(i+2) ^ s_(i+5) ^ s_(i+7) ^ 0x05_i
+        for (b = 0; b < 8; b++) {
+            t[b] = x[(b + 2) & 7] ^ x[(b + 5) & 7] ^ x[(b + 7) & 7];
+        }
+        t[0] = ~t[0];
+        t[2] = ~t[2];
+        memcpy(x, t, sizeof(t));
+    }
+
+    // x^254 = x^-1 (and 0 -> 0): 7 squarings, 4 multiplications
+    soft_gf_mul(x2, x, x);          // x^2
+    soft_gf_mul(x3, x2, x);         // x^3
+    soft_gf_mul(t, x3, x3);         // x^6
+    soft_gf_mul(x12, t, t);         // x^12
+    soft_gf_mul(t, x12, x3);        // x^15
+    for (k = 0; k < 4; k++) {
+        soft_gf_mul(t, t, t);       // x^30, x^60, x^120, x^240
+    }
+    soft_gf_mul(t, t, x12);         // x^252
+    soft_gf_mul(x, t, x2);          // x^254
+
+    if (!inverse) {
+        // Affine map: s_i = b_i ^ b_(i+4) ^ b_(i+5) ^ b_(i+6) ^ b_(i+7) ^ 0x63_i
+        for (b = 0; b < 8; b++) {
+            t[b] = x[b] ^ x[(b + 4) & 7] ^ x[(b + 5) & 7] ^ x[(b + 6) & 7] ^ x[(b + 7) & 7];
+        }
+        t[0] = ~t[0];
+        t[1] = ~t[1];
+        t[5] = ~t[5];
+        t[6] = ~t[6];
+        memcpy(x, t, sizeof(t));
+    }
+
+    for (g = 0; g < 8; g++) {
+        uint64_t w = 0;
+        for (b = 0; b < 8; b++) {
+            w |= ((x[b] >> (8*g)) & 0xFF) << (8*b);
+        }
+        w = soft_transpose8x8(w);
+        for (k = 0; k < 8; k++) {
+            lanes[8*g + k] = (uint8_t)(w >> (8*k));
+        }
+    }
+    memcpy(bytes, lanes, n);
+}
+
+static inline uint8_t soft_xtime(uint8_t a) {
+    return (uint8_t)((a << 1) ^ (0x1b & -(a >> 7)));
+}
+
+// ShiftRows on a column-major 16-byte state
+static void soft_shift_rows(uint8_t *s) {
+    uint8_t t[BLOCK_SIZE];
+    int r, c;
+
+    for (c = 0; c < 4; c++) {
+        for (r = 0; r < 4; r++) {
+            t[4*c + r] = s[4*((c + r) & 3) + r];
+        }
+    }
+    memcpy(s, t, BLOCK_SIZE);
+}
+
+// InvShiftRows on a column-major 16-byte state
+static void soft_inv_shift_rows(uint8_t *s) {
+    uint8_t t[BLOCK_SIZE];
+    int r, c;
+
+    for (c = 0; c < 4; c++) {
+        for (r = 0; r < 4; r++) {
+            t[4*c + r] = s[4*((c - r) & 3) + r];
+        }
+    }
+    memcpy(s, t, BLOCK_SIZE);
+}
+
+static void soft_mix_columns(uint8_t *s) {
+    int c;
+
+    for (c = 0; c < 4; c++) {
+        uint8_t *col = s + 4*c;
+        uint8_t a0 = col[0], a1 = col[1], a2 = col[2], a3 = col[3];
+        uint8_t all = a0 ^ a1 ^ a2 ^ a3;
+        col[0] = a0 ^ all ^ soft_xtime(a0 ^ a1);
+        col[1] = a1 ^ all ^ soft_xtime(a1 ^ a2);
+        col[2] = a2 ^ all ^ soft_xtime(a2 ^ a3);
+        col[3] = a3 ^ all ^ soft_xtime(a3 ^ a0);
+    }
+}
+
+// InvMixColumns = MixColumns after multiplying each column by {04}x^2 + {05}
+static void soft_inv_mix_columns(uint8_t *s) {
+    int c;
+
+    for (c = 0; c < 4; c++) {
+        uint8_t *col = s + 4*c;
+        uint8_t u = soft_xtime(soft_xtime(col[0] ^ col[2]));
+        uint8_t v = soft_xtime(soft_xtime(col[1] ^ col[3]));
+        col[0] ^= u;
+        col[1] ^= v;
+        col[2] ^= u;
+        col[3] ^= v;
+    }
+    soft_mix_columns(s);
+}
+
+static void soft_add_round_key(uint8_t *s, const uint8_t *rk) {
+    int i;
+
+    for (i = 0; i < BLOCK_SIZE; i++) {
+        s[i] ^= rk[i];
+    }
+}
+
+// Encrypt up to SOFT_PARALLEL_BLOCKS blocks in place
+static void soft_encrypt_blocks(const AESNI_State *aes, uint8_t *blocks, size_t nblocks) {
+    size_t j;
+    unsigned r;
+
+    for (j = 0; j < nblocks; j++) {
+        soft_add_round_key(blocks + j*BLOCK_SIZE, aes->erk[0]);
+    }
+    for (r = 1; r <= aes->rounds; r++) {
+        soft_sub_bytes(blocks, nblocks * BLOCK_SIZE, 0);
+        for (j = 0; j < nblocks; j++) {
+            uint8_t *s = blocks + j*BLOCK_SIZE;
+            soft_shift_rows(s);
+            if (r != aes->rounds) {
+                soft_mix_columns(s);
+            }
+            soft_add_round_key(s, aes->erk[r]);
+        }
+    }
+}
+
+// Decrypt up to SOFT_PARALLEL_BLOCKS blocks in place with the equivalent
+// inverse cipher (drk), the same key layout aesdec uses
+static void soft_decrypt_blocks(const AESNI_State *aes, uint8_t *blocks, size_t nblocks) {
+    size_t j;
+    unsigned r;
+
+    for (j = 0; j < nblocks; j++) {
+        soft_add_round_key(blocks + j*BLOCK_SIZE, aes->drk[0]);
+    }
+    for (r = 1; r <= aes->rounds; r++) {
+        soft_sub_bytes(blocks, nblocks * BLOCK_SIZE, 1);
+        for (j = 0; j < nblocks; j++) {
+            uint8_t *s = blocks + j*BLOCK_SIZE;
+            soft_inv_shift_rows(s);
+            if (r != aes->rounds) {
+                soft_inv_mix_columns(s);
+            }
+            soft_add_round_key(s, aes->drk[r]);
+        }
+    }
+}
+
+static void soft_ecb_encrypt(const AESNI_State *aes, const uint8_t *in, uint8_t *out, size_t nblocks) {
+    size_t i, n;
+
+    for (i = 0; i < nblocks; i += n) {
+        n = nblocks - i < SOFT_PARALLEL_BLOCKS ? nblocks - i : SOFT_PARALLEL_BLOCKS;
+        memmove(out + i*BLOCK_SIZE, in + i*BLOCK_SIZE, n*BLOCK_SIZE);
+        soft_encrypt_blocks(aes, out + i*BLOCK_SIZE, n);
+    }
+}
+
+static void soft_ecb_decrypt(const AESNI_State *aes, const uint8_t *in, uint8_t *out, size_t nblocks) {
+    size_t i, n;
+
+    for (i = 0; i < nblocks; i += n) {
+        n = nblocks - i < SOFT_PARALLEL_BLOCKS ? nblocks - i : SOFT_PARALLEL_BLOCKS;
+        memmove(out + i*BLOCK_SIZE, in + i*BLOCK_SIZE, n*BLOCK_SIZE);
+        soft_decrypt_blocks(aes, out + i*BLOCK_SIZE, n);
+    }
+}
+
+static int soft_supported(void) {
+    return 1;
+}
+
+// FIPS-197 key expansion, plus the equivalent inverse cipher keys
+static int soft_expand_key(AESNI_State *aes, const uint8_t *key, unsigned Nk, unsigned Nr) {
+    uint8_t w[4*4*(14+1)];
+    uint8_t t[4], tmp, rcon = 0x01;
+    unsigned tot_words = 4*(Nr+1), i, k;
+
+    memcpy(w, key, 4*Nk);
+    for (i = Nk; i < tot_words; i++) {
+        memcpy(t, &w[4*(i-1)], 4);
+        if (i % Nk == 0) {
+            // RotWord + SubWord + Rcon
+            tmp = t[0]; t[0] = t[1]; t[1] = t[2]; t[2] = t[3]; t[3] = tmp;
+            soft_sub_bytes(t, 4, 0);
+            t[0] ^= rcon;
+            rcon = soft_xtime(rcon);
+        } else if ((i % Nk == 4) && (Nk == 8)) {
+            soft_sub_bytes(t, 4, 0);
+        }
+        for (k = 0; k < 4; k++) {
+            w[4*i + k] = w[4*(i-Nk) + k] ^ t[k];
+        }
+    }
+    memcpy(aes->erk, w, 4*tot_words);
+
+    memcpy(aes->drk[0], aes->erk[Nr], BLOCK_SIZE);
+    for (i = 1; i < Nr; i++) {
+        memcpy(aes->drk[i], aes->erk[Nr-i], BLOCK_SIZE);
+        soft_inv_mix_columns(aes->drk[i]);
+    }
+    memcpy(aes->drk[Nr], aes->erk[0], BLOCK_SIZE);
+
+    return 0;
+}
+
+static int soft_ctr_process(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out, size_t len) {
+    uint8_t ks[SOFT_PARALLEL_BLOCKS * BLOCK_SIZE];
+    size_t i, j, n, nblocks;
+    int k;
+
+    for (i = 0; i < len; i += n) {
+        n = len - i;
+        if (n > sizeof(ks)) n = sizeof(ks);
+        nblocks = (n + BLOCK_SIZE - 1) / BLOCK_SIZE;
+
+        // Counter blocks: zero high half, big-endian counter in the last 8 bytes
+        memset(ks, 0, sizeof(ks));
+        for (j = 0; j < nblocks; j++) {
+            uint64_t c = state->counter++;
+            for (k = 0; k < 8; k++) {
+                ks[j*BLOCK_SIZE + 15 - k] = (uint8_t)(c >> (8*k));
+            }
+        }
+
+        soft_encrypt_blocks(&state->aes_state, ks, nblocks);
+        for (j = 0; j < n; j++) {
+            out[i + j] = in[i + j] ^ ks[j];
+        }
+    }
+
+    return 0;
+}
+
+// Batch of independent messages, one at a time
+static int soft_ctr_many(const CTR_Message *msgs, size_t count) {
+    AESNI_CTR_State state;
+    size_t m;
+
+    for (m = 0; m < count; m++) {
+        state.aes_state.rounds = rounds_for_key(msgs[m].key_len);
+        soft_expand_key(&state.aes_state, msgs[m].key, (unsigned)msgs[m].key_len / 4,
+                        state.aes_state.rounds);
+        state.counter = msgs[m].counter;
+        soft_ctr_process(&state, msgs[m].in, msgs[m].out, msgs[m].len);
+    }
+    secure_zero(&state, sizeof(state));
+    return 0;
+}
+
+// ---------------------------------------------------------------------------
+// GCM (NIST SP 800-38D), portable version.
+// GHASH is a branch-free shift-and-add multiply in GCM bit order, so it stays
+// constant-time like the portable block cipher.
+// ---------------------------------------------------------------------------
+
+static inline uint64_t load_be64(const uint8_t *p) {
+    uint64_t v = 0;
+    int i;
+
+    for (i = 0; i < 8; i++) {
+        v = (v << 8) | p[i];
+    }
+    return v;
+}
+
+static inline void store_be64(uint8_t *p, uint64_t v) {
+    int i;
+
+    for (i = 7; i >= 0; i--) {
+        p[i] = (uint8_t)v;
+        v >>= 8;
+    }
+}
+
+// Final GHASH block: bit lengths of the two hashed inputs, big-endian
+static void gcm_length_block(uint8_t block[BLOCK_SIZE], uint64_t a_len, uint64_t b_len) {
+    store_be64(block, a_len * 8);
+    store_be64(block + 8, b_len * 8);
+}
+
+// Increment the 32-bit big-endian block counter in the last 4 bytes
+static inline void gcm_inc32(uint8_t block[BLOCK_SIZE]) {
+    int i;
+
+    for (i = BLOCK_SIZE - 1; i >= BLOCK_SIZE - 4; i--) {
+        if (++block[i] != 0) break;
+    }
+}
+
+// x = x * h in GF(2^128)
+static void soft_gf128_mul(uint8_t x[BLOCK_SIZE], const uint8_t h[BLOCK_SIZE]) {
+    uint64_t zh = 0, zl = 0;
+    uint64_t vh = load_be64(h), vl = load_be64(h + 8);
+    int i;
+
+    for (i = 0; i < 128; i++) {
+        uint64_t bit = -(uint64_t)((x[i / 8] >> (7 - i % 8)) & 1);
+        uint64_t carry = -(vl & 1);
+
+        zh ^= vh & bit;
+        zl ^= vl & bit;
+        vl = (vl >> 1) | (vh << 63);
+        vh = (vh >> 1) ^ (0xE100000000000000ULL & carry);
+    }
+
+    store_be64(x, zh);
+    store_be64(x + 8, zl);
+}
+
+// Absorb data into the GHASH accumulator x, zero padding the last block
+static void soft_ghash(uint8_t x[BLOCK_SIZE], const uint8_t h[BLOCK_SIZE],
+                       const uint8_t *data, size_t len) {
+    size_t i, k, n;
+
+    for (i = 0; i < len; i += BLOCK_SIZE) {
+        n = len - i < BLOCK_SIZE ? len - i : BLOCK_SIZE;
+        for (k = 0; k < n; k++) {
+            x[k] ^= data[i + k];
+        }
+        soft_gf128_mul(x, h);
+    }
+}
+
+static int soft_gcm_crypt(const AESNI_GCM_State *gcm, const uint8_t *iv, size_t iv_len,
+                          const uint8_t *aad, size_t aad_len, const uint8_t *in, uint8_t *out,
+                          size_t len, int decrypt, uint8_t tag[BLOCK_SIZE]) {
+    uint8_t j0[BLOCK_SIZE] = {0}, ctr[BLOCK_SIZE], x[BLOCK_SIZE] = {0}, lengths[BLOCK_SIZE];
+    uint8_t ks[SOFT_PARALLEL_BLOCKS * BLOCK_SIZE];
+    size_t i, j, n, nblocks;
+
+    // Pre-counter block J0
+    if (iv_len == GCM_IV_SIZE) {
+        memcpy(j0, iv, GCM_IV_SIZE);
+        j0[BLOCK_SIZE - 1] = 1;
+    } else {
+        soft_ghash(j0, gcm->h, iv, iv_len);
+        gcm_length_block(lengths, 0, iv_len);
+        soft_ghash(j0, gcm->h, lengths, BLOCK_SIZE);
+    }
+    memcpy(ctr, j0, BLOCK_SIZE);
+
+    soft_ghash(x, gcm->h, aad, aad_len);
+
+    for (i = 0; i < len; i += n) {
+        n = len - i;
+        if (n > sizeof(ks)) n = sizeof(ks);
+        nblocks = (n + BLOCK_SIZE - 1) / BLOCK_SIZE;
+
+        for (j = 0; j < nblocks; j++) {
+            gcm_inc32(ctr);
+            memcpy(ks + j*BLOCK_SIZE, ctr, BLOCK_SIZE);
+        }
+        soft_encrypt_blocks(&gcm->aes_state, ks, nblocks);
+
+        // GHASH always runs over the ciphertext; read it before in-place writes
+        if (decrypt) soft_ghash(x, gcm->h, in + i, n);
+        for (j = 0; j < n; j++) {
+            out[i + j] = in[i + j] ^ ks[j];
+        }
+        if (!decrypt) soft_ghash(x, gcm->h, out + i, n);
+    }
+
+    gcm_length_block(lengths, aad_len, len);
+    soft_ghash(x, gcm->h, lengths, BLOCK_SIZE);
+
+    memcpy(tag, j0, BLOCK_SIZE);
+    soft_encrypt_blocks(&gcm->aes_state, tag, 1);
+    for (j = 0; j < BLOCK_SIZE; j++) {
+        tag[j] ^= x[j];
+    }
+
+    return 0;
+}
+
+#if AES_X86
+// ---------------------------------------------------------------------------
+// AES-NI kernel
+// ---------------------------------------------------------------------------
+
+static int aesni_supported(void) {
+    return __builtin_cpu_supports("aes") && __builtin_cpu_supports("ssse3");
+}
+
 // Helper function for key expansion
+TARGET_AESNI
 static uint32_t sub_rot(uint32_t w, unsigned idx, int subType) {
     __m128i x, y, z;
     
@@ -55,7 +618,10 @@ static uint32_t sub_rot(uint32_t w, unsigned idx, int subType) {
 }
 
 // Key expansion function
-static int expand_key(__m128i *erk, __m128i *drk, const uint8_t *key, unsigned Nk, unsigned Nr) {
+TARGET_AESNI
+static int aesni_expand_key(AESNI_State *aes, const uint8_t *key, unsigned Nk, unsigned Nr) {
+    __m128i *erk = (__m128i*)aes->erk;
+    __m128i *drk = (__m128i*)aes->drk;
     uint32_t rk[4*(14+2)];
     unsigned tot_words, i;
     
@@ -96,39 +662,10 @@ static int expand_key(__m128i *erk, __m128i *drk, const uint8_t *key, unsigned N
     return 0;
 }
 
-// Initialize AES-CTR state
-static AESNI_CTR_State* aesni_ctr_init(const uint8_t *key, size_t key_len, uint64_t initial_counter) {
-    AESNI_CTR_State *state;
-    unsigned Nr;
-    
-    if (key_len == 16) Nr = 10;
-    else if (key_len == 24) Nr = 12;
-    else if (key_len == 32) Nr = 14;
-    else return NULL;
-    
-    state = malloc(sizeof(AESNI_CTR_State));
-    if (!state) return NULL;
-    
-    state->aes_state.rounds = Nr;
-    state->counter = initial_counter;
-    
-    if (expand_key(state->aes_state.erk, state->aes_state.drk, key, key_len/4, Nr) != 0) {
-        free(state);
-        return NULL;
-    }
-    
-    return state;
-}
-
-// Cleanup AES-CTR state
-static void aesni_ctr_cleanup(AESNI_CTR_State *state) {
-    if (state) {
-        free(state);
-    }
-}
-
-// Optimized CTR mode encryption/decryption
-static int aesni_ctr_process(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out, size_t len) {
+// Single-block CTR path, used for the tail of the interleaved kernel
+TARGET_AESNI
+static int aesni_ctr_process_1x(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out, size_t len) {
+    const __m128i *rk = (const __m128i*)state->aes_state.erk;
     size_t i;
     __m128i counter_block, encrypted_counter;
     uint64_t current_counter = state->counter;
@@ -149,13 +686,13 @@ static int aesni_ctr_process(AESNI_CTR_State *state, const uint8_t *in, uint8_t
         counter_block = _mm_loadu_si128((__m128i*)counter_bytes);
         
         // Encrypt the counter block
-        encrypted_counter = _mm_xor_si128(counter_block, state->aes_state.erk[0]);
+        encrypted_counter = _mm_xor_si128(counter_block, rk[0]);
         
         for (unsigned j = 1; j < state->aes_state.rounds; j++) {
-            encrypted_counter = _mm_aesenc_si128(encrypted_counter, state->aes_state.erk[j]);
+            encrypted_counter = _mm_aesenc_si128(encrypted_counter, rk[j]);
         }
         
-        encrypted_counter = _mm_aesenclast_si128(encrypted_counter, state->aes_state.erk[state->aes_state.rounds]);
+        encrypted_counter = _mm_aesenclast_si128(encrypted_counter, rk[state->aes_state.rounds]);
         
         // XOR with data
         size_t block_size = (i + BLOCK_SIZE <= len) ? BLOCK_SIZE : (len - i);
@@ -181,79 +718,2419 @@ static int aesni_ctr_process(AESNI_CTR_State *state, const uint8_t *in, uint8_t
     return 0;
 }
 
-// Python wrapper functions
-static PyObject* py_aesni_ctr_init(PyObject* self, PyObject* args) {
-    Py_buffer key_buf;
-    uint64_t initial_counter = 0;
-    AESNI_CTR_State *state;
-    
-    if (!PyArg_ParseTuple(args, "y*|K", &key_buf, &initial_counter)) {
-        return NULL;
+// Byte-swap mask turning a little-endian 64-bit counter in the high lane into
+// the pyaes counter block (low 8 bytes zero, big-endian counter in the last 8)
+#define CTR_BSWAP_MASK _mm_setr_epi8(0, 1, 2, 3, 4, 5, 6, 7, 15, 14, 13, 12, 11, 10, 9, 8)
+
+// Optimized CTR mode encryption/decryption.
+// Keeps CTR_PARALLEL_BLOCKS counter blocks in flight per round so the
+// aesenc latency of one block is hidden behind the others, then hands the
+// remaining (< 8 block) tail to the single-block path.
+TARGET_AESNI
+static int aesni_ctr_process(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out, size_t len) {
+    const __m128i *rk = (const __m128i*)state->aes_state.erk;
+    const unsigned rounds = state->aes_state.rounds;
+    const __m128i bswap = CTR_BSWAP_MASK;
+    const __m128i one = _mm_set_epi64x(1, 0);
+    const size_t stride = CTR_PARALLEL_BLOCKS * BLOCK_SIZE;
+    __m128i ctr = _mm_set_epi64x((long long)state->counter, 0);
+    __m128i b[CTR_PARALLEL_BLOCKS];
+    size_t i;
+    unsigned j, r;
+
+    for (i = 0; i + stride <= len; i += stride) {
+        // Build the counter blocks with SIMD add + byte swap and apply round 0
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            b[j] = _mm_xor_si128(_mm_shuffle_epi8(ctr, bswap), rk[0]);
+            ctr = _mm_add_epi64(ctr, one);
+        }
+
+        for (r = 1; r < rounds; r++) {
+            const __m128i k = rk[r];
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                b[j] = _mm_aesenc_si128(b[j], k);
+            }
+        }
+
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            __m128i data_block = _mm_loadu_si128((const __m128i*)(in + i + j*BLOCK_SIZE));
+            b[j] = _mm_aesenclast_si128(b[j], rk[rounds]);
+            _mm_storeu_si128((__m128i*)(out + i + j*BLOCK_SIZE), _mm_xor_si128(data_block, b[j]));
+        }
+
+        state->counter += CTR_PARALLEL_BLOCKS;
     }
-    
-    state = aesni_ctr_init((uint8_t*)key_buf.buf, key_buf.len, initial_counter);
-    if (!state) {
-        PyBuffer_Release(&key_buf);
-        PyErr_SetString(PyExc_ValueError, "Failed to initialize AES-CTR");
-        return NULL;
+
+    if (i < len) {
+        return aesni_ctr_process_1x(state, in + i, out + i, len - i);
     }
-    
-    PyBuffer_Release(&key_buf);
-    return PyLong_FromVoidPtr(state);
+
+    return 0;
 }
 
-static PyObject* py_aesni_ctr_process(PyObject* self, PyObject* args) {
-    Py_buffer in_buf, out_buf;
-    AESNI_CTR_State *state;
-    PyObject *state_obj;
-    int result;
-    
-    if (!PyArg_ParseTuple(args, "Oy*y*", &state_obj, &in_buf, &out_buf)) {
-        return NULL;
-    }
-    
-    state = (AESNI_CTR_State*)PyLong_AsVoidPtr(state_obj);
-    if (!state) {
-        PyBuffer_Release(&in_buf);
-        PyBuffer_Release(&out_buf);
-        PyErr_SetString(PyExc_ValueError, "Invalid AES-CTR state");
-        return NULL;
+// Encrypt a single block
+TARGET_AESNI
+static inline __m128i aesni_encrypt1(const __m128i *rk, unsigned rounds, __m128i b) {
+    unsigned r;
+
+    b = _mm_xor_si128(b, rk[0]);
+    for (r = 1; r < rounds; r++) {
+        b = _mm_aesenc_si128(b, rk[r]);
     }
-    
-    result = aesni_ctr_process(state, (uint8_t*)in_buf.buf, (uint8_t*)out_buf.buf, in_buf.len);
-    
-    PyBuffer_Release(&in_buf);
-    PyBuffer_Release(&out_buf);
-    
-    if (result != 0) {
-        PyErr_SetString(PyExc_RuntimeError, "AES-CTR processing failed");
-        return NULL;
+    return _mm_aesenclast_si128(b, rk[rounds]);
+}
+
+// Decrypt a single block (drk holds the aesdec round keys)
+TARGET_AESNI
+static inline __m128i aesni_decrypt1(const __m128i *drk, unsigned rounds, __m128i b) {
+    unsigned r;
+
+    b = _mm_xor_si128(b, drk[0]);
+    for (r = 1; r < rounds; r++) {
+        b = _mm_aesdec_si128(b, drk[r]);
     }
-    
-    Py_RETURN_NONE;
+    return _mm_aesdeclast_si128(b, drk[rounds]);
 }
 
-static PyObject* py_aesni_ctr_cleanup(PyObject* self, PyObject* args) {
-    PyObject *state_obj;
-    AESNI_CTR_State *state;
+// Encryption-only key schedule for the multi-buffer kernel, where a key is
+// expanded per message: the straight-line aeskeygenassist sequences for
+// 128- and 256-bit keys (no drk, no per-word dispatch); 192-bit keys use
+// the generic expansion.
+// Next round key from the one Nk words back, w[i-Nk] ^ ... ^ w[i-4] ^ t
+TARGET_AESNI
+static inline __m128i expand_mix(__m128i k, __m128i t) {
+    k = _mm_xor_si128(k, _mm_slli_si128(k, 4));
+    k = _mm_xor_si128(k, _mm_slli_si128(k, 8));
+    return _mm_xor_si128(k, t);
+}
+
+#define EXPAND128(i, rcon) \
+    rk[i] = expand_mix(rk[(i) - 1], _mm_shuffle_epi32(_mm_aeskeygenassist_si128(rk[(i) - 1], rcon), 0xff))
+#define EXPAND256(i, rcon) do { \
+    rk[i] = expand_mix(rk[(i) - 2], _mm_shuffle_epi32(_mm_aeskeygenassist_si128(rk[(i) - 1], rcon), 0xff)); \
+    if ((i) < 14) \
+        rk[(i) + 1] = expand_mix(rk[(i) - 1], _mm_shuffle_epi32(_mm_aeskeygenassist_si128(rk[i], 0), 0xaa)); \
+} while (0)
+
+TARGET_AESNI
+static void aesni_expand_enc_key(AESNI_State *aes, const uint8_t *key, size_t key_len) {
+    __m128i *rk = (__m128i*)aes->erk;
+
+    if (key_len == 16) {
+        rk[0] = _mm_loadu_si128((const __m128i*)key);
+        EXPAND128(1, 0x01); EXPAND128(2, 0x02); EXPAND128(3, 0x04); EXPAND128(4, 0x08);
+        EXPAND128(5, 0x10); EXPAND128(6, 0x20); EXPAND128(7, 0x40); EXPAND128(8, 0x80);
+        EXPAND128(9, 0x1b); EXPAND128(10, 0x36);
+    } else if (key_len == 32) {
+        rk[0] = _mm_loadu_si128((const __m128i*)key);
+        rk[1] = _mm_loadu_si128((const __m128i*)(key + BLOCK_SIZE));
+        EXPAND256(2, 0x01); EXPAND256(4, 0x02); EXPAND256(6, 0x04); EXPAND256(8, 0x08);
+        EXPAND256(10, 0x10); EXPAND256(12, 0x20); EXPAND256(14, 0x40);
+    } else {
+        aesni_expand_key(aes, key, (unsigned)key_len / 4, rounds_for_key(key_len));
+    }
+}
+
+#undef EXPAND128
+#undef EXPAND256
+
+// Multi-buffer CTR for batches of short messages with their own keys.
+// A single short message cannot fill the 8-block pipeline, so each of the
+// CTR_PARALLEL_BLOCKS lanes works on a different message with its own round
+// keys. Lanes run in lockstep for as many whole blocks as the shortest one
+// has left; a lane that finishes takes the next message. Idle lanes keep
+// encrypting a scratch block so the lockstep loop stays fully unrolled. All
+// lanes must share the round count, so the batch is walked once per key size.
+typedef struct {
+    AESNI_State aes;
+    uint64_t counter;
+    const uint8_t *in;
+    uint8_t *out;
+    size_t left;   // Bytes still to process
+    size_t step;   // BLOCK_SIZE, or 0 for an idle lane parked on scratch
+} CTR_Lane;
+
+TARGET_AESNI
+static int aesni_ctr_many(const CTR_Message *msgs, size_t count) {
+    static const size_t key_sizes[] = {16, 24, 32};
+    const __m128i bswap = CTR_BSWAP_MASK;
+    const __m128i one = _mm_set_epi64x(1, 0);
+    CTR_Lane lanes[CTR_PARALLEL_BLOCKS];
+    ALIGN16 uint8_t scratch[BLOCK_SIZE];
+    const __m128i *rk[CTR_PARALLEL_BLOCKS];
+    const uint8_t *in[CTR_PARALLEL_BLOCKS];
+    uint8_t *out[CTR_PARALLEL_BLOCKS];
+    size_t step[CTR_PARALLEL_BLOCKS];
+    __m128i b[CTR_PARALLEL_BLOCKS], ctr[CTR_PARALLEL_BLOCKS];
+    size_t k, next, nblocks, n;
+    unsigned j, r, busy, rounds;
+
+    memset(lanes, 0, sizeof(lanes));
+    for (k = 0; k < sizeof(key_sizes) / sizeof(key_sizes[0]); k++) {
+        rounds = rounds_for_key(key_sizes[k]);
+        next = 0;
+
+        for (;;) {
+            // Refill idle lanes and find how far all busy lanes can go
+            busy = 0;
+            nblocks = SIZE_MAX;
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                CTR_Lane *lane = &lanes[j];
+                if (!lane->left) {
+                    while (next < count && (msgs[next].key_len != key_sizes[k] || !msgs[next].len)) {
+                        next++;
+                    }
+                    if (next == count) {
+                        lane->aes.rounds = rounds;
+                        lane->in = lane->out = scratch;
+                        lane->step = 0;
+                        continue;
+                    }
+                    lane->aes.rounds = rounds;
+                    aesni_expand_enc_key(&lane->aes, msgs[next].key, key_sizes[k]);
+                    lane->counter = msgs[next].counter;
+                    lane->in = msgs[next].in;
+                    lane->out = msgs[next].out;
+                    lane->left = msgs[next].len;
+                    lane->step = BLOCK_SIZE;
+                    next++;
+                }
+                busy++;
+                if (lane->left / BLOCK_SIZE < nblocks) nblocks = lane->left / BLOCK_SIZE;
+            }
+            if (!busy) break;
+
+            // Whole blocks in lockstep, from locals the compiler can keep in
+            // registers (stores through __m128i* may alias the lane structs)
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                rk[j] = (const __m128i*)lanes[j].aes.erk;
+                in[j] = lanes[j].in;
+                out[j] = lanes[j].out;
+                step[j] = lanes[j].step;
+                ctr[j] = _mm_set_epi64x((long long)lanes[j].counter, 0);
+            }
+            for (n = 0; n < nblocks; n++) {
+                for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                    b[j] = _mm_xor_si128(_mm_shuffle_epi8(ctr[j], bswap), rk[j][0]);
+                    ctr[j] = _mm_add_epi64(ctr[j], one);
+                }
+                for (r = 1; r < rounds; r++) {
+                    for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                        b[j] = _mm_aesenc_si128(b[j], rk[j][r]);
+                    }
+                }
+                for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                    __m128i data_block = _mm_loadu_si128((const __m128i*)in[j]);
+                    b[j] = _mm_aesenclast_si128(b[j], rk[j][rounds]);
+                    _mm_storeu_si128((__m128i*)out[j], _mm_xor_si128(data_block, b[j]));
+                    in[j] += step[j];
+                    out[j] += step[j];
+                }
+            }
+
+            // Advance; the lanes that ran out of whole blocks finish their tail
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                CTR_Lane *lane = &lanes[j];
+                if (!lane->step) continue;
+                lane->counter += nblocks;
+                lane->in += nblocks * BLOCK_SIZE;
+                lane->out += nblocks * BLOCK_SIZE;
+                lane->left -= nblocks * BLOCK_SIZE;
+                if (lane->left && lane->left < BLOCK_SIZE) {
+                    ALIGN16 uint8_t ks[BLOCK_SIZE];
+                    size_t i;
+                    _mm_store_si128((__m128i*)ks, aesni_encrypt1((const __m128i*)lane->aes.erk, rounds,
+                        _mm_shuffle_epi8(_mm_set_epi64x((long long)lane->counter, 0), bswap)));
+                    for (i = 0; i < lane->left; i++) {
+                        lane->out[i] = lane->in[i] ^ ks[i];
+                    }
+                    lane->left = 0;
+                }
+            }
+        }
+    }
+
+    secure_zero(lanes, sizeof(lanes));
+    secure_zero(b, sizeof(b));
+    secure_zero(scratch, sizeof(scratch));
+    return 0;
+}
+
+// ECB over whole blocks with CTR_PARALLEL_BLOCKS blocks in flight
+TARGET_AESNI
+static void aesni_ecb_encrypt(const AESNI_State *aes, const uint8_t *in, uint8_t *out, size_t nblocks) {
+    const __m128i *rk = (const __m128i*)aes->erk;
+    const unsigned rounds = aes->rounds;
+    __m128i b[CTR_PARALLEL_BLOCKS];
+    size_t i;
+    unsigned j, r;
+
+    for (i = 0; i + CTR_PARALLEL_BLOCKS <= nblocks; i += CTR_PARALLEL_BLOCKS) {
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            b[j] = _mm_xor_si128(_mm_loadu_si128((const __m128i*)(in + (i + j)*BLOCK_SIZE)), rk[0]);
+        }
+        for (r = 1; r < rounds; r++) {
+            const __m128i k = rk[r];
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                b[j] = _mm_aesenc_si128(b[j], k);
+            }
+        }
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            _mm_storeu_si128((__m128i*)(out + (i + j)*BLOCK_SIZE), _mm_aesenclast_si128(b[j], rk[rounds]));
+        }
+    }
+
+    for (; i < nblocks; i++) {
+        __m128i block = _mm_loadu_si128((const __m128i*)(in + i*BLOCK_SIZE));
+        _mm_storeu_si128((__m128i*)(out + i*BLOCK_SIZE), aesni_encrypt1(rk, rounds, block));
+    }
+}
+
+TARGET_AESNI
+static void aesni_ecb_decrypt(const AESNI_State *aes, const uint8_t *in, uint8_t *out, size_t nblocks) {
+    const __m128i *drk = (const __m128i*)aes->drk;
+    const unsigned rounds = aes->rounds;
+    __m128i b[CTR_PARALLEL_BLOCKS];
+    size_t i;
+    unsigned j, r;
+
+    for (i = 0; i + CTR_PARALLEL_BLOCKS <= nblocks; i += CTR_PARALLEL_BLOCKS) {
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            b[j] = _mm_xor_si128(_mm_loadu_si128((const __m128i*)(in + (i + j)*BLOCK_SIZE)), drk[0]);
+        }
+        for (r = 1; r < rounds; r++) {
+            const __m128i k = drk[r];
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                b[j] = _mm_aesdec_si128(b[j], k);
+            }
+        }
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            _mm_storeu_si128((__m128i*)(out + (i + j)*BLOCK_SIZE), _mm_aesdeclast_si128(b[j], drk[rounds]));
+        }
+    }
+
+    for (; i < nblocks; i++) {
+        __m128i block = _mm_loadu_si128((const __m128i*)(in + i*BLOCK_SIZE));
+        _mm_storeu_si128((__m128i*)(out + i*BLOCK_SIZE), aesni_decrypt1(drk, rounds, block));
+    }
+}
+
+// ---------------------------------------------------------------------------
+// AES-NI + PCLMULQDQ GCM kernel.
+// GHASH operands are kept byte-reflected so PCLMULQDQ can multiply them
+// directly; eight blocks are multiplied by H^8..H^1 and reduced once
+// (aggregated reduction), and those multiplies are stitched into the AES
+// rounds of the next eight counter blocks.
+// ---------------------------------------------------------------------------
+
+// Reverses all 16 bytes (GHASH operand <-> byte-reflected form)
+#define GCM_BSWAP_MASK _mm_setr_epi8(15, 14, 13, 12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2, 1, 0)
+
+// Swaps only the big-endian 32-bit block counter, so paddd can increment it
+#define GCM_CTR_BSWAP_MASK _mm_setr_epi8(0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 15, 14, 13, 12)
+
+static int pclmul_supported(void) {
+    return aesni_supported() && __builtin_cpu_supports("pclmul");
+}
+
+// Accumulate the unreduced 256-bit product x * h into lo/mid/hi
+TARGET_GCM
+static inline void ghash_mul_acc(__m128i x, __m128i h, __m128i *lo, __m128i *mid, __m128i *hi) {
+    *lo = _mm_xor_si128(*lo, _mm_clmulepi64_si128(x, h, 0x00));
+    *hi = _mm_xor_si128(*hi, _mm_clmulepi64_si128(x, h, 0x11));
+    *mid = _mm_xor_si128(*mid, _mm_clmulepi64_si128(x, h, 0x01));
+    *mid = _mm_xor_si128(*mid, _mm_clmulepi64_si128(x, h, 0x10));
+}
+
+// Shift the accumulated product left by one bit (operands are reflected)
+// and reduce it modulo x^128 + x^7 + x^2 + x + 1
+TARGET_GCM
+static inline __m128i ghash_reduce(__m128i lo, __m128i mid, __m128i hi) {
+    __m128i t7, t8, t9;
+
+    lo = _mm_xor_si128(lo, _mm_slli_si128(mid, 8));
+    hi = _mm_xor_si128(hi, _mm_srli_si128(mid, 8));
+
+    t7 = _mm_srli_epi32(lo, 31);
+    t8 = _mm_srli_epi32(hi, 31);
+    lo = _mm_slli_epi32(lo, 1);
+    hi = _mm_slli_epi32(hi, 1);
+    t9 = _mm_srli_si128(t7, 12);
+    t8 = _mm_slli_si128(t8, 4);
+    t7 = _mm_slli_si128(t7, 4);
+    lo = _mm_or_si128(lo, t7);
+    hi = _mm_or_si128(hi, t8);
+    hi = _mm_or_si128(hi, t9);
+
+    t7 = _mm_slli_epi32(lo, 31);
+    t8 = _mm_slli_epi32(lo, 30);
+    t9 = _mm_slli_epi32(lo, 25);
+    t7 = _mm_xor_si128(t7, t8);
+    t7 = _mm_xor_si128(t7, t9);
+    t8 = _mm_srli_si128(t7, 4);
+    t7 = _mm_slli_si128(t7, 12);
+    lo = _mm_xor_si128(lo, t7);
+
+    t9 = _mm_srli_epi32(lo, 1);
+    t7 = _mm_srli_epi32(lo, 2);
+    t9 = _mm_xor_si128(t9, t7);
+    t7 = _mm_srli_epi32(lo, 7);
+    t9 = _mm_xor_si128(t9, t7);
+    t9 = _mm_xor_si128(t9, t8);
+    lo = _mm_xor_si128(lo, t9);
+
+    return _mm_xor_si128(hi, lo);
+}
+
+TARGET_GCM
+static inline __m128i ghash_mul(__m128i x, __m128i h) {
+    __m128i lo = _mm_setzero_si128(), mid = lo, hi = lo;
+
+    ghash_mul_acc(x, h, &lo, &mid, &hi);
+    return ghash_reduce(lo, mid, hi);
+}
+
+// Absorb data into the reflected GHASH accumulator x, zero padding the last block
+TARGET_GCM
+static __m128i aesni_ghash(__m128i x, const __m128i *htable, const uint8_t *data, size_t len) {
+    const __m128i bswap = GCM_BSWAP_MASK;
+    const size_t stride = CTR_PARALLEL_BLOCKS * BLOCK_SIZE;
+    size_t i;
+    unsigned j;
+
+    for (i = 0; i + stride <= len; i += stride) {
+        __m128i lo = _mm_setzero_si128(), mid = lo, hi = lo;
+
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            __m128i blk = _mm_shuffle_epi8(_mm_loadu_si128((const __m128i*)(data + i + j*BLOCK_SIZE)), bswap);
+            if (j == 0) blk = _mm_xor_si128(blk, x);
+            ghash_mul_acc(blk, htable[CTR_PARALLEL_BLOCKS - 1 - j], &lo, &mid, &hi);
+        }
+        x = ghash_reduce(lo, mid, hi);
+    }
+
+    for (; i < len; i += BLOCK_SIZE) {
+        uint8_t pad[BLOCK_SIZE] = {0};
+        size_t n = len - i < BLOCK_SIZE ? len - i : BLOCK_SIZE;
+
+        memcpy(pad, data + i, n);
+        x = _mm_xor_si128(x, _mm_shuffle_epi8(_mm_loadu_si128((const __m128i*)pad), bswap));
+        x = ghash_mul(x, htable[0]);
+    }
+
+    return x;
+}
+
+// Fill htable with H^1..H^8 (byte-reflected) from gcm->h
+TARGET_GCM
+static void aesni_gcm_init_htable(AESNI_GCM_State *gcm) {
+    __m128i *htable = (__m128i*)gcm->htable;
+    __m128i h = _mm_shuffle_epi8(_mm_load_si128((const __m128i*)gcm->h), GCM_BSWAP_MASK);
+    unsigned k;
+
+    htable[0] = h;
+    for (k = 1; k < CTR_PARALLEL_BLOCKS; k++) {
+        htable[k] = ghash_mul(htable[k-1], h);
+    }
+}
+
+TARGET_GCM
+static int aesni_gcm_crypt(const AESNI_GCM_State *gcm, const uint8_t *iv, size_t iv_len,
+                           const uint8_t *aad, size_t aad_len, const uint8_t *in, uint8_t *out,
+                           size_t len, int decrypt, uint8_t tag[BLOCK_SIZE]) {
+    const __m128i *rk = (const __m128i*)gcm->aes_state.erk;
+    const __m128i *htable = (const __m128i*)gcm->htable;
+    const unsigned rounds = gcm->aes_state.rounds;
+    const __m128i bswap = GCM_BSWAP_MASK;
+    const __m128i ctr_bswap = GCM_CTR_BSWAP_MASK;
+    const __m128i one = _mm_setr_epi32(0, 0, 0, 1);
+    const size_t stride = CTR_PARALLEL_BLOCKS * BLOCK_SIZE;
+    __m128i j0, ctr, x = _mm_setzero_si128();
+    __m128i b[CTR_PARALLEL_BLOCKS], g[CTR_PARALLEL_BLOCKS];
+    uint8_t lengths[BLOCK_SIZE];
+    int pending = 0;
+    size_t i;
+    unsigned j, r;
+
+    // Pre-counter block J0
+    if (iv_len == GCM_IV_SIZE) {
+        uint8_t block[BLOCK_SIZE] = {0};
+        memcpy(block, iv, GCM_IV_SIZE);
+        block[BLOCK_SIZE - 1] = 1;
+        j0 = _mm_loadu_si128((const __m128i*)block);
+    } else {
+        __m128i y = aesni_ghash(_mm_setzero_si128(), htable, iv, iv_len);
+        gcm_length_block(lengths, 0, iv_len);
+        j0 = _mm_shuffle_epi8(aesni_ghash(y, htable, lengths, BLOCK_SIZE), bswap);
+    }
+    ctr = _mm_shuffle_epi8(j0, ctr_bswap);
+
+    x = aesni_ghash(x, htable, aad, aad_len);
+
+    // g[] holds the eight ciphertext blocks waiting to be hashed. When
+    // decrypting they are this stride's input; when encrypting they are the
+    // previous stride's output, so GHASH always overlaps the AES rounds.
+    for (i = 0; i + stride <= len; i += stride) {
+        __m128i lo = _mm_setzero_si128(), mid = lo, hi = lo;
+
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            ctr = _mm_add_epi32(ctr, one);
+            b[j] = _mm_xor_si128(_mm_shuffle_epi8(ctr, ctr_bswap), rk[0]);
+        }
+
+        if (decrypt) {
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                g[j] = _mm_shuffle_epi8(_mm_loadu_si128((const __m128i*)(in + i + j*BLOCK_SIZE)), bswap);
+            }
+            g[0] = _mm_xor_si128(g[0], x);
+            pending = 1;
+        }
+
+        // One GHASH multiply per AES round (rounds - 1 >= 9 > 8 blocks)
+        for (r = 1; r < rounds; r++) {
+            const __m128i k = rk[r];
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                b[j] = _mm_aesenc_si128(b[j], k);
+            }
+            if (pending && r <= CTR_PARALLEL_BLOCKS) {
+                ghash_mul_acc(g[r-1], htable[CTR_PARALLEL_BLOCKS - r], &lo, &mid, &hi);
+            }
+        }
+
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            __m128i data_block = _mm_loadu_si128((const __m128i*)(in + i + j*BLOCK_SIZE));
+            b[j] = _mm_xor_si128(data_block, _mm_aesenclast_si128(b[j], rk[rounds]));
+            _mm_storeu_si128((__m128i*)(out + i + j*BLOCK_SIZE), b[j]);
+        }
+
+        if (pending) {
+            x = ghash_reduce(lo, mid, hi);
+        }
+
+        if (!decrypt) {
+            for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+                g[j] = _mm_shuffle_epi8(b[j], bswap);
+            }
+            g[0] = _mm_xor_si128(g[0], x);
+            pending = 1;
+        }
+    }
+
+    // Hash the last encrypted stride
+    if (!decrypt && pending) {
+        __m128i lo = _mm_setzero_si128(), mid = lo, hi = lo;
+
+        for (j = 0; j < CTR_PARALLEL_BLOCKS; j++) {
+            ghash_mul_acc(g[j], htable[CTR_PARALLEL_BLOCKS - 1 - j], &lo, &mid, &hi);
+        }
+        x = ghash_reduce(lo, mid, hi);
+    }
+
+    // Remaining (< 8) blocks, the last one possibly partial
+    for (; i < len; i += BLOCK_SIZE) {
+        uint8_t ks[BLOCK_SIZE];
+        size_t n = len - i < BLOCK_SIZE ? len - i : BLOCK_SIZE, k;
+
+        ctr = _mm_add_epi32(ctr, one);
+        _mm_storeu_si128((__m128i*)ks, aesni_encrypt1(rk, rounds, _mm_shuffle_epi8(ctr, ctr_bswap)));
+
+        if (decrypt) x = aesni_ghash(x, htable, in + i, n);
+        for (k = 0; k < n; k++) {
+            out[i + k] = in[i + k] ^ ks[k];
+        }
+        if (!decrypt) x = aesni_ghash(x, htable, out + i, n);
+    }
+
+    gcm_length_block(lengths, aad_len, len);
+    x = aesni_ghash(x, htable, lengths, BLOCK_SIZE);
+
+    _mm_storeu_si128((__m128i*)tag, _mm_xor_si128(_mm_shuffle_epi8(x, bswap), aesni_encrypt1(rk, rounds, j0)));
+    return 0;
+}
+
+// ---------------------------------------------------------------------------
+// VAES/AVX2 kernel: two AES blocks per 256-bit register
+// ---------------------------------------------------------------------------
+
+// Number of 256-bit registers (two blocks each) kept in flight
+#define VAES_PARALLEL_REGS 8
+
+static int vaes_supported(void) {
+    return aesni_supported() && __builtin_cpu_supports("vaes") && __builtin_cpu_supports("avx2");
+}
+
+TARGET_VAES
+static int vaes_ctr_process(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out, size_t len) {
+    const __m128i *rk = (const __m128i*)state->aes_state.erk;
+    const unsigned rounds = state->aes_state.rounds;
+    const __m256i bswap = _mm256_broadcastsi128_si256(CTR_BSWAP_MASK);
+    const __m256i two = _mm256_set_epi64x(2, 0, 2, 0);
+    const size_t stride = VAES_PARALLEL_REGS * 2 * BLOCK_SIZE;
+    __m256i rk256[15];
+    __m256i ctr, b[VAES_PARALLEL_REGS];
+    size_t i;
+    unsigned j, r;
+
+    if (len < stride) {
+        return aesni_ctr_process(state, in, out, len);
+    }
+
+    for (r = 0; r <= rounds; r++) {
+        rk256[r] = _mm256_broadcastsi128_si256(rk[r]);
+    }
+    // Low lane holds counter c, high lane c + 1
+    ctr = _mm256_set_epi64x((long long)(state->counter + 1), 0, (long long)state->counter, 0);
+
+    for (i = 0; i + stride <= len; i += stride) {
+        for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+            b[j] = _mm256_xor_si256(_mm256_shuffle_epi8(ctr, bswap), rk256[0]);
+            ctr = _mm256_add_epi64(ctr, two);
+        }
+
+        for (r = 1; r < rounds; r++) {
+            for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+                b[j] = _mm256_aesenc_epi128(b[j], rk256[r]);
+            }
+        }
+
+        for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+            __m256i data_block = _mm256_loadu_si256((const __m256i*)(in + i + j*2*BLOCK_SIZE));
+            b[j] = _mm256_aesenclast_epi128(b[j], rk256[rounds]);
+            _mm256_storeu_si256((__m256i*)(out + i + j*2*BLOCK_SIZE), _mm256_xor_si256(data_block, b[j]));
+        }
+
+        state->counter += 2 * VAES_PARALLEL_REGS;
+    }
+
+    if (i < len) {
+        return aesni_ctr_process(state, in + i, out + i, len - i);
+    }
+
+    return 0;
+}
+
+// ECB over whole 16-block strides, remaining blocks through AES-NI
+TARGET_VAES
+static void vaes_ecb_encrypt(const AESNI_State *aes, const uint8_t *in, uint8_t *out, size_t nblocks) {
+    const __m128i *rk = (const __m128i*)aes->erk;
+    const unsigned rounds = aes->rounds;
+    const size_t stride = VAES_PARALLEL_REGS * 2;
+    __m256i rk256[15], b[VAES_PARALLEL_REGS];
+    size_t i;
+    unsigned j, r;
+
+    if (nblocks < stride) {
+        aesni_ecb_encrypt(aes, in, out, nblocks);
+        return;
+    }
+
+    for (r = 0; r <= rounds; r++) {
+        rk256[r] = _mm256_broadcastsi128_si256(rk[r]);
+    }
+
+    for (i = 0; i + stride <= nblocks; i += stride) {
+        for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+            b[j] = _mm256_xor_si256(_mm256_loadu_si256((const __m256i*)(in + (i + 2*j)*BLOCK_SIZE)), rk256[0]);
+        }
+        for (r = 1; r < rounds; r++) {
+            for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+                b[j] = _mm256_aesenc_epi128(b[j], rk256[r]);
+            }
+        }
+        for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+            _mm256_storeu_si256((__m256i*)(out + (i + 2*j)*BLOCK_SIZE), _mm256_aesenclast_epi128(b[j], rk256[rounds]));
+        }
+    }
+
+    if (i < nblocks) {
+        aesni_ecb_encrypt(aes, in + i*BLOCK_SIZE, out + i*BLOCK_SIZE, nblocks - i);
+    }
+}
+
+TARGET_VAES
+static void vaes_ecb_decrypt(const AESNI_State *aes, const uint8_t *in, uint8_t *out, size_t nblocks) {
+    const __m128i *drk = (const __m128i*)aes->drk;
+    const unsigned rounds = aes->rounds;
+    const size_t stride = VAES_PARALLEL_REGS * 2;
+    __m256i drk256[15], b[VAES_PARALLEL_REGS];
+    size_t i;
+    unsigned j, r;
+
+    if (nblocks < stride) {
+        aesni_ecb_decrypt(aes, in, out, nblocks);
+        return;
+    }
+
+    for (r = 0; r <= rounds; r++) {
+        drk256[r] = _mm256_broadcastsi128_si256(drk[r]);
+    }
+
+    for (i = 0; i + stride <= nblocks; i += stride) {
+        for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+            b[j] = _mm256_xor_si256(_mm256_loadu_si256((const __m256i*)(in + (i + 2*j)*BLOCK_SIZE)), drk256[0]);
+        }
+        for (r = 1; r < rounds; r++) {
+            for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+                b[j] = _mm256_aesdec_epi128(b[j], drk256[r]);
+            }
+        }
+        for (j = 0; j < VAES_PARALLEL_REGS; j++) {
+            _mm256_storeu_si256((__m256i*)(out + (i + 2*j)*BLOCK_SIZE), _mm256_aesdeclast_epi128(b[j], drk256[rounds]));
+        }
+    }
+
+    if (i < nblocks) {
+        aesni_ecb_decrypt(aes, in + i*BLOCK_SIZE, out + i*BLOCK_SIZE, nblocks - i);
+    }
+}
+#endif  // AES_X86
+
+// ---------------------------------------------------------------------------
+// Kernel dispatch
+// ---------------------------------------------------------------------------
+
+// Ordered from slowest to fastest; the last supported entry wins at import.
+// The VAES kernel shares the 128-bit multi-buffer CTR and stitched GCM kernels.
+static const AES_Kernel kernels[] = {
+    {"portable", soft_supported, soft_expand_key, soft_ecb_encrypt, soft_ecb_decrypt,
+     soft_ctr_process, soft_ctr_many, soft_gcm_crypt},
+#if AES_X86
+    {"aesni", aesni_supported, aesni_expand_key, aesni_ecb_encrypt, aesni_ecb_decrypt,
+     aesni_ctr_process, aesni_ctr_many, aesni_gcm_crypt},
+    {"vaes-avx2", vaes_supported, aesni_expand_key, vaes_ecb_encrypt, vaes_ecb_decrypt,
+     vaes_ctr_process, aesni_ctr_many, aesni_gcm_crypt},
+#endif
+};
+
+#define NUM_KERNELS (sizeof(kernels) / sizeof(kernels[0]))
+
+static const AES_Kernel *active_kernel = &kernels[0];
+
+static void select_best_kernel(void) {
+    size_t i;
+
+#if AES_X86
+    __builtin_cpu_init();
+#endif
+    for (i = NUM_KERNELS; i-- > 0;) {
+        if (kernels[i].supported()) {
+            active_kernel = &kernels[i];
+            return;
+        }
+    }
+}
+
+// CTR mode encryption/decryption through the active kernel
+static int ctr_process(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out, size_t len) {
+    return active_kernel->ctr_process(state, in, out, len);
+}
+
+// GCM through the active kernel
+static int gcm_crypt(const AESNI_GCM_State *gcm, const uint8_t *iv, size_t iv_len,
+                     const uint8_t *aad, size_t aad_len, const uint8_t *in, uint8_t *out,
+                     size_t len, int decrypt, uint8_t tag[BLOCK_SIZE]) {
+    GCM_CryptFn crypt = active_kernel->gcm_crypt;
+
+#if AES_X86
+    // GHASH needs PCLMULQDQ, which some virtual CPUs hide even with AES-NI
+    if (crypt != soft_gcm_crypt && !pclmul_supported()) {
+        crypt = soft_gcm_crypt;
+    }
+#endif
+    return crypt(gcm, iv, iv_len, aad, aad_len, in, out, len, decrypt, tag);
+}
+
+// ---------------------------------------------------------------------------
+// ECB/CBC/CFB/OFB on top of the active kernel's block functions
+// ---------------------------------------------------------------------------
+
+// Blocks handed to the kernel per call by the parallel CBC/CFB decryption
+#define CHAIN_PARALLEL_BLOCKS 32
+
+static int ecb_process(AESNI_Block_State *state, const uint8_t *in, uint8_t *out, size_t len, int decrypt) {
+    AES_BlocksFn blocks = decrypt ? active_kernel->decrypt_blocks : active_kernel->encrypt_blocks;
+
+    blocks(&state->aes_state, in, out, len / BLOCK_SIZE);
+    return 0;
+}
+
+// CBC encryption is serial: every block needs the previous ciphertext block
+static int cbc_encrypt(AESNI_Block_State *state, const uint8_t *in, uint8_t *out, size_t len) {
+    AES_BlocksFn encrypt_blocks = active_kernel->encrypt_blocks;
+    size_t i;
+    int k;
+
+    for (i = 0; i < len; i += BLOCK_SIZE) {
+        for (k = 0; k < BLOCK_SIZE; k++) {
+            state->iv[k] ^= in[i + k];
+        }
+        encrypt_blocks(&state->aes_state, state->iv, state->iv, 1);
+        memcpy(out + i, state->iv, BLOCK_SIZE);
+    }
+    return 0;
+}
+
+// CBC decryption (P_i = D(C_i) ^ C_i-1) and full-block CFB decryption
+// (P_i = E(C_i-1) ^ C_i) only depend on ciphertext, so whole chunks go
+// through the multi-block kernel at once. The ciphertext is copied first,
+// which lets in and out be the same buffer.
+static void chained_decrypt(AESNI_Block_State *state, const uint8_t *in, uint8_t *out, size_t len, int cfb) {
+    AES_BlocksFn blocks = cfb ? active_kernel->encrypt_blocks : active_kernel->decrypt_blocks;
+    uint8_t prev[(CHAIN_PARALLEL_BLOCKS + 1) * BLOCK_SIZE];
+    uint8_t tmp[CHAIN_PARALLEL_BLOCKS * BLOCK_SIZE];
+    size_t i, k, n;
+
+    for (i = 0; i < len; i += n) {
+        n = len - i < sizeof(tmp) ? len - i : sizeof(tmp);
+
+        // prev = C_i-1 for every block of the chunk, then C_last
+        memcpy(prev, state->iv, BLOCK_SIZE);
+        memcpy(prev + BLOCK_SIZE, in + i, n);
+
+        if (cfb) {
+            blocks(&state->aes_state, prev, tmp, n / BLOCK_SIZE);
+            for (k = 0; k < n; k++) {
+                out[i + k] = tmp[k] ^ prev[BLOCK_SIZE + k];
+            }
+        } else {
+            blocks(&state->aes_state, prev + BLOCK_SIZE, tmp, n / BLOCK_SIZE);
+            for (k = 0; k < n; k++) {
+                out[i + k] = tmp[k] ^ prev[k];
+            }
+        }
+
+        memcpy(state->iv, prev + n, BLOCK_SIZE);
+    }
+}
+
+// CFB with pyaes semantics: segment_size is in bytes, and each segment
+// shifts its ciphertext into the register
+static int cfb_process(AESNI_Block_State *state, const uint8_t *in, uint8_t *out, size_t len, int decrypt) {
+    AES_BlocksFn encrypt_blocks = active_kernel->encrypt_blocks;
+    const unsigned s = state->segment_size;
+    uint8_t ks[BLOCK_SIZE], segment[BLOCK_SIZE];
+    size_t i;
+    unsigned k;
+
+    if (decrypt && s == BLOCK_SIZE) {
+        chained_decrypt(state, in, out, len, 1);
+        return 0;
+    }
+
+    for (i = 0; i < len; i += s) {
+        encrypt_blocks(&state->aes_state, state->iv, ks, 1);
+        if (decrypt) memcpy(segment, in + i, s);
+        for (k = 0; k < s; k++) {
+            out[i + k] = in[i + k] ^ ks[k];
+        }
+        if (!decrypt) memcpy(segment, out + i, s);
+
+        memmove(state->iv, state->iv + s, BLOCK_SIZE - s);
+        memcpy(state->iv + BLOCK_SIZE - s, segment, s);
+    }
+    return 0;
+}
+
+// OFB keystream E(IV), E(E(IV)), ...; a partly used block carries over to
+// the next call, as in pyaes
+static int ofb_process(AESNI_Block_State *state, const uint8_t *in, uint8_t *out, size_t len) {
+    AES_BlocksFn encrypt_blocks = active_kernel->encrypt_blocks;
+    size_t i = 0, k, n;
+
+    while (i < len) {
+        if (state->used == BLOCK_SIZE) {
+            encrypt_blocks(&state->aes_state, state->iv, state->iv, 1);
+            state->used = 0;
+        }
+        n = BLOCK_SIZE - state->used;
+        if (n > len - i) n = len - i;
+        for (k = 0; k < n; k++) {
+            out[i + k] = in[i + k] ^ state->iv[state->used + k];
+        }
+        state->used += (unsigned)n;
+        i += n;
+    }
+    return 0;
+}
+
+// Size of an exported schedule: erk[0..Nr] followed by drk[0..Nr]
+#define SCHEDULE_SIZE(Nr) (2 * ((Nr) + 1) * BLOCK_SIZE)
+
+// Fill aes with the round keys for key: expanded by the active kernel, or
+// copied from a schedule exported by expand_key() when schedule is not NULL
+static int aes_state_init(AESNI_State *aes, const uint8_t *key, size_t key_len,
+                          const uint8_t *schedule, size_t schedule_len) {
+    unsigned Nr = rounds_for_key(key_len);
+    size_t half;
+
+    if (!Nr) return ERR_KEY_SIZE;
+    aes->rounds = Nr;
+
+    if (!schedule) {
+        return active_kernel->expand_key(aes, key, key_len/4, Nr);
+    }
+
+    if (schedule_len != SCHEDULE_SIZE(Nr)) return ERR_KEY_SIZE;
+    half = (Nr + 1) * BLOCK_SIZE;
+    memcpy(aes->erk, schedule, half);
+    memcpy(aes->drk, schedule + half, half);
+    return 0;
+}
+
+// Initialize AES-CTR state
+static AESNI_CTR_State* aesni_ctr_init(const uint8_t *key, size_t key_len, uint64_t initial_counter) {
+    AESNI_CTR_State *state = malloc(sizeof(AESNI_CTR_State));
+    
+    if (!state) return NULL;
+    
+    state->counter = initial_counter;
+    state->used = BLOCK_SIZE;
+    if (aes_state_init(&state->aes_state, key, key_len, NULL, 0) != 0) {
+        free(state);
+        return NULL;
+    }
+    
+    return state;
+}
+
+// Initialize AES-CTR state from a schedule exported by expand_key()
+static AESNI_CTR_State* aesni_ctr_init_schedule(const uint8_t *schedule, size_t schedule_len,
+                                                size_t key_len, uint64_t initial_counter) {
+    AESNI_CTR_State *state = malloc(sizeof(AESNI_CTR_State));
+    
+    if (!state) return NULL;
+    
+    state->counter = initial_counter;
+    state->used = BLOCK_SIZE;
+    if (aes_state_init(&state->aes_state, NULL, key_len, schedule, schedule_len) != 0) {
+        free(state);
+        return NULL;
+    }
     
-    if (!PyArg_ParseTuple(args, "O", &state_obj)) {
+    return state;
+}
+
+// Initialize GCM state: round keys (expanded, or from schedule when not
+// NULL) plus the hash key H and, with PCLMULQDQ, its powers
+static AESNI_GCM_State* aesni_gcm_init(const uint8_t *key, size_t key_len,
+                                       const uint8_t *schedule, size_t schedule_len) {
+    AESNI_GCM_State *state = malloc(sizeof(AESNI_GCM_State));
+
+    if (!state) return NULL;
+
+    if (aes_state_init(&state->aes_state, key, key_len, schedule, schedule_len) != 0) {
+        free(state);
+        return NULL;
+    }
+
+    memset(state->h, 0, BLOCK_SIZE);
+    memset(state->htable, 0, sizeof(state->htable));
+#if AES_X86
+    if (aesni_supported()) {
+        const __m128i *rk = (const __m128i*)state->aes_state.erk;
+        _mm_store_si128((__m128i*)state->h, aesni_encrypt1(rk, state->aes_state.rounds, _mm_setzero_si128()));
+    } else
+#endif
+    soft_encrypt_blocks(&state->aes_state, state->h, 1);
+
+#if AES_X86
+    if (pclmul_supported()) {
+        aesni_gcm_init_htable(state);
+    }
+#endif
+
+    return state;
+}
+
+// Cleanup AES-CTR state, wiping the round keys first
+static void aesni_ctr_cleanup(AESNI_CTR_State *state) {
+    if (state) {
+        secure_zero(state, sizeof(*state));
+        free(state);
+    }
+}
+
+// Initialize block mode state; iv may be NULL (all zero, like pyaes)
+static AESNI_Block_State* aesni_block_init(const uint8_t *key, size_t key_len,
+                                           const uint8_t *schedule, size_t schedule_len,
+                                           const uint8_t *iv, unsigned segment_size) {
+    AESNI_Block_State *state = malloc(sizeof(AESNI_Block_State));
+
+    if (!state) return NULL;
+
+    if (aes_state_init(&state->aes_state, key, key_len, schedule, schedule_len) != 0) {
+        free(state);
+        return NULL;
+    }
+
+    if (iv) {
+        memcpy(state->iv, iv, BLOCK_SIZE);
+    } else {
+        memset(state->iv, 0, BLOCK_SIZE);
+    }
+    state->used = BLOCK_SIZE;
+    state->segment_size = segment_size;
+    return state;
+}
+
+// Cleanup block mode state, wiping the round keys and chaining value first
+static void aesni_block_cleanup(AESNI_Block_State *state) {
+    if (state) {
+        secure_zero(state, sizeof(*state));
+        free(state);
+    }
+}
+
+// Cleanup GCM state, wiping the round and hash keys first
+static void aesni_gcm_cleanup(AESNI_GCM_State *state) {
+    if (state) {
+        secure_zero(state, sizeof(*state));
+        free(state);
+    }
+}
+
+// Work item for one thread of the multi-threaded CTR driver
+typedef struct {
+    AESNI_CTR_State state;  // Private copy, counter positioned at the slice start
+    const uint8_t *in;
+    uint8_t *out;
+    size_t len;
+} CTR_Slice;
+
+static void* ctr_slice_worker(void *arg) {
+    CTR_Slice *slice = (CTR_Slice*)arg;
+    ctr_process(&slice->state, slice->in, slice->out, slice->len);
+    return NULL;
+}
+
+// Multi-threaded CTR mode encryption/decryption.
+// CTR blocks are independent, so the buffer is split into counter-aligned
+// slices (whole 16-byte blocks, only the last slice may end with a partial
+// block) that are encrypted concurrently. The calling thread handles the
+// first slice itself. Must be called without holding the GIL.
+static int aesni_ctr_process_threaded(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out,
+                                      size_t len, unsigned nthreads) {
+    size_t nblocks = (len + BLOCK_SIZE - 1) / BLOCK_SIZE;
+    size_t max_threads = len / MIN_THREAD_SLICE;
+    size_t blocks_per_slice, offset;
+    CTR_Slice *slices;
+    pthread_t *tids;
+    unsigned t, started;
+
+    if (max_threads < nthreads) nthreads = (unsigned)max_threads;
+    if (nthreads <= 1) {
+        return ctr_process(state, in, out, len);
+    }
+
+    slices = malloc(nthreads * sizeof(CTR_Slice));
+    tids = malloc(nthreads * sizeof(pthread_t));
+    if (!slices || !tids) {
+        free(slices);
+        free(tids);
+        return ERR_MEMORY;
+    }
+
+    blocks_per_slice = (nblocks + nthreads - 1) / nthreads;
+    for (t = 0; t < nthreads; t++) {
+        offset = (size_t)t * blocks_per_slice * BLOCK_SIZE;
+        slices[t].state = *state;
+        slices[t].state.counter = state->counter + (uint64_t)t * blocks_per_slice;
+        slices[t].in = in + offset;
+        slices[t].out = out + offset;
+        slices[t].len = (t == nthreads - 1) ? len - offset : blocks_per_slice * BLOCK_SIZE;
+    }
+
+    // Start the helpers; if thread creation fails, process the slice inline
+    started = 0;
+    for (t = 1; t < nthreads; t++) {
+        if (pthread_create(&tids[t], NULL, ctr_slice_worker, &slices[t]) != 0) {
+            break;
+        }
+        started = t;
+    }
+    ctr_process(&slices[0].state, slices[0].in, slices[0].out, slices[0].len);
+    for (t = started + 1; t < nthreads; t++) {
+        ctr_process(&slices[t].state, slices[t].in, slices[t].out, slices[t].len);
+    }
+    for (t = 1; t <= started; t++) {
+        pthread_join(tids[t], NULL);
+    }
+
+    state->counter += nblocks;
+
+    free(slices);
+    free(tids);
+    return 0;
+}
+
+// Streaming CTR: keystream left over from a block the previous call ended
+// in is used first, and a trailing partial block keeps the rest of its
+// keystream for the next call, so the output does not depend on how a
+// stream is cut into chunks (as in pyaes). Whole blocks go to the kernel,
+// split across nthreads when that pays off.
+static int ctr_stream_process(AESNI_CTR_State *state, const uint8_t *in, uint8_t *out,
+                              size_t len, unsigned nthreads) {
+    static const uint8_t zero[BLOCK_SIZE];
+    size_t i = 0, bulk;
+    int result;
+
+    while (i < len && state->used < BLOCK_SIZE) {
+        out[i] = in[i] ^ state->keystream[state->used++];
+        i++;
+    }
+
+    bulk = (len - i) & ~(size_t)(BLOCK_SIZE - 1);
+    if (bulk) {
+        result = aesni_ctr_process_threaded(state, in + i, out + i, bulk, nthreads);
+        if (result != 0) return result;
+        i += bulk;
+    }
+
+    if (i < len) {
+        // Keystream block = E(counter), computed as the encryption of zeros
+        result = ctr_process(state, zero, state->keystream, BLOCK_SIZE);
+        if (result != 0) return result;
+        state->used = 0;
+        while (i < len) {
+            out[i] = in[i] ^ state->keystream[state->used++];
+            i++;
+        }
+    }
+    return 0;
+}
+
+// ---------------------------------------------------------------------------
+// Telemetry: calls, bytes, TSC cycles and call sizes per mode (opt-in)
+// ---------------------------------------------------------------------------
+
+// Counters are only updated with the GIL held, after the kernel returns, so
+// they need no atomics. Every call is counted; one call in sample_every
+// (on average, at random so periodic call patterns do not alias) is also
+// timed, because a TSC read costs about as much as a small CTR call. With
+// telemetry off a call pays one branch.
+enum { STATS_CTR, STATS_GCM, STATS_ECB, STATS_CBC, STATS_CFB, STATS_OFB, STATS_BATCH, NUM_STATS };
+static const char *stats_names[NUM_STATS] = {"ctr", "gcm", "ecb", "cbc", "cfb", "ofb", "batch"};
+
+// Call sizes by power of two: bucket b > 0 counts sizes in [2**(b-1), 2**b),
+// bucket 0 empty calls
+#define STATS_BUCKETS 48
+#define STATS_SAMPLE_EVERY 16
+
+typedef struct {
+    uint64_t calls;
+    uint64_t bytes;
+    uint64_t sizes[STATS_BUCKETS];
+    uint64_t timed_calls;    // Sampled calls the cycle counts cover
+    uint64_t timed_bytes;
+    uint64_t kernel_cycles;  // Inside the kernel (wall time of the calling thread)
+    uint64_t call_cycles;    // From entry into the C method until the kernel returns
+} Op_Stats;
+
+static Op_Stats op_stats[NUM_STATS];
+static int stats_enabled = 0;
+static unsigned stats_sample_every = STATS_SAMPLE_EVERY;
+static unsigned stats_countdown = 1;  // Calls until the next timed one
+static uint32_t stats_rng = 0x9e3779b9u;
+static uint64_t stats_epoch_tsc, stats_epoch_ns;  // Reference point for the TSC rate
+
+// Stamps passed to stats_record(): 0 = not counted, STATS_UNTIMED = counted
+// only, anything else a TSC value
+#define STATS_UNTIMED 1
+
+static inline uint64_t monotonic_ns(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t)ts.tv_sec * 1000000000u + (uint64_t)ts.tv_nsec;
+}
+
+// Time stamp counter; nanoseconds where there is none
+static inline uint64_t read_tsc(void) {
+#if AES_X86
+    return __rdtsc();
+#else
+    return monotonic_ns();
+#endif
+}
+
+// Stamp at entry into a method (GIL held)
+static inline uint64_t stats_start(void) {
+    if (!stats_enabled) return 0;
+    if (--stats_countdown) return STATS_UNTIMED;
+    // Next timed call in 1..2N-1 calls (xorshift32), N on average
+    stats_rng ^= stats_rng << 13;
+    stats_rng ^= stats_rng >> 17;
+    stats_rng ^= stats_rng << 5;
+    stats_countdown = 1 + stats_rng % (2 * stats_sample_every - 1);
+    return read_tsc();
+}
+
+// Stamps around the kernel, taken only for timed calls (no GIL needed)
+static inline uint64_t stats_kernel_start(uint64_t call_start) {
+    return call_start > STATS_UNTIMED ? read_tsc() : 0;
+}
+
+static inline uint64_t stats_stop(uint64_t kernel_start) {
+    return kernel_start ? read_tsc() : 0;
+}
+
+// Account one successful call (GIL held). Calls that straddle
+// enable_stats() have a zero stamp and are skipped.
+static void stats_record(int op, size_t len, uint64_t call_start, uint64_t kernel_start,
+                         uint64_t kernel_end) {
+    Op_Stats *s = &op_stats[op];
+    unsigned bucket;
+
+    if (!call_start) return;
+    bucket = len ? 64 - (unsigned)__builtin_clzll((unsigned long long)len) : 0;
+    if (bucket >= STATS_BUCKETS) bucket = STATS_BUCKETS - 1;
+    s->calls++;
+    s->bytes += len;
+    s->sizes[bucket]++;
+    if (call_start > STATS_UNTIMED && kernel_start) {
+        s->timed_calls++;
+        s->timed_bytes += len;
+        s->kernel_cycles += kernel_end - kernel_start;
+        s->call_cycles += kernel_end - call_start;
+    }
+}
+
+// TSC ticks per second, measured against CLOCK_MONOTONIC since import
+static double tsc_hz(void) {
+    uint64_t ns = monotonic_ns() - stats_epoch_ns;
+
+    while (ns < 10000000u) {  // At least 10 ms for a stable rate
+        ns = monotonic_ns() - stats_epoch_ns;
+    }
+    return (double)(read_tsc() - stats_epoch_tsc) * 1e9 / (double)ns;
+}
+
+// Position a CTR state at byte offset of the stream whose first block is
+// initial_counter. Block offset / 16 has counter initial_counter + offset / 16
+// (mod 2**64, like the kernels); inside a block, that block's keystream is
+// computed and the bytes before offset are marked as used. Nothing before
+// the offset is encrypted.
+static int ctr_seek(AESNI_CTR_State *state, uint64_t initial_counter, uint64_t offset) {
+    static const uint8_t zero[BLOCK_SIZE];
+    int result;
+
+    state->counter = initial_counter + offset / BLOCK_SIZE;
+    state->used = BLOCK_SIZE;
+    if (offset % BLOCK_SIZE) {
+        result = ctr_process(state, zero, state->keystream, BLOCK_SIZE);
+        if (result != 0) return result;
+        state->used = (unsigned)(offset % BLOCK_SIZE);
+    }
+    return 0;
+}
+
+// ---------------------------------------------------------------------------
+// CTR extension type: owns its AESNI_CTR_State for the object's lifetime
+// ---------------------------------------------------------------------------
+
+typedef struct {
+    PyObject_HEAD
+    AESNI_CTR_State *state;
+    uint64_t initial_counter;  // Counter of stream byte 0, for seek()
+    int threads;
+    int busy;  // Set while the GIL is released around the kernel
+} CTRObject;
+
+static int CTR_init(CTRObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"key", "counter", "threads", "schedule", NULL};
+    Py_buffer key_buf, schedule_buf;
+    PyObject *schedule = Py_None;
+    uint64_t initial_counter = 0;
+    int threads = 1;
+    AESNI_CTR_State *state;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*|Ki$O", kwlist,
+                                     &key_buf, &initial_counter, &threads, &schedule)) {
+        return -1;
+    }
+
+    if (threads < 1 || threads > MAX_THREADS) {
+        PyBuffer_Release(&key_buf);
+        PyErr_Format(PyExc_ValueError, "threads must be between 1 and %d", MAX_THREADS);
+        return -1;
+    }
+
+    if (schedule == Py_None) {
+        state = aesni_ctr_init((uint8_t*)key_buf.buf, key_buf.len, initial_counter);
+    } else {
+        // Pre-expanded round keys (e.g. from the round key cache)
+        if (PyObject_GetBuffer(schedule, &schedule_buf, PyBUF_SIMPLE) != 0) {
+            PyBuffer_Release(&key_buf);
+            return -1;
+        }
+        state = aesni_ctr_init_schedule((uint8_t*)schedule_buf.buf, schedule_buf.len,
+                                        key_buf.len, initial_counter);
+        PyBuffer_Release(&schedule_buf);
+    }
+    PyBuffer_Release(&key_buf);
+    if (!state) {
+        PyErr_SetString(PyExc_ValueError, "Failed to initialize AES-CTR");
+        return -1;
+    }
+    // Checked last: parsing the arguments can run Python code, and another
+    // thread may be using the current state without the GIL
+    if (self->busy) {
+        aesni_ctr_cleanup(state);
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR object is in use by another thread");
+        return -1;
+    }
+
+    aesni_ctr_cleanup(self->state);
+    self->state = state;
+    self->initial_counter = initial_counter;
+    self->threads = threads;
+    return 0;
+}
+
+static void CTR_dealloc(CTRObject *self) {
+    aesni_ctr_cleanup(self->state);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+// Run the kernel on len bytes, without the GIL for large inputs.
+// in and out may be the same buffer.
+static int CTR_run(CTRObject *self, const uint8_t *in, uint8_t *out, Py_ssize_t len,
+                   uint64_t call_start) {
+    uint64_t kernel_start, kernel_end;
+    int result;
+
+    if (!self->state) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR not initialized");
+        return -1;
+    }
+    if (self->busy) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR object is in use by another thread");
+        return -1;
+    }
+
+    if (len >= GIL_RELEASE_THRESHOLD) {
+        self->busy = 1;
+        Py_BEGIN_ALLOW_THREADS
+        kernel_start = stats_kernel_start(call_start);
+        result = ctr_stream_process(self->state, in, out, (size_t)len, (unsigned)self->threads);
+        kernel_end = stats_stop(kernel_start);
+        Py_END_ALLOW_THREADS
+        self->busy = 0;
+    } else {
+        kernel_start = stats_kernel_start(call_start);
+        result = ctr_stream_process(self->state, in, out, (size_t)len, 1);
+        kernel_end = stats_stop(kernel_start);
+    }
+
+    if (result != 0) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR processing failed");
+        return -1;
+    }
+    stats_record(STATS_CTR, (size_t)len, call_start, kernel_start, kernel_end);
+    return 0;
+}
+
+static PyObject* CTR_encrypt(CTRObject *self, PyObject *arg) {
+    uint64_t call_start = stats_start();
+    Py_buffer in_buf;
+    PyObject *out;
+
+    if (PyObject_GetBuffer(arg, &in_buf, PyBUF_SIMPLE) != 0) {
+        return NULL;
+    }
+
+    // Single allocation: the kernel writes straight into the result bytes
+    out = PyBytes_FromStringAndSize(NULL, in_buf.len);
+    if (out && CTR_run(self, (uint8_t*)in_buf.buf, (uint8_t*)PyBytes_AS_STRING(out), in_buf.len,
+                       call_start) != 0) {
+        Py_CLEAR(out);
+    }
+
+    PyBuffer_Release(&in_buf);
+    return out;
+}
+
+static PyObject* CTR_encrypt_into(CTRObject *self, PyObject *args) {
+    uint64_t call_start = stats_start();
+    Py_buffer in_buf, out_buf;
+    int result;
+
+    if (!PyArg_ParseTuple(args, "y*w*", &in_buf, &out_buf)) {
+        return NULL;
+    }
+
+    if (out_buf.len < in_buf.len) {
+        PyBuffer_Release(&in_buf);
+        PyBuffer_Release(&out_buf);
+        PyErr_SetString(PyExc_ValueError, "Output buffer is smaller than input");
+        return NULL;
+    }
+
+    result = CTR_run(self, (uint8_t*)in_buf.buf, (uint8_t*)out_buf.buf, in_buf.len, call_start);
+
+    PyBuffer_Release(&in_buf);
+    PyBuffer_Release(&out_buf);
+
+    if (result != 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* CTR_encrypt_inplace(CTRObject *self, PyObject *arg) {
+    uint64_t call_start = stats_start();
+    Py_buffer buf;
+    int result;
+
+    if (PyObject_GetBuffer(arg, &buf, PyBUF_WRITABLE) != 0) {
+        return NULL;
+    }
+
+    result = CTR_run(self, (uint8_t*)buf.buf, (uint8_t*)buf.buf, buf.len, call_start);
+    PyBuffer_Release(&buf);
+
+    if (result != 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* CTR_seek(CTRObject *self, PyObject *arg) {
+    unsigned long long offset = PyLong_AsUnsignedLongLong(arg);
+    int result;
+
+    if (offset == (unsigned long long)-1 && PyErr_Occurred()) {
+        return NULL;
+    }
+    if (!self->state) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR not initialized");
+        return NULL;
+    }
+    if (self->busy) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR object is in use by another thread");
+        return NULL;
+    }
+    result = ctr_seek(self->state, self->initial_counter, offset);
+    if (result != 0) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR processing failed");
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject* CTR_tell(CTRObject *self, PyObject *Py_UNUSED(ignored)) {
+    uint64_t blocks;
+
+    if (!self->state) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR not initialized");
+        return NULL;
+    }
+    // The counter is already past a partly used block
+    blocks = self->state->counter - self->initial_counter;
+    return PyLong_FromUnsignedLongLong(blocks * BLOCK_SIZE - (BLOCK_SIZE - self->state->used));
+}
+
+// Decrypt buf[offset:offset + length], buf holding the stream from byte 0,
+// through a copy of the state: the object's own position does not move.
+static PyObject* CTR_decrypt_range(CTRObject *self, PyObject *args) {
+    uint64_t call_start = stats_start(), kernel_start, kernel_end;
+    AESNI_CTR_State local;
+    Py_buffer buf;
+    Py_ssize_t offset, length;
+    PyObject *out;
+    uint8_t *dst;
+    int result;
+
+    if (!PyArg_ParseTuple(args, "y*nn", &buf, &offset, &length)) {
+        return NULL;
+    }
+    if (!self->state) {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR not initialized");
+        return NULL;
+    }
+    if (offset < 0 || length < 0 || offset > buf.len - length) {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "Range is outside the buffer");
+        return NULL;
+    }
+
+    out = PyBytes_FromStringAndSize(NULL, length);
+    if (!out) {
+        PyBuffer_Release(&buf);
+        return NULL;
+    }
+    dst = (uint8_t*)PyBytes_AS_STRING(out);
+
+    // Round keys never change after init, so copying them is safe even
+    // while another thread runs the object's own kernel
+    local = *self->state;
+    if (length >= GIL_RELEASE_THRESHOLD) {
+        Py_BEGIN_ALLOW_THREADS
+        kernel_start = stats_kernel_start(call_start);
+        result = ctr_seek(&local, self->initial_counter, (uint64_t)offset);
+        if (result == 0) {
+            result = ctr_stream_process(&local, (uint8_t*)buf.buf + offset, dst, (size_t)length,
+                                        (unsigned)self->threads);
+        }
+        kernel_end = stats_stop(kernel_start);
+        Py_END_ALLOW_THREADS
+    } else {
+        kernel_start = stats_kernel_start(call_start);
+        result = ctr_seek(&local, self->initial_counter, (uint64_t)offset);
+        if (result == 0) {
+            result = ctr_stream_process(&local, (uint8_t*)buf.buf + offset, dst, (size_t)length, 1);
+        }
+        kernel_end = stats_stop(kernel_start);
+    }
+    secure_zero(&local, sizeof(local));
+    PyBuffer_Release(&buf);
+
+    if (result != 0) {
+        Py_DECREF(out);
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR processing failed");
+        return NULL;
+    }
+    stats_record(STATS_CTR, (size_t)length, call_start, kernel_start, kernel_end);
+    return out;
+}
+
+static PyObject* CTR_get_counter(CTRObject *self, void *closure) {
+    if (!self->state) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR not initialized");
+        return NULL;
+    }
+    return PyLong_FromUnsignedLongLong(self->state->counter);
+}
+
+static PyObject* CTR_get_threads(CTRObject *self, void *closure) {
+    return PyLong_FromLong(self->threads);
+}
+
+static int CTR_set_threads(CTRObject *self, PyObject *value, void *closure) {
+    long threads;
+
+    if (!value) {
+        PyErr_SetString(PyExc_AttributeError, "Cannot delete threads");
+        return -1;
+    }
+    threads = PyLong_AsLong(value);
+    if (threads == -1 && PyErr_Occurred()) {
+        return -1;
+    }
+    if (threads < 1 || threads > MAX_THREADS) {
+        PyErr_Format(PyExc_ValueError, "threads must be between 1 and %d", MAX_THREADS);
+        return -1;
+    }
+    self->threads = (int)threads;
+    return 0;
+}
+
+static PyMethodDef CTR_methods[] = {
+    {"encrypt", (PyCFunction)CTR_encrypt, METH_O,
+     "encrypt(data) -> bytes\nEncrypt any bytes-like object with one output allocation."},
+    {"decrypt", (PyCFunction)CTR_encrypt, METH_O,
+     "decrypt(data) -> bytes\nCTR mode is symmetric: same as encrypt()."},
+    {"encrypt_into", (PyCFunction)CTR_encrypt_into, METH_VARARGS,
+     "encrypt_into(src, dst)\nEncrypt src into the writable buffer dst (bytearray, memoryview,\n"
+     "mmap, numpy array, ...). dst may be src; nothing is allocated."},
+    {"decrypt_into", (PyCFunction)CTR_encrypt_into, METH_VARARGS,
+     "decrypt_into(src, dst)\nSame as encrypt_into()."},
+    {"encrypt_inplace", (PyCFunction)CTR_encrypt_inplace, METH_O,
+     "encrypt_inplace(buf)\nEncrypt a writable buffer in place."},
+    {"decrypt_inplace", (PyCFunction)CTR_encrypt_inplace, METH_O,
+     "decrypt_inplace(buf)\nSame as encrypt_inplace()."},
+    {"seek", (PyCFunction)CTR_seek, METH_O,
+     "seek(offset)\nMove to byte offset of the stream (counter and intra-block position\n"
+     "are derived directly; nothing before the offset is processed)."},
+    {"tell", (PyCFunction)CTR_tell, METH_NOARGS,
+     "tell() -> int\nByte offset of the next byte to be processed."},
+    {"decrypt_range", (PyCFunction)CTR_decrypt_range, METH_VARARGS,
+     "decrypt_range(buf, offset, length) -> bytes\nDecrypt buf[offset:offset + length], where buf holds the\n"
+     "stream from byte 0 (e.g. an mmap of an encrypted file). Does not move\n"
+     "the object's own position."},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef CTR_getset[] = {
+    {"counter", (getter)CTR_get_counter, NULL, "Counter value of the next keystream block", NULL},
+    {"threads", (getter)CTR_get_threads, (setter)CTR_set_threads,
+     "Threads used for inputs of at least 256 KB per thread", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject CTRType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "c_aesni.CTR",
+    .tp_basicsize = sizeof(CTRObject),
+    .tp_dealloc = (destructor)CTR_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,
+    .tp_doc = "CTR(key, counter=0, threads=1, *, schedule=None)\n"
+              "AES-CTR context. The keystream carries over between calls, so a stream\n"
+              "may be fed in chunks of any size. Inputs of 16 KB and more run without\n"
+              "the GIL; threads > 1 splits large inputs into counter-aligned slices.\n"
+              "seek() and decrypt_range() give random access at any byte offset.\n"
+              "schedule takes round keys from expand_key() instead of expanding key again.",
+    .tp_methods = CTR_methods,
+    .tp_getset = CTR_getset,
+    .tp_init = (initproc)CTR_init,
+    .tp_new = PyType_GenericNew,
+};
+
+// ---------------------------------------------------------------------------
+// GCM extension type: one key, a fresh nonce per message
+// ---------------------------------------------------------------------------
+
+typedef struct {
+    PyObject_HEAD
+    AESNI_GCM_State *state;
+    int tag_length;
+    int users;  // Calls running without the GIL; the state must not be replaced
+} GCMObject;
+
+static int GCM_init(GCMObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"key", "tag_length", "schedule", NULL};
+    Py_buffer key_buf, schedule_buf = {0};
+    PyObject *schedule = Py_None;
+    int tag_length = BLOCK_SIZE;
+    AESNI_GCM_State *state;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*|i$O", kwlist,
+                                     &key_buf, &tag_length, &schedule)) {
+        return -1;
+    }
+
+    if (tag_length < 4 || tag_length > BLOCK_SIZE) {
+        PyBuffer_Release(&key_buf);
+        PyErr_SetString(PyExc_ValueError, "tag_length must be between 4 and 16");
+        return -1;
+    }
+    if (self->users) {
+        PyBuffer_Release(&key_buf);
+        PyErr_SetString(PyExc_RuntimeError, "AES-GCM object is in use by another thread");
+        return -1;
+    }
+
+    if (schedule != Py_None && PyObject_GetBuffer(schedule, &schedule_buf, PyBUF_SIMPLE) != 0) {
+        PyBuffer_Release(&key_buf);
+        return -1;
+    }
+    state = aesni_gcm_init((uint8_t*)key_buf.buf, key_buf.len,
+                           (uint8_t*)schedule_buf.buf, schedule_buf.len);
+    PyBuffer_Release(&schedule_buf);
+    PyBuffer_Release(&key_buf);
+    if (!state) {
+        PyErr_SetString(PyExc_ValueError, "Failed to initialize AES-GCM");
+        return -1;
+    }
+
+    aesni_gcm_cleanup(self->state);
+    self->state = state;
+    self->tag_length = tag_length;
+    return 0;
+}
+
+static void GCM_dealloc(GCMObject *self) {
+    aesni_gcm_cleanup(self->state);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+// Run the GCM kernel, without the GIL for large inputs
+static int GCM_run(GCMObject *self, const Py_buffer *nonce, const Py_buffer *aad,
+                   const uint8_t *in, uint8_t *out, Py_ssize_t len, int decrypt,
+                   uint8_t tag[BLOCK_SIZE], uint64_t call_start) {
+    uint64_t kernel_start, kernel_end;
+    int result;
+
+    if (!self->state) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-GCM not initialized");
+        return -1;
+    }
+    if (nonce->len == 0) {
+        PyErr_SetString(PyExc_ValueError, "Nonce cannot be empty");
+        return -1;
+    }
+    if ((uint64_t)len > GCM_MAX_DATA) {
+        PyErr_SetString(PyExc_ValueError, "Message too long for AES-GCM");
+        return -1;
+    }
+
+    if (len >= GIL_RELEASE_THRESHOLD) {
+        self->users++;
+        Py_BEGIN_ALLOW_THREADS
+        kernel_start = stats_kernel_start(call_start);
+        result = gcm_crypt(self->state, (uint8_t*)nonce->buf, nonce->len, (uint8_t*)aad->buf, aad->len,
+                           in, out, (size_t)len, decrypt, tag);
+        kernel_end = stats_stop(kernel_start);
+        Py_END_ALLOW_THREADS
+        self->users--;
+    } else {
+        kernel_start = stats_kernel_start(call_start);
+        result = gcm_crypt(self->state, (uint8_t*)nonce->buf, nonce->len, (uint8_t*)aad->buf, aad->len,
+                           in, out, (size_t)len, decrypt, tag);
+        kernel_end = stats_stop(kernel_start);
+    }
+
+    if (result != 0) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-GCM processing failed");
+        return -1;
+    }
+    stats_record(STATS_GCM, (size_t)len, call_start, kernel_start, kernel_end);
+    return 0;
+}
+
+static PyObject* GCM_encrypt(GCMObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"nonce", "data", "associated_data", NULL};
+    uint64_t call_start = stats_start();
+    Py_buffer nonce_buf, in_buf, aad_buf = {0};
+    uint8_t tag[BLOCK_SIZE];
+    PyObject *out, *result = NULL;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*y*|y*", kwlist,
+                                     &nonce_buf, &in_buf, &aad_buf)) {
         return NULL;
     }
-    
-    state = (AESNI_CTR_State*)PyLong_AsVoidPtr(state_obj);
-    if (state) {
-        aesni_ctr_cleanup(state);
+
+    out = PyBytes_FromStringAndSize(NULL, in_buf.len);
+    if (out && GCM_run(self, &nonce_buf, &aad_buf, (uint8_t*)in_buf.buf,
+                       (uint8_t*)PyBytes_AS_STRING(out), in_buf.len, 0, tag, call_start) == 0) {
+        result = Py_BuildValue("(Oy#)", out, (char*)tag, (Py_ssize_t)self->tag_length);
     }
-    
+    Py_XDECREF(out);
+
+    PyBuffer_Release(&nonce_buf);
+    PyBuffer_Release(&in_buf);
+    PyBuffer_Release(&aad_buf);
+    return result;
+}
+
+static PyObject* GCM_decrypt(GCMObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"nonce", "data", "tag", "associated_data", NULL};
+    uint64_t call_start = stats_start();
+    Py_buffer nonce_buf, in_buf, tag_buf, aad_buf = {0};
+    uint8_t tag[BLOCK_SIZE], diff = 0;
+    PyObject *out;
+    Py_ssize_t k;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*y*y*|y*", kwlist,
+                                     &nonce_buf, &in_buf, &tag_buf, &aad_buf)) {
+        return NULL;
+    }
+
+    if (tag_buf.len != self->tag_length) {
+        PyErr_Format(PyExc_ValueError, "Tag must be %d bytes", self->tag_length);
+        out = NULL;
+        goto done;
+    }
+
+    out = PyBytes_FromStringAndSize(NULL, in_buf.len);
+    if (!out || GCM_run(self, &nonce_buf, &aad_buf, (uint8_t*)in_buf.buf,
+                        (uint8_t*)PyBytes_AS_STRING(out), in_buf.len, 1, tag, call_start) != 0) {
+        Py_CLEAR(out);
+        goto done;
+    }
+
+    // Constant-time tag comparison; never release unauthenticated plaintext
+    for (k = 0; k < tag_buf.len; k++) {
+        diff |= tag[k] ^ ((uint8_t*)tag_buf.buf)[k];
+    }
+    if (diff) {
+        secure_zero(PyBytes_AS_STRING(out), in_buf.len);
+        Py_CLEAR(out);
+        PyErr_SetString(PyExc_ValueError, "MAC check failed");
+    }
+
+done:
+    PyBuffer_Release(&nonce_buf);
+    PyBuffer_Release(&in_buf);
+    PyBuffer_Release(&tag_buf);
+    PyBuffer_Release(&aad_buf);
+    return out;
+}
+
+static PyObject* GCM_get_tag_length(GCMObject *self, void *closure) {
+    return PyLong_FromLong(self->tag_length);
+}
+
+static PyMethodDef GCM_methods[] = {
+    {"encrypt", (PyCFunction)(void(*)(void))GCM_encrypt, METH_VARARGS | METH_KEYWORDS,
+     "encrypt(nonce, data, associated_data=b'') -> (ciphertext, tag)\n"
+     "Encrypt and authenticate one message. Never reuse a nonce with the same key."},
+    {"decrypt", (PyCFunction)(void(*)(void))GCM_decrypt, METH_VARARGS | METH_KEYWORDS,
+     "decrypt(nonce, data, tag, associated_data=b'') -> plaintext\n"
+     "Decrypt and verify one message; raises ValueError if the tag does not match."},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef GCM_getset[] = {
+    {"tag_length", (getter)GCM_get_tag_length, NULL, "Tag size in bytes", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+static PyTypeObject GCMType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    .tp_name = "c_aesni.GCM",
+    .tp_basicsize = sizeof(GCMObject),
+    .tp_dealloc = (destructor)GCM_dealloc,
+    .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,
+    .tp_doc = "GCM(key, tag_length=16, *, schedule=None)\n"
+              "AES-GCM context (NIST SP 800-38D). CTR and GHASH run in one stitched\n"
+              "pass; inputs of 16 KB and more run without the GIL. The object holds no\n"
+              "per-message state, so threads may share it.\n"
+              "schedule takes round keys from expand_key() instead of expanding key again.",
+    .tp_methods = GCM_methods,
+    .tp_getset = GCM_getset,
+    .tp_init = (initproc)GCM_init,
+    .tp_new = PyType_GenericNew,
+};
+
+// ---------------------------------------------------------------------------
+// ECB, CBC, CFB and OFB extension types (one shared object layout)
+// ---------------------------------------------------------------------------
+
+enum { MODE_ECB, MODE_CBC, MODE_CFB, MODE_OFB };
+
+typedef struct {
+    PyObject_HEAD
+    AESNI_Block_State *state;
+    int mode;
+    int busy;  // Set while the GIL is released around the kernel
+} BlockModeObject;
+
+// Common part of the mode constructors; takes ownership of key_buf
+static int BlockMode_setup(BlockModeObject *self, int mode, Py_buffer *key_buf,
+                           PyObject *iv, int segment_size, PyObject *schedule) {
+    Py_buffer iv_buf = {0}, schedule_buf = {0};
+    AESNI_Block_State *state;
+
+    if (self->busy) {
+        PyErr_SetString(PyExc_RuntimeError, "AES object is in use by another thread");
+        goto fail;
+    }
+    if (segment_size == 0) segment_size = 1;  // pyaes treats 0 as 1
+    if (segment_size < 1 || segment_size > BLOCK_SIZE) {
+        PyErr_SetString(PyExc_ValueError, "segment_size must be between 1 and 16 bytes");
+        goto fail;
+    }
+
+    if (iv != Py_None) {
+        if (PyObject_GetBuffer(iv, &iv_buf, PyBUF_SIMPLE) != 0) goto fail;
+        if (iv_buf.len != BLOCK_SIZE) {
+            PyErr_SetString(PyExc_ValueError, "initialization vector must be 16 bytes");
+            goto fail;
+        }
+    }
+    if (schedule != Py_None && PyObject_GetBuffer(schedule, &schedule_buf, PyBUF_SIMPLE) != 0) {
+        goto fail;
+    }
+
+    state = aesni_block_init((uint8_t*)key_buf->buf, key_buf->len,
+                             (uint8_t*)schedule_buf.buf, schedule_buf.len,
+                             (uint8_t*)iv_buf.buf, (unsigned)segment_size);
+    if (!state) {
+        PyErr_SetString(PyExc_ValueError, "Failed to initialize AES");
+        goto fail;
+    }
+
+    aesni_block_cleanup(self->state);
+    self->state = state;
+    self->mode = mode;
+    PyBuffer_Release(&iv_buf);
+    PyBuffer_Release(&schedule_buf);
+    PyBuffer_Release(key_buf);
+    return 0;
+
+fail:
+    PyBuffer_Release(&iv_buf);
+    PyBuffer_Release(&schedule_buf);
+    PyBuffer_Release(key_buf);
+    return -1;
+}
+
+static int ECB_init(BlockModeObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"key", "schedule", NULL};
+    Py_buffer key_buf;
+    PyObject *schedule = Py_None;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*|$O", kwlist, &key_buf, &schedule)) {
+        return -1;
+    }
+    return BlockMode_setup(self, MODE_ECB, &key_buf, Py_None, 1, schedule);
+}
+
+static int CBC_init(BlockModeObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"key", "iv", "schedule", NULL};
+    Py_buffer key_buf;
+    PyObject *iv = Py_None, *schedule = Py_None;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*|O$O", kwlist, &key_buf, &iv, &schedule)) {
+        return -1;
+    }
+    return BlockMode_setup(self, MODE_CBC, &key_buf, iv, 1, schedule);
+}
+
+static int CFB_init(BlockModeObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"key", "iv", "segment_size", "schedule", NULL};
+    Py_buffer key_buf;
+    PyObject *iv = Py_None, *schedule = Py_None;
+    int segment_size = 1;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*|Oi$O", kwlist,
+                                     &key_buf, &iv, &segment_size, &schedule)) {
+        return -1;
+    }
+    return BlockMode_setup(self, MODE_CFB, &key_buf, iv, segment_size, schedule);
+}
+
+static int OFB_init(BlockModeObject *self, PyObject *args, PyObject *kwargs) {
+    static char *kwlist[] = {"key", "iv", "schedule", NULL};
+    Py_buffer key_buf;
+    PyObject *iv = Py_None, *schedule = Py_None;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "y*|O$O", kwlist, &key_buf, &iv, &schedule)) {
+        return -1;
+    }
+    return BlockMode_setup(self, MODE_OFB, &key_buf, iv, 1, schedule);
+}
+
+static void BlockMode_dealloc(BlockModeObject *self) {
+    aesni_block_cleanup(self->state);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static int block_mode_process(AESNI_Block_State *state, int mode, const uint8_t *in, uint8_t *out,
+                              size_t len, int decrypt) {
+    switch (mode) {
+    case MODE_ECB:
+        return ecb_process(state, in, out, len, decrypt);
+    case MODE_CBC:
+        if (decrypt) {
+            chained_decrypt(state, in, out, len, 0);
+            return 0;
+        }
+        return cbc_encrypt(state, in, out, len);
+    case MODE_CFB:
+        return cfb_process(state, in, out, len, decrypt);
+    default:
+        return ofb_process(state, in, out, len);
+    }
+}
+
+// Check the length, then run the mode without the GIL for large inputs
+static PyObject* BlockMode_run(BlockModeObject *self, PyObject *arg, int decrypt) {
+    uint64_t call_start = stats_start(), kernel_start, kernel_end;
+    Py_buffer in_buf;
+    PyObject *out;
+    int result;
+
+    if (!self->state) {
+        PyErr_SetString(PyExc_RuntimeError, "AES not initialized");
+        return NULL;
+    }
+    if (self->busy) {
+        PyErr_SetString(PyExc_RuntimeError, "AES object is in use by another thread");
+        return NULL;
+    }
+    if (PyObject_GetBuffer(arg, &in_buf, PyBUF_SIMPLE) != 0) {
+        return NULL;
+    }
+
+    if ((self->mode == MODE_ECB || self->mode == MODE_CBC) && in_buf.len % BLOCK_SIZE != 0) {
+        PyBuffer_Release(&in_buf);
+        PyErr_SetString(PyExc_ValueError, "data must be a multiple of 16 bytes");
+        return NULL;
+    }
+    if (self->mode == MODE_CFB && in_buf.len % self->state->segment_size != 0) {
+        PyBuffer_Release(&in_buf);
+        PyErr_SetString(PyExc_ValueError, "data must be a multiple of segment_size");
+        return NULL;
+    }
+
+    out = PyBytes_FromStringAndSize(NULL, in_buf.len);
+    if (!out) {
+        PyBuffer_Release(&in_buf);
+        return NULL;
+    }
+
+    if (in_buf.len >= GIL_RELEASE_THRESHOLD) {
+        self->busy = 1;
+        Py_BEGIN_ALLOW_THREADS
+        kernel_start = stats_kernel_start(call_start);
+        result = block_mode_process(self->state, self->mode, (uint8_t*)in_buf.buf,
+                                    (uint8_t*)PyBytes_AS_STRING(out), (size_t)in_buf.len, decrypt);
+        kernel_end = stats_stop(kernel_start);
+        Py_END_ALLOW_THREADS
+        self->busy = 0;
+    } else {
+        kernel_start = stats_kernel_start(call_start);
+        result = block_mode_process(self->state, self->mode, (uint8_t*)in_buf.buf,
+                                    (uint8_t*)PyBytes_AS_STRING(out), (size_t)in_buf.len, decrypt);
+        kernel_end = stats_stop(kernel_start);
+    }
+    PyBuffer_Release(&in_buf);
+
+    if (result != 0) {
+        Py_DECREF(out);
+        PyErr_SetString(PyExc_RuntimeError, "AES processing failed");
+        return NULL;
+    }
+    stats_record(STATS_ECB + self->mode, (size_t)PyBytes_GET_SIZE(out), call_start, kernel_start, kernel_end);
+    return out;
+}
+
+static PyObject* BlockMode_encrypt(BlockModeObject *self, PyObject *arg) {
+    return BlockMode_run(self, arg, 0);
+}
+
+static PyObject* BlockMode_decrypt(BlockModeObject *self, PyObject *arg) {
+    return BlockMode_run(self, arg, 1);
+}
+
+static PyObject* CFB_get_segment_bytes(BlockModeObject *self, void *closure) {
+    if (!self->state) {
+        PyErr_SetString(PyExc_RuntimeError, "AES not initialized");
+        return NULL;
+    }
+    return PyLong_FromUnsignedLong(self->state->segment_size);
+}
+
+static PyMethodDef BlockMode_methods[] = {
+    {"encrypt", (PyCFunction)BlockMode_encrypt, METH_O,
+     "encrypt(data) -> bytes\nEncrypt data, continuing the chain of earlier calls."},
+    {"decrypt", (PyCFunction)BlockMode_decrypt, METH_O,
+     "decrypt(data) -> bytes\nDecrypt data, continuing the chain of earlier calls."},
+    {NULL, NULL, 0, NULL}
+};
+
+static PyGetSetDef CFB_getset[] = {
+    {"segment_bytes", (getter)CFB_get_segment_bytes, NULL, "Segment size in bytes", NULL},
+    {NULL, NULL, NULL, NULL, NULL}
+};
+
+#define BLOCK_MODE_TYPE(type_name, init, getset, doc)               \
+    {                                                               \
+        PyVarObject_HEAD_INIT(NULL, 0)                              \
+        .tp_name = "c_aesni." type_name,                            \
+        .tp_basicsize = sizeof(BlockModeObject),                    \
+        .tp_dealloc = (destructor)BlockMode_dealloc,                \
+        .tp_flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,       \
+        .tp_doc = doc,                                              \
+        .tp_methods = BlockMode_methods,                            \
+        .tp_getset = getset,                                        \
+        .tp_init = (initproc)init,                                  \
+        .tp_new = PyType_GenericNew,                                \
+    }
+
+static PyTypeObject BlockModeTypes[] = {
+    BLOCK_MODE_TYPE("ECB", ECB_init, NULL,
+        "ECB(key, *, schedule=None)\n"
+        "AES-ECB. encrypt()/decrypt() take any multiple of 16 bytes and run the\n"
+        "multi-block kernel."),
+    BLOCK_MODE_TYPE("CBC", CBC_init, NULL,
+        "CBC(key, iv=None, *, schedule=None)\n"
+        "AES-CBC; iv defaults to 16 zero bytes as in pyaes. Data must be a multiple\n"
+        "of 16 bytes. Decryption runs up to 32 blocks through the multi-block kernel\n"
+        "at once; encryption is serial by construction."),
+    BLOCK_MODE_TYPE("CFB", CFB_init, CFB_getset,
+        "CFB(key, iv=None, segment_size=1, *, schedule=None)\n"
+        "AES-CFB with pyaes semantics: segment_size is in bytes (1-16) and data\n"
+        "must be a multiple of it. Full-block (16) decryption runs in parallel."),
+    BLOCK_MODE_TYPE("OFB", OFB_init, NULL,
+        "OFB(key, iv=None, *, schedule=None)\n"
+        "AES-OFB stream mode; any length, keystream carries over between calls."),
+};
+
+#define NUM_BLOCK_MODES (sizeof(BlockModeTypes) / sizeof(BlockModeTypes[0]))
+
+// Module functions
+static PyObject* py_expand_key(PyObject* self, PyObject* args) {
+    Py_buffer key_buf;
+    AESNI_State aes;
+    PyObject *schedule;
+    unsigned Nr;
+    size_t half;
+
+    if (!PyArg_ParseTuple(args, "y*", &key_buf)) {
+        return NULL;
+    }
+
+    Nr = rounds_for_key(key_buf.len);
+    if (!Nr) {
+        PyBuffer_Release(&key_buf);
+        PyErr_SetString(PyExc_ValueError, "Key must be 16, 24, or 32 bytes");
+        return NULL;
+    }
+
+    aes.rounds = Nr;
+    active_kernel->expand_key(&aes, (uint8_t*)key_buf.buf, key_buf.len/4, Nr);
+    PyBuffer_Release(&key_buf);
+
+    half = (Nr + 1) * BLOCK_SIZE;
+    schedule = PyByteArray_FromStringAndSize(NULL, SCHEDULE_SIZE(Nr));
+    if (schedule) {
+        memcpy(PyByteArray_AS_STRING(schedule), aes.erk, half);
+        memcpy(PyByteArray_AS_STRING(schedule) + half, aes.drk, half);
+    }
+    secure_zero(&aes, sizeof(aes));
+    return schedule;
+}
+
+// Borrow the bytes of a process_many() item: bytes objects are read directly
+// (the argument tuples keep them alive), other buffers are exported into
+// views, allocated on first use
+static int batch_item(PyObject *obj, Py_buffer **views, Py_ssize_t slots, Py_ssize_t slot,
+                      const uint8_t **data, size_t *len) {
+    if (PyBytes_CheckExact(obj)) {
+        *data = (const uint8_t*)PyBytes_AS_STRING(obj);
+        *len = (size_t)PyBytes_GET_SIZE(obj);
+        return 0;
+    }
+    if (!*views) {
+        *views = PyMem_Calloc((size_t)slots, sizeof(Py_buffer));
+        if (!*views) {
+            PyErr_NoMemory();
+            return -1;
+        }
+    }
+    if (PyObject_GetBuffer(obj, &(*views)[slot], PyBUF_SIMPLE) != 0) {
+        return -1;
+    }
+    *data = (const uint8_t*)(*views)[slot].buf;
+    *len = (size_t)(*views)[slot].len;
+    return 0;
+}
+
+// CTR over many independent messages in one call: per-call overhead is paid
+// once per batch and the kernel interleaves messages (multi-buffer)
+static PyObject* py_process_many(PyObject* self, PyObject* args) {
+    uint64_t call_start = stats_start(), kernel_start, kernel_end;
+    PyObject *keys_arg, *counters_arg, *inputs_arg;
+    PyObject *keys = NULL, *counters = NULL, *inputs = NULL;
+    PyObject *out = NULL, *offsets = NULL, *view = NULL, *result = NULL;
+    Py_buffer *views = NULL;
+    CTR_Message *msgs = NULL;
+    uint64_t *offs;
+    uint8_t *base;
+    Py_ssize_t count, m;
+    size_t total = 0;
+    int rc;
+
+    if (!PyArg_ParseTuple(args, "OOO", &keys_arg, &counters_arg, &inputs_arg)) {
+        return NULL;
+    }
+
+    // Tuples pin every item for the duration of the call
+    keys = PySequence_Tuple(keys_arg);
+    inputs = keys ? PySequence_Tuple(inputs_arg) : NULL;
+    if (!inputs) goto done;
+    if (counters_arg != Py_None && !(counters = PySequence_Tuple(counters_arg))) goto done;
+
+    count = PyTuple_GET_SIZE(inputs);
+    if (PyTuple_GET_SIZE(keys) != count || (counters && PyTuple_GET_SIZE(counters) != count)) {
+        PyErr_SetString(PyExc_ValueError, "keys, counters and inputs must have the same length");
+        goto done;
+    }
+
+    msgs = PyMem_Calloc((size_t)count + 1, sizeof(CTR_Message));
+    offsets = PyBytes_FromStringAndSize(NULL, (count + 1) * (Py_ssize_t)sizeof(uint64_t));
+    if (!msgs || !offsets) {
+        if (!msgs) PyErr_NoMemory();
+        goto done;
+    }
+    offs = (uint64_t*)PyBytes_AS_STRING(offsets);
+    offs[0] = 0;
+
+    for (m = 0; m < count; m++) {
+        CTR_Message *msg = &msgs[m];
+
+        if (batch_item(PyTuple_GET_ITEM(keys, m), &views, 2 * count, 2 * m,
+                       &msg->key, &msg->key_len) != 0) {
+            goto done;
+        }
+        if (!rounds_for_key(msg->key_len)) {
+            PyErr_Format(PyExc_ValueError, "Key %zd must be 16, 24, or 32 bytes", m);
+            goto done;
+        }
+        if (counters) {
+            msg->counter = PyLong_AsUnsignedLongLong(PyTuple_GET_ITEM(counters, m));
+            if (msg->counter == (uint64_t)-1 && PyErr_Occurred()) goto done;
+        }
+        if (batch_item(PyTuple_GET_ITEM(inputs, m), &views, 2 * count, 2 * m + 1,
+                       &msg->in, &msg->len) != 0) {
+            goto done;
+        }
+        total += msg->len;
+        offs[m + 1] = total;
+    }
+
+    out = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)total);
+    if (!out) goto done;
+    base = (uint8_t*)PyBytes_AS_STRING(out);
+    for (m = 0; m < count; m++) {
+        msgs[m].out = base + offs[m];
+    }
+
+    if (total >= GIL_RELEASE_THRESHOLD) {
+        Py_BEGIN_ALLOW_THREADS
+        kernel_start = stats_kernel_start(call_start);
+        rc = active_kernel->ctr_many(msgs, (size_t)count);
+        kernel_end = stats_stop(kernel_start);
+        Py_END_ALLOW_THREADS
+    } else {
+        kernel_start = stats_kernel_start(call_start);
+        rc = active_kernel->ctr_many(msgs, (size_t)count);
+        kernel_end = stats_stop(kernel_start);
+    }
+    if (rc != 0) {
+        PyErr_SetString(PyExc_RuntimeError, "AES-CTR processing failed");
+        goto done;
+    }
+    stats_record(STATS_BATCH, total, call_start, kernel_start, kernel_end);
+
+    // Offsets as a memoryview of count + 1 native uint64 values
+    view = PyMemoryView_FromObject(offsets);
+    if (view) {
+        PyObject *typed = PyObject_CallMethod(view, "cast", "s", "Q");
+        if (typed) {
+            result = PyTuple_Pack(2, out, typed);
+            Py_DECREF(typed);
+        }
+    }
+
+done:
+    if (views) {
+        for (m = 0; m < 2 * PyTuple_GET_SIZE(inputs); m++) {
+            if (views[m].obj) PyBuffer_Release(&views[m]);
+        }
+        PyMem_Free(views);
+    }
+    PyMem_Free(msgs);
+    Py_XDECREF(view);
+    Py_XDECREF(out);
+    Py_XDECREF(offsets);
+    Py_XDECREF(counters);
+    Py_XDECREF(inputs);
+    Py_XDECREF(keys);
+    return result;
+}
+
+// out = a ^ b over len bytes (SSE2 is part of x86-64; elsewhere 8 bytes at a time).
+// out may alias a or b.
+static void xor_bytes(const uint8_t *a, const uint8_t *b, uint8_t *out, size_t len) {
+    size_t i = 0;
+#if AES_X86
+    for (; i + 4 * BLOCK_SIZE <= len; i += 4 * BLOCK_SIZE) {
+        __m128i x0 = _mm_loadu_si128((const __m128i*)(a + i));
+        __m128i x1 = _mm_loadu_si128((const __m128i*)(a + i + 16));
+        __m128i x2 = _mm_loadu_si128((const __m128i*)(a + i + 32));
+        __m128i x3 = _mm_loadu_si128((const __m128i*)(a + i + 48));
+        x0 = _mm_xor_si128(x0, _mm_loadu_si128((const __m128i*)(b + i)));
+        x1 = _mm_xor_si128(x1, _mm_loadu_si128((const __m128i*)(b + i + 16)));
+        x2 = _mm_xor_si128(x2, _mm_loadu_si128((const __m128i*)(b + i + 32)));
+        x3 = _mm_xor_si128(x3, _mm_loadu_si128((const __m128i*)(b + i + 48)));
+        _mm_storeu_si128((__m128i*)(out + i), x0);
+        _mm_storeu_si128((__m128i*)(out + i + 16), x1);
+        _mm_storeu_si128((__m128i*)(out + i + 32), x2);
+        _mm_storeu_si128((__m128i*)(out + i + 48), x3);
+    }
+    for (; i + BLOCK_SIZE <= len; i += BLOCK_SIZE) {
+        _mm_storeu_si128((__m128i*)(out + i),
+                         _mm_xor_si128(_mm_loadu_si128((const __m128i*)(a + i)),
+                                       _mm_loadu_si128((const __m128i*)(b + i))));
+    }
+#else
+    for (; i + 8 <= len; i += 8) {
+        uint64_t x, y;
+        memcpy(&x, a + i, 8);
+        memcpy(&y, b + i, 8);
+        x ^= y;
+        memcpy(out + i, &x, 8);
+    }
+#endif
+    for (; i < len; i++) {
+        out[i] = a[i] ^ b[i];
+    }
+}
+
+// XOR data with precomputed keystream (see keystream_prefetch.py)
+static PyObject* py_xor_into(PyObject* self, PyObject* args) {
+    Py_buffer a, b, out;
+    PyObject *result = NULL;
+
+    if (!PyArg_ParseTuple(args, "y*y*w*", &a, &b, &out)) {
+        return NULL;
+    }
+    if (b.len < a.len || out.len < a.len) {
+        PyErr_SetString(PyExc_ValueError, "Keystream and output must be at least as long as the data");
+        goto done;
+    }
+
+    if (a.len >= GIL_RELEASE_THRESHOLD) {
+        Py_BEGIN_ALLOW_THREADS
+        xor_bytes((const uint8_t*)a.buf, (const uint8_t*)b.buf, (uint8_t*)out.buf, (size_t)a.len);
+        Py_END_ALLOW_THREADS
+    } else {
+        xor_bytes((const uint8_t*)a.buf, (const uint8_t*)b.buf, (uint8_t*)out.buf, (size_t)a.len);
+    }
+    result = Py_None;
+    Py_INCREF(result);
+
+done:
+    PyBuffer_Release(&a);
+    PyBuffer_Release(&b);
+    PyBuffer_Release(&out);
+    return result;
+}
+
+static PyObject* py_active_kernel(PyObject* self, PyObject* Py_UNUSED(args)) {
+    return PyUnicode_FromString(active_kernel->name);
+}
+
+static PyObject* py_available_kernels(PyObject* self, PyObject* Py_UNUSED(args)) {
+    PyObject *names = PyList_New(0);
+    size_t i;
+
+    if (!names) return NULL;
+    for (i = 0; i < NUM_KERNELS; i++) {
+        if (kernels[i].supported()) {
+            PyObject *name = PyUnicode_FromString(kernels[i].name);
+            if (!name || PyList_Append(names, name) != 0) {
+                Py_XDECREF(name);
+                Py_DECREF(names);
+                return NULL;
+            }
+            Py_DECREF(name);
+        }
+    }
+    return names;
+}
+
+static PyObject* py_set_kernel(PyObject* self, PyObject* args) {
+    const char *name;
+    size_t i;
+
+    if (!PyArg_ParseTuple(args, "s", &name)) {
+        return NULL;
+    }
+
+    for (i = 0; i < NUM_KERNELS; i++) {
+        if (strcmp(kernels[i].name, name) == 0) {
+            if (!kernels[i].supported()) {
+                PyErr_Format(PyExc_ValueError, "Kernel '%s' is not supported by this CPU", name);
+                return NULL;
+            }
+            active_kernel = &kernels[i];
+            Py_RETURN_NONE;
+        }
+    }
+
+    PyErr_Format(PyExc_ValueError, "Unknown kernel '%s'", name);
+    return NULL;
+}
+
+static PyObject* py_enable_stats(PyObject* self, PyObject* args, PyObject* kwargs) {
+    static char *kwlist[] = {"enabled", "sample_every", NULL};
+    int enabled = 1, previous = stats_enabled;
+    unsigned sample_every = stats_sample_every;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "|pI", kwlist, &enabled, &sample_every)) {
+        return NULL;
+    }
+    if (sample_every < 1 || sample_every > (1u << 30)) {
+        PyErr_SetString(PyExc_ValueError, "sample_every must be between 1 and 2**30");
+        return NULL;
+    }
+    stats_sample_every = sample_every;
+    stats_countdown = 1;
+    stats_enabled = enabled;
+    return PyBool_FromLong(previous);
+}
+
+static PyObject* py_reset_stats(PyObject* self, PyObject* Py_UNUSED(args)) {
+    memset(op_stats, 0, sizeof(op_stats));
     Py_RETURN_NONE;
 }
 
+static PyObject* stats_entry(const Op_Stats *s) {
+    PyObject *hist = PyDict_New();
+    unsigned b;
+
+    if (!hist) return NULL;
+    for (b = 0; b < STATS_BUCKETS; b++) {
+        PyObject *lower, *count;
+        int rc;
+
+        if (!s->sizes[b]) continue;
+        lower = PyLong_FromUnsignedLongLong(b ? 1ull << (b - 1) : 0);
+        count = PyLong_FromUnsignedLongLong(s->sizes[b]);
+        rc = (lower && count) ? PyDict_SetItem(hist, lower, count) : -1;
+        Py_XDECREF(lower);
+        Py_XDECREF(count);
+        if (rc != 0) {
+            Py_DECREF(hist);
+            return NULL;
+        }
+    }
+    return Py_BuildValue("{s:K,s:K,s:K,s:K,s:K,s:K,s:d,s:d,s:N}",
+                         "calls", (unsigned long long)s->calls,
+                         "bytes", (unsigned long long)s->bytes,
+                         "timed_calls", (unsigned long long)s->timed_calls,
+                         "timed_bytes", (unsigned long long)s->timed_bytes,
+                         "kernel_cycles", (unsigned long long)s->kernel_cycles,
+                         "call_cycles", (unsigned long long)s->call_cycles,
+                         "cycles_per_byte", s->timed_bytes ?
+                             (double)s->kernel_cycles / (double)s->timed_bytes : 0.0,
+                         "overhead_share", s->call_cycles ?
+                             1.0 - (double)s->kernel_cycles / (double)s->call_cycles : 0.0,
+                         "size_histogram", hist);
+}
+
+static PyObject* py_stats(PyObject* self, PyObject* Py_UNUSED(args)) {
+    PyObject *result = Py_BuildValue("{s:O,s:I,s:d}", "enabled", stats_enabled ? Py_True : Py_False,
+                                     "sample_every", stats_sample_every, "tsc_hz", tsc_hz());
+    int op;
+
+    if (!result) return NULL;
+    for (op = 0; op < NUM_STATS; op++) {
+        PyObject *entry = stats_entry(&op_stats[op]);
+        if (!entry || PyDict_SetItemString(result, stats_names[op], entry) != 0) {
+            Py_XDECREF(entry);
+            Py_DECREF(result);
+            return NULL;
+        }
+        Py_DECREF(entry);
+    }
+    return result;
+}
+
 // Method definitions
 static PyMethodDef AESNICTRMethods[] = {
-    {"init", py_aesni_ctr_init, METH_VARARGS, "Initialize AES-CTR state"},
-    {"process", py_aesni_ctr_process, METH_VARARGS, "Process data with AES-CTR"},
-    {"cleanup", py_aesni_ctr_cleanup, METH_VARARGS, "Cleanup AES-CTR state"},
+    {"expand_key", py_expand_key, METH_VARARGS,
+     "expand_key(key) -> bytearray\nEncryption then decryption round keys, for CTR(schedule=...)"},
+    {"process_many", py_process_many, METH_VARARGS,
+     "process_many(keys, counters, inputs) -> (bytes, offsets)\n"
+     "AES-CTR over many messages, each with its own key and initial counter\n"
+     "(counters may be None for all zeros). Outputs are concatenated; message i\n"
+     "is out[offsets[i]:offsets[i+1]], offsets being a memoryview of uint64."},
+    {"xor_into", py_xor_into, METH_VARARGS,
+     "xor_into(data, keystream, out)\n"
+     "out[:len(data)] = data ^ keystream[:len(data)]; out may be data itself"},
+    {"active_kernel", py_active_kernel, METH_NOARGS, "Name of the kernel selected for this CPU"},
+    {"available_kernels", py_available_kernels, METH_NOARGS, "Kernels this CPU can run, slowest first"},
+    {"set_kernel", py_set_kernel, METH_VARARGS, "Force a kernel by name (must be supported)"},
+    {"enable_stats", (PyCFunction)(void(*)(void))py_enable_stats, METH_VARARGS | METH_KEYWORDS,
+     "enable_stats(enabled=True, sample_every=16) -> bool\n"
+     "Turn call telemetry on or off (AES_STATS=1 turns it on at import); returns\n"
+     "the previous setting. Every call is counted, one in sample_every (at\n"
+     "random) is timed; sample_every=1 times them all."},
+    {"stats", py_stats, METH_NOARGS,
+     "stats() -> dict\n"
+     "Telemetry since the last reset_stats(): 'enabled', 'sample_every', 'tsc_hz',\n"
+     "and per mode ('ctr', 'gcm', 'ecb', 'cbc', 'cfb', 'ofb', 'batch') calls,\n"
+     "bytes, size_histogram {lower bound: calls} in powers of two, and over the\n"
+     "timed calls timed_calls, timed_bytes, kernel_cycles, call_cycles (from entry\n"
+     "into the C method), cycles_per_byte and overhead_share. Cycles are TSC\n"
+     "ticks; threaded calls count the caller's wall time."},
+    {"reset_stats", py_reset_stats, METH_NOARGS, "Zero the telemetry counters"},
     {NULL, NULL, 0, NULL}
 };
 
@@ -261,12 +3138,65 @@ static PyMethodDef AESNICTRMethods[] = {
 static struct PyModuleDef aesni_ctr_module = {
     PyModuleDef_HEAD_INIT,
     "c_aesni",
-    "Optimized AES-CTR module",
+    "Optimized AES module: CTR, GCM, ECB, CBC, CFB and OFB",
     -1,
     AESNICTRMethods
 };
 
 // Module initialization
 PyMODINIT_FUNC PyInit_c_aesni(void) {
-    return PyModule_Create(&aesni_ctr_module);
+    PyObject *module;
+    size_t i;
+
+    // Check CPUID once and pick the fastest supported kernel
+    select_best_kernel();
+
+    // Telemetry is off unless AES_STATS is set to something other than 0
+    {
+        const char *env = getenv("AES_STATS");
+        stats_enabled = env && *env && strcmp(env, "0") != 0;
+    }
+    stats_epoch_ns = monotonic_ns();
+    stats_epoch_tsc = read_tsc();
+
+    if (PyType_Ready(&CTRType) < 0 || PyType_Ready(&GCMType) < 0) {
+        return NULL;
+    }
+    for (i = 0; i < NUM_BLOCK_MODES; i++) {
+        if (PyType_Ready(&BlockModeTypes[i]) < 0) {
+            return NULL;
+        }
+    }
+
+    module = PyModule_Create(&aesni_ctr_module);
+    if (!module) {
+        return NULL;
+    }
+
+    Py_INCREF(&CTRType);
+    if (PyModule_AddObject(module, "CTR", (PyObject*)&CTRType) < 0) {
+        Py_DECREF(&CTRType);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    Py_INCREF(&GCMType);
+    if (PyModule_AddObject(module, "GCM", (PyObject*)&GCMType) < 0) {
+        Py_DECREF(&GCMType);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    for (i = 0; i < NUM_BLOCK_MODES; i++) {
+        // tp_name is "c_aesni.<MODE>"
+        const char *name = strchr(BlockModeTypes[i].tp_name, '.') + 1;
+        Py_INCREF(&BlockModeTypes[i]);
+        if (PyModule_AddObject(module, name, (PyObject*)&BlockModeTypes[i]) < 0) {
+            Py_DECREF(&BlockModeTypes[i]);
+            Py_DECREF(module);
+            return NULL;
+        }
+    }
+
+    return module;
 }
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Event-loop latency under encryption load, for the asyncio stream adapters.
+
+A producer streams blobs through EncryptingStreamWriter and a consumer
+reads them back through DecryptingStreamReader, over an in-memory loopback
+so that socket copies do not blur the result. Meanwhile a
+ticker coroutine asks to wake up every millisecond and records how late it
+runs. The lag shows how long the event loop is blocked. Encrypting every
+chunk inline is compared with offloading large chunks to the GIL-released
+thread pool. Offloading only helps when a second core can run the kernel
+while the loop thread keeps serving.
+
+    python c_aesni_async_latency_benchmark.py --backend cython_aesni --chunk 4M --total 512M
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+import argparse
+import asyncio
+import statistics
+import time
+from async_streams import DEFAULT_OFFLOAD_THRESHOLD, DecryptingStreamReader, EncryptingStreamWriter
+
+# 128-bit key (16 bytes)
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'
+TICK = 0.001
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in _UNITS:
+        return int(text[:-1]) * _UNITS[text[-1]]
+    return int(text)
+
+
+def load_backend(name):
+    if name == "cython_aesni":
+        sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.joinpath("cython_aesni").resolve()))
+        from cython_aesni_wrapper import AESModeOfOperationCTR
+    else:
+        from c_aesni_wrapper import AESModeOfOperationCTR
+    return AESModeOfOperationCTR
+
+
+async def ticker(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        lags.append(loop.time() - expected)
+
+
+class LoopbackWriter:
+    """StreamWriter stand-in feeding a StreamReader in the same process.
+    drain() waits until the reader has consumed all but two chunks."""
+
+    def __init__(self, stream, high_water):
+        self.stream = stream
+        self.high_water = high_water
+        self.pending = 0
+        self.consumed = asyncio.Condition()
+
+    def write(self, data):
+        self.pending += len(data)
+        self.stream.feed_data(data)
+
+    async def drain(self):
+        async with self.consumed:
+            await self.consumed.wait_for(lambda: self.pending <= self.high_water)
+
+    async def ack(self, n):
+        async with self.consumed:
+            self.pending -= n
+            self.consumed.notify_all()
+
+
+async def run(cipher_class, chunk, total, threshold):
+    payload = bytes(chunk)
+    chunks = total // chunk
+
+    lags = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK)
+
+    t0 = time.perf_counter()
+    stream = asyncio.StreamReader(limit=chunk)
+    pipe = LoopbackWriter(stream, 2 * chunk)
+    out = EncryptingStreamWriter(pipe, cipher_class(KEY), offload_threshold=threshold)
+    plain = DecryptingStreamReader(stream, cipher_class(KEY), offload_threshold=threshold)
+
+    async def produce():
+        for _ in range(chunks):
+            await out.write(payload)
+            await out.drain()
+
+    async def consume():
+        for _ in range(chunks):
+            if await plain.readexactly(chunk) != payload:
+                raise Exception("decrypt error!")
+            await pipe.ack(chunk)
+
+    await asyncio.gather(produce(), consume())
+    elapsed = time.perf_counter() - t0
+
+    stop.set()
+    await tick_task
+    stats = {"writer": out.stats, "reader": plain.stats}
+    return lags, 2 * chunks * chunk / elapsed, stats
+
+
+def report(label, lags, throughput, stats):
+    lags_ms = sorted(lag * 1000 for lag in lags)
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"{label:<28} loop lag p50 {statistics.median(lags_ms):7.3f} ms  "
+          f"p99 {p99:7.3f} ms  max {lags_ms[-1]:7.3f} ms  "
+          f"throughput {throughput / 1e9:5.2f} GB/s  chunks {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=("c_aesni", "cython_aesni"), default="c_aesni")
+    parser.add_argument("--chunk", default="4M", help="Bytes per write (default: 4M)")
+    parser.add_argument("--total", default="256M", help="Bytes streamed per run (default: 256M)")
+    parser.add_argument("--threshold", default=str(DEFAULT_OFFLOAD_THRESHOLD),
+                        help="Offload threshold of the adapters (default: %d)" % DEFAULT_OFFLOAD_THRESHOLD)
+    args = parser.parse_args()
+
+    cipher_class = load_backend(args.backend)
+    chunk, total = parse_size(args.chunk), parse_size(args.total)
+    print(f"{args.backend}: {total // chunk} chunks of {chunk} bytes")
+    for label, threshold in (("inline (blocks the loop)", float("inf")),
+                             (f"offload >= {args.threshold}", parse_size(args.threshold))):
+        report(label, *asyncio.run(run(cipher_class, chunk, total, threshold)))
+
+
+if __name__ == "__main__":
+    main()
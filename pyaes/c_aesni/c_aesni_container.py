@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Chunk-indexed encrypted container: read any slice of a large encrypted
+payload without decrypting the rest.
+
+The payload is cut into fixed-size chunks that are encrypted independently
+with c_aesni, either AES-GCM (one tag per chunk, the default) or AES-CTR
+(no tags; the chunks are then one continuous CTR stream). A reader maps the
+file, finds the chunks covering a byte range through the footer index, and
+decrypts them on a thread pool; the c_aesni kernels release the GIL for
+chunks of 16 KB and more, so the threads run in parallel.
+
+Layout (all integers little-endian):
+
+    header   32 bytes
+        magic        8s   b"AESCHUNK"
+        version      B    1
+        mode         B    0 = CTR, 1 = GCM
+        tag length   B    0 for CTR, 4..16 for GCM
+        reserved     B    0
+        chunk size   I    bytes of plaintext per chunk, a multiple of 16
+        payload size Q    bytes of plaintext in total
+        seed         8s   CTR: initial counter (Q); GCM: random nonce prefix
+    chunks   back to back: ciphertext, then the tag for GCM
+    index    one entry per chunk
+        offset       Q    file offset of the chunk
+        length       I    plaintext bytes in the chunk
+        counter      Q    CTR: counter of the chunk's first block;
+                          GCM: chunk number (the nonce is prefix + number)
+    trailer  16 bytes
+        index offset Q
+        magic        8s   b"AESINDEX"
+
+Chunk i starts at counter seed + i * chunk_size // 16 in CTR mode. In GCM
+mode its 12-byte nonce is the 8-byte prefix followed by i as a big-endian
+uint32, and its associated data is the header followed by i (Q). The
+reader derives counters and nonces from the chunk number and checks the
+index against them, so tampering with the header, the index or the order
+of chunks fails the tags.
+
+API:
+    write_container(key, data, path, chunk_size=1 MB, authenticated=True, counter=None, threads=None)
+    ContainerReader(path, key, threads=None)
+        .read(offset=0, length=None), .read_chunks(indices), .close()
+
+CLI:
+    python c_aesni_container.py pack --key HEX src dst [--chunk-size KB] [--ctr]
+    python c_aesni_container.py unpack --key HEX src dst
+    python c_aesni_container.py read --key HEX src --offset N --length N
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+import argparse
+import mmap
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from c_aesni_wrapper import AESModeOfOperationCTR, AESModeOfOperationGCM
+
+MAGIC = b"AESCHUNK"
+INDEX_MAGIC = b"AESINDEX"
+VERSION = 1
+MODE_CTR = 0
+MODE_GCM = 1
+
+HEADER = struct.Struct("<8sBBBBIQ8s")
+INDEX_ENTRY = struct.Struct("<QIQ")
+TRAILER = struct.Struct("<Q8s")
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MAX_GCM_CHUNKS = 1 << 32  # the chunk number is 32 bits of the nonce
+
+
+def _chunk_lengths(size, chunk_size):
+    return [min(chunk_size, size - start) for start in range(0, size, chunk_size)]
+
+
+def _gcm_nonce(prefix, index):
+    return prefix + index.to_bytes(4, "big")
+
+
+def _run(pool, func, items):
+    """func over items, on the pool when there is more than one"""
+    if pool is None or len(items) < 2:
+        return [func(item) for item in items]
+    return list(pool.map(func, items))
+
+
+def write_container(key, data, path, chunk_size=DEFAULT_CHUNK_SIZE, authenticated=True,
+                    counter=None, threads=None, tag_length=16):
+    """
+    Encrypt data into a chunked container file
+
+    Args:
+        key: 16, 24, or 32 byte key
+        data: Payload (any bytes-like object, e.g. an mmap of the source file)
+        path: Destination path (created or truncated)
+        chunk_size: Plaintext bytes per chunk, a multiple of 16
+        authenticated: AES-GCM with one tag per chunk; False for AES-CTR
+        counter: CTR only: counter of the first block (default 0)
+        threads: Threads encrypting chunks (default: os.cpu_count())
+        tag_length: GCM tag size in bytes (4 to 16)
+
+    Returns:
+        Number of chunks written
+
+    Raises:
+        ValueError: If counter is given with authenticated=True (GCM derives
+        the chunk nonces itself)
+    """
+    if authenticated and counter is not None:
+        raise ValueError("counter only applies to CTR containers (authenticated=False)")
+    if chunk_size <= 0 or chunk_size % 16 or chunk_size >= 1 << 32:
+        raise ValueError("chunk_size must be a positive multiple of 16 below 4 GB")
+    view = memoryview(data).cast("B")
+    size = len(view)
+    lengths = _chunk_lengths(size, chunk_size)
+    tag_length = tag_length if authenticated else 0
+    if authenticated:
+        if len(lengths) > MAX_GCM_CHUNKS:
+            raise ValueError("Too many chunks for one GCM nonce prefix")
+        seed = os.urandom(8)
+        mode = MODE_GCM
+    else:
+        counter = counter or 0
+        seed = struct.pack("<Q", counter)
+        mode = MODE_CTR
+    header = HEADER.pack(MAGIC, VERSION, mode, tag_length, 0, chunk_size, size, seed)
+
+    # Fixed layout: every chunk's place is known before any is encrypted
+    offsets, entries, position = [], [], HEADER.size
+    blocks_per_chunk = chunk_size // 16
+    for i, length in enumerate(lengths):
+        offsets.append(position)
+        chunk_counter = i if authenticated else (counter + i * blocks_per_chunk) % (1 << 64)
+        entries.append(INDEX_ENTRY.pack(position, length, chunk_counter))
+        position += length + tag_length
+    index_offset = position
+    total = index_offset + INDEX_ENTRY.size * len(lengths) + TRAILER.size
+
+    with open(path, "w+b") as f:
+        f.truncate(total)
+        with mmap.mmap(f.fileno(), total, access=mmap.ACCESS_WRITE) as out, memoryview(out) as dst:
+            dst[:HEADER.size] = header
+
+            def encrypt_chunk(i):
+                start = i * chunk_size
+                src = view[start:start + lengths[i]]
+                at = offsets[i]
+                if authenticated:
+                    aad = header + struct.pack("<Q", i)
+                    gcm = AESModeOfOperationGCM(key, _gcm_nonce(seed, i), tag_length)
+                    ciphertext, tag = gcm.encrypt_and_digest(src, aad)
+                    dst[at:at + lengths[i]] = ciphertext
+                    dst[at + lengths[i]:at + lengths[i] + tag_length] = tag
+                else:
+                    chunk_counter = INDEX_ENTRY.unpack(entries[i])[2]
+                    AESModeOfOperationCTR(key, chunk_counter).encrypt_into(src, dst[at:at + lengths[i]])
+
+            workers = threads or os.cpu_count() or 1
+            if workers > 1 and len(lengths) > 1:
+                with ThreadPoolExecutor(workers) as pool:
+                    _run(pool, encrypt_chunk, range(len(lengths)))
+            else:
+                _run(None, encrypt_chunk, range(len(lengths)))
+
+            dst[index_offset:total - TRAILER.size] = b"".join(entries)
+            dst[total - TRAILER.size:] = TRAILER.pack(index_offset, INDEX_MAGIC)
+            del encrypt_chunk  # drops the closure's reference to dst
+    return len(lengths)
+
+
+class ContainerReader:
+    """Random access to a container written by write_container()"""
+
+    def __init__(self, path, key, threads=None):
+        """
+        Args:
+            path: Container file
+            key: The key given to write_container()
+            threads: Threads decrypting chunks (default: os.cpu_count())
+
+        Raises:
+            ValueError: If the file is not a well-formed container
+        """
+        self.key = key
+        self.threads = threads or os.cpu_count() or 1
+        self._file = open(path, "rb")
+        try:
+            file_size = os.fstat(self._file.fileno()).st_size
+            if file_size < HEADER.size + TRAILER.size:
+                raise ValueError("Not a chunked AES container (too short)")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            self._parse(file_size)
+        except BaseException:
+            self.close()
+            raise
+        self._pool = None
+
+    def _parse(self, file_size):
+        self.header = bytes(self._view[:HEADER.size])
+        magic, version, mode, tag_length, _, chunk_size, size, seed = HEADER.unpack(self.header)
+        if magic != MAGIC or version != VERSION or mode not in (MODE_CTR, MODE_GCM):
+            raise ValueError("Not a chunked AES container (bad header)")
+        if chunk_size <= 0 or chunk_size % 16:
+            raise ValueError("Corrupt container header (chunk size)")
+        index_offset, index_magic = TRAILER.unpack(self._view[file_size - TRAILER.size:])
+        if index_magic != INDEX_MAGIC:
+            raise ValueError("Not a chunked AES container (no index)")
+
+        self.authenticated = mode == MODE_GCM
+        self.tag_length = tag_length
+        self.chunk_size = chunk_size
+        self.size = size
+        self._seed = seed
+        lengths = _chunk_lengths(size, chunk_size)
+        if index_offset + INDEX_ENTRY.size * len(lengths) + TRAILER.size != file_size:
+            raise ValueError("Corrupt container index (size)")
+
+        # Counters and lengths follow from the chunk number; the index must agree
+        first_counter = struct.unpack("<Q", seed)[0]
+        self.offsets = []
+        self.counters = []
+        end = HEADER.size
+        for i, (offset, length, counter) in enumerate(
+                INDEX_ENTRY.iter_unpack(self._view[index_offset:file_size - TRAILER.size])):
+            expected = i if self.authenticated else (first_counter + i * (chunk_size // 16)) % (1 << 64)
+            if length != lengths[i] or counter != expected or offset < end \
+                    or offset + length + tag_length > index_offset:
+                raise ValueError(f"Corrupt container index (chunk {i})")
+            self.offsets.append(offset)
+            self.counters.append(counter)
+            end = offset + length + tag_length
+        self.lengths = lengths
+
+    @property
+    def chunk_count(self):
+        return len(self.lengths)
+
+    def _executor(self):
+        if self.threads <= 1:
+            return None
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.threads)
+        return self._pool
+
+    def _verify(self, i):
+        """Whole plaintext of GCM chunk i (bytes), after checking its tag"""
+        # The slices are released even when the tag does not match, so
+        # close() can unmap
+        at, length = self.offsets[i], self.lengths[i]
+        tag = bytes(self._view[at + length:at + length + self.tag_length])
+        aad = self.header + struct.pack("<Q", i)
+        gcm = AESModeOfOperationGCM(self.key, _gcm_nonce(self._seed, i), self.tag_length)
+        with self._view[at:at + length] as ciphertext:
+            return gcm.decrypt_and_verify(ciphertext, tag, aad)
+
+    def _decrypt(self, i, start, stop, out):
+        """Plaintext bytes [start, stop) of chunk i into the writable buffer out"""
+        at = self.offsets[i]
+        if self.authenticated:
+            # The whole chunk is needed to check its tag
+            out[:] = memoryview(self._verify(i))[start:stop]
+        else:
+            aes = AESModeOfOperationCTR(self.key, self.counters[i])
+            aes.seek(start)
+            with self._view[at + start:at + stop] as ciphertext:
+                aes.decrypt_into(ciphertext, out)
+
+    def read(self, offset=0, length=None):
+        """
+        Plaintext bytes [offset, offset + length) of the payload, as a new bytearray
+
+        Only the chunks covering the range are decrypted, in parallel. In
+        GCM mode each of them is authenticated first.
+
+        Raises:
+            ValueError: If the range is outside the payload or a tag does not match
+        """
+        if length is None:
+            length = self.size - offset
+        if offset < 0 or length < 0 or offset + length > self.size:
+            raise ValueError("Range is outside the payload")
+        # Returned as is: chunks are decrypted straight into it
+        result = bytearray(length)
+        if not length:
+            return result
+        out = memoryview(result)
+        first = offset // self.chunk_size
+        last = (offset + length - 1) // self.chunk_size
+
+        def decrypt_part(i):
+            base = i * self.chunk_size
+            start = max(offset, base) - base
+            stop = min(offset + length, base + self.lengths[i]) - base
+            self._decrypt(i, start, stop, out[base + start - offset:base + stop - offset])
+
+        _run(self._executor(), decrypt_part, range(first, last + 1))
+        return result
+
+    def read_chunks(self, indices):
+        """Plaintext of the given chunks, decrypted in parallel: the GCM
+        plaintext as bytes, CTR chunks decrypted into a bytearray each"""
+        indices = list(indices)
+        for i in indices:
+            if not 0 <= i < self.chunk_count:
+                raise IndexError(f"chunk {i} out of range")
+
+        def decrypt_chunk(i):
+            if self.authenticated:
+                return self._verify(i)
+            chunk = bytearray(self.lengths[i])
+            self._decrypt(i, 0, self.lengths[i], memoryview(chunk))
+            return chunk
+
+        return _run(self._executor(), decrypt_chunk, indices)
+
+    def close(self):
+        if getattr(self, "_pool", None) is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+            self._view = None
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunk-indexed AES container files")
+    parser.add_argument("operation", choices=("pack", "unpack", "read"))
+    parser.add_argument("src")
+    parser.add_argument("dst", nargs="?", help="Output path (pack/unpack)")
+    key_group = parser.add_mutually_exclusive_group(required=True)
+    key_group.add_argument("--key", help="Key as hex (32, 48 or 64 digits)")
+    key_group.add_argument("--key-file", help="File holding the raw 16, 24 or 32 byte key")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE // 1024,
+                        help="pack: plaintext KB per chunk (default: %(default)s)")
+    parser.add_argument("--ctr", action="store_true", help="pack: AES-CTR chunks without tags")
+    parser.add_argument("--offset", type=int, default=0, help="read: first payload byte")
+    parser.add_argument("--length", type=int, help="read: bytes (default: to the end)")
+    parser.add_argument("--threads", type=int, help="Threads (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if args.key is not None:
+        key = bytes.fromhex(args.key)
+    else:
+        key = pathlib.Path(args.key_file).read_bytes()
+    if args.operation != "read" and args.dst is None:
+        parser.error(f"{args.operation} needs a dst path")
+
+    if args.operation == "pack":
+        with open(args.src, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # An empty file cannot be mapped
+            with (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else memoryview(b"")) as data:
+                write_container(key, data, args.dst, args.chunk_size * 1024, not args.ctr,
+                                threads=args.threads)
+    else:
+        with ContainerReader(args.src, key, args.threads) as reader:
+            if args.operation == "unpack":
+                pathlib.Path(args.dst).write_bytes(reader.read())
+            else:
+                sys.stdout.buffer.write(reader.read(args.offset, args.length))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Random-access benchmark for chunked containers (c_aesni_container.py).
+
+Reads a 1 MB slice from the middle of a container, which decrypts only
+the chunks under it, against reading the whole payload, for CTR and GCM
+containers and 1..N reader threads.
+"""
+
+import atexit
+import os
+import shutil
+import sys, pathlib
+import tempfile
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+import pyperf
+from c_aesni_container import ContainerReader, write_container
+from c_aesni_threads_runbenchmark import parse_size, thread_counts
+
+# 128-bit key (16 bytes)
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'
+
+DEFAULT_SIZE = "64M"
+CHUNK_SIZE = 1024 * 1024
+SLICE_SIZE = 1024 * 1024
+
+_CONTAINERS = {}
+
+
+def get_container(size, authenticated):
+    # Written lazily in the worker that needs it, then removed at exit
+    if (size, authenticated) not in _CONTAINERS:
+        tmp = tempfile.mkdtemp(prefix="c_aesni_container_")
+        atexit.register(shutil.rmtree, tmp, ignore_errors=True)
+        path = os.path.join(tmp, "payload.aesc")
+        write_container(KEY, bytes(size), path, CHUNK_SIZE, authenticated)
+        _CONTAINERS[size, authenticated] = path
+    return _CONTAINERS[size, authenticated]
+
+
+def make_bench(size, authenticated, threads, whole):
+    def bench_c_aesni_container(loops):
+        path = get_container(size, authenticated)
+        # Straddles a chunk boundary, so two chunks are decrypted
+        offset, length = (0, size) if whole else (size // 2 - SLICE_SIZE // 2, min(SLICE_SIZE, size))
+        with ContainerReader(path, KEY, threads) as reader:
+            range_it = range(loops)
+            t0 = pyperf.perf_counter()
+
+            for _ in range_it:
+                plaintext = reader.read(offset, length)
+
+            dt = pyperf.perf_counter() - t0
+        if plaintext != bytes(length):
+            raise Exception("decrypt error!")
+        return dt
+
+    return bench_c_aesni_container
+
+
+def add_cmdline_args(cmd, args):
+    # Forward our options to the pyperf worker processes
+    cmd.extend(("--size", args.size, "--max-threads", str(args.max_threads)))
+
+
+if __name__ == "__main__":
+    runner = pyperf.Runner(add_cmdline_args=add_cmdline_args)
+    runner.argparser.add_argument("--size", default=DEFAULT_SIZE,
+                                  help="Payload size, e.g. 64M (default: %s)" % DEFAULT_SIZE)
+    runner.argparser.add_argument("--max-threads", type=int, default=os.cpu_count() or 1,
+                                  help="Largest reader thread count (default: CPU count)")
+    args = runner.parse_args()
+    runner.metadata['description'] = (
+        "Chunked AES container: slice reads against whole-payload reads"
+    )
+
+    size = parse_size(args.size)
+    for mode, authenticated in (("ctr", False), ("gcm", True)):
+        for threads in thread_counts(args.max_threads):
+            for what, whole in (("slice", False), ("whole", True)):
+                name = f"crypto_c_aesni_container_{mode}_{what}_{args.size}_{threads}t"
+                runner.bench_time_func(name, make_bench(size, authenticated, threads, whole),
+                                       inner_loops=1)
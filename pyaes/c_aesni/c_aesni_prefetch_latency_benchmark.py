@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of AES-CTR with and without KeystreamPrefetcher.
+
+Simulates a request path: a stream of encrypt() calls of a fixed size,
+separated by idle gaps during which a service would wait for the next
+request. Every call is timed, and the p50, p99 and maximum latency of the
+plain cipher are compared with those of the prefetcher. The prefetcher's
+refill thread uses the gaps to produce keystream, so its calls reduce to an
+XOR as long as the gaps are long enough. When they are not, the hit and
+miss counts show it. The XOR saves most where keystream is slow to
+produce, so --kernel portable shows hosts without AES-NI; with VAES the
+kernel is about as fast as the XOR itself.
+
+    python c_aesni_prefetch_latency_benchmark.py --backend cython_aesni --size 16K --gap 200
+    python c_aesni_prefetch_latency_benchmark.py --kernel portable --gap 2000
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+import argparse
+import statistics
+import time
+from c_aesni_async_latency_benchmark import parse_size
+from keystream_prefetch import DEFAULT_CAPACITY, KeystreamPrefetcher
+
+# 128-bit key (16 bytes)
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'
+
+
+def load_backend(name):
+    if name == "cython_aesni":
+        sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.joinpath("cython_aesni").resolve()))
+        from cython_aesni_wrapper import AESModeOfOperationCTR, set_kernel, xor_into
+    else:
+        from c_aesni_wrapper import AESModeOfOperationCTR, set_kernel, xor_into
+    return AESModeOfOperationCTR, set_kernel, xor_into
+
+
+def run(cipher, size, requests, gap):
+    payload = bytes(size)
+    latencies = []
+    for _ in range(requests):
+        t0 = time.perf_counter_ns()
+        cipher.encrypt(payload)
+        latencies.append(time.perf_counter_ns() - t0)
+        # Idle until the next request (sleep releases the GIL)
+        time.sleep(gap)
+    return latencies
+
+
+def report(label, latencies, extra=""):
+    us = sorted(ns / 1000 for ns in latencies)
+    p99 = us[min(len(us) - 1, int(len(us) * 0.99))]
+    print(f"{label:<12} p50 {statistics.median(us):9.2f} us  p99 {p99:9.2f} us  "
+          f"max {us[-1]:9.2f} us  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=("c_aesni", "cython_aesni"), default="c_aesni")
+    parser.add_argument("--size", default="4K", help="Bytes per call (default: 4K)")
+    parser.add_argument("--requests", type=int, default=5000, help="Calls per run (default: 5000)")
+    parser.add_argument("--gap", type=float, default=100,
+                        help="Idle microseconds between calls (default: 100)")
+    parser.add_argument("--kernel", help="Force a kernel, e.g. portable (default: the best one)")
+    parser.add_argument("--capacity", default=str(DEFAULT_CAPACITY),
+                        help="Prefetcher ring size (default: %d)" % DEFAULT_CAPACITY)
+    args = parser.parse_args()
+
+    cipher_class, set_kernel, xor_into = load_backend(args.backend)
+    if args.kernel:
+        set_kernel(args.kernel)
+    size, gap = parse_size(args.size), args.gap / 1e6
+    print(f"{args.backend}: {args.requests} calls of {size} bytes, {args.gap:g} us apart")
+
+    report("plain", run(cipher_class(KEY), size, args.requests, gap))
+    with KeystreamPrefetcher(cipher_class(KEY), xor_into, capacity=parse_size(args.capacity)) as cipher:
+        cipher.wait_ready()
+        latencies = run(cipher, size, args.requests, gap)
+        report("prefetched", latencies, cipher.stats)
+
+
+if __name__ == "__main__":
+    main()
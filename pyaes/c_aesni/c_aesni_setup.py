@@ -14,17 +14,16 @@ extensions = [
     Extension(
         "c_aesni",
         [SRC],
+        # No -march=native / -maes: the AES-NI and VAES kernels carry their
+        # own target attributes and are selected at import by CPUID, so the
+        # same build runs (with the portable kernel) on CPUs without AES-NI.
         extra_compile_args=[
-            "-march=native",  # Enable all CPU features
-            "-maes",          # Enable AES-NI
-            "-msse4.2",       # Enable SSE4.2
             "-O3",            # High optimization
             "-fomit-frame-pointer",  # Optimize for speed
+            "-pthread",       # Worker threads for threads= processing
         ],
         extra_link_args=[
-            "-march=native",
-            "-maes",
-            "-msse4.2",
+            "-pthread",
         ],
     )
 ]
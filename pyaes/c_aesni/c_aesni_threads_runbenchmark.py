@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Thread-scaling benchmark for the C AESNI CTR extension.
+
+Encrypts large payloads with 1..N threads (threads= option of
+c_aesni.CTR) so the speedup of the GIL-free, counter-aligned slicing
+can be read directly from the pyperf results.
+"""
+
+import os
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+import pyperf
+import c_aesni
+
+# 128-bit key (16 bytes)
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'
+
+DEFAULT_SIZES = "1M,16M,128M,1G"
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in _UNITS:
+        return int(text[:-1]) * _UNITS[text[-1]]
+    return int(text)
+
+
+def thread_counts(max_threads):
+    # 1, 2, 4, ... up to and including max_threads
+    counts = []
+    n = 1
+    while n < max_threads:
+        counts.append(n)
+        n *= 2
+    counts.append(max_threads)
+    return counts
+
+
+_BUFFERS = {}
+
+
+def get_buffers(size):
+    # Allocate lazily: each pyperf worker only runs one benchmark, so
+    # building every payload up front would waste gigabytes of memory
+    if size not in _BUFFERS:
+        _BUFFERS.clear()
+        _BUFFERS[size] = (bytes(size), bytearray(size))
+    return _BUFFERS[size]
+
+
+def make_bench(size, threads):
+    def bench_c_aesni_threads(loops):
+        payload, output = get_buffers(size)
+        range_it = range(loops)
+        t0 = pyperf.perf_counter()
+
+        for _ in range_it:
+            c_aesni.CTR(KEY, 0, threads).encrypt_into(payload, output)
+
+        return pyperf.perf_counter() - t0
+
+    return bench_c_aesni_threads
+
+
+def add_cmdline_args(cmd, args):
+    # Forward our options to the pyperf worker processes
+    cmd.extend(("--sizes", args.sizes, "--max-threads", str(args.max_threads)))
+
+
+if __name__ == "__main__":
+    runner = pyperf.Runner(add_cmdline_args=add_cmdline_args)
+    runner.argparser.add_argument("--sizes", default=DEFAULT_SIZES,
+                                  help="Comma separated payload sizes, e.g. 1M,16M,1G "
+                                       "(default: %s)" % DEFAULT_SIZES)
+    runner.argparser.add_argument("--max-threads", type=int, default=os.cpu_count() or 1,
+                                  help="Largest thread count to measure (default: CPU count)")
+    args = runner.parse_args()
+    runner.metadata['description'] = (
+        "Thread scaling of the C AESNI CTR kernel with the GIL released"
+    )
+
+    for size_text in args.sizes.split(","):
+        size = parse_size(size_text)
+        for threads in thread_counts(args.max_threads):
+            name = f"crypto_c_aesni_ctr_{size_text.strip()}_{threads}t"
+            runner.bench_time_func(name, make_bench(size, threads), inner_loops=1)
@@ -6,8 +6,24 @@ Comparison script between optimized AESNI CTR wrapper and pyaes implementations.
 import sys, pathlib
 sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
 
+import asyncio
+import gc
+import os
+import random
+import tempfile
+import threading
 import pyaes
-from c_aesni_wrapper import AESModeOfOperationCTR, Counter
+from Crypto.Cipher import AES
+from c_aesni_wrapper import (AESModeOfOperationCTR, AESModeOfOperationGCM,
+                             AESModeOfOperationECB, AESModeOfOperationCBC,
+                             AESModeOfOperationCFB, AESModeOfOperationOFB, Counter,
+                             active_kernel, available_kernels, enable_stats, process_many,
+                             reset_stats, set_kernel, stats, xor_into)
+from async_streams import DecryptingStreamReader, EncryptingStreamWriter
+from c_aesni_container import ContainerReader, write_container
+from c_aesni_file import decrypt_file, encrypt_file
+from keystream_prefetch import KeystreamPrefetcher
+from round_key_cache import RoundKeyCache, get_cache
 
 # Test data
 CLEARTEXT = b"This is a test. What could possibly go wrong? " * 500  # 23,000 bytes
@@ -37,6 +53,555 @@ def encrypt_decrypt_c_aesni(key, data, nonce):
 
     return ciphertext, plaintext
 
+def compare_lengths():
+    """Compare ciphertexts for lengths around the 8-block interleave boundary"""
+    lengths = list(range(0, 300)) + [1023, 1024, 1025, len(CLEARTEXT)]
+    for length in lengths:
+        data = CLEARTEXT[:length]
+        expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=0)).encrypt(data)
+        actual = AESModeOfOperationCTR(KEY, Counter(initial_value=0)).encrypt(data)
+        if expected != actual:
+            print(f"✗ Ciphertexts differ for length {length}")
+            return False
+    print(f"✓ Ciphertexts match pyaes for {len(lengths)} message lengths")
+    return True
+
+def _pyaes_blocks(mode, data):
+    """pyaes ECB/CBC take one block per call"""
+    return b"".join(mode.encrypt(data[i:i + 16]) for i in range(0, len(data), 16))
+
+def compare_modes():
+    """Compare ECB, CBC, CFB and OFB with pyaes, across calls split at odd points"""
+    iv = bytes(range(16))
+    data = CLEARTEXT[:16 * 300]
+    for key in (KEY, KEY + KEY[:8], KEY + KEY):
+        cases = [
+            ("ECB", _pyaes_blocks(pyaes.AESModeOfOperationECB(key), data),
+             lambda: AESModeOfOperationECB(key), 16),
+            ("CBC", _pyaes_blocks(pyaes.AESModeOfOperationCBC(key, iv), data),
+             lambda: AESModeOfOperationCBC(key, iv), 16),
+            ("OFB", pyaes.AESModeOfOperationOFB(key, iv).encrypt(data),
+             lambda: AESModeOfOperationOFB(key, iv), 1),
+        ]
+        for segment_size in (1, 5, 16):
+            length = len(data) // segment_size * segment_size
+            cases.append((f"CFB{segment_size}",
+                          pyaes.AESModeOfOperationCFB(key, iv, segment_size).encrypt(data[:length]),
+                          lambda s=segment_size: AESModeOfOperationCFB(key, iv, s), segment_size))
+        for name, expected, make, unit in cases:
+            split = unit * 37
+            plain = data[:len(expected)]
+            enc, dec = make(), make()
+            if enc.encrypt(plain[:split]) + enc.encrypt(plain[split:]) != expected:
+                print(f"✗ {name} encryption differs from pyaes ({len(key) * 8}-bit key)")
+                return False
+            if dec.decrypt(expected[:split]) + dec.decrypt(expected[split:]) != plain:
+                print(f"✗ {name} decryption differs from pyaes ({len(key) * 8}-bit key)")
+                return False
+    print("✓ ECB, CBC, CFB and OFB match pyaes for 128/192/256-bit keys")
+    return True
+
+def compare_streaming():
+    """Chunked encryption must match one-shot pyaes, whatever the chunk sizes"""
+    data = CLEARTEXT * 20
+    expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=7)).encrypt(data)
+    rng = random.Random(8)
+    for trial in range(20):
+        aes = AESModeOfOperationCTR(KEY, Counter(initial_value=7))
+        chunks, offset = [], 0
+        while offset < len(data):
+            size = rng.choice((1, 7, 15, 16, 17, 100, 4096, 20000, 70001))
+            chunks.append(aes.encrypt(data[offset:offset + size]))
+            offset += size
+        if b"".join(chunks) != expected:
+            print(f"✗ Streaming CTR differs from pyaes (trial {trial})")
+            return False
+    print("✓ Streaming CTR matches pyaes for random chunk sizes")
+    return True
+
+def check_file_encryption():
+    """Round trip files through the mmap encryptor, with windows smaller than the file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        src, enc, dec = (os.path.join(tmp, name) for name in ("src", "enc", "dec"))
+        for size in (0, 1, 4095, 3 * 65536 + 123):
+            data = os.urandom(size)
+            with open(src, "wb") as f:
+                f.write(data)
+            encrypt_file(KEY, src, enc, counter=3, window=65536)
+            decrypt_file(KEY, enc, dec, counter=3, window=65536)
+            with open(enc, "rb") as f:
+                ciphertext = f.read()
+            with open(dec, "rb") as f:
+                plaintext = f.read()
+            expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=3)).encrypt(data)
+            if ciphertext != expected or plaintext != data:
+                print(f"✗ File encryption mismatch for {size} bytes")
+                return False
+    print("✓ mmap file encryption matches pyaes")
+    return True
+
+def check_container():
+    """Chunked containers: CTR chunks form one pyaes stream, GCM chunks reject tampering"""
+    rng = random.Random(22)
+    chunk = 64 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "container")
+        for size in (0, 1, chunk, 5 * chunk + 4321):
+            data = os.urandom(size)
+            for authenticated in (False, True):
+                write_container(KEY, data, path, chunk_size=chunk, authenticated=authenticated,
+                                counter=None if authenticated else 9, threads=3)
+                with ContainerReader(path, KEY, threads=3) as reader:
+                    if reader.read() != data:
+                        print(f"✗ Container round trip failed ({size} bytes, gcm={authenticated})")
+                        return False
+                    if not authenticated:
+                        # The CTR chunks are exactly one continuous stream
+                        expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=9)).encrypt(data)
+                        stream = b"".join(bytes(reader._view[o:o + n]) for o, n in zip(reader.offsets, reader.lengths))
+                        if stream != expected:
+                            print(f"✗ CTR container differs from pyaes ({size} bytes)")
+                            return False
+                    for _ in range(20 if size else 0):
+                        offset = rng.randrange(size)
+                        length = rng.randrange(min(size - offset, 3 * chunk) + 1)
+                        if reader.read(offset, length) != data[offset:offset + length]:
+                            print(f"✗ Container read({offset}, {length}) differs (gcm={authenticated})")
+                            return False
+                    subset = rng.sample(range(reader.chunk_count), min(3, reader.chunk_count))
+                    if reader.read_chunks(subset) != [data[i * chunk:(i + 1) * chunk] for i in subset]:
+                        print(f"✗ Container read_chunks({subset}) differs (gcm={authenticated})")
+                        return False
+
+        try:
+            write_container(KEY, b"x", path, counter=9)
+        except ValueError:
+            pass
+        else:
+            print("✗ write_container accepted a counter for a GCM container")
+            return False
+
+        # Flip one ciphertext byte, then swap two whole chunks (with their tags)
+        data = os.urandom(3 * chunk)
+        write_container(KEY, data, path, chunk_size=chunk)
+        with open(path, "rb") as f:
+            original = bytearray(f.read())
+        with ContainerReader(path, KEY) as reader:
+            first, second = reader.offsets[0], reader.offsets[2]
+        flipped = bytearray(original)
+        flipped[second + 100] ^= 1
+        swapped = bytearray(original)
+        span = chunk + 16
+        swapped[first:first + span] = original[second:second + span]
+        swapped[second:second + span] = original[first:first + span]
+        for name, tampered in (("flipped byte", flipped), ("swapped chunks", swapped)):
+            with open(path, "wb") as f:
+                f.write(tampered)
+            try:
+                with ContainerReader(path, KEY) as reader:
+                    reader.read(0, 10)  # chunk 0 only
+                    reader.read()
+            except ValueError:
+                continue
+            print(f"✗ GCM container accepted a {name}")
+            return False
+    print("✓ Chunked containers match pyaes and reject tampered chunks")
+    return True
+
+def compare_process_many():
+    """Batched multi-key CTR must match one pyaes cipher per message"""
+    rng = random.Random(9)
+    keys = [os.urandom(rng.choice((16, 24, 32))) for _ in range(300)]
+    counters = [rng.randrange(1 << 20) for _ in keys]
+    inputs = [CLEARTEXT[:rng.choice((0, 1, 15, 16, 17, 64, 100, 2048, 3000))] for _ in keys]
+    inputs[1] = bytearray(inputs[1])  # any bytes-like object is accepted
+    out, offsets = process_many(keys, counters, inputs)
+    for i, (key, counter, data) in enumerate(zip(keys, counters, inputs)):
+        expected = pyaes.AESModeOfOperationCTR(key, pyaes.Counter(initial_value=counter)).encrypt(bytes(data))
+        if out[offsets[i]:offsets[i + 1]] != expected:
+            print(f"✗ process_many differs from pyaes for message {i}")
+            return False
+    print(f"✓ process_many matches pyaes for {len(keys)} messages")
+    return True
+
+def check_async_streams():
+    """Round trip through the asyncio adapters, inline and offloaded chunks mixed"""
+    class Sink:
+        def __init__(self):
+            self.data = bytearray()
+
+        def write(self, data):
+            self.data += data
+
+    async def round_trip(sizes):
+        sink = Sink()
+        writer = EncryptingStreamWriter(sink, AESModeOfOperationCTR(KEY, Counter(initial_value=0)),
+                                        offload_threshold=16 * 1024)
+        for size in sizes:
+            await writer.write(CLEARTEXT[:size])
+        stream = asyncio.StreamReader()
+        stream.feed_data(bytes(sink.data))
+        stream.feed_eof()
+        reader = DecryptingStreamReader(stream, AESModeOfOperationCTR(KEY, Counter(initial_value=0)),
+                                        offload_threshold=16 * 1024)
+        plaintext = b"".join([chunk async for chunk in reader])
+        return bytes(sink.data), plaintext, writer.stats
+
+    sizes = [1, 17, 23000, 5, 20000, 3]
+    ciphertext, plaintext, stats = asyncio.run(round_trip(sizes))
+    data = b"".join(CLEARTEXT[:size] for size in sizes)
+    expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=0)).encrypt(data)
+    if ciphertext != expected or plaintext != data or not stats["inline"] or not stats["offloaded"]:
+        print(f"✗ asyncio stream adapters mismatch ({stats})")
+        return False
+    print("✓ asyncio stream adapters match pyaes")
+    return check_async_cancel()
+
+def check_async_cancel():
+    """Cancelling an offloaded write or read must not desynchronize the stream"""
+    class Sink:
+        def __init__(self):
+            self.data = bytearray()
+
+        def write(self, data):
+            self.data += data
+
+    class Signalling:
+        # Sets started once the executor thread is inside the cipher
+        def __init__(self, cipher):
+            self.cipher = cipher
+            self.started = threading.Event()
+
+        def encrypt(self, data):
+            self.started.set()
+            return self.cipher.encrypt(data)
+
+        decrypt = encrypt
+
+    async def cancel_running(coro, cipher):
+        task = asyncio.ensure_future(coro)
+        while not cipher.started.is_set():
+            await asyncio.sleep(0.0001)
+        cipher.started.clear()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    big, small = os.urandom(32 * 1024 * 1024), os.urandom(1000)
+
+    async def run():
+        sink = Sink()
+        cipher = Signalling(AESModeOfOperationCTR(KEY, 7))
+        writer = EncryptingStreamWriter(sink, cipher, offload_threshold=16 * 1024)
+        cancelled = await cancel_running(writer.write(big), cipher)
+        await writer.write(small)
+
+        stream = asyncio.StreamReader()
+        stream.feed_data(bytes(sink.data))
+        stream.feed_eof()
+        cipher = Signalling(AESModeOfOperationCTR(KEY, 7))
+        reader = DecryptingStreamReader(stream, cipher, offload_threshold=16 * 1024)
+        cancelled = await cancel_running(reader.read(len(big) // 2), cipher) and cancelled
+        head = await reader.readexactly(len(big) // 2 + 10)
+        return cancelled, bytes(sink.data), head + await reader.read()
+
+    cancelled, ciphertext, plaintext = asyncio.run(run())
+    expected = AESModeOfOperationCTR(KEY, 7).encrypt(big + small)
+    if not cancelled or ciphertext != expected or plaintext != big + small:
+        print("✗ asyncio stream adapters lose sync after a cancelled call")
+        return False
+    print("✓ asyncio stream adapters stay in sync after cancelled calls")
+    return True
+
+def compare_kernels():
+    """Run the CTR, GCM and block mode comparisons on every kernel this CPU supports"""
+    best = active_kernel()
+    ok = True
+    try:
+        for kernel in available_kernels():
+            set_kernel(kernel)
+            print(f"Kernel: {kernel}")
+            ok = compare_lengths() and ok
+            ok = compare_streaming() and ok
+            ok = compare_process_many() and ok
+            ok = check_gcm_vectors() and ok
+            ok = compare_gcm_pycryptodome() and ok
+            ok = compare_modes() and ok
+    finally:
+        set_kernel(best)
+    return ok
+
+# AES-GCM test cases from the GCM specification (McGrew & Viega), as used by
+# NIST: (case, key, iv, plaintext, aad, ciphertext, tag), all hex
+_GCM_K = "feffe9928665731c6d6a8f9467308308"
+_GCM_P = ("d9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a72"
+          "1c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b391aafd255")
+_GCM_A = "feedfacedeadbeeffeedfacedeadbeefabaddad2"
+GCM_VECTORS = [
+    (1, "00" * 16, "00" * 12, "", "", "", "58e2fccefa7e3061367f1d57a4e7455a"),
+    (2, "00" * 16, "00" * 12, "00" * 16, "", "0388dace60b6a392f328c2b971b2fe78",
+     "ab6e47d42cec13bdf53a67b21257bddf"),
+    (3, _GCM_K, "cafebabefacedbaddecaf888", _GCM_P, "",
+     "42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e"
+     "21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091473f5985",
+     "4d5c2af327cd64a62cf35abd2ba6fab4"),
+    (4, _GCM_K, "cafebabefacedbaddecaf888", _GCM_P[:120], _GCM_A,
+     "42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e"
+     "21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091",
+     "5bc94fbc3221a5db94fae95ae7121a47"),
+    (5, _GCM_K, "cafebabefacedbad", _GCM_P[:120], _GCM_A,
+     "61353b4c2806934a777ff51fa22a4755699b2a714fcdc6f83766e5f97b6c7423"
+     "73806900e49f24b22b097544d4896b424989b5e1ebac0f07c23f4598",
+     "3612d2e79e3b0785561be14aaca2fccb"),
+    (6, _GCM_K,
+     "9313225df88406e555909c5aff5269aa6a7a9538534f7da1e4c303d2a318a728"
+     "c3c0c95156809539fcf0e2429a6b525416aedbf5a0de6a57a637b39b",
+     _GCM_P[:120], _GCM_A,
+     "8ce24998625615b603a033aca13fb894be9112a5c3a211a8ba262a3cca7e2ca7"
+     "01e4a9a4fba43c90ccdcb281d48c7c6fd62875d2aca417034c34aee5",
+     "619cc5aefffe0bfa462af43c1699d050"),
+    (10, _GCM_K + _GCM_K[:16], "cafebabefacedbaddecaf888", _GCM_P[:120], _GCM_A,
+     "3980ca0b3c00e841eb06fac4872a2757859e1ceaa6efd984628593b40ca1e19c"
+     "7d773d00c144c525ac619d18c84a3f4718e2448b2fe324d9ccda2710",
+     "2519498e80f1478f37ba55bd6d27618c"),
+    (13, "00" * 32, "00" * 12, "", "", "", "530f8afbc74536b9a963b4f1c4cb738b"),
+    (14, "00" * 32, "00" * 12, "00" * 16, "", "cea7403d4d606b6e074ec5d3baf39d18",
+     "d0d1c8a799996bf0265b98b5d48ab919"),
+    (16, _GCM_K + _GCM_K, "cafebabefacedbaddecaf888", _GCM_P[:120], _GCM_A,
+     "522dc1f099567d07f47f37a32a84427d643a8cdcbfe5c0c97598a2bd2555d1aa"
+     "8cb08e48590dbb3da7b08b1056828838c5f61e6393ba7a0abcc9f662",
+     "76fc6ece0f4e1768cddf8853bb2d551b"),
+]
+
+def check_gcm_vectors():
+    """Known-answer tests for encryption, decryption and tag rejection"""
+    for case, key, iv, pt, aad, ct, tag in GCM_VECTORS:
+        key, iv, pt, aad, ct, tag = (bytes.fromhex(v) for v in (key, iv, pt, aad, ct, tag))
+        if AESModeOfOperationGCM(key, iv).encrypt_and_digest(pt, aad) != (ct, tag):
+            print(f"✗ GCM test case {case}: encryption mismatch")
+            return False
+        if AESModeOfOperationGCM(key, iv).decrypt_and_verify(ct, tag, aad) != pt:
+            print(f"✗ GCM test case {case}: decryption mismatch")
+            return False
+        try:
+            AESModeOfOperationGCM(key, iv).decrypt_and_verify(ct, bytes([tag[0] ^ 1]) + tag[1:], aad)
+        except ValueError:
+            pass
+        else:
+            print(f"✗ GCM test case {case}: forged tag accepted")
+            return False
+    print(f"✓ GCM matches {len(GCM_VECTORS)} NIST test vectors")
+    return True
+
+def compare_gcm_pycryptodome():
+    """Cross-check GCM with pycryptodome around the 8-block stitching boundary"""
+    key = os.urandom(32)
+    lengths = list(range(0, 300)) + [1023, 1024, 1025, len(CLEARTEXT)]
+    for length in lengths:
+        nonce = os.urandom(12 if length % 3 else 1 + length % 40)
+        aad = CLEARTEXT[:length % 37]
+        data = CLEARTEXT[:length]
+        ref = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        ref.update(aad)
+        if AESModeOfOperationGCM(key, nonce).encrypt_and_digest(data, aad) != ref.encrypt_and_digest(data):
+            print(f"✗ GCM differs from pycryptodome for length {length}")
+            return False
+    print(f"✓ GCM matches pycryptodome for {len(lengths)} message lengths")
+    return True
+
+def check_round_key_cache():
+    """Reused keys must hit the cache on the portable kernel only and give the same ciphertext"""
+    cache = get_cache()
+    best = active_kernel()
+    for kernel in available_kernels():
+        cache.clear()
+        cache.reset_stats()
+        set_kernel(kernel)
+        try:
+            first = AESModeOfOperationCTR(KEY, Counter(initial_value=0)).encrypt(CLEARTEXT)
+            second = AESModeOfOperationCTR(KEY, Counter(initial_value=0)).encrypt(CLEARTEXT)
+        finally:
+            set_kernel(best)
+        stats = cache.stats()
+        expected = (1, 1) if kernel == "portable" else (0, 0)
+        if first != second or (stats["misses"], stats["hits"]) != expected:
+            print(f"✗ Round-key cache mismatch on {kernel}: {stats}")
+            return False
+
+    # Evicted schedules are wiped, copies already handed out are not
+    small = RoundKeyCache(maxsize=1)
+    held = small.get("test", b"a" * 16, lambda key: bytearray(key))
+    small.get("test", b"b" * 16, lambda key: bytearray(key))
+    if small.stats()["evictions"] != 1 or held != bytearray(b"a" * 16):
+        print("✗ Round-key cache eviction misbehaved")
+        return False
+
+    # Borrowed copies are wiped on exit, with and without caching, and raw
+    # keys are not kept as dict keys
+    for maxsize in (0, 4):
+        cache = RoundKeyCache(maxsize=maxsize)
+        with cache.borrow("test", b"c" * 16, lambda key: bytearray(key)) as schedule:
+            pass
+        if any(schedule) or any(b"c" * 16 in k for k in cache._entries):
+            print(f"✗ Round-key cache leaked a schedule or key (maxsize={maxsize})")
+            return False
+    print("✓ Round-key cache hits on reuse (portable kernel), evicts safely and wipes borrowed copies")
+    return True
+
+def check_seek():
+    """seek() and decrypt_range() must match the same bytes of a one-shot pyaes stream"""
+    rng = random.Random(21)
+    data = os.urandom(600 * 1024 + 5)
+    ciphertext = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=5)).encrypt(data)
+    ranges = [(0, 0), (0, 16), (3, 1), (15, 2), (16, 100), (17, 40000), (len(data) - 1, 1),
+              (123457, 300 * 1024)]
+    ranges += [(rng.randrange(len(data)), rng.randrange(5000)) for _ in range(50)]
+    for threads in (1, 2):
+        aes = AESModeOfOperationCTR(KEY, Counter(initial_value=5), threads=threads)
+        for offset, length in ranges:
+            length = min(length, len(data) - offset)
+            if aes.decrypt_range(ciphertext, offset, length) != data[offset:offset + length]:
+                print(f"✗ decrypt_range({offset}, {length}) differs from pyaes")
+                return False
+            aes.seek(offset)
+            if aes.tell() != offset:
+                print(f"✗ tell() is {aes.tell()} after seek({offset})")
+                return False
+            # Continue from the seek point in two uneven pieces
+            half = length // 3
+            out = aes.decrypt(ciphertext[offset:offset + half]) + aes.decrypt(ciphertext[offset + half:offset + length])
+            if out != data[offset:offset + length] or aes.tell() != offset + length:
+                print(f"✗ seek({offset}) then decrypt differs from pyaes")
+                return False
+    # decrypt_range leaves the stream position alone
+    aes = AESModeOfOperationCTR(KEY, Counter(initial_value=5))
+    head = aes.decrypt(ciphertext[:7])
+    aes.decrypt_range(memoryview(ciphertext), 1000, 50)
+    if head + aes.decrypt(ciphertext[7:100]) != data[:100]:
+        print("✗ decrypt_range moved the stream position")
+        return False
+    for offset, length in ((-1, 1), (0, len(data) + 1), (len(data), 1), (5, -1)):
+        try:
+            aes.decrypt_range(ciphertext, offset, length)
+        except ValueError:
+            continue
+        print(f"✗ decrypt_range accepted offset={offset} length={length}")
+        return False
+    print(f"✓ seek() and decrypt_range() match pyaes at {len(ranges)} offsets (1 and 2 threads)")
+    return True
+
+def check_reinit_busy():
+    """__init__ on a CTR object must not free the state a GIL-free call is using"""
+    data = bytes(64 * 1024 * 1024)
+    ctr = AESModeOfOperationCTR(KEY, 0).ctr_state
+    result = []
+    worker = threading.Thread(target=lambda: result.append(ctr.encrypt(data)))
+    worker.start()
+    refused = False
+    while worker.is_alive() and not refused:
+        try:
+            # Same key and counter, so a call that wins the race is unaffected
+            ctr.__init__(KEY, 0)
+        except RuntimeError:
+            refused = True
+    worker.join()
+    if not refused or result != [AESModeOfOperationCTR(KEY, 0).encrypt(data)]:
+        print(f"✗ CTR __init__ during a running call (refused: {refused})")
+        return False
+    ctr.__init__(KEY, 0)
+    print("✓ CTR __init__ is refused while another thread runs the kernel")
+    return True
+
+def check_prefetcher():
+    """Prefetched keystream must give the pyaes stream, whether calls hit or miss"""
+    data = os.urandom(300 * 1024 + 7)
+    expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=3)).encrypt(data)
+    rng = random.Random(23)
+    for wait in (False, True):
+        with KeystreamPrefetcher(AESModeOfOperationCTR(KEY, Counter(initial_value=3)), xor_into,
+                                 capacity=64 * 1024 + 5, batch=5000) as aes:
+            chunks, offset = [], 0
+            while offset < len(data):
+                if wait:
+                    aes.wait_ready()
+                size = rng.choice((1, 15, 16, 17, 1000, 4096, 40000, 100000))
+                chunks.append(aes.encrypt(data[offset:offset + size]))
+                offset += size
+            current = aes.stats
+        if b"".join(chunks) != expected:
+            print(f"✗ Prefetched CTR differs from pyaes (wait_ready={wait})")
+            return False
+        if current["hit_bytes"] + current["miss_bytes"] != len(data) or (wait and not current["hits"]):
+            print(f"✗ Prefetcher stats are inconsistent: {current}")
+            return False
+    for options in ({"capacity": 0}, {"low_watermark": 10, "high_watermark": 5}, {"batch": 0}):
+        try:
+            KeystreamPrefetcher(AESModeOfOperationCTR(KEY), xor_into, **options)
+        except ValueError:
+            continue
+        print(f"✗ KeystreamPrefetcher accepted {options}")
+        return False
+    # Dropped without close(): collected, ring wiped, thread gone
+    aes = KeystreamPrefetcher(AESModeOfOperationCTR(KEY), xor_into, capacity=64 * 1024)
+    aes.wait_ready()
+    ring, thread = aes._ring, aes._thread
+    del aes
+    gc.collect()
+    thread.join(5)
+    if thread.is_alive() or any(ring):
+        print("✗ An unclosed KeystreamPrefetcher was not cleaned up")
+        return False
+    try:
+        xor_into(b"abc", b"ab", bytearray(3))
+    except ValueError:
+        pass
+    else:
+        print("✗ xor_into accepted a short keystream")
+        return False
+    print(f"✓ Prefetched keystream matches pyaes ({current['hits']} hits, {current['misses']} misses)")
+    return True
+
+def check_stats():
+    """Telemetry must count every call, byte and size bucket, and stay off when disabled"""
+    sample_every = stats()["sample_every"]
+    previous = enable_stats(True, sample_every=1)  # time every call
+    reset_stats()
+    try:
+        aes = AESModeOfOperationCTR(KEY, Counter(initial_value=0))
+        sizes = [0, 1, 16, 1000, 64 * 1024]
+        for size in sizes:
+            aes.encrypt(b"\0" * size)
+        AESModeOfOperationCBC(KEY).encrypt(b"\0" * 64)
+        AESModeOfOperationGCM(KEY, b"\0" * 12).encrypt_and_digest(CLEARTEXT)
+        current = stats()
+        ctr = current["ctr"]
+        # The wrapper returns b"" for empty input without calling the kernel
+        if (ctr["calls"] != len(sizes) - 1 or ctr["bytes"] != sum(sizes)
+                or ctr["size_histogram"] != {1: 1, 16: 1, 512: 1, 65536: 1}):
+            print(f"✗ CTR telemetry mismatch: {ctr}")
+            return False
+        if current["cbc"]["calls"] != 1 or current["gcm"]["bytes"] != len(CLEARTEXT):
+            print(f"✗ Block/GCM telemetry mismatch: {current['cbc']}, {current['gcm']}")
+            return False
+        if (ctr["timed_calls"] != ctr["calls"] or not 0 < ctr["kernel_cycles"] <= ctr["call_cycles"]
+                or current["tsc_hz"] <= 0):
+            print(f"✗ Telemetry cycle counts are inconsistent: {ctr}")
+            return False
+
+        enable_stats(False)
+        aes.encrypt(CLEARTEXT)
+        if stats()["ctr"]["calls"] != ctr["calls"]:
+            print("✗ Telemetry counted a call while disabled")
+            return False
+    finally:
+        enable_stats(previous, sample_every=sample_every)
+        reset_stats()
+    print(f"✓ Telemetry counts calls, bytes and sizes ({ctr['cycles_per_byte']:.2f} cycles/byte)")
+    return True
+
 def main():
     """Main comparison function"""
     print("Optimized AESNI CTR Wrapper vs pyaes Comparison")
@@ -76,6 +641,18 @@ def main():
             if len(pyaes_ciphertext) >= 16 and len(aesni_ciphertext) >= 16:
                 print(f"pyaes ciphertext first 16: {pyaes_ciphertext[:16].hex()}")
                 print(f"AESNI CTR ciphertext first 16: {aesni_ciphertext[:16].hex()}")
+
+        print(f"\nActive kernel: {active_kernel()}")
+        print("Testing CTR, GCM and block modes on every supported kernel...")
+        compare_kernels()
+        check_round_key_cache()
+        check_seek()
+        check_reinit_busy()
+        check_prefetcher()
+        check_stats()
+        check_file_encryption()
+        check_container()
+        check_async_streams()
             
     except Exception as e:
         print(f"✗ Error during testing: {e}")
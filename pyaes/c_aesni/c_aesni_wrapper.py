@@ -3,7 +3,41 @@
 Optimized Python wrapper for AES-CTR using hardware acceleration.
 """
 
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
 import c_aesni
+from round_key_cache import get_cache
+
+# Kernel selection (chosen by CPUID when c_aesni is imported)
+active_kernel = c_aesni.active_kernel
+available_kernels = c_aesni.available_kernels
+set_kernel = c_aesni.set_kernel
+
+# Batched CTR: process_many(keys, counters, inputs) -> (out, offsets), one
+# call for many short messages with their own keys (multi-buffer kernel)
+process_many = c_aesni.process_many
+
+# xor_into(data, keystream, out): SIMD XOR with precomputed keystream, the
+# hot path of keystream_prefetch.KeystreamPrefetcher
+xor_into = c_aesni.xor_into
+
+# Opt-in telemetry (or AES_STATS=1): stats() gives per-mode calls, bytes,
+# TSC cycles in the kernel and per call, cycles/byte, call-overhead share and
+# a power-of-two histogram of call sizes
+enable_stats = c_aesni.enable_stats
+stats = c_aesni.stats
+reset_stats = c_aesni.reset_stats
+
+def _new(factory, key, *args):
+    """factory(key, *args), with round keys from the cache on the portable kernel
+
+    The AES-NI and VAES kernels expand a key (~1 us) faster than a cache
+    hit costs (~2 us), so only the portable kernel (~9 us) uses the cache.
+    """
+    if c_aesni.active_kernel() != "portable":
+        return factory(key, *args)
+    return get_cache().construct("c_aesni", key, c_aesni.expand_key, factory, *args)
 
 class Counter:
     """Counter class similar to pyaes.Counter"""
@@ -19,13 +53,14 @@ class Counter:
 class AESModeOfOperationCTR:
     """Optimized AES-CTR mode implementation using AESNI hardware acceleration"""
     
-    def __init__(self, key, counter=None):
+    def __init__(self, key, counter=None, threads=1):
         """
         Initialize AES-CTR mode
         
         Args:
             key: 16, 24, or 32 byte key
             counter: Counter object or initial counter value
+            threads: Number of threads used for large inputs (>= 256 KB per thread)
         """
         if not isinstance(key, bytes):
             raise TypeError("Key must be bytes")
@@ -41,13 +76,19 @@ class AESModeOfOperationCTR:
         else:
             initial_counter = counter
         
-        # Initialize AES-CTR state
-        self.ctr_state = c_aesni.init(key, initial_counter)
-        if not self.ctr_state:
-            raise RuntimeError("Failed to initialize AES-CTR")
+        # Initialize AES-CTR state (freed and wiped by the extension type)
+        self.ctr_state = _new(c_aesni.CTR, key, initial_counter, threads)
         
         self.key = key
     
+    @property
+    def threads(self):
+        return self.ctr_state.threads
+    
+    @threads.setter
+    def threads(self, value):
+        self.ctr_state.threads = value
+    
     def encrypt(self, data):
         """
         Encrypt data using AES-CTR mode
@@ -64,13 +105,28 @@ class AESModeOfOperationCTR:
         if not data:
             return b''
         
-        # Create output buffer
-        output = bytearray(len(data))
+        # Process data using optimized C implementation, straight into bytes
+        return self.ctr_state.encrypt(data)
+    
+    def encrypt_into(self, src, dst):
+        """
+        Encrypt src into dst without allocating
         
-        # Process data using optimized C implementation
-        c_aesni.process(self.ctr_state, data, output)
+        Args:
+            src: Any bytes-like object
+            dst: Writable buffer at least len(src) long (bytearray,
+                 memoryview, mmap, numpy array); may be src itself
+        """
+        self.ctr_state.encrypt_into(src, dst)
+    
+    def encrypt_inplace(self, buf):
+        """
+        Encrypt a writable buffer in place
         
-        return bytes(output)
+        Args:
+            buf: Writable buffer (bytearray, memoryview, mmap, numpy array)
+        """
+        self.ctr_state.encrypt_inplace(buf)
     
     def decrypt(self, data):
         """
@@ -85,10 +141,188 @@ class AESModeOfOperationCTR:
         # CTR mode is symmetric, so decryption is the same as encryption
         return self.encrypt(data)
     
-    def __del__(self):
-        """Cleanup AES-CTR state when object is destroyed"""
-        if hasattr(self, 'ctr_state') and self.ctr_state:
-            try:
-                c_aesni.cleanup(self.ctr_state)
-            except:
-                pass
+    def seek(self, offset):
+        """
+        Move to a byte offset of the stream
+        
+        The counter (initial counter + offset // 16) and the position inside
+        that block are derived directly; nothing before offset is processed.
+        
+        Args:
+            offset: Byte offset from the start of the stream (>= 0)
+        """
+        self.ctr_state.seek(offset)
+    
+    def tell(self):
+        """Byte offset of the next byte to be encrypted or decrypted"""
+        return self.ctr_state.tell()
+    
+    def decrypt_range(self, buf, offset, length):
+        """
+        Decrypt one range of a stream without touching the bytes before it
+        
+        Args:
+            buf: The whole ciphertext from byte 0 (bytes, bytearray, mmap, ...)
+            offset: First byte of the range
+            length: Number of bytes
+            
+        Returns:
+            Plaintext of buf[offset:offset + length] (bytes). The object's own
+            stream position is left where it was.
+        """
+        return self.ctr_state.decrypt_range(buf, offset, length)
+    
+    # CTR mode is symmetric
+    decrypt_into = encrypt_into
+    decrypt_inplace = encrypt_inplace
+
+class AESModeOfOperationGCM:
+    """AES-GCM authenticated encryption using AES-NI and PCLMULQDQ"""
+    
+    def __init__(self, key, nonce, tag_length=16):
+        """
+        Initialize AES-GCM mode
+        
+        Args:
+            key: 16, 24, or 32 byte key
+            nonce: IV for this message, ideally 12 bytes; never reuse a nonce with the same key
+            tag_length: Authentication tag size in bytes (4 to 16)
+        """
+        if not isinstance(key, bytes):
+            raise TypeError("Key must be bytes")
+        
+        if len(key) not in (16, 24, 32):
+            raise ValueError("Key must be 16, 24, or 32 bytes")
+        
+        if not nonce:
+            raise ValueError("Nonce cannot be empty")
+        
+        self.gcm_state = _new(c_aesni.GCM, key, tag_length)
+        
+        self.key = key
+        self.nonce = bytes(nonce)
+        self._encrypted = False
+    
+    @property
+    def tag_length(self):
+        return self.gcm_state.tag_length
+    
+    def encrypt_and_digest(self, plaintext, associated_data=b''):
+        """
+        Encrypt and authenticate a message
+        
+        Args:
+            plaintext: Data to encrypt (bytes-like)
+            associated_data: Data authenticated but not encrypted (bytes-like)
+            
+        Returns:
+            (ciphertext, tag) tuple
+        """
+        # A second message under the same nonce would leak the GHASH key
+        if self._encrypted:
+            raise TypeError("encrypt_and_digest() can only be called once per nonce")
+        self._encrypted = True
+        return self.gcm_state.encrypt(self.nonce, plaintext, associated_data)
+    
+    def decrypt_and_verify(self, ciphertext, tag, associated_data=b''):
+        """
+        Decrypt a message and check its tag
+        
+        Args:
+            ciphertext: Data to decrypt (bytes-like)
+            tag: Tag returned by encrypt_and_digest()
+            associated_data: The associated data given to encrypt_and_digest()
+            
+        Returns:
+            Decrypted data (bytes)
+            
+        Raises:
+            ValueError: If the tag does not match (no plaintext is returned)
+        """
+        return self.gcm_state.decrypt(self.nonce, ciphertext, tag, associated_data)
+
+def _new_block_mode(factory, key, *args):
+    """Validate key, then _new(factory, key, *args)"""
+    if not isinstance(key, bytes):
+        raise TypeError("Key must be bytes")
+    
+    if len(key) not in (16, 24, 32):
+        raise ValueError("Key must be 16, 24, or 32 bytes")
+    
+    return _new(factory, key, *args)
+
+class _BlockModeOfOperation:
+    """Common encrypt/decrypt for the ECB, CBC, CFB and OFB wrappers"""
+    
+    def encrypt(self, data):
+        """
+        Encrypt data; ECB and CBC take any multiple of 16 bytes, CFB any
+        multiple of segment_size and OFB any length
+        
+        Args:
+            data: Data to encrypt (bytes-like)
+            
+        Returns:
+            Encrypted data (bytes)
+        """
+        return self.mode_state.encrypt(data)
+    
+    def decrypt(self, data):
+        """
+        Decrypt data (same length rules as encrypt)
+        
+        Args:
+            data: Data to decrypt (bytes-like)
+            
+        Returns:
+            Decrypted data (bytes)
+        """
+        return self.mode_state.decrypt(data)
+
+class AESModeOfOperationECB(_BlockModeOfOperation):
+    """AES-ECB; blocks are independent and go through the multi-block kernel"""
+    
+    def __init__(self, key):
+        self.mode_state = _new_block_mode(c_aesni.ECB, key)
+        self.key = key
+
+class AESModeOfOperationCBC(_BlockModeOfOperation):
+    """AES-CBC; decryption is pipelined through the multi-block kernel"""
+    
+    def __init__(self, key, iv=None):
+        """
+        Args:
+            key: 16, 24, or 32 byte key
+            iv: 16 byte initialization vector (zeros if None, as in pyaes)
+        """
+        self.mode_state = _new_block_mode(c_aesni.CBC, key, iv)
+        self.key = key
+
+class AESModeOfOperationCFB(_BlockModeOfOperation):
+    """AES-CFB with pyaes semantics"""
+    
+    def __init__(self, key, iv=None, segment_size=1):
+        """
+        Args:
+            key: 16, 24, or 32 byte key
+            iv: 16 byte initialization vector (zeros if None, as in pyaes)
+            segment_size: Bytes per segment (1 to 16); 16 decrypts in parallel
+        """
+        self.mode_state = _new_block_mode(c_aesni.CFB, key, iv, segment_size)
+        self.key = key
+    
+    @property
+    def segment_bytes(self):
+        return self.mode_state.segment_bytes
+
+class AESModeOfOperationOFB(_BlockModeOfOperation):
+    """AES-OFB; the keystream carries over between calls"""
+    
+    def __init__(self, key, iv=None):
+        """
+        Args:
+            key: 16, 24, or 32 byte key
+            iv: 16 byte initialization vector (zeros if None, as in pyaes)
+        """
+        self.mode_state = _new_block_mode(c_aesni.OFB, key, iv)
+        self.key = key
@@ -10,16 +10,17 @@ Optimized AESNI CTR implementation using Cython.
 This provides the same performance as the C extension but with Cython syntax.
 """
 
-import numpy as np
-cimport numpy as np
 from libc.stdint cimport uint8_t, uint32_t, uint64_t
-from libc.stdlib cimport malloc, free
-from libc.string cimport memcpy
-from cpython.bytes cimport PyBytes_FromStringAndSize, PyBytes_AsString
-from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, PyBUF_SIMPLE
+from libc.stdlib cimport malloc, calloc, free
+from libc.string cimport memcpy, memmove, memset, strcmp
+from cpython.bytes cimport PyBytes_FromStringAndSize, PyBytes_AsString, PyBytes_AS_STRING, PyBytes_GET_SIZE
+from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, PyBUF_SIMPLE, PyBUF_WRITABLE
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
+from cython.parallel cimport prange
+import os
 
 # SSE4.2 and AES-NI intrinsics
-cdef extern from "immintrin.h":
+cdef extern from "immintrin.h" nogil:
     ctypedef long long __m128i
     __m128i _mm_loadu_si128(const __m128i*)
     __m128i _mm_storeu_si128(__m128i*, __m128i)
@@ -35,9 +36,196 @@ cdef extern from "immintrin.h":
     __m128i _mm_set1_epi32(int)
     int _mm_cvtsi128_si32(__m128i)
 
+cdef extern from *:
+    uint64_t __builtin_bswap64(uint64_t) nogil
+    int __builtin_clzll(unsigned long long) nogil
+
+cdef extern from "x86intrin.h" nogil:
+    unsigned long long __rdtsc()
+
+# Wipes key material; a plain memset before free() or a return is a dead
+# store the compiler may drop, volatile writes are not (as in c_aesni.c)
+cdef extern from *:
+    """
+    static void cy_secure_zero(void *p, size_t len) {
+        volatile uint8_t *v = (volatile uint8_t*)p;
+        while (len--) {
+            *v++ = 0;
+        }
+    }
+    """
+    void secure_zero "cy_secure_zero"(void *p, size_t len) nogil
+
+# Whether cython_aesni_setup.py compiled the module with OpenMP; without it
+# the prange loops below run serially on the calling thread
+cdef extern from *:
+    """
+    #ifdef _OPENMP
+    #define CY_OPENMP_ENABLED 1
+    #else
+    #define CY_OPENMP_ENABLED 0
+    #endif
+    """
+    int CY_OPENMP_ENABLED
+
+# 256-bit VAES kernel and CPUID probes. Cython cannot attach target
+# attributes to its own functions, so these live in a verbatim C block; the
+# module itself is built with -maes only (no -march=native), which keeps it
+# loadable on any x86-64 CPU and lets the dispatcher pick a kernel at import.
+cdef extern from *:
+    """
+    #include <immintrin.h>
+    #include <stdint.h>
+    #include <stddef.h>
+
+    static int cy_cpu_has_aesni(void) {
+        __builtin_cpu_init();
+        return __builtin_cpu_supports("aes");
+    }
+
+    static int cy_cpu_has_vaes(void) {
+        __builtin_cpu_init();
+        return __builtin_cpu_supports("aes") && __builtin_cpu_supports("vaes")
+            && __builtin_cpu_supports("avx2");
+    }
+
+    /* Encrypt whole 16-block strides (two blocks per 256-bit register) and
+       return the number of bytes processed; the caller handles the tail. */
+    __attribute__((target("vaes,avx2,aes")))
+    static size_t cy_vaes_ctr_strides(const __m128i *rk, unsigned rounds, uint64_t counter,
+                                      const uint8_t *in, uint8_t *out, size_t len) {
+        const __m256i bswap = _mm256_broadcastsi128_si256(
+            _mm_setr_epi8(0, 1, 2, 3, 4, 5, 6, 7, 15, 14, 13, 12, 11, 10, 9, 8));
+        const __m256i two = _mm256_set_epi64x(2, 0, 2, 0);
+        __m256i rk256[15], b[8];
+        __m256i ctr = _mm256_set_epi64x((long long)(counter + 1), 0, (long long)counter, 0);
+        size_t i;
+        unsigned j, r;
+
+        for (r = 0; r <= rounds; r++) {
+            rk256[r] = _mm256_broadcastsi128_si256(_mm_loadu_si128(rk + r));
+        }
+        for (i = 0; i + 256 <= len; i += 256) {
+            for (j = 0; j < 8; j++) {
+                b[j] = _mm256_xor_si256(_mm256_shuffle_epi8(ctr, bswap), rk256[0]);
+                ctr = _mm256_add_epi64(ctr, two);
+            }
+            for (r = 1; r < rounds; r++) {
+                for (j = 0; j < 8; j++) {
+                    b[j] = _mm256_aesenc_epi128(b[j], rk256[r]);
+                }
+            }
+            for (j = 0; j < 8; j++) {
+                __m256i data = _mm256_loadu_si256((const __m256i*)(in + i + 32*j));
+                b[j] = _mm256_aesenclast_epi128(b[j], rk256[rounds]);
+                _mm256_storeu_si256((__m256i*)(out + i + 32*j), _mm256_xor_si256(data, b[j]));
+            }
+        }
+        return i;
+    }
+
+    /* ECB over whole 16-block strides with erk (encrypt) or drk (decrypt);
+       returns the number of blocks processed. */
+    __attribute__((target("vaes,avx2,aes")))
+    static size_t cy_vaes_ecb_strides(const __m128i *rk, unsigned rounds, int decrypt,
+                                      const uint8_t *in, uint8_t *out, size_t nblocks) {
+        __m256i rk256[15], b[8];
+        size_t i;
+        unsigned j, r;
+
+        if (nblocks < 16) {
+            return 0;
+        }
+        for (r = 0; r <= rounds; r++) {
+            rk256[r] = _mm256_broadcastsi128_si256(_mm_loadu_si128(rk + r));
+        }
+        for (i = 0; i + 16 <= nblocks; i += 16) {
+            for (j = 0; j < 8; j++) {
+                b[j] = _mm256_xor_si256(_mm256_loadu_si256((const __m256i*)(in + 16*(i + 2*j))), rk256[0]);
+            }
+            if (decrypt) {
+                for (r = 1; r < rounds; r++) {
+                    for (j = 0; j < 8; j++) {
+                        b[j] = _mm256_aesdec_epi128(b[j], rk256[r]);
+                    }
+                }
+                for (j = 0; j < 8; j++) {
+                    _mm256_storeu_si256((__m256i*)(out + 16*(i + 2*j)), _mm256_aesdeclast_epi128(b[j], rk256[rounds]));
+                }
+            } else {
+                for (r = 1; r < rounds; r++) {
+                    for (j = 0; j < 8; j++) {
+                        b[j] = _mm256_aesenc_epi128(b[j], rk256[r]);
+                    }
+                }
+                for (j = 0; j < 8; j++) {
+                    _mm256_storeu_si256((__m256i*)(out + 16*(i + 2*j)), _mm256_aesenclast_epi128(b[j], rk256[rounds]));
+                }
+            }
+        }
+        return i;
+    }
+    """
+    int cy_cpu_has_aesni() nogil
+    int cy_cpu_has_vaes() nogil
+    size_t cy_vaes_ctr_strides(const __m128i *rk, unsigned int rounds, uint64_t counter,
+                               const uint8_t *in_data, uint8_t *out_data, size_t len) nogil
+    size_t cy_vaes_ecb_strides(const __m128i *rk, unsigned int rounds, int decrypt,
+                               const uint8_t *in_data, uint8_t *out_data, size_t nblocks) nogil
+
 # Constants
 DEF BLOCK_SIZE = 16
 DEF MAX_ROUNDS = 14
+DEF SOFT_PARALLEL_BLOCKS = 4
+DEF GIL_RELEASE_THRESHOLD = 16 * 1024  # CTR inputs this large run without the GIL
+DEF MIN_THREAD_SLICE = 256 * 1024       # Smallest CTR slice handed to an OpenMP thread
+DEF MAX_THREADS = 256           # Upper bound for the threads= argument
+DEF ECB_PARALLEL_BLOCKS = 8     # Blocks in flight in the AES-NI ECB kernel
+DEF MB_LANES = 8                # Messages in flight in the multi-buffer CTR kernel
+DEF CHAIN_PARALLEL_BLOCKS = 32  # Blocks per kernel call in parallel CBC/CFB decryption
+
+# Block modes sharing the _BlockMode layout
+DEF MODE_ECB = 0
+DEF MODE_CBC = 1
+DEF MODE_CFB = 2
+DEF MODE_OFB = 3
+
+# Kernels, slowest first (same names as the c_aesni extension)
+DEF KERNEL_PORTABLE = 0
+DEF KERNEL_AESNI = 1
+DEF KERNEL_VAES = 2
+KERNEL_NAMES = ('portable', 'aesni', 'vaes-avx2')
+cdef int _active_kernel = KERNEL_PORTABLE
+
+# Telemetry (opt-in): calls, bytes, TSC cycles and call sizes per mode, as
+# in c_aesni. Counters are only updated with the GIL held, after the kernel
+# returns, so they need no atomics. Every call is counted; one call in
+# sample_every (on average, at random so periodic call patterns do not
+# alias) is also timed, because a TSC read costs about as much as a small
+# CTR call. With telemetry off a call pays one branch.
+DEF STATS_CTR = 0
+DEF STATS_ECB = 1               # ECB, CBC, CFB, OFB: STATS_ECB + MODE_*
+DEF STATS_BATCH = 5
+DEF NUM_STATS = 6
+DEF STATS_BUCKETS = 48          # Bucket b > 0: sizes in [2**(b-1), 2**b); bucket 0: empty calls
+DEF STATS_SAMPLE_EVERY = 16
+DEF STATS_UNTIMED = 1           # Stamp of a counted but untimed call (0: not counted)
+STATS_NAMES = ('ctr', 'ecb', 'cbc', 'cfb', 'ofb', 'batch')
+
+cdef struct Op_Stats:
+    uint64_t calls
+    uint64_t bytes
+    uint64_t sizes[STATS_BUCKETS]
+    uint64_t timed_calls        # Sampled calls the cycle counts cover
+    uint64_t timed_bytes
+    uint64_t kernel_cycles      # Inside the kernel (wall time of the calling thread)
+    uint64_t call_cycles        # From entry into the method until the kernel returns
+
+cdef Op_Stats _op_stats[NUM_STATS]
+cdef unsigned int _stats_sample_every = STATS_SAMPLE_EVERY
+cdef unsigned int _stats_countdown = 1  # Calls until the next timed one
+cdef uint32_t _stats_rng = 0x9e3779b9
+cdef bint _stats_enabled = os.environ.get("AES_STATS", "0") not in ("", "0")
 
 
 
@@ -47,10 +235,294 @@ cdef struct AESNI_State:
     __m128i drk[MAX_ROUNDS + 1]  # Decryption round keys
     unsigned int rounds
 
-# CTR state structure
+# CTR state structure; keystream/used hold the rest of a block that a
+# previous call ended in the middle of
 cdef struct AESNI_CTR_State:
     AESNI_State aes_state
+    uint64_t counter              # Counter of the next keystream block
+    uint8_t keystream[BLOCK_SIZE] # Last keystream block
+    unsigned int used             # Bytes of keystream already consumed
+
+# One message of a process_many() batch: its own key and initial counter
+cdef struct CTR_Message:
+    const uint8_t *key
+    size_t key_len                # 16, 24 or 32 (checked by the caller)
+    uint64_t counter
+    const uint8_t *in_data
+    uint8_t *out_data
+    size_t len
+
+# Multi-buffer lane: one message in flight
+cdef struct CTR_Lane:
+    AESNI_State aes
     uint64_t counter
+    const uint8_t *in_data
+    uint8_t *out_data
+    size_t left                   # Bytes still to process
+    size_t step                   # BLOCK_SIZE, or 0 for an idle lane parked on scratch
+
+# ECB/CBC/CFB/OFB state structure
+cdef struct AESNI_Block_State:
+    AESNI_State aes_state
+    uint8_t iv[BLOCK_SIZE]        # CBC: last ciphertext, CFB: shift register, OFB: last keystream block
+    unsigned int used             # OFB: keystream bytes of iv already consumed
+    unsigned int segment_size     # CFB: bytes per segment (1..16)
+
+# ---------------------------------------------------------------------------
+# Portable kernel: constant-time and table-free (mirrors c_aesni.c).
+# The S-box is GF(2^8) inversion (x^254) plus the affine map, evaluated on a
+# bitsliced representation of up to 64 bytes.
+# ---------------------------------------------------------------------------
+
+# Transpose an 8x8 bit matrix (row = byte, column = bit)
+cdef inline uint64_t soft_transpose8x8(uint64_t x) nogil:
+    cdef uint64_t t
+    t = (x ^ (x >> 7)) & 0x00AA00AA00AA00AAULL
+    x ^= t ^ (t << 7)
+    t = (x ^ (x >> 14)) & 0x0000CCCC0000CCCCULL
+    x ^= t ^ (t << 14)
+    t = (x ^ (x >> 28)) & 0x00000000F0F0F0F0ULL
+    x ^= t ^ (t << 28)
+    return x
+
+# Multiply two bitsliced GF(2^8) vectors modulo x^8 + x^4 + x^3 + x + 1
+cdef void soft_gf_mul(uint64_t *r, const uint64_t *a, const uint64_t *b) noexcept nogil:
+    cdef uint64_t t[15]
+    cdef int i, j
+    for i in range(15):
+        t[i] = 0
+    for i in range(8):
+        for j in range(8):
+            t[i + j] ^= a[i] & b[j]
+    # x^k = x^(k-4) + x^(k-5) + x^(k-7) + x^(k-8) for k >= 8
+    for i in range(14, 7, -1):
+        t[i - 4] ^= t[i]
+        t[i - 5] ^= t[i]
+        t[i - 7] ^= t[i]
+        t[i - 8] ^= t[i]
+    for i in range(8):
+        r[i] = t[i]
+
+# SubBytes (or InvSubBytes) on n <= 64 bytes in place
+cdef void soft_sub_bytes(uint8_t *data, size_t n, bint inverse) noexcept nogil:
+    cdef uint8_t lanes[64]
+    cdef uint64_t x[8]
+    cdef uint64_t x2[8]
+    cdef uint64_t x3[8]
+    cdef uint64_t x12[8]
+    cdef uint64_t t[8]
+    cdef uint64_t w
+    cdef int g, b, k
+
+    memset(lanes, 0, 64)
+    memcpy(lanes, data, n)
+    for b in range(8):
+        x[b] = 0
+
+    # Bitslice: plane b, bit i = bit b of byte i
+    for g in range(8):
+        w = 0
+        for k in range(8):
+            w |= (<uint64_t>lanes[8*g + k]) << (8*k)
+        w = soft_transpose8x8(w)
+        for b in range(8):
+            x[b] |= ((w >> (8*b)) & 0xFF) << (8*g)
+
+    if inverse:
+        # Inverse affine map: b_i = s_(i+2) ^ s_(i+5) ^ s_(i+7) ^ 0x05_i
+        for b in range(8):
+            t[b] = x[(b + 2) & 7] ^ x[(b + 5) & 7] ^ x[(b + 7) & 7]
+        t[0] = ~t[0]
+        t[2] = ~t[2]
+        memcpy(x, t, sizeof(t))
+
+    # x^254 = x^-1 (and 0 -> 0): 7 squarings, 4 multiplications
+    soft_gf_mul(x2, x, x)       # x^2
+    soft_gf_mul(x3, x2, x)      # x^3
+    soft_gf_mul(t, x3, x3)      # x^6
+    soft_gf_mul(x12, t, t)      # x^12
+    soft_gf_mul(t, x12, x3)     # x^15
+    for k in range(4):
+        soft_gf_mul(t, t, t)    # x^30, x^60, x^120, x^240
+    soft_gf_mul(t, t, x12)      # x^252
+    soft_gf_mul(x, t, x2)       # x^254
+
+    if not inverse:
+        # Affine map: s_i = b_i ^ b_(i+4) ^ b_(i+5) ^ b_(i+6) ^ b_(i+7) ^ 0x63_i
+        for b in range(8):
+            t[b] = x[b] ^ x[(b + 4) & 7] ^ x[(b + 5) & 7] ^ x[(b + 6) & 7] ^ x[(b + 7) & 7]
+        t[0] = ~t[0]
+        t[1] = ~t[1]
+        t[5] = ~t[5]
+        t[6] = ~t[6]
+        memcpy(x, t, sizeof(t))
+
+    for g in range(8):
+        w = 0
+        for b in range(8):
+            w |= ((x[b] >> (8*g)) & 0xFF) << (8*b)
+        w = soft_transpose8x8(w)
+        for k in range(8):
+            lanes[8*g + k] = <uint8_t>(w >> (8*k))
+    memcpy(data, lanes, n)
+
+cdef inline uint8_t soft_xtime(uint8_t a) nogil:
+    return <uint8_t>((a << 1) ^ (0x1b & -(a >> 7)))
+
+# ShiftRows on a column-major 16-byte state
+cdef void soft_shift_rows(uint8_t *s) noexcept nogil:
+    cdef uint8_t t[BLOCK_SIZE]
+    cdef int r, c
+    for c in range(4):
+        for r in range(4):
+            t[4*c + r] = s[4*((c + r) & 3) + r]
+    memcpy(s, t, BLOCK_SIZE)
+
+# InvShiftRows on a column-major 16-byte state
+cdef void soft_inv_shift_rows(uint8_t *s) noexcept nogil:
+    cdef uint8_t t[BLOCK_SIZE]
+    cdef int r, c
+    for c in range(4):
+        for r in range(4):
+            t[4*c + r] = s[4*((c - r) & 3) + r]
+    memcpy(s, t, BLOCK_SIZE)
+
+cdef void soft_mix_columns(uint8_t *s) noexcept nogil:
+    cdef uint8_t a0, a1, a2, a3, all_
+    cdef int c
+    for c in range(4):
+        a0 = s[4*c]; a1 = s[4*c + 1]; a2 = s[4*c + 2]; a3 = s[4*c + 3]
+        all_ = a0 ^ a1 ^ a2 ^ a3
+        s[4*c] = a0 ^ all_ ^ soft_xtime(a0 ^ a1)
+        s[4*c + 1] = a1 ^ all_ ^ soft_xtime(a1 ^ a2)
+        s[4*c + 2] = a2 ^ all_ ^ soft_xtime(a2 ^ a3)
+        s[4*c + 3] = a3 ^ all_ ^ soft_xtime(a3 ^ a0)
+
+# InvMixColumns = MixColumns after multiplying each column by {04}x^2 + {05}
+cdef void soft_inv_mix_columns(uint8_t *s) noexcept nogil:
+    cdef uint8_t u, v
+    cdef int c
+    for c in range(4):
+        u = soft_xtime(soft_xtime(s[4*c] ^ s[4*c + 2]))
+        v = soft_xtime(soft_xtime(s[4*c + 1] ^ s[4*c + 3]))
+        s[4*c] ^= u
+        s[4*c + 1] ^= v
+        s[4*c + 2] ^= u
+        s[4*c + 3] ^= v
+    soft_mix_columns(s)
+
+cdef inline void soft_add_round_key(uint8_t *s, const __m128i *rk) noexcept nogil:
+    cdef const uint8_t *k = <const uint8_t*>rk
+    cdef int i
+    for i in range(BLOCK_SIZE):
+        s[i] ^= k[i]
+
+# Encrypt up to SOFT_PARALLEL_BLOCKS blocks in place
+cdef void soft_encrypt_blocks(AESNI_State *aes, uint8_t *blocks, size_t nblocks) noexcept nogil:
+    cdef size_t j
+    cdef unsigned int r
+    for j in range(nblocks):
+        soft_add_round_key(blocks + j*BLOCK_SIZE, &aes.erk[0])
+    for r in range(1, aes.rounds + 1):
+        soft_sub_bytes(blocks, nblocks * BLOCK_SIZE, False)
+        for j in range(nblocks):
+            soft_shift_rows(blocks + j*BLOCK_SIZE)
+            if r != aes.rounds:
+                soft_mix_columns(blocks + j*BLOCK_SIZE)
+            soft_add_round_key(blocks + j*BLOCK_SIZE, &aes.erk[r])
+
+# Decrypt up to SOFT_PARALLEL_BLOCKS blocks in place with the equivalent
+# inverse cipher (drk), the same key layout aesdec uses
+cdef void soft_decrypt_blocks(AESNI_State *aes, uint8_t *blocks, size_t nblocks) noexcept nogil:
+    cdef size_t j
+    cdef unsigned int r
+    for j in range(nblocks):
+        soft_add_round_key(blocks + j*BLOCK_SIZE, &aes.drk[0])
+    for r in range(1, aes.rounds + 1):
+        soft_sub_bytes(blocks, nblocks * BLOCK_SIZE, True)
+        for j in range(nblocks):
+            soft_inv_shift_rows(blocks + j*BLOCK_SIZE)
+            if r != aes.rounds:
+                soft_inv_mix_columns(blocks + j*BLOCK_SIZE)
+            soft_add_round_key(blocks + j*BLOCK_SIZE, &aes.drk[r])
+
+cdef void soft_ecb_encrypt(AESNI_State *aes, const uint8_t *in_data, uint8_t *out_data, size_t nblocks) noexcept nogil:
+    cdef size_t i = 0, n
+    while i < nblocks:
+        n = min(nblocks - i, <size_t>SOFT_PARALLEL_BLOCKS)
+        memmove(out_data + i*BLOCK_SIZE, in_data + i*BLOCK_SIZE, n*BLOCK_SIZE)
+        soft_encrypt_blocks(aes, out_data + i*BLOCK_SIZE, n)
+        i += n
+
+cdef void soft_ecb_decrypt(AESNI_State *aes, const uint8_t *in_data, uint8_t *out_data, size_t nblocks) noexcept nogil:
+    cdef size_t i = 0, n
+    while i < nblocks:
+        n = min(nblocks - i, <size_t>SOFT_PARALLEL_BLOCKS)
+        memmove(out_data + i*BLOCK_SIZE, in_data + i*BLOCK_SIZE, n*BLOCK_SIZE)
+        soft_decrypt_blocks(aes, out_data + i*BLOCK_SIZE, n)
+        i += n
+
+# FIPS-197 key expansion, plus the equivalent inverse cipher keys
+cdef int soft_expand_key(AESNI_State *aes, const uint8_t *key, unsigned int Nk, unsigned int Nr) nogil:
+    cdef uint8_t w[4*4*(MAX_ROUNDS + 1)]
+    cdef uint8_t t[4]
+    cdef uint8_t tmp, rcon = 0x01
+    cdef unsigned int tot_words = 4*(Nr+1), i, k
+
+    memcpy(w, key, 4*Nk)
+    for i in range(Nk, tot_words):
+        memcpy(t, &w[4*(i-1)], 4)
+        if i % Nk == 0:
+            # RotWord + SubWord + Rcon
+            tmp = t[0]; t[0] = t[1]; t[1] = t[2]; t[2] = t[3]; t[3] = tmp
+            soft_sub_bytes(t, 4, False)
+            t[0] ^= rcon
+            rcon = soft_xtime(rcon)
+        elif (i % Nk == 4) and (Nk == 8):
+            soft_sub_bytes(t, 4, False)
+        for k in range(4):
+            w[4*i + k] = w[4*(i-Nk) + k] ^ t[k]
+    memcpy(aes.erk, w, 4*tot_words)
+    secure_zero(w, sizeof(w))
+    secure_zero(t, sizeof(t))
+
+    aes.drk[0] = aes.erk[Nr]
+    for i in range(1, Nr):
+        aes.drk[i] = aes.erk[Nr-i]
+        soft_inv_mix_columns(<uint8_t*>&aes.drk[i])
+    aes.drk[Nr] = aes.erk[0]
+    return 0
+
+cdef int soft_ctr_process(AESNI_CTR_State *state, const uint8_t *in_data, uint8_t *out_data, size_t len) nogil:
+    cdef uint8_t ks[SOFT_PARALLEL_BLOCKS * BLOCK_SIZE]
+    cdef size_t i = 0, j, n, nblocks
+    cdef uint64_t c
+    cdef int k
+
+    while i < len:
+        n = len - i
+        if n > sizeof(ks):
+            n = sizeof(ks)
+        nblocks = (n + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+        # Counter blocks: zero high half, big-endian counter in the last 8 bytes
+        memset(ks, 0, sizeof(ks))
+        for j in range(nblocks):
+            c = state.counter
+            state.counter += 1
+            for k in range(8):
+                ks[j*BLOCK_SIZE + 15 - k] = <uint8_t>(c >> (8*k))
+
+        soft_encrypt_blocks(&state.aes_state, ks, nblocks)
+        for j in range(n):
+            out_data[i + j] = in_data[i + j] ^ ks[j]
+        i += n
+    secure_zero(ks, sizeof(ks))
+    return 0
+
+# ---------------------------------------------------------------------------
+# AES-NI kernel
+# ---------------------------------------------------------------------------
 
 # Helper function for key expansion (exact copy from C implementation)
 cdef inline uint32_t sub_rot(uint32_t w, unsigned int idx, int subType):
@@ -88,7 +560,7 @@ cdef inline uint32_t sub_rot(uint32_t w, unsigned int idx, int subType):
     return <uint32_t>_mm_cvtsi128_si32(z)
 
 # Key expansion function
-cdef int expand_key(__m128i *erk, __m128i *drk, const uint8_t *key, unsigned int Nk, unsigned int Nr):
+cdef int aesni_expand_key(__m128i *erk, __m128i *drk, const uint8_t *key, unsigned int Nk, unsigned int Nr):
     cdef uint32_t rk[4*(14+2)]
     cdef unsigned int tot_words, i
     cdef uint32_t tmp
@@ -125,9 +597,11 @@ cdef int expand_key(__m128i *erk, __m128i *drk, const uint8_t *key, unsigned int
     
     return 0
 
-# Initialize AES-CTR state
-cdef AESNI_CTR_State* aesni_ctr_init(const uint8_t *key, size_t key_len, uint64_t initial_counter):
-    cdef AESNI_CTR_State *state
+# Fill aes with the round keys for key: expanded by the active kernel, or
+# copied from a schedule produced by expand_key() ((Nr+1) encryption round
+# keys followed by (Nr+1) decryption round keys) when schedule is not NULL
+cdef int aes_state_init(AESNI_State *aes, const uint8_t *key, size_t key_len,
+                        const uint8_t *schedule, size_t schedule_len):
     cdef unsigned int Nr
     
     if key_len == 16:
@@ -137,16 +611,46 @@ cdef AESNI_CTR_State* aesni_ctr_init(const uint8_t *key, size_t key_len, uint64_
     elif key_len == 32:
         Nr = 14
     else:
-        return NULL
+        return -1
+    aes.rounds = Nr
+    
+    if schedule == NULL:
+        if _active_kernel == KERNEL_PORTABLE:
+            return soft_expand_key(aes, key, key_len//4, Nr)
+        return aesni_expand_key(aes.erk, aes.drk, key, key_len//4, Nr)
+    
+    if schedule_len != 2 * (Nr + 1) * BLOCK_SIZE:
+        return -1
+    memcpy(aes.erk, schedule, (Nr + 1) * BLOCK_SIZE)
+    memcpy(aes.drk, schedule + (Nr + 1) * BLOCK_SIZE, (Nr + 1) * BLOCK_SIZE)
+    return 0
+
+# Initialize AES-CTR state with the key schedule of the active kernel
+cdef AESNI_CTR_State* aesni_ctr_init(const uint8_t *key, size_t key_len, uint64_t initial_counter):
+    cdef AESNI_CTR_State *state = <AESNI_CTR_State*>malloc(sizeof(AESNI_CTR_State))
     
-    state = <AESNI_CTR_State*>malloc(sizeof(AESNI_CTR_State))
     if not state:
         return NULL
     
-    state.aes_state.rounds = Nr
     state.counter = initial_counter
+    state.used = BLOCK_SIZE
+    if aes_state_init(&state.aes_state, key, key_len, NULL, 0) != 0:
+        free(state)
+        return NULL
+    
+    return state
+
+# Initialize AES-CTR state from a schedule produced by expand_key()
+cdef AESNI_CTR_State* aesni_ctr_init_schedule(const uint8_t *schedule, size_t schedule_len,
+                                              size_t key_len, uint64_t initial_counter):
+    cdef AESNI_CTR_State *state = <AESNI_CTR_State*>malloc(sizeof(AESNI_CTR_State))
+    
+    if not state:
+        return NULL
     
-    if expand_key(state.aes_state.erk, state.aes_state.drk, key, key_len//4, Nr) != 0:
+    state.counter = initial_counter
+    state.used = BLOCK_SIZE
+    if aes_state_init(&state.aes_state, NULL, key_len, schedule, schedule_len) != 0:
         free(state)
         return NULL
     
@@ -155,10 +659,11 @@ cdef AESNI_CTR_State* aesni_ctr_init(const uint8_t *key, size_t key_len, uint64_
 # Cleanup AES-CTR state
 cdef void aesni_ctr_cleanup(AESNI_CTR_State *state):
     if state:
+        secure_zero(state, sizeof(AESNI_CTR_State))
         free(state)
 
 # Optimized CTR mode encryption/decryption
-cdef int aesni_ctr_process(AESNI_CTR_State *state, const uint8_t *in_data, uint8_t *out_data, size_t len):
+cdef int aesni_ctr_process(AESNI_CTR_State *state, const uint8_t *in_data, uint8_t *out_data, size_t len) noexcept nogil:
     cdef size_t i
     cdef __m128i counter_block, encrypted_counter
     cdef uint64_t current_counter = state.counter
@@ -214,34 +719,742 @@ cdef int aesni_ctr_process(AESNI_CTR_State *state, const uint8_t *in_data, uint8
     
     return 0
 
+# ECB over whole blocks, ECB_PARALLEL_BLOCKS in flight
+cdef void aesni_ecb_encrypt(AESNI_State *aes, const uint8_t *in_data, uint8_t *out_data, size_t nblocks):
+    cdef __m128i b[ECB_PARALLEL_BLOCKS]
+    cdef size_t i = 0
+    cdef unsigned int j, r, n, rounds = aes.rounds
+    
+    while i < nblocks:
+        n = min(nblocks - i, <size_t>ECB_PARALLEL_BLOCKS)
+        for j in range(n):
+            b[j] = _mm_xor_si128(_mm_loadu_si128(<const __m128i*>(in_data + (i + j)*BLOCK_SIZE)), aes.erk[0])
+        for r in range(1, rounds):
+            for j in range(n):
+                b[j] = _mm_aesenc_si128(b[j], aes.erk[r])
+        for j in range(n):
+            _mm_storeu_si128(<__m128i*>(out_data + (i + j)*BLOCK_SIZE), _mm_aesenclast_si128(b[j], aes.erk[rounds]))
+        i += n
+
+cdef void aesni_ecb_decrypt(AESNI_State *aes, const uint8_t *in_data, uint8_t *out_data, size_t nblocks):
+    cdef __m128i b[ECB_PARALLEL_BLOCKS]
+    cdef size_t i = 0
+    cdef unsigned int j, r, n, rounds = aes.rounds
+    
+    while i < nblocks:
+        n = min(nblocks - i, <size_t>ECB_PARALLEL_BLOCKS)
+        for j in range(n):
+            b[j] = _mm_xor_si128(_mm_loadu_si128(<const __m128i*>(in_data + (i + j)*BLOCK_SIZE)), aes.drk[0])
+        for r in range(1, rounds):
+            for j in range(n):
+                b[j] = _mm_aesdec_si128(b[j], aes.drk[r])
+        for j in range(n):
+            _mm_storeu_si128(<__m128i*>(out_data + (i + j)*BLOCK_SIZE), _mm_aesdeclast_si128(b[j], aes.drk[rounds]))
+        i += n
+
+# Multi-buffer CTR for batches of short messages with their own keys: each
+# of MB_LANES lanes works on a different message with its own round keys,
+# in lockstep for as many whole blocks as the shortest lane has left, and
+# takes the next message when it finishes. Idle lanes encrypt a scratch
+# block. All lanes share the round count, so the batch is walked once per
+# key size.
+cdef int aesni_ctr_many(const CTR_Message *msgs, size_t count):
+    cdef CTR_Lane lanes[MB_LANES]
+    cdef uint8_t scratch[BLOCK_SIZE]
+    cdef uint8_t ks[BLOCK_SIZE]
+    cdef __m128i b[MB_LANES]
+    cdef size_t key_sizes[3]
+    cdef size_t k, next_msg, nblocks, n, i, off
+    cdef unsigned int j, r, busy, rounds
+    cdef CTR_Lane *lane
+    
+    key_sizes[0] = 16
+    key_sizes[1] = 24
+    key_sizes[2] = 32
+    memset(lanes, 0, sizeof(lanes))
+    for k in range(3):
+        rounds = 10 + 2*k
+        next_msg = 0
+        
+        while True:
+            # Refill idle lanes and find how far all busy lanes can go
+            busy = 0
+            nblocks = <size_t>-1
+            for j in range(MB_LANES):
+                lane = &lanes[j]
+                if lane.left == 0:
+                    while next_msg < count and (msgs[next_msg].key_len != key_sizes[k] or msgs[next_msg].len == 0):
+                        next_msg += 1
+                    lane.aes.rounds = rounds
+                    if next_msg == count:
+                        lane.in_data = scratch
+                        lane.out_data = scratch
+                        lane.step = 0
+                        continue
+                    aesni_expand_key(lane.aes.erk, lane.aes.drk, msgs[next_msg].key,
+                                     <unsigned int>(key_sizes[k] // 4), rounds)
+                    lane.counter = msgs[next_msg].counter
+                    lane.in_data = msgs[next_msg].in_data
+                    lane.out_data = msgs[next_msg].out_data
+                    lane.left = msgs[next_msg].len
+                    lane.step = BLOCK_SIZE
+                    next_msg += 1
+                busy += 1
+                nblocks = min(nblocks, lane.left // BLOCK_SIZE)
+            if busy == 0:
+                break
+            
+            # Whole blocks in lockstep
+            for n in range(nblocks):
+                for j in range(MB_LANES):
+                    b[j] = _mm_xor_si128(_mm_set_epi64x(<long long>__builtin_bswap64(lanes[j].counter + n), 0),
+                                         lanes[j].aes.erk[0])
+                for r in range(1, rounds):
+                    for j in range(MB_LANES):
+                        b[j] = _mm_aesenc_si128(b[j], lanes[j].aes.erk[r])
+                for j in range(MB_LANES):
+                    off = n * lanes[j].step
+                    b[j] = _mm_aesenclast_si128(b[j], lanes[j].aes.erk[rounds])
+                    _mm_storeu_si128(<__m128i*>(lanes[j].out_data + off),
+                                     _mm_xor_si128(_mm_loadu_si128(<const __m128i*>(lanes[j].in_data + off)), b[j]))
+            
+            # Advance; lanes that ran out of whole blocks finish their tail
+            for j in range(MB_LANES):
+                lane = &lanes[j]
+                if lane.step == 0:
+                    continue
+                lane.counter += nblocks
+                lane.in_data += nblocks * BLOCK_SIZE
+                lane.out_data += nblocks * BLOCK_SIZE
+                lane.left -= nblocks * BLOCK_SIZE
+                if lane.left and lane.left < BLOCK_SIZE:
+                    b[0] = _mm_xor_si128(_mm_set_epi64x(<long long>__builtin_bswap64(lane.counter), 0), lane.aes.erk[0])
+                    for r in range(1, rounds):
+                        b[0] = _mm_aesenc_si128(b[0], lane.aes.erk[r])
+                    _mm_storeu_si128(<__m128i*>ks, _mm_aesenclast_si128(b[0], lane.aes.erk[rounds]))
+                    for i in range(lane.left):
+                        lane.out_data[i] = lane.in_data[i] ^ ks[i]
+                    lane.left = 0
+    
+    secure_zero(lanes, sizeof(lanes))
+    secure_zero(ks, BLOCK_SIZE)
+    secure_zero(b, sizeof(b))
+    return 0
+
+# Batch of independent messages, one at a time
+cdef int soft_ctr_many(const CTR_Message *msgs, size_t count) nogil:
+    cdef AESNI_CTR_State state
+    cdef size_t m
+    
+    for m in range(count):
+        state.aes_state.rounds = <unsigned int>(msgs[m].key_len // 4 + 6)
+        soft_expand_key(&state.aes_state, msgs[m].key, <unsigned int>(msgs[m].key_len // 4),
+                        state.aes_state.rounds)
+        state.counter = msgs[m].counter
+        soft_ctr_process(&state, msgs[m].in_data, msgs[m].out_data, msgs[m].len)
+    secure_zero(&state, sizeof(state))
+    return 0
+
+# VAES/AVX2 kernel: whole 16-block strides in C, tail through AES-NI
+cdef int vaes_ctr_process(AESNI_CTR_State *state, const uint8_t *in_data, uint8_t *out_data, size_t len) noexcept nogil:
+    cdef size_t done = cy_vaes_ctr_strides(state.aes_state.erk, state.aes_state.rounds,
+                                           state.counter, in_data, out_data, len)
+    state.counter += done // BLOCK_SIZE
+    if done < len:
+        return aesni_ctr_process(state, in_data + done, out_data + done, len - done)
+    return 0
+
+# ---------------------------------------------------------------------------
+# Kernel dispatch
+# ---------------------------------------------------------------------------
+
+cdef bint kernel_supported(int kernel):
+    if kernel == KERNEL_PORTABLE:
+        return True
+    if kernel == KERNEL_AESNI:
+        return cy_cpu_has_aesni()
+    if kernel == KERNEL_VAES:
+        return cy_cpu_has_vaes()
+    return False
+
+cdef int select_best_kernel():
+    cdef int kernel
+    for kernel in range(KERNEL_VAES, KERNEL_PORTABLE, -1):
+        if kernel_supported(kernel):
+            return kernel
+    return KERNEL_PORTABLE
+
+# Checked once at import
+_active_kernel = select_best_kernel()
+
+# CTR mode encryption/decryption through the active kernel
+cdef int ctr_process(AESNI_CTR_State *state, const uint8_t *in_data, uint8_t *out_data, size_t len) noexcept nogil:
+    if _active_kernel == KERNEL_VAES:
+        return vaes_ctr_process(state, in_data, out_data, len)
+    if _active_kernel == KERNEL_AESNI:
+        return aesni_ctr_process(state, in_data, out_data, len)
+    return soft_ctr_process(state, in_data, out_data, len)
+
+# Batched CTR through the active kernel; VAES shares the 128-bit
+# multi-buffer kernel
+cdef int ctr_many(const CTR_Message *msgs, size_t count):
+    if _active_kernel == KERNEL_PORTABLE:
+        return soft_ctr_many(msgs, count)
+    return aesni_ctr_many(msgs, count)
+
+# Multi-threaded CTR (mirrors c_aesni.c). CTR blocks are independent, so
+# the whole blocks are split into counter-aligned slices, each with its own
+# copy of the state, that an OpenMP team encrypts in a prange. Inputs under
+# MIN_THREAD_SLICE per thread use fewer threads.
+cdef int ctr_process_parallel(AESNI_CTR_State *state, const uint8_t *in_data, uint8_t *out_data,
+                              size_t len, int nthreads) noexcept nogil:
+    cdef size_t nblocks = (len + BLOCK_SIZE - 1) // BLOCK_SIZE
+    cdef size_t max_threads = len // MIN_THREAD_SLICE
+    cdef size_t blocks_per_slice, offset
+    cdef AESNI_CTR_State *slices
+    cdef Py_ssize_t t
+    cdef int failed = 0
+    
+    if max_threads < <size_t>nthreads:
+        nthreads = <int>max_threads
+    if nthreads <= 1:
+        return ctr_process(state, in_data, out_data, len)
+    
+    slices = <AESNI_CTR_State*>malloc(nthreads * sizeof(AESNI_CTR_State))
+    if not slices:
+        return -1
+    blocks_per_slice = (nblocks + nthreads - 1) // nthreads
+    for t in range(nthreads):
+        slices[t] = state[0]
+        slices[t].counter = state.counter + <uint64_t>t * blocks_per_slice
+    
+    for t in prange(nthreads, num_threads=nthreads, schedule='static'):
+        offset = <size_t>t * blocks_per_slice * BLOCK_SIZE
+        if t == nthreads - 1:
+            failed += ctr_process(&slices[t], in_data + offset, out_data + offset, len - offset) != 0
+        else:
+            failed += ctr_process(&slices[t], in_data + offset, out_data + offset,
+                                  blocks_per_slice * BLOCK_SIZE) != 0
+    
+    state.counter += nblocks
+    secure_zero(slices, nthreads * sizeof(AESNI_CTR_State))
+    free(slices)
+    return -1 if failed else 0
+
+# Streaming CTR: leftover keystream from the previous call is used first and
+# a trailing partial block keeps the rest, so chunk boundaries do not change
+# the output (as in pyaes). Whole blocks go through the kernel, split across
+# nthreads when that pays off.
+cdef int ctr_stream_process(AESNI_CTR_State *state, const uint8_t *in_data, uint8_t *out_data, size_t len,
+                            int nthreads) noexcept nogil:
+    cdef uint8_t zero[BLOCK_SIZE]
+    cdef size_t i = 0, bulk
+    cdef int result
+    
+    while i < len and state.used < BLOCK_SIZE:
+        out_data[i] = in_data[i] ^ state.keystream[state.used]
+        state.used += 1
+        i += 1
+    
+    bulk = (len - i) & ~(<size_t>(BLOCK_SIZE - 1))
+    if bulk:
+        result = ctr_process_parallel(state, in_data + i, out_data + i, bulk, nthreads)
+        if result != 0:
+            return result
+        i += bulk
+    
+    if i < len:
+        # Keystream block = E(counter), computed as the encryption of zeros
+        memset(zero, 0, BLOCK_SIZE)
+        result = ctr_process(state, zero, state.keystream, BLOCK_SIZE)
+        if result != 0:
+            return result
+        state.used = 0
+        while i < len:
+            out_data[i] = in_data[i] ^ state.keystream[state.used]
+            state.used += 1
+            i += 1
+    return 0
+
+# Position a CTR state at byte offset of the stream whose first block is
+# initial_counter (mirrors c_aesni.c): the counter of that block directly,
+# and inside a block its keystream with the bytes before offset marked used
+cdef int ctr_seek(AESNI_CTR_State *state, uint64_t initial_counter, uint64_t offset) noexcept nogil:
+    cdef uint8_t zero[BLOCK_SIZE]
+    cdef int result
+    
+    state.counter = initial_counter + offset // BLOCK_SIZE
+    state.used = BLOCK_SIZE
+    if offset % BLOCK_SIZE:
+        memset(zero, 0, BLOCK_SIZE)
+        result = ctr_process(state, zero, state.keystream, BLOCK_SIZE)
+        if result != 0:
+            return result
+        state.used = <unsigned int>(offset % BLOCK_SIZE)
+    return 0
+
+# ECB over whole blocks through the active kernel; in and out may alias
+cdef void encrypt_blocks(AESNI_State *aes, const uint8_t *in_data, uint8_t *out_data, size_t nblocks):
+    cdef size_t done = 0
+    if _active_kernel == KERNEL_PORTABLE:
+        soft_ecb_encrypt(aes, in_data, out_data, nblocks)
+        return
+    if _active_kernel == KERNEL_VAES:
+        done = cy_vaes_ecb_strides(aes.erk, aes.rounds, 0, in_data, out_data, nblocks)
+    aesni_ecb_encrypt(aes, in_data + done*BLOCK_SIZE, out_data + done*BLOCK_SIZE, nblocks - done)
+
+cdef void decrypt_blocks(AESNI_State *aes, const uint8_t *in_data, uint8_t *out_data, size_t nblocks):
+    cdef size_t done = 0
+    if _active_kernel == KERNEL_PORTABLE:
+        soft_ecb_decrypt(aes, in_data, out_data, nblocks)
+        return
+    if _active_kernel == KERNEL_VAES:
+        done = cy_vaes_ecb_strides(aes.drk, aes.rounds, 1, in_data, out_data, nblocks)
+    aesni_ecb_decrypt(aes, in_data + done*BLOCK_SIZE, out_data + done*BLOCK_SIZE, nblocks - done)
+
+# ---------------------------------------------------------------------------
+# ECB/CBC/CFB/OFB on top of the block functions (mirrors c_aesni.c)
+# ---------------------------------------------------------------------------
+
+# CBC encryption is serial: every block needs the previous ciphertext block
+cdef void cbc_encrypt(AESNI_Block_State *state, const uint8_t *in_data, uint8_t *out_data, size_t len):
+    cdef size_t i
+    cdef int k
+    for i in range(0, len, BLOCK_SIZE):
+        for k in range(BLOCK_SIZE):
+            state.iv[k] ^= in_data[i + k]
+        encrypt_blocks(&state.aes_state, state.iv, state.iv, 1)
+        memcpy(out_data + i, state.iv, BLOCK_SIZE)
+
+# CBC decryption (P_i = D(C_i) ^ C_i-1) and full-block CFB decryption
+# (P_i = E(C_i-1) ^ C_i) only depend on ciphertext, so whole chunks go
+# through the multi-block kernel at once
+cdef void chained_decrypt(AESNI_Block_State *state, const uint8_t *in_data, uint8_t *out_data,
+                          size_t len, bint cfb):
+    cdef uint8_t prev[(CHAIN_PARALLEL_BLOCKS + 1) * BLOCK_SIZE]
+    cdef uint8_t tmp[CHAIN_PARALLEL_BLOCKS * BLOCK_SIZE]
+    cdef size_t i = 0, k, n
+    
+    while i < len:
+        n = min(len - i, <size_t>sizeof(tmp))
+        
+        # prev = C_i-1 for every block of the chunk, then C_last
+        memcpy(prev, state.iv, BLOCK_SIZE)
+        memcpy(prev + BLOCK_SIZE, in_data + i, n)
+        
+        if cfb:
+            encrypt_blocks(&state.aes_state, prev, tmp, n // BLOCK_SIZE)
+            for k in range(n):
+                out_data[i + k] = tmp[k] ^ prev[BLOCK_SIZE + k]
+        else:
+            decrypt_blocks(&state.aes_state, prev + BLOCK_SIZE, tmp, n // BLOCK_SIZE)
+            for k in range(n):
+                out_data[i + k] = tmp[k] ^ prev[k]
+        
+        memcpy(state.iv, prev + n, BLOCK_SIZE)
+        i += n
+
+# CFB with pyaes semantics: segment_size is in bytes, and each segment
+# shifts its ciphertext into the register
+cdef void cfb_process(AESNI_Block_State *state, const uint8_t *in_data, uint8_t *out_data,
+                      size_t len, bint decrypt):
+    cdef unsigned int s = state.segment_size, k
+    cdef uint8_t ks[BLOCK_SIZE]
+    cdef uint8_t segment[BLOCK_SIZE]
+    cdef size_t i
+    
+    if decrypt and s == BLOCK_SIZE:
+        chained_decrypt(state, in_data, out_data, len, True)
+        return
+    
+    for i in range(0, len, s):
+        encrypt_blocks(&state.aes_state, state.iv, ks, 1)
+        if decrypt:
+            memcpy(segment, in_data + i, s)
+        for k in range(s):
+            out_data[i + k] = in_data[i + k] ^ ks[k]
+        if not decrypt:
+            memcpy(segment, out_data + i, s)
+        
+        memmove(state.iv, state.iv + s, BLOCK_SIZE - s)
+        memcpy(state.iv + BLOCK_SIZE - s, segment, s)
+
+# OFB keystream E(IV), E(E(IV)), ...; a partly used block carries over to
+# the next call, as in pyaes
+cdef void ofb_process(AESNI_Block_State *state, const uint8_t *in_data, uint8_t *out_data, size_t len):
+    cdef size_t i = 0, k, n
+    while i < len:
+        if state.used == BLOCK_SIZE:
+            encrypt_blocks(&state.aes_state, state.iv, state.iv, 1)
+            state.used = 0
+        n = min(<size_t>(BLOCK_SIZE - state.used), len - i)
+        for k in range(n):
+            out_data[i + k] = in_data[i + k] ^ state.iv[state.used + k]
+        state.used += <unsigned int>n
+        i += n
+
+cdef void block_mode_process(AESNI_Block_State *state, int mode, const uint8_t *in_data,
+                             uint8_t *out_data, size_t len, bint decrypt):
+    if mode == MODE_ECB:
+        if decrypt:
+            decrypt_blocks(&state.aes_state, in_data, out_data, len // BLOCK_SIZE)
+        else:
+            encrypt_blocks(&state.aes_state, in_data, out_data, len // BLOCK_SIZE)
+    elif mode == MODE_CBC:
+        if decrypt:
+            chained_decrypt(state, in_data, out_data, len, False)
+        else:
+            cbc_encrypt(state, in_data, out_data, len)
+    elif mode == MODE_CFB:
+        cfb_process(state, in_data, out_data, len, decrypt)
+    else:
+        ofb_process(state, in_data, out_data, len)
+
+cdef inline uint64_t monotonic_ns() noexcept nogil:
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return <uint64_t>ts.tv_sec * 1000000000 + <uint64_t>ts.tv_nsec
+
+# Stamp at entry into a method (GIL held)
+cdef inline uint64_t stats_start() noexcept:
+    global _stats_countdown, _stats_rng
+    if not _stats_enabled:
+        return 0
+    _stats_countdown -= 1
+    if _stats_countdown:
+        return STATS_UNTIMED
+    # Next timed call in 1..2N-1 calls (xorshift32), N on average
+    _stats_rng ^= _stats_rng << 13
+    _stats_rng ^= _stats_rng >> 17
+    _stats_rng ^= _stats_rng << 5
+    _stats_countdown = 1 + _stats_rng % (2 * _stats_sample_every - 1)
+    return __rdtsc()
+
+# Stamps around the kernel, taken only for timed calls (no GIL needed)
+cdef inline uint64_t stats_kernel_start(uint64_t call_start) noexcept nogil:
+    return __rdtsc() if call_start > STATS_UNTIMED else 0
+
+cdef inline uint64_t stats_stop(uint64_t kernel_start) noexcept nogil:
+    return __rdtsc() if kernel_start else 0
+
+# Account one successful call (GIL held). Calls that straddle
+# enable_stats() have a zero stamp and are skipped.
+cdef void stats_record(int op, size_t length, uint64_t call_start, uint64_t kernel_start,
+                       uint64_t kernel_end) noexcept:
+    cdef Op_Stats *s = &_op_stats[op]
+    cdef unsigned int bucket = 0
+    
+    if not call_start:
+        return
+    if length:
+        bucket = 64 - __builtin_clzll(length)
+    if bucket >= STATS_BUCKETS:
+        bucket = STATS_BUCKETS - 1
+    s.calls += 1
+    s.bytes += length
+    s.sizes[bucket] += 1
+    if call_start > STATS_UNTIMED and kernel_start:
+        s.timed_calls += 1
+        s.timed_bytes += length
+        s.kernel_cycles += kernel_end - kernel_start
+        s.call_cycles += kernel_end - call_start
+
+cdef uint64_t _stats_epoch_ns = monotonic_ns()
+cdef uint64_t _stats_epoch_tsc = __rdtsc()
+
+cdef double tsc_hz():
+    """TSC ticks per second, measured against CLOCK_MONOTONIC since import"""
+    cdef uint64_t ns = monotonic_ns() - _stats_epoch_ns
+    while ns < 10000000:  # At least 10 ms for a stable rate
+        ns = monotonic_ns() - _stats_epoch_ns
+    return <double>(__rdtsc() - _stats_epoch_tsc) * 1e9 / <double>ns
+
+def enable_stats(enabled=True, sample_every=None):
+    """
+    Turn call telemetry on or off (AES_STATS=1 turns it on at import) and
+    return the previous setting. Every call is counted, one in sample_every
+    (at random, default 16) is timed; sample_every=1 times them all.
+    """
+    global _stats_enabled, _stats_sample_every, _stats_countdown
+    previous = bool(_stats_enabled)
+    if sample_every is not None:
+        if not 1 <= sample_every <= 1 << 30:
+            raise ValueError("sample_every must be between 1 and 2**30")
+        _stats_sample_every = sample_every
+    _stats_countdown = 1
+    _stats_enabled = bool(enabled)
+    return previous
+
+def reset_stats():
+    """Zero the telemetry counters"""
+    memset(_op_stats, 0, sizeof(_op_stats))
+
+def stats():
+    """
+    Telemetry since the last reset_stats(): 'enabled', 'sample_every',
+    'tsc_hz', and per mode ('ctr', 'ecb', 'cbc', 'cfb', 'ofb', 'batch')
+    calls, bytes, size_histogram {lower bound: calls} in powers of two, and
+    over the timed calls timed_calls, timed_bytes, kernel_cycles,
+    call_cycles (from entry into the method), cycles_per_byte and
+    overhead_share. Cycles are TSC ticks.
+    """
+    cdef Op_Stats *s
+    cdef int op, b
+    
+    result = {"enabled": bool(_stats_enabled), "sample_every": _stats_sample_every, "tsc_hz": tsc_hz()}
+    for op in range(NUM_STATS):
+        s = &_op_stats[op]
+        result[STATS_NAMES[op]] = {
+            "calls": s.calls,
+            "bytes": s.bytes,
+            "timed_calls": s.timed_calls,
+            "timed_bytes": s.timed_bytes,
+            "kernel_cycles": s.kernel_cycles,
+            "call_cycles": s.call_cycles,
+            "cycles_per_byte": s.kernel_cycles / <double>s.timed_bytes if s.timed_bytes else 0.0,
+            "overhead_share": 1.0 - s.kernel_cycles / <double>s.call_cycles if s.call_cycles else 0.0,
+            "size_histogram": {(1 << (b - 1) if b else 0): s.sizes[b]
+                               for b in range(STATS_BUCKETS) if s.sizes[b]},
+        }
+    return result
+
+def openmp_enabled():
+    """True when the module was built with OpenMP (threads > 1 runs in parallel)"""
+    return bool(CY_OPENMP_ENABLED)
+
+def active_kernel():
+    """Name of the kernel selected for this CPU"""
+    return KERNEL_NAMES[_active_kernel]
+
+def available_kernels():
+    """Kernels this CPU can run, slowest first"""
+    return [KERNEL_NAMES[k] for k in range(len(KERNEL_NAMES)) if kernel_supported(k)]
+
+def set_kernel(name):
+    """Force a kernel by name (must be supported)"""
+    global _active_kernel
+    if name not in KERNEL_NAMES:
+        raise ValueError(f"Unknown kernel '{name}'")
+    kernel = KERNEL_NAMES.index(name)
+    if not kernel_supported(kernel):
+        raise ValueError(f"Kernel '{name}' is not supported by this CPU")
+    _active_kernel = kernel
+
+def expand_key(key):
+    """
+    Expand key with the active kernel and return the round keys as a
+    bytearray: (Nr+1) encryption round keys followed by (Nr+1) decryption
+    round keys. Pass it back as AESModeOfOperationCTR(..., schedule=...)
+    to skip key expansion.
+    """
+    cdef const uint8_t[::1] key_view = bytes(key)
+    cdef AESNI_CTR_State *state
+    cdef size_t rk_len
+    
+    state = aesni_ctr_init(&key_view[0], key_view.shape[0], 0)
+    if not state:
+        raise ValueError("Key must be 16, 24 or 32 bytes")
+    
+    rk_len = (state.aes_state.rounds + 1) * BLOCK_SIZE
+    schedule = bytearray((<char*>state.aes_state.erk)[:rk_len])
+    schedule += (<char*>state.aes_state.drk)[:rk_len]
+    aesni_ctr_cleanup(state)
+    return schedule
+
+# out = a ^ b over length bytes; out may alias a or b
+cdef void xor_bytes(const uint8_t *a, const uint8_t *b, uint8_t *out, size_t length) noexcept nogil:
+    cdef size_t i = 0
+    cdef __m128i x0, x1, x2, x3
+    while i + 4 * BLOCK_SIZE <= length:
+        x0 = _mm_xor_si128(_mm_loadu_si128(<const __m128i*>(a + i)), _mm_loadu_si128(<const __m128i*>(b + i)))
+        x1 = _mm_xor_si128(_mm_loadu_si128(<const __m128i*>(a + i + 16)), _mm_loadu_si128(<const __m128i*>(b + i + 16)))
+        x2 = _mm_xor_si128(_mm_loadu_si128(<const __m128i*>(a + i + 32)), _mm_loadu_si128(<const __m128i*>(b + i + 32)))
+        x3 = _mm_xor_si128(_mm_loadu_si128(<const __m128i*>(a + i + 48)), _mm_loadu_si128(<const __m128i*>(b + i + 48)))
+        _mm_storeu_si128(<__m128i*>(out + i), x0)
+        _mm_storeu_si128(<__m128i*>(out + i + 16), x1)
+        _mm_storeu_si128(<__m128i*>(out + i + 32), x2)
+        _mm_storeu_si128(<__m128i*>(out + i + 48), x3)
+        i += 4 * BLOCK_SIZE
+    while i + BLOCK_SIZE <= length:
+        _mm_storeu_si128(<__m128i*>(out + i),
+                         _mm_xor_si128(_mm_loadu_si128(<const __m128i*>(a + i)), _mm_loadu_si128(<const __m128i*>(b + i))))
+        i += BLOCK_SIZE
+    while i < length:
+        out[i] = a[i] ^ b[i]
+        i += 1
+
+def xor_into(data, keystream, out):
+    """
+    out[:len(data)] = data ^ keystream[:len(data)]; out may be data itself.
+    XORs precomputed keystream (see keystream_prefetch.py).
+    """
+    cdef Py_buffer a, b, o
+    PyObject_GetBuffer(data, &a, PyBUF_SIMPLE)
+    try:
+        PyObject_GetBuffer(keystream, &b, PyBUF_SIMPLE)
+        try:
+            PyObject_GetBuffer(out, &o, PyBUF_WRITABLE)
+            try:
+                if b.len < a.len or o.len < a.len:
+                    raise ValueError("Keystream and output must be at least as long as the data")
+                if a.len >= GIL_RELEASE_THRESHOLD:
+                    with nogil:
+                        xor_bytes(<const uint8_t*>a.buf, <const uint8_t*>b.buf, <uint8_t*>o.buf, a.len)
+                else:
+                    xor_bytes(<const uint8_t*>a.buf, <const uint8_t*>b.buf, <uint8_t*>o.buf, a.len)
+            finally:
+                PyBuffer_Release(&o)
+        finally:
+            PyBuffer_Release(&b)
+    finally:
+        PyBuffer_Release(&a)
+
+# Borrow the bytes of a process_many() item: bytes objects are read directly
+# (the argument tuples keep them alive), other buffers are exported into
+# views[slot], released by the caller
+cdef int batch_item(obj, Py_buffer *views, Py_ssize_t slot, const uint8_t **data, size_t *length) except -1:
+    if type(obj) is bytes:
+        data[0] = <const uint8_t*>PyBytes_AS_STRING(obj)
+        length[0] = <size_t>PyBytes_GET_SIZE(obj)
+        return 0
+    PyObject_GetBuffer(obj, &views[slot], PyBUF_SIMPLE)
+    data[0] = <const uint8_t*>views[slot].buf
+    length[0] = <size_t>views[slot].len
+    return 0
+
+def process_many(keys, counters, inputs):
+    """
+    AES-CTR over many messages in one call, each with its own key and
+    initial counter (counters may be None for all zeros). The messages are
+    interleaved through the multi-buffer kernel.
+
+    Returns (out, offsets): the outputs concatenated in one bytes object,
+    message i being out[offsets[i]:offsets[i+1]], and offsets a memoryview
+    of count + 1 native uint64 values.
+    """
+    cdef tuple key_items = tuple(keys)
+    cdef tuple input_items = tuple(inputs)
+    cdef tuple counter_items = None if counters is None else tuple(counters)
+    cdef Py_ssize_t count = len(input_items), m
+    cdef CTR_Message *msgs
+    cdef Py_buffer *views
+    cdef uint64_t *offs
+    cdef uint8_t *base
+    cdef size_t total = 0
+    cdef uint64_t call_start = stats_start(), kernel_start, kernel_end
+    
+    if len(key_items) != count or (counter_items is not None and len(counter_items) != count):
+        raise ValueError("keys, counters and inputs must have the same length")
+    
+    offsets = bytearray((count + 1) * sizeof(uint64_t))
+    offs = <uint64_t*><char*>offsets
+    msgs = <CTR_Message*>calloc(count + 1, sizeof(CTR_Message))
+    views = <Py_buffer*>calloc(2 * count + 1, sizeof(Py_buffer))
+    if not msgs or not views:
+        free(msgs)
+        free(views)
+        raise MemoryError()
+    
+    try:
+        for m in range(count):
+            batch_item(key_items[m], views, 2*m, &msgs[m].key, &msgs[m].key_len)
+            if msgs[m].key_len != 16 and msgs[m].key_len != 24 and msgs[m].key_len != 32:
+                raise ValueError(f"Key {m} must be 16, 24, or 32 bytes")
+            if counter_items is not None:
+                msgs[m].counter = counter_items[m]
+            batch_item(input_items[m], views, 2*m + 1, &msgs[m].in_data, &msgs[m].len)
+            total += msgs[m].len
+            offs[m + 1] = total
+        
+        out_data = PyBytes_FromStringAndSize(NULL, total)
+        base = <uint8_t*>PyBytes_AsString(out_data)
+        for m in range(count):
+            msgs[m].out_data = base + offs[m]
+        
+        kernel_start = stats_kernel_start(call_start)
+        if ctr_many(msgs, count) != 0:
+            raise RuntimeError("AES-CTR processing failed")
+        kernel_end = stats_stop(kernel_start)
+        stats_record(STATS_BATCH, total, call_start, kernel_start, kernel_end)
+    finally:
+        for m in range(2 * count):
+            if <void*>views[m].obj != NULL:
+                PyBuffer_Release(&views[m])
+        free(views)
+        free(msgs)
+    
+    return out_data, memoryview(offsets).cast("Q")
+
 # Python wrapper class
 cdef class AESModeOfOperationCTR:
+    """
+    AESModeOfOperationCTR(key, counter=None, threads=1, *, schedule=None)
+
+    threads > 1 encrypts inputs of at least 256 KB per thread in
+    counter-aligned slices on an OpenMP team, without the GIL. seek() and
+    decrypt_range() give random access at any byte offset.
+    """
     cdef AESNI_CTR_State *state
     cdef bint initialized
+    cdef bint busy  # Set while the GIL is released around the kernel
+    cdef int nthreads
+    cdef uint64_t initial_counter  # Counter of stream byte 0, for seek()
     
-    def __init__(self, key, counter=None):
-        cdef Py_buffer key_buf
+    def __init__(self, key, counter=None, threads=1, *, schedule=None):
+        cdef Py_buffer key_buf, schedule_buf
+        cdef AESNI_CTR_State *state
         cdef uint64_t initial_counter = 0
         
+        # Re-initialization must not free a state the kernel is using
+        if self.busy:
+            raise RuntimeError("AES-CTR object is in use by another thread")
+        if not 1 <= threads <= MAX_THREADS:
+            raise ValueError(f"threads must be between 1 and {MAX_THREADS}")
         if counter is not None:
             initial_counter = counter.initial_value
         
+        # Build the new state first, so a failed re-init keeps the old one
         PyObject_GetBuffer(key, &key_buf, PyBUF_SIMPLE)
         
-        self.state = aesni_ctr_init(<uint8_t*>key_buf.buf, key_buf.len, initial_counter)
+        if schedule is None:
+            state = aesni_ctr_init(<uint8_t*>key_buf.buf, key_buf.len, initial_counter)
+        else:
+            PyObject_GetBuffer(schedule, &schedule_buf, PyBUF_SIMPLE)
+            state = aesni_ctr_init_schedule(<uint8_t*>schedule_buf.buf, schedule_buf.len,
+                                            key_buf.len, initial_counter)
+            PyBuffer_Release(&schedule_buf)
         PyBuffer_Release(&key_buf)
         
-        if not self.state:
+        if not state:
             raise ValueError("Failed to initialize AES-CTR")
         
+        if self.state:
+            aesni_ctr_cleanup(self.state)
+        self.state = state
+        self.nthreads = threads
+        self.initial_counter = initial_counter
         self.initialized = True
     
+    @property
+    def threads(self):
+        """Threads used for large inputs"""
+        return self.nthreads
+    
+    @threads.setter
+    def threads(self, value):
+        if not 1 <= value <= MAX_THREADS:
+            raise ValueError(f"threads must be between 1 and {MAX_THREADS}")
+        self.nthreads = value
+    
     def encrypt(self, data):
+        cdef uint64_t call_start = stats_start(), kernel_start, kernel_end
         cdef Py_buffer in_buf, out_buf
         cdef int result
         
         if not self.initialized:
             raise RuntimeError("AES-CTR not initialized")
+        if self.busy:
+            raise RuntimeError("AES-CTR object is in use by another thread")
         
         PyObject_GetBuffer(data, &in_buf, PyBUF_SIMPLE)
         
@@ -249,13 +1462,25 @@ cdef class AESModeOfOperationCTR:
         out_data = PyBytes_FromStringAndSize(NULL, in_buf.len)
         PyObject_GetBuffer(out_data, &out_buf, PyBUF_SIMPLE)
         
-        result = aesni_ctr_process(self.state, <uint8_t*>in_buf.buf, <uint8_t*>out_buf.buf, in_buf.len)
+        if in_buf.len >= GIL_RELEASE_THRESHOLD:
+            self.busy = True
+            with nogil:
+                kernel_start = stats_kernel_start(call_start)
+                result = ctr_stream_process(self.state, <uint8_t*>in_buf.buf, <uint8_t*>out_buf.buf, in_buf.len,
+                                            self.nthreads)
+                kernel_end = stats_stop(kernel_start)
+            self.busy = False
+        else:
+            kernel_start = stats_kernel_start(call_start)
+            result = ctr_stream_process(self.state, <uint8_t*>in_buf.buf, <uint8_t*>out_buf.buf, in_buf.len, 1)
+            kernel_end = stats_stop(kernel_start)
         
         PyBuffer_Release(&in_buf)
         PyBuffer_Release(&out_buf)
         
         if result != 0:
             raise RuntimeError("AES-CTR processing failed")
+        stats_record(STATS_CTR, len(out_data), call_start, kernel_start, kernel_end)
         
         return out_data
     
@@ -263,10 +1488,193 @@ cdef class AESModeOfOperationCTR:
         # CTR mode: decryption is the same as encryption
         return self.encrypt(data)
     
+    def seek(self, uint64_t offset):
+        """Move to byte offset of the stream; nothing before it is processed"""
+        if not self.initialized:
+            raise RuntimeError("AES-CTR not initialized")
+        if self.busy:
+            raise RuntimeError("AES-CTR object is in use by another thread")
+        if ctr_seek(self.state, self.initial_counter, offset) != 0:
+            raise RuntimeError("AES-CTR processing failed")
+    
+    def tell(self):
+        """Byte offset of the next byte to be processed"""
+        cdef uint64_t blocks
+        if not self.initialized:
+            raise RuntimeError("AES-CTR not initialized")
+        # The counter is already past a partly used block
+        blocks = self.state.counter - self.initial_counter
+        return blocks * BLOCK_SIZE - (BLOCK_SIZE - self.state.used)
+    
+    def decrypt_range(self, buf, Py_ssize_t offset, Py_ssize_t length):
+        """
+        Decrypt buf[offset:offset + length], where buf holds the stream from
+        byte 0 (e.g. an mmap of an encrypted file). Works on a copy of the
+        state, so the object's own position does not move.
+        """
+        cdef uint64_t call_start = stats_start(), kernel_start, kernel_end
+        cdef AESNI_CTR_State local
+        cdef Py_buffer in_buf
+        cdef uint8_t *dst
+        cdef int result
+        
+        if not self.initialized:
+            raise RuntimeError("AES-CTR not initialized")
+        PyObject_GetBuffer(buf, &in_buf, PyBUF_SIMPLE)
+        try:
+            if offset < 0 or length < 0 or offset > in_buf.len - length:
+                raise ValueError("Range is outside the buffer")
+            out_data = PyBytes_FromStringAndSize(NULL, length)
+            dst = <uint8_t*>PyBytes_AS_STRING(out_data)
+            # Round keys never change after init, so the copy is safe even
+            # while another thread runs the object's own kernel
+            local = self.state[0]
+            if length >= GIL_RELEASE_THRESHOLD:
+                with nogil:
+                    kernel_start = stats_kernel_start(call_start)
+                    result = ctr_seek(&local, self.initial_counter, <uint64_t>offset)
+                    if result == 0:
+                        result = ctr_stream_process(&local, <uint8_t*>in_buf.buf + offset, dst, length,
+                                                    self.nthreads)
+                    kernel_end = stats_stop(kernel_start)
+            else:
+                kernel_start = stats_kernel_start(call_start)
+                result = ctr_seek(&local, self.initial_counter, <uint64_t>offset)
+                if result == 0:
+                    result = ctr_stream_process(&local, <uint8_t*>in_buf.buf + offset, dst, length, 1)
+                kernel_end = stats_stop(kernel_start)
+            secure_zero(&local, sizeof(local))
+        finally:
+            PyBuffer_Release(&in_buf)
+        
+        if result != 0:
+            raise RuntimeError("AES-CTR processing failed")
+        stats_record(STATS_CTR, length, call_start, kernel_start, kernel_end)
+        return out_data
+    
     def __dealloc__(self):
         if self.initialized and self.state:
             aesni_ctr_cleanup(self.state)
 
+# Shared layout of the ECB/CBC/CFB/OFB classes
+cdef class _BlockMode:
+    cdef AESNI_Block_State *state
+    cdef int mode
+    
+    cdef _setup(self, int mode, key, iv, int segment_size, schedule):
+        cdef Py_buffer key_buf, iv_buf, schedule_buf
+        cdef AESNI_Block_State *state
+        cdef int result
+        
+        if segment_size == 0:
+            segment_size = 1  # pyaes treats 0 as 1
+        if segment_size < 1 or segment_size > BLOCK_SIZE:
+            raise ValueError("segment_size must be between 1 and 16 bytes")
+        
+        state = <AESNI_Block_State*>malloc(sizeof(AESNI_Block_State))
+        if not state:
+            raise MemoryError()
+        
+        memset(state.iv, 0, BLOCK_SIZE)
+        if iv is not None:
+            PyObject_GetBuffer(iv, &iv_buf, PyBUF_SIMPLE)
+            if iv_buf.len != BLOCK_SIZE:
+                PyBuffer_Release(&iv_buf)
+                free(state)
+                raise ValueError("initialization vector must be 16 bytes")
+            memcpy(state.iv, iv_buf.buf, BLOCK_SIZE)
+            PyBuffer_Release(&iv_buf)
+        state.used = BLOCK_SIZE
+        state.segment_size = segment_size
+        
+        PyObject_GetBuffer(key, &key_buf, PyBUF_SIMPLE)
+        if schedule is None:
+            result = aes_state_init(&state.aes_state, <uint8_t*>key_buf.buf, key_buf.len, NULL, 0)
+        else:
+            PyObject_GetBuffer(schedule, &schedule_buf, PyBUF_SIMPLE)
+            result = aes_state_init(&state.aes_state, NULL, key_buf.len,
+                                    <uint8_t*>schedule_buf.buf, schedule_buf.len)
+            PyBuffer_Release(&schedule_buf)
+        PyBuffer_Release(&key_buf)
+        
+        if result != 0:
+            free(state)
+            raise ValueError("Failed to initialize AES")
+        
+        self._cleanup()
+        self.state = state
+        self.mode = mode
+    
+    cdef _cleanup(self):
+        if self.state:
+            secure_zero(self.state, sizeof(AESNI_Block_State))
+            free(self.state)
+            self.state = NULL
+    
+    cdef _run(self, data, bint decrypt):
+        cdef uint64_t call_start = stats_start(), kernel_start, kernel_end
+        cdef Py_buffer in_buf
+        cdef size_t n
+        
+        if not self.state:
+            raise RuntimeError("AES not initialized")
+        
+        PyObject_GetBuffer(data, &in_buf, PyBUF_SIMPLE)
+        try:
+            n = in_buf.len
+            if (self.mode == MODE_ECB or self.mode == MODE_CBC) and n % BLOCK_SIZE != 0:
+                raise ValueError("data must be a multiple of 16 bytes")
+            if self.mode == MODE_CFB and n % self.state.segment_size != 0:
+                raise ValueError("data must be a multiple of segment_size")
+            
+            out_data = PyBytes_FromStringAndSize(NULL, n)
+            kernel_start = stats_kernel_start(call_start)
+            block_mode_process(self.state, self.mode, <const uint8_t*>in_buf.buf,
+                               <uint8_t*>PyBytes_AsString(out_data), n, decrypt)
+            kernel_end = stats_stop(kernel_start)
+        finally:
+            PyBuffer_Release(&in_buf)
+        stats_record(STATS_ECB + self.mode, n, call_start, kernel_start, kernel_end)
+        
+        return out_data
+    
+    def encrypt(self, data):
+        return self._run(data, False)
+    
+    def decrypt(self, data):
+        return self._run(data, True)
+    
+    def __dealloc__(self):
+        self._cleanup()
+
+cdef class AESModeOfOperationECB(_BlockMode):
+    """AES-ECB over any multiple of 16 bytes, using the multi-block kernel"""
+    
+    def __init__(self, key, *, schedule=None):
+        self._setup(MODE_ECB, key, None, 1, schedule)
+
+cdef class AESModeOfOperationCBC(_BlockMode):
+    """AES-CBC; decryption runs whole chunks through the multi-block kernel"""
+    
+    def __init__(self, key, iv=None, *, schedule=None):
+        self._setup(MODE_CBC, key, iv, 1, schedule)
+
+cdef class AESModeOfOperationCFB(_BlockMode):
+    """AES-CFB with pyaes semantics (segment_size in bytes)"""
+    
+    def __init__(self, key, iv=None, segment_size=1, *, schedule=None):
+        self._setup(MODE_CFB, key, iv, segment_size, schedule)
+    
+    @property
+    def segment_bytes(self):
+        return self.state.segment_size if self.state else None
+
+cdef class AESModeOfOperationOFB(_BlockMode):
+    """AES-OFB stream mode; the keystream carries over between calls"""
+    
+    def __init__(self, key, iv=None, *, schedule=None):
+        self._setup(MODE_OFB, key, iv, 1, schedule)
+
 # Counter class for compatibility with pyaes
 cdef class Counter:
     cdef public uint64_t initial_value
@@ -3,28 +3,58 @@
 Setup script for Cython AESNI CTR implementation.
 """
 
+import os
+import shutil
+import tempfile
+
 from setuptools import setup, Extension
+from setuptools._distutils.ccompiler import new_compiler
+from setuptools._distutils.errors import CompileError, LinkError
+from setuptools._distutils.sysconfig import customize_compiler
 from Cython.Build import cythonize
-import numpy as np
+
+
+def openmp_flags():
+    """-fopenmp if the compiler can build and link an OpenMP program, else []
+
+    CYTHON_AESNI_OPENMP=0 forces a build without OpenMP.
+    """
+    if os.environ.get("CYTHON_AESNI_OPENMP", "1") == "0":
+        return []
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    tmp = tempfile.mkdtemp()
+    try:
+        source = os.path.join(tmp, "check_openmp.c")
+        with open(source, "w") as f:
+            f.write("#include <omp.h>\nint main(void) { return omp_get_max_threads() > 0 ? 0 : 1; }\n")
+        objects = compiler.compile([source], output_dir=tmp, extra_postargs=["-fopenmp"])
+        compiler.link_executable(objects, os.path.join(tmp, "check_openmp"), extra_postargs=["-fopenmp"])
+    except (CompileError, LinkError):
+        print("OpenMP not available: AESModeOfOperationCTR threads > 1 will run serially")
+        return []
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return ["-fopenmp"]
+
+
+OPENMP_FLAGS = openmp_flags()
 
 # Define the Cython extension with optimizations
 extensions = [
     Extension(
         "cython_aesni",
         ["cython_aesni.pyx"],
-        include_dirs=[np.get_include()],
+        # No -march=native: only the AES-NI intrinsics need -maes (the
+        # compiler never emits AES instructions on its own), the VAES kernel
+        # carries a target attribute, and the kernel is picked by CPUID at
+        # import, so one build also runs on CPUs without AES-NI.
         extra_compile_args=[
-            "-march=native",  # Enable all CPU features
-            "-maes",          # Enable AES-NI
-            "-msse4.2",       # Enable SSE4.2
+            "-maes",          # Enable AES-NI intrinsics
             "-O3",            # High optimization
             "-fomit-frame-pointer",  # Optimize for speed
-        ],
-        extra_link_args=[
-            "-march=native",
-            "-maes",
-            "-msse4.2",
-        ],
+        ] + OPENMP_FLAGS,   # prange in the threaded CTR path
+        extra_link_args=OPENMP_FLAGS,
     )
 ]
 
@@ -3,8 +3,15 @@
 Validation script to compare Cython AESNI CTR implementation with pyaes.
 """
 
+import os
+import random
+import threading
 import pyaes
-from cython_aesni_wrapper import AESModeOfOperationCTR, Counter
+from cython_aesni_wrapper import (AESModeOfOperationCTR, AESModeOfOperationECB, AESModeOfOperationCBC,
+                                  AESModeOfOperationCFB, AESModeOfOperationOFB, Counter,
+                                  active_kernel, available_kernels, enable_stats, openmp_enabled,
+                                  process_many, reset_stats, set_kernel, stats, xor_into)
+from keystream_prefetch import KeystreamPrefetcher
 
 # Test data
 CLEARTEXT = b"This is a test. What could possibly go wrong? " * 500  # 23,000 bytes
@@ -96,6 +103,279 @@ def compare_results():
         
         return False
 
+def _pyaes_blocks(mode, data):
+    """pyaes ECB/CBC take one block per call"""
+    return b"".join(mode.encrypt(data[i:i + 16]) for i in range(0, len(data), 16))
+
+def compare_modes():
+    """Compare ECB, CBC, CFB and OFB with pyaes, across calls split at odd points"""
+    iv = bytes(range(16))
+    data = CLEARTEXT[:16 * 300]
+    for key in (KEY, KEY + KEY[:8], KEY + KEY):
+        cases = [
+            ("ECB", _pyaes_blocks(pyaes.AESModeOfOperationECB(key), data),
+             lambda: AESModeOfOperationECB(key), 16),
+            ("CBC", _pyaes_blocks(pyaes.AESModeOfOperationCBC(key, iv), data),
+             lambda: AESModeOfOperationCBC(key, iv), 16),
+            ("OFB", pyaes.AESModeOfOperationOFB(key, iv).encrypt(data),
+             lambda: AESModeOfOperationOFB(key, iv), 1),
+        ]
+        for segment_size in (1, 5, 16):
+            length = len(data) // segment_size * segment_size
+            cases.append((f"CFB{segment_size}",
+                          pyaes.AESModeOfOperationCFB(key, iv, segment_size).encrypt(data[:length]),
+                          lambda s=segment_size: AESModeOfOperationCFB(key, iv, s), segment_size))
+        for name, expected, make, unit in cases:
+            split = unit * 37
+            plain = data[:len(expected)]
+            enc, dec = make(), make()
+            if enc.encrypt(plain[:split]) + enc.encrypt(plain[split:]) != expected:
+                print(f"✗ {name} encryption differs from pyaes ({len(key) * 8}-bit key)")
+                return False
+            if dec.decrypt(expected[:split]) + dec.decrypt(expected[split:]) != plain:
+                print(f"✗ {name} decryption differs from pyaes ({len(key) * 8}-bit key)")
+                return False
+    print("✓ ECB, CBC, CFB and OFB match pyaes for 128/192/256-bit keys")
+    return True
+
+def compare_streaming():
+    """Chunked encryption must match one-shot pyaes, whatever the chunk sizes"""
+    data = CLEARTEXT * 20
+    expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=0)).encrypt(data)
+    rng = random.Random(8)
+    for trial in range(20):
+        aes = AESModeOfOperationCTR(KEY, Counter(initial_value=0))
+        chunks, offset = [], 0
+        while offset < len(data):
+            size = rng.choice((1, 7, 15, 16, 17, 100, 4096, 20000, 70001))
+            chunks.append(aes.encrypt(data[offset:offset + size]))
+            offset += size
+        if b"".join(chunks) != expected:
+            print(f"✗ Streaming CTR differs from pyaes (trial {trial})")
+            return False
+    print("✓ Streaming CTR matches pyaes for random chunk sizes")
+    return True
+
+def compare_threads():
+    """threads > 1 must give the output and counter of a single thread"""
+    slice_size = 256 * 1024
+    data = os.urandom(4 * slice_size + 23)
+    expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=5)).encrypt(data)
+    for threads in (2, 3, 4, 7):
+        aes = AESModeOfOperationCTR(KEY, Counter(initial_value=5), threads=threads)
+        # A 5-byte head leaves keystream over, so the slices start mid-block
+        out = aes.encrypt(data[:5]) + aes.encrypt(data[5:slice_size * 3]) + aes.encrypt(data[slice_size * 3:])
+        if out != expected:
+            print(f"✗ CTR with threads={threads} differs from pyaes")
+            return False
+        if aes.encrypt(b"\0" * 16) != AESModeOfOperationCTR(KEY, Counter(initial_value=5)).encrypt(
+                b"\0" * (len(data) + 16))[-16:]:
+            print(f"✗ CTR with threads={threads} left the counter in the wrong place")
+            return False
+    for bad in (0, 257):
+        try:
+            AESModeOfOperationCTR(KEY, threads=bad)
+        except ValueError:
+            continue
+        print(f"✗ threads={bad} was accepted")
+        return False
+    mode = "OpenMP" if openmp_enabled() else "serial, built without OpenMP"
+    print(f"✓ Threaded CTR matches pyaes for 2-7 threads ({mode})")
+    return True
+
+def compare_seek():
+    """seek() and decrypt_range() must match the same bytes of a one-shot pyaes stream"""
+    rng = random.Random(21)
+    data = os.urandom(600 * 1024 + 5)
+    ciphertext = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=5)).encrypt(data)
+    ranges = [(0, 0), (0, 16), (3, 1), (15, 2), (16, 100), (17, 40000), (len(data) - 1, 1),
+              (123457, 300 * 1024)]
+    ranges += [(rng.randrange(len(data)), rng.randrange(5000)) for _ in range(50)]
+    for threads in (1, 2):
+        aes = AESModeOfOperationCTR(KEY, Counter(initial_value=5), threads=threads)
+        for offset, length in ranges:
+            length = min(length, len(data) - offset)
+            if aes.decrypt_range(ciphertext, offset, length) != data[offset:offset + length]:
+                print(f"✗ decrypt_range({offset}, {length}) differs from pyaes")
+                return False
+            aes.seek(offset)
+            if aes.tell() != offset:
+                print(f"✗ tell() is {aes.tell()} after seek({offset})")
+                return False
+            # Continue from the seek point in two uneven pieces
+            half = length // 3
+            out = aes.decrypt(ciphertext[offset:offset + half]) + aes.decrypt(ciphertext[offset + half:offset + length])
+            if out != data[offset:offset + length] or aes.tell() != offset + length:
+                print(f"✗ seek({offset}) then decrypt differs from pyaes")
+                return False
+    # decrypt_range leaves the stream position alone
+    aes = AESModeOfOperationCTR(KEY, Counter(initial_value=5))
+    head = aes.decrypt(ciphertext[:7])
+    aes.decrypt_range(memoryview(ciphertext), 1000, 50)
+    if head + aes.decrypt(ciphertext[7:100]) != data[:100]:
+        print("✗ decrypt_range moved the stream position")
+        return False
+    for offset, length in ((-1, 1), (0, len(data) + 1), (len(data), 1), (5, -1)):
+        try:
+            aes.decrypt_range(ciphertext, offset, length)
+        except ValueError:
+            continue
+        print(f"✗ decrypt_range accepted offset={offset} length={length}")
+        return False
+    print(f"✓ seek() and decrypt_range() match pyaes at {len(ranges)} offsets (1 and 2 threads)")
+    return True
+
+def compare_process_many():
+    """Batched multi-key CTR must match one pyaes cipher per message"""
+    rng = random.Random(9)
+    keys = [os.urandom(rng.choice((16, 24, 32))) for _ in range(300)]
+    counters = [rng.randrange(1 << 20) for _ in keys]
+    inputs = [CLEARTEXT[:rng.choice((0, 1, 15, 16, 17, 64, 100, 2048, 3000))] for _ in keys]
+    inputs[1] = bytearray(inputs[1])  # any bytes-like object is accepted
+    out, offsets = process_many(keys, counters, inputs)
+    for i, (key, counter, data) in enumerate(zip(keys, counters, inputs)):
+        expected = pyaes.AESModeOfOperationCTR(key, pyaes.Counter(initial_value=counter)).encrypt(bytes(data))
+        if out[offsets[i]:offsets[i + 1]] != expected:
+            print(f"✗ process_many differs from pyaes for message {i}")
+            return False
+    print(f"✓ process_many matches pyaes for {len(keys)} messages")
+    return True
+
+def compare_prefetcher():
+    """Prefetched keystream must give the pyaes stream, whether calls hit or miss"""
+    data = os.urandom(300 * 1024 + 7)
+    expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=3)).encrypt(data)
+    rng = random.Random(23)
+    for wait in (False, True):
+        with KeystreamPrefetcher(AESModeOfOperationCTR(KEY, Counter(initial_value=3)), xor_into,
+                                 capacity=64 * 1024 + 5, batch=5000) as aes:
+            chunks, offset = [], 0
+            while offset < len(data):
+                if wait:
+                    aes.wait_ready()
+                size = rng.choice((1, 15, 16, 17, 1000, 4096, 40000, 100000))
+                chunks.append(aes.encrypt(data[offset:offset + size]))
+                offset += size
+            current = aes.stats
+        if b"".join(chunks) != expected:
+            print(f"✗ Prefetched CTR differs from pyaes (wait_ready={wait})")
+            return False
+        if current["hit_bytes"] + current["miss_bytes"] != len(data) or (wait and not current["hits"]):
+            print(f"✗ Prefetcher stats are inconsistent: {current}")
+            return False
+    for options in ({"capacity": 0}, {"low_watermark": 10, "high_watermark": 5}, {"batch": 0}):
+        try:
+            KeystreamPrefetcher(AESModeOfOperationCTR(KEY), xor_into, **options)
+        except ValueError:
+            continue
+        print(f"✗ KeystreamPrefetcher accepted {options}")
+        return False
+    try:
+        xor_into(b"abc", b"ab", bytearray(3))
+    except ValueError:
+        pass
+    else:
+        print("✗ xor_into accepted a short keystream")
+        return False
+    print(f"✓ Prefetched keystream matches pyaes ({current['hits']} hits, {current['misses']} misses)")
+    return True
+
+def check_stats():
+    """Telemetry must count every call, byte and size bucket, and stay off when disabled"""
+    sample_every = stats()["sample_every"]
+    previous = enable_stats(True, sample_every=1)  # time every call
+    reset_stats()
+    try:
+        aes = AESModeOfOperationCTR(KEY, Counter(0))
+        sizes = [0, 1, 16, 1000, 64 * 1024]
+        for size in sizes:
+            aes.encrypt(b"\0" * size)
+        AESModeOfOperationCBC(KEY).encrypt(b"\0" * 64)
+        process_many([KEY, KEY], None, [b"a", b"bc"])
+        current = stats()
+        ctr = current["ctr"]
+        if (ctr["calls"] != len(sizes) or ctr["bytes"] != sum(sizes)
+                or ctr["size_histogram"] != {0: 1, 1: 1, 16: 1, 512: 1, 65536: 1}):
+            print(f"✗ CTR telemetry mismatch: {ctr}")
+            return False
+        if current["cbc"]["calls"] != 1 or current["batch"]["bytes"] != 3:
+            print(f"✗ Block/batch telemetry mismatch: {current['cbc']}, {current['batch']}")
+            return False
+        if (ctr["timed_calls"] != ctr["calls"] or not 0 < ctr["kernel_cycles"] <= ctr["call_cycles"]
+                or current["tsc_hz"] <= 0):
+            print(f"✗ Telemetry cycle counts are inconsistent: {ctr}")
+            return False
+
+        enable_stats(False)
+        aes.encrypt(CLEARTEXT)
+        if stats()["ctr"]["calls"] != ctr["calls"]:
+            print("✗ Telemetry counted a call while disabled")
+            return False
+    finally:
+        enable_stats(previous, sample_every=sample_every)
+        reset_stats()
+    print(f"✓ Telemetry counts calls, bytes and sizes ({ctr['cycles_per_byte']:.2f} cycles/byte)")
+    return True
+
+def check_reinit():
+    """CTR __init__ must keep the old state on failure and refuse to run during a call"""
+    expected = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=0)).encrypt(CLEARTEXT)
+    aes = AESModeOfOperationCTR(KEY)
+    try:
+        aes.__init__(KEY[:15])
+    except ValueError:
+        pass
+    else:
+        print("✗ CTR __init__ accepted a 15-byte key")
+        return False
+    if aes.encrypt(CLEARTEXT) != expected:
+        print("✗ CTR differs from pyaes after a failed __init__")
+        return False
+    for _ in range(1000):
+        aes.__init__(KEY + KEY, Counter(5))
+    aes.__init__(KEY)
+    if aes.encrypt(CLEARTEXT) != expected:
+        print("✗ CTR differs from pyaes after repeated __init__")
+        return False
+
+    data = bytes(64 * 1024 * 1024)
+    result = []
+    worker = threading.Thread(target=lambda: result.append(aes.encrypt(data)))
+    aes.__init__(KEY)
+    worker.start()
+    refused = False
+    while worker.is_alive() and not refused:
+        try:
+            # Same key and counter, so a call that wins the race is unaffected
+            aes.__init__(KEY)
+        except RuntimeError:
+            refused = True
+    worker.join()
+    if not refused or result != [AESModeOfOperationCTR(KEY).encrypt(data)]:
+        print(f"✗ CTR __init__ during a running call (refused: {refused})")
+        return False
+    print("✓ CTR __init__ keeps its state on failure and is refused during a call")
+    return True
+
+def compare_kernels():
+    """Compare every kernel this CPU supports against pyaes"""
+    print(f"\nActive kernel: {active_kernel()}")
+    best = active_kernel()
+    ok = True
+    try:
+        for kernel in available_kernels():
+            set_kernel(kernel)
+            print(f"Kernel: {kernel}")
+            ok = compare_results() and ok
+            ok = compare_streaming() and ok
+            ok = compare_threads() and ok
+            ok = compare_seek() and ok
+            ok = compare_process_many() and ok
+            ok = compare_modes() and ok
+    finally:
+        set_kernel(best)
+    return ok
+
 def main():
     """Main validation function"""
     print("=" * 40)
@@ -108,7 +388,8 @@ def main():
         return
     
     # Compare results
-    if compare_results():
+    if (compare_results() and compare_kernels() and compare_prefetcher() and check_stats()
+            and check_reinit()):
         print("\n🎉 All tests passed! Cython AESNI CTR implementation is correct.")
     else:
         print("\n❌ Validation failed! Results don't match pyaes.")
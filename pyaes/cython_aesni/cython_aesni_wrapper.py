@@ -4,7 +4,80 @@ Python wrapper for Cython AESNI CTR implementation.
 Provides the same interface as pyaes and other implementations.
 """
 
-from cython_aesni import AESModeOfOperationCTR, Counter
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+import cython_aesni
+from cython_aesni import (
+    Counter,
+    active_kernel,
+    available_kernels,
+    enable_stats,
+    expand_key,
+    openmp_enabled,
+    process_many,
+    reset_stats,
+    set_kernel,
+    stats,
+    xor_into,
+)
+from round_key_cache import get_cache
+
+
+def _init(init, key, *args):
+    """init(key, *args), with round keys from the cache on the portable kernel
+
+    The AES-NI and VAES kernels expand a key (~2 us) about as fast as a
+    cache hit costs, so only the portable kernel (~11 us) uses the cache.
+    The extension copies the round keys; the cached copy is wiped.
+    """
+    if active_kernel() != "portable":
+        return init(key, *args)
+    return get_cache().construct("cython_aesni", key, expand_key, init, *args)
+
+
+class AESModeOfOperationCTR(cython_aesni.AESModeOfOperationCTR):
+    """AES-CTR whose round keys come from the shared round-key cache
+    on the portable kernel"""
+
+    def __init__(self, key, counter=None, threads=1):
+        _init(super().__init__, key, counter, threads)
+
+
+class AESModeOfOperationECB(cython_aesni.AESModeOfOperationECB):
+    """AES-ECB whose round keys come from the shared round-key cache
+    on the portable kernel"""
+
+    def __init__(self, key):
+        _init(super().__init__, key)
+
+
+class AESModeOfOperationCBC(cython_aesni.AESModeOfOperationCBC):
+    """AES-CBC whose round keys come from the shared round-key cache
+    on the portable kernel"""
+
+    def __init__(self, key, iv=None):
+        _init(super().__init__, key, iv)
+
+
+class AESModeOfOperationCFB(cython_aesni.AESModeOfOperationCFB):
+    """AES-CFB whose round keys come from the shared round-key cache
+    on the portable kernel"""
+
+    def __init__(self, key, iv=None, segment_size=1):
+        _init(super().__init__, key, iv, segment_size)
+
+
+class AESModeOfOperationOFB(cython_aesni.AESModeOfOperationOFB):
+    """AES-OFB whose round keys come from the shared round-key cache
+    on the portable kernel"""
+
+    def __init__(self, key, iv=None):
+        _init(super().__init__, key, iv)
+
 
 # Re-export the classes for easy import
-__all__ = ['AESModeOfOperationCTR', 'Counter']
+__all__ = ['AESModeOfOperationCTR', 'AESModeOfOperationECB', 'AESModeOfOperationCBC',
+           'AESModeOfOperationCFB', 'AESModeOfOperationOFB', 'Counter', 'expand_key', 'process_many',
+           'active_kernel', 'available_kernels', 'set_kernel', 'openmp_enabled',
+           'enable_stats', 'stats', 'reset_stats', 'xor_into']
@@ -0,0 +1,58 @@
+"""
+fastaes: a pyaes-compatible front end over every AES backend in this repo.
+
+    import fastaes as pyaes
+
+    aes = pyaes.AESModeOfOperationCTR(key, pyaes.Counter(initial_value=5))
+    ciphertext = aes.encrypt(plaintext)
+
+On import, fastaes finds out which backends are installed or built:
+c_aesni, cython_aesni, pycryptodome, numpy_numba, numpy_vectorized, and
+the original pyaes. The first CTR call loads the calibration of these
+backends from disk. If no calibration is cached yet, the backends are
+measured once at a few payload sizes, which takes a few seconds. Each CTR
+call then runs on the fastest backend for its message size. Small
+messages favour low per-call overhead, bulk data favours the widest
+kernel.
+
+See router.py for FASTAES_BACKEND and calibration.py for the cache location.
+"""
+
+from .backends import available_backends
+from .calibration import cache_path
+from .modes import (
+    AESModeOfOperationCBC,
+    AESModeOfOperationCFB,
+    AESModeOfOperationCTR,
+    AESModeOfOperationECB,
+    AESModeOfOperationOFB,
+    AESModesOfOperation,
+    Counter,
+    block_mode_backend,
+)
+from .router import get_router
+
+VERSION = [1, 0, 0]
+
+
+def backend_for(nbytes, counter=1):
+    """Name of the backend a CTR call of nbytes starting at counter would use"""
+    return get_router().pick(nbytes, counter + (nbytes + 15) // 16).name
+
+
+def routing_table():
+    """[(calibrated size, [backend names, fastest first])]"""
+    return get_router().table()
+
+
+def recalibrate():
+    """Measure the backends again and replace the cached calibration"""
+    return get_router(recalibrate=True).table()
+
+
+__all__ = [
+    "AESModeOfOperationCBC", "AESModeOfOperationCFB", "AESModeOfOperationCTR",
+    "AESModeOfOperationECB", "AESModeOfOperationOFB", "AESModesOfOperation",
+    "Counter", "available_backends", "backend_for", "block_mode_backend",
+    "cache_path", "recalibrate", "routing_table",
+]
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+The AES-CTR backends behind fastaes, adapted to one interface.
+
+Every backend's stream(key, counter) returns an object whose encrypt(data)
+continues one CTR keystream across calls. Here counter is the 128-bit value
+of the first counter block. The backends disagree on counter width.
+c_aesni, cython_aesni and numpy_vectorized keep the high 64 bits at zero.
+The Numba kernels take a signed 64-bit start. pycryptodome, pyaes_ttable and pyaes
+count with all 128 bits. max_counter records how far each one can be trusted, so
+that the router only offers counters a backend handles exactly like pyaes.
+
+Backends are imported only when first used. Probing for one only checks
+that its module can be found, so importing fastaes does not pay for Numba
+or for extensions it will never route to.
+"""
+
+import abc
+import importlib.util
+import sys, pathlib
+
+PYAES_DIR = pathlib.Path(__file__).parent.parent.resolve()
+
+
+def _add_path(subdir):
+    path = str(PYAES_DIR / subdir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class _FunctionStream:
+    """CTR stream over a stateless f(key, data, counter) function"""
+
+    def __init__(self, func, key, counter):
+        self.func = func
+        self.key = key
+        self.counter = counter
+        self.offset = 0
+
+    def encrypt(self, data):
+        skip = self.offset % 16
+        counter = self.counter + self.offset // 16
+        self.offset += len(data)
+        if not skip:
+            return self.func(self.key, data, counter)
+        # Resume mid-block: run the partial block's leading bytes too
+        return self.func(self.key, bytes(skip) + bytes(data), counter)[skip:]
+
+
+class Backend(abc.ABC):
+    """One AES-CTR implementation: how to find it and how to start a stream"""
+
+    # Importable module that tells whether the backend is installed/built
+    probe_module = None
+    probe_path = None
+    # First counter value that is NOT handled like pyaes's 128-bit counter
+    max_counter = 1 << 128
+
+    def __init__(self):
+        self._open = None
+
+    def available(self):
+        if self.probe_path:
+            _add_path(self.probe_path)
+        try:
+            spec = importlib.util.find_spec(self.probe_module)
+        except (ImportError, ValueError):
+            return False
+        # A bare directory (e.g. an unbuilt c_aesni/) is a namespace package
+        return spec is not None and spec.origin is not None
+
+    def stream(self, key, counter):
+        """Start a CTR keystream whose first block is counter"""
+        if self._open is None:
+            if self.probe_path:
+                _add_path(self.probe_path)
+            self._open = self.load()
+        return self._open(key, counter)
+
+    @abc.abstractmethod
+    def load(self):
+        """Import the backend; return a (key, counter) -> stream callable"""
+
+
+class CAesniBackend(Backend):
+    name = "c_aesni"
+    probe_module = "c_aesni"
+    probe_path = "c_aesni"
+    max_counter = 1 << 64
+
+    def load(self):
+        from c_aesni_wrapper import AESModeOfOperationCTR
+        # The extension object itself takes any bytes-like input
+        return lambda key, counter: AESModeOfOperationCTR(key, counter).ctr_state
+
+
+class CythonAesniBackend(Backend):
+    name = "cython_aesni"
+    probe_module = "cython_aesni"
+    probe_path = "cython_aesni"
+    max_counter = 1 << 64
+
+    def load(self):
+        from cython_aesni_wrapper import AESModeOfOperationCTR, Counter
+        return lambda key, counter: AESModeOfOperationCTR(key, Counter(counter))
+
+
+class PycryptodomeBackend(Backend):
+    name = "pycryptodome"
+    probe_module = "Crypto"
+
+    def load(self):
+        from Crypto.Cipher import AES
+        # Empty nonce: the whole 16-byte block is the counter, as in pyaes
+        return lambda key, counter: AES.new(key, AES.MODE_CTR, nonce=b"", initial_value=counter)
+
+
+class NumbaBackend(Backend):
+    name = "numpy_numba"
+    probe_module = "numba"
+    probe_path = "numpy_numba"
+    max_counter = 1 << 63  # the kernel's start counter is an int64
+
+    def load(self):
+        from numpy_numba_ttable import AESModeOfOperationCTR
+        return AESModeOfOperationCTR
+
+
+class NumpyVectorizedBackend(Backend):
+    name = "numpy_vectorized"
+    probe_module = "numpy"
+    probe_path = "numpy_vectorized"
+    max_counter = 1 << 64
+
+    def load(self):
+        from numpy_vectorized import aes_ctr_numpy
+        return lambda key, counter: _FunctionStream(aes_ctr_numpy, key, counter)
+
+
+class PyaesTtableBackend(Backend):
+    name = "pyaes_ttable"
+    probe_module = "pyaes_ttable"
+    probe_path = "original"
+    max_counter = float("inf")  # 128-bit counter that wraps like pyaes
+
+    def load(self):
+        from pyaes_ttable import AESModeOfOperationCTR, Counter
+        return lambda key, counter: AESModeOfOperationCTR(key, Counter(counter))
+
+
+class PyaesBackend(Backend):
+    name = "original"
+    probe_module = "pyaes"
+    max_counter = float("inf")  # the reference: wraps at 2**128 by definition
+
+    def load(self):
+        import pyaes
+        return lambda key, counter: pyaes.AESModeOfOperationCTR(key, pyaes.Counter(counter))
+
+
+# In order of preference when two backends tie or nothing was measured
+ALL_BACKENDS = (
+    CAesniBackend(),
+    CythonAesniBackend(),
+    PycryptodomeBackend(),
+    NumbaBackend(),
+    NumpyVectorizedBackend(),
+    PyaesTtableBackend(),
+    PyaesBackend(),
+)
+
+BACKENDS_BY_NAME = {backend.name: backend for backend in ALL_BACKENDS}
+
+
+def available_backends():
+    """Names of the backends that can be imported here"""
+    return [backend.name for backend in ALL_BACKENDS if backend.available()]
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+One-off calibration of the fastaes backends, cached on disk.
+
+Each available backend is timed with a fresh stream at every size in
+CALIBRATION_SIZES. That is the cost of a cipher object plus one encrypt
+call. The resulting ranking per size is written to a JSON file and reused
+by every later import. The file name holds a fingerprint of the machine,
+the Python version and the set of available backends. Building an
+extension, or moving to another host, therefore triggers a new
+calibration. Slow backends are not timed at sizes where extrapolation
+already shows they would lose by a wide margin.
+
+The cache directory is $FASTAES_CACHE_DIR, else $XDG_CACHE_HOME/fastaes,
+else ~/.cache/fastaes.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from .backends import BACKENDS_BY_NAME
+
+CALIBRATION_VERSION = 1
+CALIBRATION_SIZES = (64, 1024, 16 * 1024, 256 * 1024, 4 * 1024 * 1024)
+CALIBRATION_KEY = bytes(range(16))
+
+# Timing budget per backend and size, and the slowest single call worth timing
+TIME_BUDGET = 0.05
+MAX_CALL_TIME = 0.05
+
+
+def cache_dir():
+    if os.environ.get("FASTAES_CACHE_DIR"):
+        return os.environ["FASTAES_CACHE_DIR"]
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "fastaes")
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def fingerprint(names):
+    ident = [CALIBRATION_VERSION, sys.version, platform.machine(), _cpu_model(), os.cpu_count(),
+             sorted(names), list(CALIBRATION_SIZES)]
+    return hashlib.sha1(json.dumps(ident).encode()).hexdigest()[:16]
+
+
+def cache_path(names):
+    return os.path.join(cache_dir(), f"calibration-{fingerprint(names)}.json")
+
+
+def _time_call(backend, data):
+    t0 = time.perf_counter()
+    backend.stream(CALIBRATION_KEY, 1).encrypt(data)
+    return time.perf_counter() - t0
+
+
+def measure(backend, size):
+    """Best seconds per (new stream + encrypt) call on size bytes"""
+    data = bytes(size)
+    first = _time_call(backend, data)  # also JIT compile / import
+    if first > MAX_CALL_TIME:
+        return _time_call(backend, data)
+    best = float("inf")
+    loops = max(1, min(1000, int(TIME_BUDGET / 5 / max(first, 1e-7))))
+    for _ in range(5):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            backend.stream(CALIBRATION_KEY, 1).encrypt(data)
+        best = min(best, (time.perf_counter() - t0) / loops)
+    return best
+
+
+def calibrate(names):
+    """Time every backend in names; returns {"sizes", "timings"} (None = skipped)"""
+    timings = {name: [] for name in names}
+    for i, size in enumerate(CALIBRATION_SIZES):
+        # Linear extrapolation from the previous size (None: already dropped)
+        estimates = {}
+        for name in names:
+            if i == 0:
+                estimates[name] = 0.0
+            elif timings[name][-1] is None:
+                estimates[name] = None
+            else:
+                estimates[name] = timings[name][-1] * size / CALIBRATION_SIZES[i - 1]
+        best_estimate = min((e for e in estimates.values() if e is not None), default=0.0)
+        for name in names:
+            estimate = estimates[name]
+            # Skip what was already dropped, or would lose by 100x at a slow size
+            if estimate is None or (estimate > MAX_CALL_TIME and estimate > 100 * best_estimate):
+                timings[name].append(None)
+            else:
+                timings[name].append(measure(BACKENDS_BY_NAME[name], size))
+    return {"version": CALIBRATION_VERSION, "sizes": list(CALIBRATION_SIZES), "timings": timings}
+
+
+def load_or_calibrate(names, force=False):
+    """Calibration for names from the disk cache, measuring (and saving) on a miss"""
+    path = cache_path(names)
+    if not force:
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            if result.get("version") == CALIBRATION_VERSION and sorted(result["timings"]) == sorted(names):
+                return result
+        except (OSError, ValueError, KeyError):
+            pass
+
+    result = calibrate(names)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic replace: concurrent first imports never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(result, f, indent=1)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # read-only home: calibrate again next time
+    return result
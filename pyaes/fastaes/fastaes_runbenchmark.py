@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+fastaes facade vs pinned backends across message sizes.
+
+Every call builds a cipher object and encrypts one message, as application
+code written for pyaes does. The facade should track the fastest pinned
+backend at every size, paying only its routing overhead.
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+import pyperf
+
+import fastaes
+from fastaes.router import Router
+import fastaes.router
+
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'  # 128-bit key
+SIZES = (("64B", 64), ("16K", 16 * 1024), ("4M", 4 * 1024 * 1024))
+PINNED = ("c_aesni", "cython_aesni", "pycryptodome")
+
+
+def make_bench(size, pinned=None):
+    def bench_fastaes(loops):
+        data = bytes(size)
+        fastaes.router._router = Router.single(pinned, ["original"]) if pinned else None
+        fastaes.AESModeOfOperationCTR(KEY).encrypt(data)  # calibrate / load backends
+        range_it = range(loops)
+        t0 = pyperf.perf_counter()
+
+        for _ in range_it:
+            fastaes.AESModeOfOperationCTR(KEY).encrypt(data)
+
+        return pyperf.perf_counter() - t0
+
+    return bench_fastaes
+
+
+if __name__ == "__main__":
+    runner = pyperf.Runner()
+    runner.metadata['description'] = (
+        "AES-CTR through the fastaes facade vs the facade pinned to one backend"
+    )
+    available = fastaes.available_backends()
+    for label, size in SIZES:
+        runner.bench_time_func(f"crypto_fastaes_ctr_{label}", make_bench(size))
+        for name in PINNED:
+            if name in available:
+                runner.bench_time_func(f"crypto_fastaes_ctr_{label}_{name}", make_bench(size, name))
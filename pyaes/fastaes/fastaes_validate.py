@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+import os
+import random
+import shutil
+import tempfile
+
+# Calibrate into a scratch directory, never into the user's cache
+os.environ["FASTAES_CACHE_DIR"] = tempfile.mkdtemp(prefix="fastaes-validate-")
+
+import pyaes
+import fastaes
+from fastaes.backends import BACKENDS_BY_NAME
+from fastaes.router import Router
+import fastaes.router
+
+CLEARTEXT = b"This is a test. What could possibly go wrong? " * 500  # ~23,000 bytes
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'  # 128-bit key
+
+
+def check_backends():
+    print(f"Available backends: {', '.join(fastaes.available_backends())}")
+    rng = random.Random(15)
+    for name in fastaes.available_backends():
+        backend = BACKENDS_BY_NAME[name]
+        for key_size in (16, 24, 32):
+            key = rng.randbytes(key_size)
+            for counter in (1, 0xFFFFFFFF - 2, (1 << 63) - 40):
+                if counter + 100 > backend.max_counter:
+                    continue
+                data = rng.randbytes(1000)
+                expected = pyaes.AESModeOfOperationCTR(key, pyaes.Counter(counter)).encrypt(data)
+                stream = backend.stream(key, counter)
+                got = stream.encrypt(data[:7]) + stream.encrypt(data[7:500]) + stream.encrypt(data[500:])
+                if got != expected:
+                    raise RuntimeError(f"{name} differs from pyaes (key {key_size}, counter {counter:#x})")
+    print("\u2713 Every backend stream matches pyaes")
+
+
+def check_facade():
+    table = fastaes.routing_table()
+    for size, ranking in table:
+        print(f"  {size:>8} bytes -> {ranking[0]}")
+    if not os.path.exists(fastaes.cache_path(fastaes.available_backends())):
+        raise RuntimeError("calibration was not cached on disk")
+
+    # Default counter, like pyaes
+    if fastaes.AESModeOfOperationCTR(KEY).encrypt(CLEARTEXT) != pyaes.AESModeOfOperationCTR(KEY).encrypt(CLEARTEXT):
+        raise RuntimeError("facade differs from pyaes with the default counter")
+
+    # Calls of very different sizes switch backends mid-stream
+    rng = random.Random(150)
+    sizes = [5, 3, 70000, 17, 1100 * 1024 + 3, 1, 64, 20000, 9]
+    data = rng.randbytes(sum(sizes))
+    for counter_cls in (fastaes.Counter, pyaes.Counter):
+        counter = counter_cls(initial_value=42)
+        aes = fastaes.AESModeOfOperationCTR(KEY, counter)
+        ref_counter = pyaes.Counter(initial_value=42)
+        ref = pyaes.AESModeOfOperationCTR(KEY, ref_counter)
+        used, pos = set(), 0
+        for size in sizes:
+            chunk = data[pos:pos + size]
+            pos += size
+            if aes.encrypt(chunk) != ref.encrypt(chunk):
+                raise RuntimeError(f"facade differs from pyaes after {pos} bytes")
+            used.add(aes.backend)
+            if counter.value != ref_counter.value:
+                raise RuntimeError("counter object was not advanced like pyaes")
+        print(f"\u2713 Mixed-size stream matches pyaes ({counter_cls.__module__}.Counter, "
+              f"backends: {', '.join(sorted(used))})")
+
+    # Counters past 2**64 must land on a 128-bit backend
+    counter = (1 << 64) - 3
+    aes = fastaes.AESModeOfOperationCTR(KEY, fastaes.Counter(counter))
+    if aes.encrypt(CLEARTEXT) != pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(counter)).encrypt(CLEARTEXT):
+        raise RuntimeError("facade differs from pyaes across 2**64")
+    print(f"\u2713 Counter carry past 2**64 matches pyaes ({aes.backend})")
+
+    # Custom counters are delegated to pyaes unchanged
+    class StepCounter(pyaes.Counter):
+        def increment(self):
+            for _ in range(3):
+                pyaes.Counter.increment(self)
+
+    aes = fastaes.AESModeOfOperationCTR(KEY, StepCounter(7))
+    if aes.encrypt(CLEARTEXT) != pyaes.AESModeOfOperationCTR(KEY, StepCounter(7)).encrypt(CLEARTEXT):
+        raise RuntimeError("facade differs from pyaes with a custom counter")
+    print("\u2713 Custom counter classes match pyaes")
+
+
+def check_forced_backend():
+    saved = fastaes.router._router
+    try:
+        for name in fastaes.available_backends():
+            fastaes.router._router = Router.single(name, ["original"])
+            aes = fastaes.AESModeOfOperationCTR(KEY, fastaes.Counter(3))
+            if aes.encrypt(CLEARTEXT) != pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(3)).encrypt(CLEARTEXT):
+                raise RuntimeError(f"facade pinned to {name} differs from pyaes")
+    finally:
+        fastaes.router._router = saved
+    print("\u2713 Facade pinned to each backend matches pyaes")
+
+
+def check_block_modes():
+    iv = bytes(range(16))
+    data = CLEARTEXT[:16 * 64]
+    for name, args in (("ecb", ()), ("cbc", (iv,)), ("cfb", (iv, 16)), ("ofb", (iv,))):
+        ours = fastaes.AESModesOfOperation[name](KEY, *args)
+        ref = pyaes.AESModesOfOperation[name](KEY, *args)
+        for i in range(0, len(data), 16):
+            block = data[i:i + 16]
+            if ours.encrypt(block) != ref.encrypt(block):
+                raise RuntimeError(f"{name.upper()} differs from pyaes")
+    print(f"\u2713 ECB/CBC/CFB/OFB ({fastaes.block_mode_backend}) match pyaes")
+
+
+def main():
+    print("Validating the fastaes facade against pyaes...")
+    try:
+        check_backends()
+        check_facade()
+        check_forced_backend()
+        check_block_modes()
+    finally:
+        shutil.rmtree(os.environ["FASTAES_CACHE_DIR"], ignore_errors=True)
+    print("Validation complete.")
+
+
+if __name__ == "__main__":
+    main()
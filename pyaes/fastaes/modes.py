@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+pyaes-compatible Counter and modes of operation.
+
+AESModeOfOperationCTR keeps pyaes semantics. The counter is 128 bits
+(default initial value 1), the keystream carries over between calls, and
+the Counter object advances as blocks are used. Each call goes to the
+backend the router picks for its size. The object tracks its byte offset
+in the keystream, so it can switch backends between calls: the new
+backend's stream starts at the right block and skips the used part of a
+partial block.
+
+Counters with a custom increment() cannot be mapped onto a backend, so
+those objects go straight to pyaes.
+
+ECB, CBC, CFB and OFB come from the first backend that has them: c_aesni,
+then cython_aesni, then pyaes. No calibration is involved. The native
+kernels beat pyaes at every size.
+"""
+
+from .backends import PYAES_DIR, _add_path
+from .router import get_router
+
+_COUNTER_MODULUS = 1 << 128
+
+
+class Counter:
+    """A 128-bit CTR counter, like pyaes.Counter"""
+
+    def __init__(self, initial_value=1):
+        self._int = initial_value % _COUNTER_MODULUS
+
+    @property
+    def value(self):
+        """The counter as a list of 16 byte values (big-endian), as in pyaes"""
+        return list(self._int.to_bytes(16, "big"))
+
+    def increment(self):
+        """Increment the counter (overflow rolls back to 0)"""
+        self._int = (self._int + 1) % _COUNTER_MODULUS
+
+
+def _is_pyaes_counter(counter):
+    cls = type(counter)
+    return cls.__name__ == "Counter" and cls.__module__ == "pyaes.aes"
+
+
+def _counter_int(counter):
+    """Integer value of a plain counter; None for custom counter classes"""
+    if type(counter) is Counter:
+        return counter._int
+    if _is_pyaes_counter(counter):
+        return int.from_bytes(bytes(counter.value), "big")
+    return None
+
+
+class AESModeOfOperationCTR:
+    """AES Counter Mode of Operation, dispatched per call to the fastest backend"""
+
+    name = "Counter (CTR)"
+
+    def __init__(self, key, counter=None):
+        if len(key) not in (16, 24, 32):
+            raise ValueError("Invalid key size")
+        if counter is None:
+            counter = Counter()
+
+        self._key = bytes(key)
+        self._counter = counter
+        self._start = _counter_int(counter)
+        self._offset = 0
+        self._stream = None
+        self._backend = None
+
+        if self._start is None:
+            import pyaes
+            self._stream = pyaes.AESModeOfOperationCTR(self._key, counter)
+
+    @property
+    def backend(self):
+        """Name of the backend that handled the last call (None before any)"""
+        if self._start is None:
+            return "original"
+        return self._backend.name if self._backend is not None else None
+
+    def encrypt(self, plaintext):
+        if self._start is None:
+            return self._stream.encrypt(plaintext)
+
+        n = len(plaintext)
+        used = self._offset + n
+        backend = get_router().pick(n, self._start + (used + 15) // 16)
+        if backend is not self._backend:
+            self._stream = backend.stream(self._key, (self._start + self._offset // 16) % _COUNTER_MODULUS)
+            skip = self._offset % 16
+            if skip:
+                self._stream.encrypt(bytes(skip))
+            self._backend = backend
+
+        out = self._stream.encrypt(plaintext)
+        self._offset = used
+
+        # Advance the caller's counter past the blocks generated so far
+        value = (self._start + (used + 15) // 16) % _COUNTER_MODULUS
+        if type(self._counter) is Counter:
+            self._counter._int = value
+        else:
+            self._counter._counter = list(value.to_bytes(16, "big"))
+        return out
+
+    def decrypt(self, crypttext):
+        # AES-CTR is symmetric
+        return self.encrypt(crypttext)
+
+
+def _block_modes():
+    for subdir, module in (("c_aesni", "c_aesni_wrapper"), ("cython_aesni", "cython_aesni_wrapper")):
+        if not (PYAES_DIR / subdir).is_dir():
+            continue
+        _add_path(subdir)
+        try:
+            wrapper = __import__(module)
+        except ImportError:
+            continue  # extension not built
+        return (subdir, wrapper.AESModeOfOperationECB, wrapper.AESModeOfOperationCBC,
+                wrapper.AESModeOfOperationCFB, wrapper.AESModeOfOperationOFB)
+    import pyaes
+    return ("original", pyaes.AESModeOfOperationECB, pyaes.AESModeOfOperationCBC,
+            pyaes.AESModeOfOperationCFB, pyaes.AESModeOfOperationOFB)
+
+
+(block_mode_backend, AESModeOfOperationECB, AESModeOfOperationCBC,
+ AESModeOfOperationCFB, AESModeOfOperationOFB) = _block_modes()
+
+AESModesOfOperation = dict(
+    ctr=AESModeOfOperationCTR,
+    cbc=AESModeOfOperationCBC,
+    cfb=AESModeOfOperationCFB,
+    ecb=AESModeOfOperationECB,
+    ofb=AESModeOfOperationOFB,
+)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Per-size routing of CTR calls to the fastest calibrated backend.
+
+The calibration gives a ranking of the backends at each calibrated size.
+A call of nbytes uses the ranking of the nearest size on a log scale.
+Within that ranking it takes the first backend whose counter range covers
+the blocks the call will consume.
+
+FASTAES_BACKEND=<name> skips calibration and sends everything to one
+backend. Calls that one backend cannot represent still go to pyaes.
+"""
+
+import bisect
+import math
+import os
+import threading
+
+from .backends import ALL_BACKENDS, BACKENDS_BY_NAME, available_backends
+from .calibration import load_or_calibrate
+
+
+class Router:
+    """Backend rankings per size class"""
+
+    def __init__(self, sizes, rankings):
+        """
+        Args:
+            sizes: Ascending calibrated sizes
+            rankings: For each size, backends from fastest to slowest
+        """
+        self.sizes = list(sizes)
+        self.rankings = rankings
+        # Size classes split halfway between neighbours on a log scale
+        self.bounds = [math.sqrt(a * b) for a, b in zip(self.sizes, self.sizes[1:])]
+
+    @classmethod
+    def from_calibration(cls, calibration):
+        order = {backend.name: i for i, backend in enumerate(ALL_BACKENDS)}
+        rankings = []
+        for i, _ in enumerate(calibration["sizes"]):
+            measured = [(t[i], order[name], name) for name, t in calibration["timings"].items()
+                        if t[i] is not None]
+            skipped = [(order[name], name) for name, t in calibration["timings"].items() if t[i] is None]
+            names = [name for _, _, name in sorted(measured)] + [name for _, name in sorted(skipped)]
+            rankings.append([BACKENDS_BY_NAME[name] for name in names])
+        return cls(calibration["sizes"], rankings)
+
+    @classmethod
+    def single(cls, name, fallback_names=()):
+        chain = [BACKENDS_BY_NAME[name]] + [BACKENDS_BY_NAME[n] for n in fallback_names if n != name]
+        return cls([1], [chain])
+
+    def ranking(self, nbytes):
+        return self.rankings[bisect.bisect_left(self.bounds, nbytes)]
+
+    def pick(self, nbytes, counter_end):
+        """Fastest backend for nbytes that can count up to counter_end"""
+        for backend in self.ranking(nbytes):
+            if counter_end <= backend.max_counter:
+                return backend
+        raise OverflowError("no available backend supports counter value %d" % counter_end)
+
+    def table(self):
+        """[(size, [backend names, fastest first])] for inspection"""
+        return [(size, [b.name for b in ranking]) for size, ranking in zip(self.sizes, self.rankings)]
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router(recalibrate=False):
+    """The process-wide router, calibrated (or loaded from disk) on first use"""
+    global _router
+    router = _router
+    if router is not None and not recalibrate:
+        return router
+    with _router_lock:
+        if _router is None or recalibrate:
+            names = available_backends()
+            forced = os.environ.get("FASTAES_BACKEND")
+            if forced:
+                if forced not in names:
+                    raise ValueError(f"FASTAES_BACKEND={forced} is not available (have: {names})")
+                _router = Router.single(forced, [n for n in names if n == "original"])
+            else:
+                _router = Router.from_calibration(load_or_calibrate(names, force=recalibrate))
+        return _router
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Keystream precomputed on a background thread, for latency-critical CTR calls.
+
+In CTR mode the keystream depends only on the key and the counter, so it
+can be produced before the data arrives. KeystreamPrefetcher owns a stream
+cipher, for example AESModeOfOperationCTR from the c_aesni or cython_aesni
+wrapper, and a background thread that encrypts zeros with it into a ring
+buffer of capacity bytes. encrypt() on the request path then only XORs the
+data with buffered keystream, using the backend's xor_into().
+
+Memory is bounded by the ring. The thread sleeps until the buffered
+keystream drops below low_watermark, then refills up to high_watermark in
+batches; the c_aesni and cython_aesni kernels release the GIL for batches
+of 16 KB and more. A call that needs more keystream than is buffered is a
+miss: it uses up the buffer and encrypts the rest itself, waiting for at
+most one batch of the thread. The output is the same stream either way, so
+a prefetcher and a plain cipher with the same key and counter agree byte
+for byte.
+
+The cipher must not be used directly once it is wrapped. Call close(), or
+use the prefetcher as a context manager: it stops the thread and wipes the
+buffered keystream. The thread only holds the prefetcher weakly while it is
+idle, so one dropped without close() is still collected, with its ring
+wiped, and the thread exits within REAP_INTERVAL seconds.
+"""
+
+import threading
+import weakref
+
+DEFAULT_CAPACITY = 1024 * 1024
+DEFAULT_BATCH = 64 * 1024
+
+# How often an idle refill thread checks whether its prefetcher is gone
+REAP_INTERVAL = 1.0
+
+
+def _refill(ref, cond):
+    # Refill thread. The prefetcher is only referenced while a refill runs:
+    # a strong reference would keep an unclosed prefetcher, and its ring,
+    # alive for the life of the process.
+    while True:
+        with cond:
+            while True:
+                owner = ref()
+                if owner is None or owner._closed:
+                    return
+                if owner._write - owner._read < owner.low_watermark:
+                    break
+                owner = None
+                cond.wait(REAP_INTERVAL)
+            owner.refills += 1
+            owner._filling = True
+        try:
+            owner._fill()
+        finally:
+            with cond:
+                owner._filling = False
+                cond.notify_all()
+        owner = None
+
+
+def _wipe_ring(ring):
+    ring[:] = bytes(len(ring))
+
+
+class KeystreamPrefetcher:
+    """Stream cipher front end that XORs with keystream generated ahead of time"""
+
+    def __init__(self, cipher, xor_into, capacity=DEFAULT_CAPACITY, low_watermark=None,
+                 high_watermark=None, batch=DEFAULT_BATCH):
+        """
+        Args:
+            cipher: Stream cipher with encrypt(data) -> bytes (encrypt_into()
+                    is used when present); owned by the prefetcher from now on
+            xor_into: xor_into(data, keystream, out) of the backend
+            capacity: Ring buffer size in bytes
+            low_watermark: Refill when fewer bytes are buffered (default: capacity / 2)
+            high_watermark: Refill up to this many bytes (default: capacity)
+            batch: Bytes of keystream generated per cipher call
+        """
+        high_watermark = capacity if high_watermark is None else high_watermark
+        low_watermark = high_watermark // 2 if low_watermark is None else low_watermark
+        if not 0 < low_watermark <= high_watermark <= capacity:
+            raise ValueError("Need 0 < low_watermark <= high_watermark <= capacity")
+        if batch <= 0:
+            raise ValueError("batch must be positive")
+
+        self.cipher = cipher
+        self.capacity = capacity
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.batch = min(batch, capacity)
+        self._xor_into = xor_into
+        self._ring = memoryview(bytearray(capacity))
+        self._zeros = memoryview(bytes(self.batch))
+
+        # Stream offsets: [_read, _write) of the stream is buffered in the ring
+        # at offset % capacity. _lock guards both (_cond waits on it; the hot
+        # path takes the plain lock, which is cheaper); _generate_lock is held
+        # while the cipher runs, so only one thread advances it.
+        self._read = 0
+        self._write = 0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._generate_lock = threading.Lock()
+        self._closed = False
+        self._filling = False
+
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        self.miss_bytes = 0
+        self.refills = 0
+
+        # Wipes the ring if the prefetcher is collected without close()
+        self._finalizer = weakref.finalize(self, _wipe_ring, self._ring)
+        self._thread = threading.Thread(target=_refill, args=(weakref.ref(self), self._cond),
+                                        name="keystream-prefetch", daemon=True)
+        self._thread.start()
+
+    @property
+    def stats(self):
+        """Calls served from the buffer (hits) or not (misses), bytes XORed with
+        buffered keystream, bytes encrypted on the caller, refill cycles"""
+        with self._cond:
+            return {"hits": self.hits, "misses": self.misses, "hit_bytes": self.hit_bytes,
+                    "miss_bytes": self.miss_bytes, "refills": self.refills,
+                    "buffered": self._write - self._read, "capacity": self.capacity}
+
+    def _generate(self, out):
+        zeros = self._zeros[:len(out)]
+        if hasattr(self.cipher, "encrypt_into"):
+            self.cipher.encrypt_into(zeros, out)
+        else:
+            out[:] = self.cipher.encrypt(zeros)
+
+    def _fill(self):
+        while True:
+            with self._generate_lock:
+                with self._cond:
+                    if self._closed:
+                        return
+                    start = self._write
+                    room = self.high_watermark - (start - self._read)
+                if room <= 0:
+                    return
+                # The slots from _write up to _read + capacity are free;
+                # callers only read the buffered part before _write
+                at = start % self.capacity
+                n = min(room, self.batch, self.capacity - at)
+                self._generate(self._ring[at:at + n])
+                with self._cond:
+                    self._write = start + n
+                    self._cond.notify_all()
+
+    def _xor_buffered(self, data, out, n):
+        # Caller holds _cond and has checked that n bytes are buffered
+        at = self._read % self.capacity
+        if at + n <= self.capacity:
+            # xor_into only reads the first len(data) bytes of the ring slice
+            self._xor_into(data, self._ring[at:], out)
+        else:
+            data, out = memoryview(data).cast("B"), memoryview(out).cast("B")
+            first = self.capacity - at
+            self._xor_into(data[:first], self._ring[at:], out[:first])
+            self._xor_into(data[first:n], self._ring, out[first:n])
+        self._read += n
+        if self._write - self._read < self.low_watermark:
+            self._cond.notify_all()
+
+    def encrypt_into(self, src, dst):
+        """
+        Encrypt src into dst without allocating
+
+        Args:
+            src: Any bytes-like object
+            dst: Writable buffer at least len(src) long; may be src itself
+        """
+        n = memoryview(src).nbytes
+        if memoryview(dst).nbytes < n:
+            raise ValueError("Output buffer is smaller than input")
+        self._encrypt(src, dst, n)
+
+    def _encrypt(self, src, dst, n):
+        if not n:
+            return
+        with self._lock:
+            if self._write - self._read >= n:
+                self._xor_buffered(src, dst, n)
+                self.hits += 1
+                self.hit_bytes += n
+                return
+
+        # Miss: wait for the batch in progress, use what is buffered, and
+        # continue the stream on this thread
+        with self._generate_lock:
+            with self._cond:
+                take = min(self._write - self._read, n)
+                if take < n:
+                    data, out = memoryview(src).cast("B"), memoryview(dst).cast("B")
+                    self._xor_buffered(data[:take], out, take)
+                    self._generate_direct(data[take:], out[take:n])
+                    self.misses += 1
+                else:
+                    self._xor_buffered(src, dst, n)
+                    self.hits += 1  # refilled while this call waited
+                self.hit_bytes += take
+                self.miss_bytes += n - take
+
+    def _generate_direct(self, data, out):
+        # Caller holds both locks and has emptied the buffer
+        if hasattr(self.cipher, "encrypt_into"):
+            self.cipher.encrypt_into(data, out)
+        else:
+            out[:] = self.cipher.encrypt(data)
+        self._write += len(data)
+        self._read = self._write
+
+    def encrypt(self, data):
+        """Encrypt data (bytes-like) into a new bytearray
+
+        A bytearray rather than bytes: converting would copy every payload
+        a second time. encrypt_into() avoids the allocation altogether.
+        """
+        n = memoryview(data).nbytes
+        out = bytearray(n)
+        self._encrypt(data, out, n)
+        return out
+
+    def decrypt(self, data):
+        # CTR mode is symmetric
+        return self.encrypt(data)
+
+    decrypt_into = encrypt_into
+
+    def wait_ready(self, timeout=None):
+        """Block until the thread has no refill to do (at least low_watermark
+        bytes buffered, high_watermark after a refill); False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._closed or (not self._filling and self._write - self._read >= self.low_watermark),
+                timeout)
+
+    def close(self):
+        """Stop the background thread and wipe the buffered keystream"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._generate_lock, self._cond:
+            self._ring[:] = bytes(self.capacity)
+            self._read = self._write
+        self._finalizer.detach()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
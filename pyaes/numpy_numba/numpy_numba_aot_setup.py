@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Setup script for the ahead-of-time compiled T-table CTR kernel.
+
+numba.pycc compiles _ctr_xor_blocks from numpy_numba_ttable.py into the
+numpy_numba_aot extension. numpy_numba_ttable picks the extension up on
+its first call, so the first call in a new process needs no JIT compilation.
+
+    python numpy_numba_aot_setup.py build_ext --inplace
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+import os
+
+# Compile from the kernel source, never from a stale numpy_numba_aot build
+os.environ["AES_NUMBA_AOT"] = "0"
+
+from numba.pycc import CC
+from setuptools import setup
+
+from numpy_numba_ttable import AOT_SIGNATURE, _ctr_xor_blocks, _numba
+
+_numba()  # njit the helpers _ctr_xor_blocks calls
+
+cc = CC("numpy_numba_aot")
+cc.output_dir = str(pathlib.Path(__file__).parent.resolve())
+cc.export("ctr_xor", AOT_SIGNATURE)(_ctr_xor_blocks)
+
+setup(
+    name="numpy_numba_aot",
+    ext_modules=[cc.distutils_extension()],
+    packages=[],
+    py_modules=[],
+    zip_safe=False,
+)
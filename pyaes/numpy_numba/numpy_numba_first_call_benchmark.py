@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+First-call latency vs steady state for the Numba engines.
+
+Every sample is a fresh interpreter, the way a short-lived worker starts.
+Each one times the import of the engine, the first encryption of the ~23 KB
+cleartext (which includes JIT compilation or cache loading), and the median
+of the following calls. The variants are:
+
+    reference JIT, cold cache   aes_ctr_numba with an empty NUMBA_CACHE_DIR
+    reference JIT, warm cache   aes_ctr_numba with a primed NUMBA_CACHE_DIR
+    T-table JIT, cold cache     aes_ctr_numba_ttable, AES_NUMBA_AOT=0
+    T-table JIT, warm cache
+    T-table AOT                 numpy_numba_aot, built by numpy_numba_aot_setup.py
+
+    python numpy_numba_first_call_benchmark.py --runs 5
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+HERE = pathlib.Path(__file__).parent.resolve()
+STEADY_CALLS = 50
+
+
+def child(engine):
+    t0 = time.perf_counter()
+    if engine == "reference":
+        from numpy_numba_runbenchmark import aes_ctr_numba as func, CLEARTEXT, KEY
+        kernel = "jit"
+    else:
+        from numpy_numba_runbenchmark import CLEARTEXT, KEY
+        from numpy_numba_ttable import aes_ctr_numba_ttable as func, kernel_name
+        kernel = kernel_name()
+    t1 = time.perf_counter()
+    func(KEY, CLEARTEXT, 0)
+    t2 = time.perf_counter()
+    steady = []
+    for _ in range(STEADY_CALLS):
+        t = time.perf_counter()
+        func(KEY, CLEARTEXT, 0)
+        steady.append(time.perf_counter() - t)
+    print(json.dumps({"kernel": kernel, "import": t1 - t0, "first": t2 - t1,
+                      "steady": statistics.median(steady)}))
+
+
+def sample(engine, env):
+    out = subprocess.run([sys.executable, str(pathlib.Path(__file__).resolve()), "--child", engine],
+                         env=env, cwd=HERE, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def run_variant(label, engine, aot, cold, runs):
+    samples = []
+    with tempfile.TemporaryDirectory() as warm_dir:
+        env = dict(os.environ, AES_NUMBA_AOT="1" if aot else "0", NUMBA_CACHE_DIR=warm_dir)
+        if not cold:
+            sample(engine, env)  # prime the cache
+        for _ in range(runs):
+            if cold:
+                with tempfile.TemporaryDirectory() as cold_dir:
+                    samples.append(sample(engine, dict(env, NUMBA_CACHE_DIR=cold_dir)))
+            else:
+                samples.append(sample(engine, env))
+
+    if aot and samples[0]["kernel"] != "aot":
+        print(f"{label:<28} skipped: numpy_numba_aot is not built (numpy_numba_aot_setup.py)")
+        return
+    med = {k: statistics.median(s[k] for s in samples) for k in ("import", "first", "steady")}
+    print(f"{label:<28} import {med['import'] * 1e3:8.1f} ms  first call {med['first'] * 1e3:9.2f} ms  "
+          f"steady {med['steady'] * 1e6:9.1f} us  first/steady {med['first'] / med['steady']:8.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per variant (default: 3)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    for label, engine, aot, cold in (("reference JIT, cold cache", "reference", False, True),
+                                     ("reference JIT, warm cache", "reference", False, False),
+                                     ("T-table JIT, cold cache", "ttable", False, True),
+                                     ("T-table JIT, warm cache", "ttable", False, False),
+                                     ("T-table AOT", "ttable", True, False)):
+        run_variant(label, engine, aot, cold, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
 import numpy as np
 import pyperf
 from numba import njit, prange, uint8, int64
 
+from aes_tables import SBOX, RCON
+from round_key_cache import get_cache
+
 # ---------------------------------------------------------------------------
 # Parameters / Test data
 # ---------------------------------------------------------------------------
@@ -11,31 +17,7 @@ KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'                    # 16 bytes
 BLOCK_SIZE = 16
 
 # ---------------------------------------------------------------------------
-# AES tables (S-box + Rcon) as uint8 numpy arrays
-# ---------------------------------------------------------------------------
-SBOX = np.array([
-    0x63,0x7C,0x77,0x7B,0xF2,0x6B,0x6F,0xC5,0x30,0x01,0x67,0x2B,0xFE,0xD7,0xAB,0x76,
-    0xCA,0x82,0xC9,0x7D,0xFA,0x59,0x47,0xF0,0xAD,0xD4,0xA2,0xAF,0x9C,0xA4,0x72,0xC0,
-    0xB7,0xFD,0x93,0x26,0x36,0x3F,0xF7,0xCC,0x34,0xA5,0xE5,0xF1,0x71,0xD8,0x31,0x15,
-    0x04,0xC7,0x23,0xC3,0x18,0x96,0x05,0x9A,0x07,0x12,0x80,0xE2,0xEB,0x27,0xB2,0x75,
-    0x09,0x83,0x2C,0x1A,0x1B,0x6E,0x5A,0xA0,0x52,0x3B,0xD6,0xB3,0x29,0xE3,0x2F,0x84,
-    0x53,0xD1,0x00,0xED,0x20,0xFC,0xB1,0x5B,0x6A,0xCB,0xBE,0x39,0x4A,0x4C,0x58,0xCF,
-    0xD0,0xEF,0xAA,0xFB,0x43,0x4D,0x33,0x85,0x45,0xF9,0x02,0x7F,0x50,0x3C,0x9F,0xA8,
-    0x51,0xA3,0x40,0x8F,0x92,0x9D,0x38,0xF5,0xBC,0xB6,0xDA,0x21,0x10,0xFF,0xF3,0xD2,
-    0xCD,0x0C,0x13,0xEC,0x5F,0x97,0x44,0x17,0xC4,0xA7,0x7E,0x3D,0x64,0x5D,0x19,0x73,
-    0x60,0x81,0x4F,0xDC,0x22,0x2A,0x90,0x88,0x46,0xEE,0xB8,0x14,0xDE,0x5E,0x0B,0xDB,
-    0xE0,0x32,0x3A,0x0A,0x49,0x06,0x24,0x5C,0xC2,0xD3,0xAC,0x62,0x91,0x95,0xE4,0x79,
-    0xE7,0xC8,0x37,0x6D,0x8D,0xD5,0x4E,0xA9,0x6C,0x56,0xF4,0xEA,0x65,0x7A,0xAE,0x08,
-    0xBA,0x78,0x25,0x2E,0x1C,0xA6,0xB4,0xC6,0xE8,0xDD,0x74,0x1F,0x4B,0xBD,0x8B,0x8A,
-    0x70,0x3E,0xB5,0x66,0x48,0x03,0xF6,0x0E,0x61,0x35,0x57,0xB9,0x86,0xC1,0x1D,0x9E,
-    0xE1,0xF8,0x98,0x11,0x69,0xD9,0x8E,0x94,0x9B,0x1E,0x87,0xE9,0xCE,0x55,0x28,0xDF,
-    0x8C,0xA1,0x89,0x0D,0xBF,0xE6,0x42,0x68,0x41,0x99,0x2D,0x0F,0xB0,0x54,0xBB,0x16
-], dtype=np.uint8)
-
-RCON = np.array([0x00,0x01,0x02,0x04,0x08,0x10,0x20,0x40,0x80,0x1B,0x36], dtype=np.uint8)
-
-# ---------------------------------------------------------------------------
-# Numba-accelerated AES core (AES-128)
+# Numba-accelerated AES core (AES-128/192/256)
 # ---------------------------------------------------------------------------
 
 @njit(uint8(uint8), cache=True)
@@ -105,10 +87,12 @@ def _state_to_bytes_colmajor(state):
     return out
 
 @njit(cache=True)
-def _expand_key_128(key_bytes):
-    # AES-128 key expansion -> (11,4,4) round keys (column-major)
-    Nk, Nb, Nr = 4, 4, 10
-    w = np.empty((Nb*(Nr+1), 4), dtype=np.uint8)  # 44 words
+def _expand_key(key_bytes):
+    # AES key expansion -> (Nr+1,4,4) round keys (column-major)
+    # Nk = 4/6/8 words for AES-128/192/256, Nr = 10/12/14 rounds
+    Nk, Nb = key_bytes.size // 4, 4
+    Nr = Nk + 6
+    w = np.empty((Nb*(Nr+1), 4), dtype=np.uint8)  # 44/52/60 words
 
     # copy initial key into w[0..3]
     for i in range(Nk):
@@ -134,6 +118,12 @@ def _expand_key_128(key_bytes):
             # Rcon
             temp[0] ^= RCON[rconi]
             rconi += 1
+        elif Nk > 6 and wi % Nk == 4:
+            # AES-256: extra SubWord halfway through each 8-word group
+            temp[0] = SBOX[temp[0]]
+            temp[1] = SBOX[temp[1]]
+            temp[2] = SBOX[temp[2]]
+            temp[3] = SBOX[temp[3]]
         w[wi, 0] = w[wi - Nk, 0] ^ temp[0]
         w[wi, 1] = w[wi - Nk, 1] ^ temp[1]
         w[wi, 2] = w[wi - Nk, 2] ^ temp[2]
@@ -153,17 +143,18 @@ def _expand_key_128(key_bytes):
     return round_keys
 
 @njit(cache=True)
-def _aes_encrypt_block_128(block16, round_keys):
+def _aes_encrypt_block(block16, round_keys):
+    nr = round_keys.shape[0] - 1
     st = _bytes_to_state_colmajor(block16)
     st = _add_round_key(st, round_keys[0])
-    for rnd in range(1, 10):
+    for rnd in range(1, nr):
         st = _sub_bytes(st)
         st = _shift_rows(st)
         st = _mix_columns(st)
         st = _add_round_key(st, round_keys[rnd])
     st = _sub_bytes(st)
     st = _shift_rows(st)
-    st = _add_round_key(st, round_keys[10])
+    st = _add_round_key(st, round_keys[nr])
     return _state_to_bytes_colmajor(st)
 
 @njit(cache=True)
@@ -183,7 +174,7 @@ def _ctr_xor_all(data_view, out_view, initial_counter, round_keys):
         cb[9]  = uint8((v >> 48) & 0xFF)
         cb[8]  = uint8((v >> 56) & 0xFF)
 
-        ks = _aes_encrypt_block_128(cb, round_keys)
+        ks = _aes_encrypt_block(cb, round_keys)
 
         start = i * 16
         end = nbytes if (i == nblocks - 1) else (start + 16)
@@ -192,17 +183,21 @@ def _ctr_xor_all(data_view, out_view, initial_counter, round_keys):
             out_view[j] = data_view[j] ^ ks[k]
             k += 1
 
+def expand_key(key: bytes) -> np.ndarray:
+    """AES round keys (Nr+1,4,4) for key; the factory behind the round-key cache."""
+    return _expand_key(np.frombuffer(key, dtype=np.uint8))
+
 def aes_ctr_numba(key: bytes, data: bytes, initial_counter: int = 0) -> bytes:
-    """Public wrapper: AES-128 CTR encryption/decryption (same op)."""
-    if len(key) != 16:
-        raise ValueError("AES-128 requires a 16-byte key")
+    """Public wrapper: AES-128/192/256 CTR encryption/decryption (same op)."""
+    if len(key) not in (16, 24, 32):
+        raise ValueError("AES requires a 16, 24 or 32-byte key")
     if len(data) == 0:
         return b""
 
-    round_keys = _expand_key_128(np.frombuffer(key, dtype=np.uint8))
     data_view = np.frombuffer(data, dtype=np.uint8)
     out_view = np.empty_like(data_view)
-    _ctr_xor_all(data_view, out_view, int64(initial_counter), round_keys)
+    with get_cache().borrow("numpy_numba", key, expand_key) as round_keys:
+        _ctr_xor_all(data_view, out_view, int64(initial_counter), round_keys)
     return out_view.tobytes()
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Block-batched AES CTR engine for Numba using 32-bit T-tables.
+
+The reference engine in numpy_numba_runbenchmark.py works one byte at a
+time on a 4x4 uint8 state and allocates a counter block, a state and an
+output array for every 16-byte block. Here, each block is four uint32
+column words held in local variables. One round is 16 table lookups and
+XORs. SubBytes, ShiftRows and MixColumns are folded into the four tables
+Te0..Te3 from aes_tables.py.
+
+The blocks are split into batches of BATCH_BLOCKS, and prange spreads the
+batches over Numba's thread pool. The kernel is compiled with parallel=True
+and nogil=True, so other Python threads keep running while it works. It
+allocates nothing for each block or each batch.
+
+The counter layout matches aes_ctr_numba(): the high 64 bits are zero and
+the low 64 bits hold initial_counter + block index, big-endian. Because
+the counter of any block follows from its index, AESModeOfOperationCTR
+wraps the kernel as a stream with seek() and decrypt_range().
+
+The JIT kernel is compiled on the first call of each process: seconds when
+the on-disk cache is cold, and still a noticeable load when it is warm.
+numpy_numba_aot_setup.py compiles the same kernel ahead of time into the
+numpy_numba_aot extension. When that module has been built it is used
+instead, so short-lived workers pay no compilation at all. The AOT build
+runs on one thread (pycc has no parallel=True), so set AES_NUMBA_AOT=0 to
+keep the parallel JIT kernel for large payloads.
+
+Kernels are looked up on the first encryption, not at import: numba (about
+0.3 s to import) is only loaded when the JIT kernel is needed, and importing
+this module costs little more than NumPy.
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+import os
+import threading
+import weakref
+import numpy as np
+
+from aes_tables import SBOX32, TE0, TE1, TE2, TE3, expand_key_words
+from round_key_cache import _wipe, get_cache
+
+# 256 blocks (4 KB) per prange iteration: big enough to amortize scheduling,
+# small enough to balance the last batches across threads
+BATCH_BLOCKS = 256
+
+# The kernel sources below stay plain Python functions until _numba() turns
+# the helpers into inlined njit functions; until then prange is range
+prange = range
+
+
+def _encrypt_words(s0, s1, s2, s3, rk, te0, te1, te2, te3, sbox):
+    nr = rk.size // 4 - 1
+    s0 ^= rk[0]; s1 ^= rk[1]; s2 ^= rk[2]; s3 ^= rk[3]
+    for r in range(1, nr):
+        k = 4 * r
+        t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ rk[k]
+        t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ rk[k + 1]
+        t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ rk[k + 2]
+        t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ rk[k + 3]
+        s0 = t0; s1 = t1; s2 = t2; s3 = t3
+    k = 4 * nr
+    t0 = ((sbox[s0 >> 24] << 24) | (sbox[(s1 >> 16) & 0xFF] << 16)
+          | (sbox[(s2 >> 8) & 0xFF] << 8) | sbox[s3 & 0xFF]) ^ rk[k]
+    t1 = ((sbox[s1 >> 24] << 24) | (sbox[(s2 >> 16) & 0xFF] << 16)
+          | (sbox[(s3 >> 8) & 0xFF] << 8) | sbox[s0 & 0xFF]) ^ rk[k + 1]
+    t2 = ((sbox[s2 >> 24] << 24) | (sbox[(s3 >> 16) & 0xFF] << 16)
+          | (sbox[(s0 >> 8) & 0xFF] << 8) | sbox[s1 & 0xFF]) ^ rk[k + 2]
+    t3 = ((sbox[s3 >> 24] << 24) | (sbox[(s0 >> 16) & 0xFF] << 16)
+          | (sbox[(s1 >> 8) & 0xFF] << 8) | sbox[s2 & 0xFF]) ^ rk[k + 3]
+    return t0, t1, t2, t3
+
+
+def _xor_word(data, out, j, w):
+    out[j] = data[j] ^ ((w >> 24) & 0xFF)
+    out[j + 1] = data[j + 1] ^ ((w >> 16) & 0xFF)
+    out[j + 2] = data[j + 2] ^ ((w >> 8) & 0xFF)
+    out[j + 3] = data[j + 3] ^ (w & 0xFF)
+
+
+def _ctr_xor_blocks(data, out, initial_counter, rk, te0, te1, te2, te3, sbox):
+    nbytes = data.size
+    nblocks = (nbytes + 15) // 16
+    nbatches = (nblocks + BATCH_BLOCKS - 1) // BATCH_BLOCKS
+    for b in prange(nbatches):
+        first = b * BATCH_BLOCKS
+        last = min(first + BATCH_BLOCKS, nblocks)
+        for i in range(first, last):
+            v = np.uint64(initial_counter + i)
+            k0, k1, k2, k3 = _encrypt_words(
+                np.uint32(0), np.uint32(0), np.uint32(v >> np.uint64(32)), np.uint32(v & np.uint64(0xFFFFFFFF)),
+                rk, te0, te1, te2, te3, sbox)
+            j = i * 16
+            if j + 16 <= nbytes:
+                _xor_word(data, out, j, k0)
+                _xor_word(data, out, j + 4, k1)
+                _xor_word(data, out, j + 8, k2)
+                _xor_word(data, out, j + 12, k3)
+            else:
+                # Partial last block
+                for n in range(nbytes - j):
+                    w = k0 if n < 4 else k1 if n < 8 else k2 if n < 12 else k3
+                    out[j + n] = data[j + n] ^ ((w >> (24 - 8 * (n & 3))) & 0xFF)
+
+
+AOT_SIGNATURE = "void(uint8[::1], uint8[::1], int64, " + ", ".join(["uint32[::1]"] * 6) + ")"
+
+_load_lock = threading.Lock()
+_kernel = None      # Set on first use: the AOT or the JIT kernel
+_aot_kernel = None  # numpy_numba_aot.ctr_xor, False when unavailable or disabled
+
+
+def _numba():
+    """Import numba and turn the kernel helpers into njit functions (once).
+
+    _ctr_xor_blocks resolves _encrypt_words, _xor_word and prange from the
+    module globals when it is compiled, so rebinding them here is enough;
+    numpy_numba_aot_setup.py calls this before exporting it with pycc.
+    """
+    global prange, _encrypt_words, _xor_word
+    import numba
+    with _load_lock:
+        if prange is range:
+            _encrypt_words = numba.njit(inline="always")(_encrypt_words)
+            _xor_word = numba.njit(inline="always")(_xor_word)
+            prange = numba.prange
+    return numba
+
+
+def _load_aot():
+    """numpy_numba_aot.ctr_xor, or None (not built, or AES_NUMBA_AOT=0)"""
+    global _aot_kernel
+    if _aot_kernel is None:
+        kernel = False
+        if os.environ.get("AES_NUMBA_AOT", "1") != "0":
+            try:
+                from numpy_numba_aot import ctr_xor as kernel
+            except ImportError:
+                pass
+        _aot_kernel = kernel
+    return _aot_kernel or None
+
+
+def _get_kernel():
+    """The kernel of this process, chosen on the first call"""
+    global _kernel
+    if _kernel is None:
+        kernel = _load_aot()
+        if kernel is None:
+            kernel = _numba().njit(parallel=True, nogil=True, cache=True)(_ctr_xor_blocks)
+        _kernel = kernel
+    return _kernel
+
+
+def kernel_name():
+    """'aot' when the ahead-of-time module is in use, else 'jit'"""
+    return "aot" if _load_aot() is not None else "jit"
+
+
+def _ctr_at(rk, data, initial_counter, position, out=None):
+    """CTR over data taken to start at byte position of the stream
+
+    Returns new bytes, or writes into out (a writable buffer) and returns None.
+    """
+    data_view = np.frombuffer(data, dtype=np.uint8)
+    if out is None:
+        out_view = np.empty_like(data_view)
+    else:
+        out_view = np.frombuffer(out, dtype=np.uint8)[:data_view.size]
+    kernel = _get_kernel()
+    counter = initial_counter + position // 16
+    head = 0
+    skip = position % 16
+    if skip:
+        # Mid-block start: one keystream block for the head, then aligned
+        head = min(16 - skip, data_view.size)
+        keystream = np.empty(16, dtype=np.uint8)
+        kernel(np.zeros(16, dtype=np.uint8), keystream, np.int64(counter), rk, TE0, TE1, TE2, TE3, SBOX32)
+        out_view[:head] = data_view[:head] ^ keystream[skip:skip + head]
+        counter += 1
+    if head < data_view.size:
+        kernel(data_view[head:], out_view[head:], np.int64(counter), rk, TE0, TE1, TE2, TE3, SBOX32)
+    # tobytes() is a second copy of the output; encrypt_into() avoids it
+    return out_view.tobytes() if out is None else None
+
+
+def aes_ctr_numba_ttable(key: bytes, data, initial_counter: int = 0) -> bytes:
+    """AES-128/192/256 CTR encryption/decryption (same op) with the T-table engine."""
+    if len(key) not in (16, 24, 32):
+        raise ValueError("AES requires a 16, 24 or 32-byte key")
+    if len(data) == 0:
+        return b""
+
+    with get_cache().borrow("numpy_numba_ttable", key, expand_key_words) as rk:
+        return _ctr_at(rk, data, initial_counter, 0)
+
+
+class AESModeOfOperationCTR:
+    """Seekable CTR stream over the T-table kernel
+
+    Stream byte p uses counter initial_counter + p // 16, so seek() and
+    decrypt_range() go straight to any offset: at most one extra keystream
+    block for a range that starts inside a block.
+
+    The object keeps its own copy of the round keys for its lifetime;
+    close() (or leaving a with block) wipes it, and so does garbage
+    collection of an unclosed stream.
+    """
+
+    def __init__(self, key: bytes, initial_counter: int = 0):
+        if len(key) not in (16, 24, 32):
+            raise ValueError("AES requires a 16, 24 or 32-byte key")
+        self.rk = get_cache().get("numpy_numba_ttable", key, expand_key_words)
+        self._finalizer = weakref.finalize(self, _wipe, self.rk)
+        self.initial_counter = initial_counter
+        self.position = 0
+
+    def close(self):
+        """Wipe the round keys; the stream cannot be used afterwards"""
+        self._finalizer()
+        self.rk = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def encrypt(self, data) -> bytes:
+        if len(data) == 0:
+            return b""
+        out = _ctr_at(self.rk, data, self.initial_counter, self.position)
+        self.position += len(data)
+        return out
+
+    def encrypt_into(self, src, dst):
+        """Encrypt src into dst (a writable buffer at least len(src) long),
+        without allocating an output; dst may be src itself"""
+        n = memoryview(src).nbytes
+        if memoryview(dst).nbytes < n:
+            raise ValueError("Output buffer is smaller than input")
+        if n:
+            _ctr_at(self.rk, src, self.initial_counter, self.position, dst)
+            self.position += n
+
+    # CTR mode is symmetric
+    decrypt = encrypt
+    decrypt_into = encrypt_into
+
+    def seek(self, offset: int):
+        """Move to byte offset of the stream"""
+        if offset < 0:
+            raise ValueError("offset must be >= 0")
+        self.position = offset
+
+    def tell(self) -> int:
+        """Byte offset of the next byte to be processed"""
+        return self.position
+
+    def decrypt_range(self, buf, offset: int, length: int) -> bytes:
+        """Decrypt buf[offset:offset + length], buf holding the stream from byte 0
+
+        The stream position is left where it was.
+        """
+        view = memoryview(buf).cast("B")
+        if offset < 0 or length < 0 or offset + length > len(view):
+            raise ValueError("Range is outside the buffer")
+        if length == 0:
+            return b""
+        return _ctr_at(self.rk, view[offset:offset + length], self.initial_counter, offset)
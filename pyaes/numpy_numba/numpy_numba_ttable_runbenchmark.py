@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+T-table engine benchmark: aes_ctr_numba_ttable() vs the reference aes_ctr_numba().
+
+Both run AES-128 CTR encrypt + decrypt over the same ~23 KB cleartext as
+numpy_numba_runbenchmark.py, and over 1 MB where the batches spread across
+Numba's thread pool (NUMBA_NUM_THREADS).
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+import pyperf
+
+from numpy_numba_runbenchmark import aes_ctr_numba, CLEARTEXT, KEY
+from numpy_numba_ttable import aes_ctr_numba_ttable
+
+LARGE = CLEARTEXT * 45  # ~1 MB
+
+
+def make_bench(func, data):
+    # warm-up (ensure JIT compiled)
+    _ = func(KEY, data[:16], 0)
+
+    def bench(loops):
+        range_it = range(loops)
+        t0 = pyperf.perf_counter()
+
+        for _ in range_it:
+            ct = func(KEY, data, 0)
+            pt = func(KEY, ct, 0)
+
+        dt = pyperf.perf_counter() - t0
+        if pt != data:
+            raise RuntimeError("decrypt mismatch after benchmark")
+        return dt
+
+    return bench
+
+
+if __name__ == "__main__":
+    runner = pyperf.Runner()
+    runner.metadata['description'] = (
+        "AES-128 CTR with Numba: batched T-table engine vs per-block reference"
+    )
+    runner.bench_time_func("crypto_aes_numba_ttable_ctr", make_bench(aes_ctr_numba_ttable, CLEARTEXT))
+    runner.bench_time_func("crypto_aes_numba_ctr", make_bench(aes_ctr_numba, CLEARTEXT))
+    runner.bench_time_func("crypto_aes_numba_ttable_ctr_1MB", make_bench(aes_ctr_numba_ttable, LARGE))
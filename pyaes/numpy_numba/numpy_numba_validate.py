@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import random
 import pyaes
 
 from numpy_numba_runbenchmark import (
@@ -7,6 +8,7 @@ from numpy_numba_runbenchmark import (
     KEY,
     BLOCK_SIZE,
 )
+from numpy_numba_ttable import AESModeOfOperationCTR, aes_ctr_numba_ttable, kernel_name, BATCH_BLOCKS
 
 
 def validate_aes_implementation():
@@ -40,8 +42,102 @@ def validate_aes_implementation():
         raise RuntimeError("pyaes decryption of main script data failed")
     print("\u2713 pyaes self-decryption passed")
 
+    compare_ttable_engine()
+    compare_key_sizes()
+    compare_seek()
+
     print("Validation complete.")
 
 
+def compare_ttable_engine():
+    # Lengths around the block and batch boundaries, counters across 2**32
+    print("Comparing T-table engine with the reference engine and pyaes...")
+    rng = random.Random(11)
+    batch_bytes = BATCH_BLOCKS * BLOCK_SIZE
+    for length in (0, 1, 15, 16, 17, 255, batch_bytes - 1, batch_bytes, batch_bytes + 1,
+                   3 * batch_bytes + 7, len(CLEARTEXT)):
+        data = rng.randbytes(length)
+        for counter in (0, 1, 0xFFFFFFFF - 3, 0x123456789):
+            ct = aes_ctr_numba_ttable(KEY, data, counter)
+            if ct != aes_ctr_numba(KEY, data, counter):
+                raise RuntimeError(f"T-table engine mismatch: len={length} counter={counter:#x}")
+            if aes_ctr_numba_ttable(KEY, ct, counter) != data:
+                raise RuntimeError(f"T-table engine round trip failed: len={length}")
+
+    if aes_ctr_numba_ttable(KEY, CLEARTEXT, 1) != pyaes.AESModeOfOperationCTR(KEY).encrypt(CLEARTEXT):
+        raise RuntimeError("T-table engine differs from pyaes with counter=1")
+    print(f"\u2713 T-table engine ({kernel_name()} kernel) matches the reference engine and pyaes")
+
+
+def compare_key_sizes():
+    print("Comparing AES-128/192/256 with pyaes...")
+    rng = random.Random(12)
+    for key_size in (16, 24, 32):
+        key = rng.randbytes(key_size)
+        expected = pyaes.AESModeOfOperationCTR(key).encrypt(CLEARTEXT)
+        if aes_ctr_numba(key, CLEARTEXT, 1) != expected:
+            raise RuntimeError(f"Reference engine differs from pyaes for a {key_size}-byte key")
+        if aes_ctr_numba_ttable(key, CLEARTEXT, 1) != expected:
+            raise RuntimeError(f"T-table engine differs from pyaes for a {key_size}-byte key")
+    for bad in (b"", KEY[:15], KEY + b"x"):
+        for func in (aes_ctr_numba, aes_ctr_numba_ttable):
+            try:
+                func(bad, CLEARTEXT)
+            except ValueError:
+                continue
+            raise RuntimeError(f"{func.__name__} accepted a {len(bad)}-byte key")
+    print("\u2713 AES-128/192/256 match pyaes")
+
+
+def compare_seek():
+    # seek() and decrypt_range() against the same bytes of one pyaes stream
+    print("Comparing seek(), decrypt_range() and decrypt_into() with pyaes...")
+    rng = random.Random(21)
+    data = rng.randbytes(200 * 1024 + 5)
+    ciphertext = pyaes.AESModeOfOperationCTR(KEY, pyaes.Counter(initial_value=5)).encrypt(data)
+    ranges = [(0, 0), (0, 16), (3, 1), (15, 2), (16, 100), (17, 40000), (len(data) - 1, 1)]
+    ranges += [(rng.randrange(len(data)), rng.randrange(5000)) for _ in range(50)]
+    aes = AESModeOfOperationCTR(KEY, 5)
+    for offset, length in ranges:
+        length = min(length, len(data) - offset)
+        if aes.decrypt_range(ciphertext, offset, length) != data[offset:offset + length]:
+            raise RuntimeError(f"decrypt_range({offset}, {length}) differs from pyaes")
+        aes.seek(offset)
+        half = length // 3
+        out = aes.decrypt(ciphertext[offset:offset + half]) + aes.decrypt(ciphertext[offset + half:offset + length])
+        if out != data[offset:offset + length] or aes.tell() != offset + length:
+            raise RuntimeError(f"seek({offset}) then decrypt differs from pyaes")
+        # decrypt_into(), in place and into a larger buffer
+        aes.seek(offset)
+        buf = bytearray(ciphertext[offset:offset + length])
+        aes.decrypt_into(buf, buf)
+        wide = bytearray(length + 7)
+        aes.seek(offset)
+        aes.decrypt_into(ciphertext[offset:offset + length], wide)
+        if buf != data[offset:offset + length] or wide[:length] != buf or any(wide[length:]):
+            raise RuntimeError(f"seek({offset}) then decrypt_into differs from pyaes")
+    for offset, length in ((-1, 1), (0, len(data) + 1), (5, -1)):
+        try:
+            aes.decrypt_range(ciphertext, offset, length)
+        except ValueError:
+            continue
+        raise RuntimeError(f"decrypt_range accepted offset={offset} length={length}")
+    try:
+        aes.decrypt_into(ciphertext[:32], bytearray(31))
+    except ValueError:
+        pass
+    else:
+        raise RuntimeError("decrypt_into accepted a short output buffer")
+    # close() and garbage collection wipe the stream's round keys
+    with AESModeOfOperationCTR(KEY, 5) as closed:
+        rk = closed.rk
+    collected = AESModeOfOperationCTR(KEY, 5)
+    collected_rk = collected.rk
+    del collected
+    if rk.any() or collected_rk.any():
+        raise RuntimeError("Round keys were not wiped after close() or collection")
+    print(f"\u2713 seek(), decrypt_range() and decrypt_into() match pyaes at {len(ranges)} offsets")
+
+
 if __name__ == "__main__":
     validate_aes_implementation()
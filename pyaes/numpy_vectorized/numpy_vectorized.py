@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+AES-CTR in pure NumPy: no Numba, no compiler, no extension modules.
+
+All counter blocks of a message are built at once as an (nblocks, 16)
+uint8 array. Each block is then viewed as four big-endian uint32 column
+words, so the state is four uint32 vectors of length nblocks. A round is
+16 fancy-indexed T-table lookups (np.take) and whole-array XORs. The last
+round uses the S-box. The keystream goes back to (nblocks, 16) bytes and is
+XORed with the message in one operation.
+
+Every NumPy call costs the same fixed overhead whatever the array length,
+so this only pays off on large arrays. Long messages are cut into
+CHUNK_BLOCKS pieces, so the temporaries stay in cache. Scratch buffers are
+allocated once per chunk and reused by every round.
+
+The counter layout matches the Numba backend: the high 64 bits are zero
+and the low 64 bits hold initial_counter + block index, big-endian.
+"""
+
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.resolve()))
+
+import numpy as np
+
+from aes_tables import SBOX32, TE0, TE1, TE2, TE3, expand_key_words
+from round_key_cache import get_cache
+
+# 16K blocks (256 KB) per pass: the per-call overhead is amortized and the
+# ~20 uint32 temporaries (64 KB each) still fit in L2
+CHUNK_BLOCKS = 16 * 1024
+
+
+def counter_blocks(initial_counter, nblocks):
+    """(nblocks, 16) uint8 counter blocks: zero high half, big-endian low half"""
+    blocks = np.zeros((nblocks, 16), dtype=np.uint8)
+    counters = np.arange(nblocks, dtype=np.uint64)
+    counters += np.uint64(initial_counter & 0xFFFFFFFFFFFFFFFF)  # wraps like the 64-bit C counter
+    blocks[:, 8:] = counters.astype(">u8").view(np.uint8).reshape(nblocks, 8)
+    return blocks
+
+
+def encrypt_blocks(blocks, rk):
+    """Encrypt (n, 16) uint8 blocks with the uint32 round-key words rk"""
+    n = blocks.shape[0]
+    nr = rk.size // 4 - 1
+    cols = blocks.view(">u4").astype(np.uint32)  # (n, 4) native-endian words
+    s = [np.ascontiguousarray(cols[:, c]) ^ rk[c] for c in range(4)]
+
+    t = [np.empty(n, dtype=np.uint32) for _ in range(4)]
+    idx = np.empty(n, dtype=np.uint32)
+    look = np.empty(n, dtype=np.uint32)
+
+    def lookup(table, word, shift, out):
+        # out = table[(word >> shift) & 0xFF], without fresh allocations
+        np.right_shift(word, shift, out=idx)
+        if shift != 24:
+            np.bitwise_and(idx, 0xFF, out=idx)
+        np.take(table, idx, out=out)
+
+    for r in range(1, nr):
+        for c in range(4):
+            out = t[c]
+            lookup(TE0, s[c], 24, out)
+            lookup(TE1, s[(c + 1) & 3], 16, look)
+            out ^= look
+            lookup(TE2, s[(c + 2) & 3], 8, look)
+            out ^= look
+            lookup(TE3, s[(c + 3) & 3], 0, look)
+            out ^= look
+            out ^= rk[4 * r + c]
+        s, t = t, s
+
+    for c in range(4):
+        out = t[c]
+        lookup(SBOX32, s[c], 24, out)
+        out <<= 24
+        lookup(SBOX32, s[(c + 1) & 3], 16, look)
+        look <<= 16
+        out |= look
+        lookup(SBOX32, s[(c + 2) & 3], 8, look)
+        look <<= 8
+        out |= look
+        lookup(SBOX32, s[(c + 3) & 3], 0, look)
+        out |= look
+        out ^= rk[4 * nr + c]
+
+    ks = np.empty((n, 4), dtype=">u4")
+    for c in range(4):
+        ks[:, c] = t[c]
+    return ks.view(np.uint8)
+
+
+def aes_ctr_numpy(key: bytes, data, initial_counter: int = 0) -> bytes:
+    """AES-128/192/256 CTR encryption/decryption (same op) in pure NumPy."""
+    if len(key) not in (16, 24, 32):
+        raise ValueError("AES requires a 16, 24 or 32-byte key")
+    if len(data) == 0:
+        return b""
+
+    data_view = np.frombuffer(data, dtype=np.uint8)
+    out = np.empty_like(data_view)
+    nbytes = data_view.size
+
+    chunk_bytes = CHUNK_BLOCKS * 16
+    with get_cache().borrow("numpy_vectorized", key, expand_key_words) as rk:
+        for start in range(0, nbytes, chunk_bytes):
+            end = min(start + chunk_bytes, nbytes)
+            nblocks = (end - start + 15) // 16
+            ks = encrypt_blocks(counter_blocks(initial_counter + start // 16, nblocks), rk)
+            np.bitwise_xor(data_view[start:end], ks.reshape(-1)[:end - start], out=out[start:end])
+    return out.tobytes()
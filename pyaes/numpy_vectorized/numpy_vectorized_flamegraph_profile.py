@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+from numpy_vectorized_runbenchmark import (
+    aes_ctr_numpy,
+    CLEARTEXT,
+    KEY,
+)
+
+
+def main():
+    ciphertext = aes_ctr_numpy(KEY, CLEARTEXT, 0)
+    plaintext = aes_ctr_numpy(KEY, ciphertext, 0)
+    if plaintext != CLEARTEXT:
+        raise RuntimeError("Encryption/decryption failed!")
+
+
+if __name__ == "__main__":
+    for i in range(1000):
+        main()
+        if (i + 1) % 100 == 0:
+            print("-", end="", flush=True)
+    print()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+import pyperf
+
+from numpy_vectorized import aes_ctr_numpy
+
+# ---------------------------------------------------------------------------
+# Parameters / Test data
+# ---------------------------------------------------------------------------
+CLEARTEXT = b"This is a test. What could possibly go wrong? " * 500  # ~23 KB
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'                    # 16 bytes
+BLOCK_SIZE = 16
+
+# ---------------------------------------------------------------------------
+# pyperf harness
+# ---------------------------------------------------------------------------
+def bench_aes_ctr_numpy(loops: int):
+    t0 = pyperf.perf_counter()
+    for _ in range(loops):
+        ct = aes_ctr_numpy(KEY, CLEARTEXT, 0)
+        pt = aes_ctr_numpy(KEY, ct, 0)
+    dt = pyperf.perf_counter() - t0
+
+    if pt != CLEARTEXT:
+        raise RuntimeError("decrypt mismatch after benchmark")
+    return dt
+
+if __name__ == "__main__":
+    # Clean performance benchmark without any prints or comparisons
+    runner = pyperf.Runner()
+    runner.metadata['description'] = (
+        "AES-128 CTR vectorized over all counter blocks in pure NumPy"
+    )
+    runner.bench_time_func("crypto_aes_numpy_ctr", bench_aes_ctr_numpy)
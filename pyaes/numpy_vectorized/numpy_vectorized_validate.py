@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import random
+import pyaes
+
+from numpy_vectorized import CHUNK_BLOCKS
+from numpy_vectorized_runbenchmark import (
+    aes_ctr_numpy,
+    CLEARTEXT,
+    KEY,
+    BLOCK_SIZE,
+)
+
+
+def validate_aes_implementation():
+    print("Validating pure-NumPy AES-CTR implementation...")
+
+    # Test: Main script test data validation
+    print(f"Testing with main script data: {len(CLEARTEXT)} bytes, block size: {BLOCK_SIZE}")
+    ct = aes_ctr_numpy(KEY, CLEARTEXT, 0)
+    pt = aes_ctr_numpy(KEY, ct, 0)
+    if pt != CLEARTEXT:
+        raise RuntimeError("AES CTR main script data test failed")
+    print("\u2713 Main script data test passed")
+
+    # Test: Compare main script data with pyaes using aligned counter
+    print("Comparing main script data with pyaes using counter=1 (pyaes alignment)...")
+    if aes_ctr_numpy(KEY, CLEARTEXT, 1) != pyaes.AESModeOfOperationCTR(KEY).encrypt(CLEARTEXT):
+        raise RuntimeError("Ciphertexts differ vs pyaes with counter=1")
+    print("\u2713 NumPy matches pyaes exactly with counter=1")
+
+    compare_lengths_and_key_sizes()
+
+    print("Validation complete.")
+
+
+def compare_lengths_and_key_sizes():
+    # Lengths around the block and chunk boundaries, all three key sizes
+    print("Comparing lengths and AES-128/192/256 with pyaes...")
+    rng = random.Random(13)
+    chunk_bytes = CHUNK_BLOCKS * BLOCK_SIZE
+    for key_size in (16, 24, 32):
+        key = rng.randbytes(key_size)
+        for length in (0, 1, 15, 16, 17, 1000, chunk_bytes - 1, chunk_bytes, 2 * chunk_bytes + 9):
+            data = rng.randbytes(length)
+            ct = aes_ctr_numpy(key, data, 1)
+            if ct != pyaes.AESModeOfOperationCTR(key).encrypt(data):
+                raise RuntimeError(f"Mismatch vs pyaes: key_size={key_size} len={length}")
+            if aes_ctr_numpy(key, ct, 1) != data:
+                raise RuntimeError(f"Round trip failed: key_size={key_size} len={length}")
+
+    # Counter carry from the low 32-bit word into the next one
+    data = rng.randbytes(5 * BLOCK_SIZE)
+    counter = pyaes.Counter(initial_value=0xFFFFFFFF - 1)
+    if aes_ctr_numpy(KEY, data, 0xFFFFFFFF - 1) != pyaes.AESModeOfOperationCTR(KEY, counter).encrypt(data):
+        raise RuntimeError("Mismatch vs pyaes across a 32-bit counter carry")
+
+    for bad in (b"", KEY[:15], KEY + b"x"):
+        try:
+            aes_ctr_numpy(bad, CLEARTEXT)
+        except ValueError:
+            continue
+        raise RuntimeError(f"aes_ctr_numpy accepted a {len(bad)}-byte key")
+    print("\u2713 All lengths and key sizes match pyaes")
+
+
+if __name__ == "__main__":
+    validate_aes_implementation()
@@ -2,9 +2,17 @@
 """
 AES encryption/decryption for flamegraph profiling using pyaes.
 Runs 1000 times to generate detailed profiling data with py-spy.
+
+Pass "ttable" as the first argument to profile pyaes_ttable instead.
 """
 
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
 import pyaes
+import pyaes_ttable
+
+IMPLEMENTATIONS = {"pyaes": pyaes, "ttable": pyaes_ttable}
 
 # 23,000 bytes (same as benchmark)
 CLEARTEXT = b"This is a test. What could possibly go wrong? " * 500
@@ -12,13 +20,13 @@ CLEARTEXT = b"This is a test. What could possibly go wrong? " * 500
 # 128-bit key (16 bytes)
 KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'
 
-def main():
+def main(aes=pyaes):
     # Perform encryption
-    aes_encrypt = pyaes.AESModeOfOperationCTR(KEY)
+    aes_encrypt = aes.AESModeOfOperationCTR(KEY)
     ciphertext = aes_encrypt.encrypt(CLEARTEXT)
     
     # Perform decryption
-    aes_decrypt = pyaes.AESModeOfOperationCTR(KEY)
+    aes_decrypt = aes.AESModeOfOperationCTR(KEY)
     plaintext = aes_decrypt.decrypt(ciphertext)
 
     aes_encrypt = None
@@ -29,5 +37,5 @@ def main():
         raise RuntimeError("Encryption/decryption failed!")
 
 if __name__ == "__main__":
-    main()
+    main(IMPLEMENTATIONS[sys.argv[1] if len(sys.argv) > 1 else "pyaes"])
     print()
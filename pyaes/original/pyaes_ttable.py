@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Pure-Python AES-CTR on 32-bit words, for hosts that cannot load extensions.
+
+pyaes encrypts one counter block at a time, as lists of bytes, and
+allocates a fresh counter list for every 16 bytes. This module keeps the
+pyaes interface (AESModeOfOperationCTR, Counter, keystream carried over
+between calls) but generates the keystream of a whole call at once:
+
+- The counter blocks of the call are precomputed into one buffer: the top
+  96 bits only change every 2**32 blocks, the low words come from a single
+  struct.pack.
+- Rounds use T-tables: TE0[x] is the MixColumns column (2s, s, s, 3s) of
+  s = SBOX[x]. Its three distinct byte lanes (s, 2s, 3s) are applied to
+  every block of the buffer with bytes.translate. The state is then one
+  big integer of packed big-endian 32-bit words. ShiftRows, the word
+  rotations that combine the lanes, and AddRoundKey are a fixed number of
+  shifts, masks and XORs on that integer, whatever the number of blocks.
+- The keystream is built as one bytes object, and the message is XORed
+  with it in a single int.from_bytes XOR instead of one XOR per byte.
+
+Runs of fewer than BULK_MIN_BLOCKS blocks, where the fixed cost of the
+bulk rounds dominates, use the word T-tables block by block instead.
+
+Only the standard library is used. Output is identical to pyaes.
+"""
+
+import functools
+import struct
+
+MASK32 = 0xFFFFFFFF
+_COUNTER_MODULUS = 1 << 128
+
+# Blocks per keystream chunk: bounds the size of the bulk integers
+CHUNK_BLOCKS = 4096
+
+# Fewer blocks than this are encrypted one at a time (measured crossover)
+BULK_MIN_BLOCKS = 4
+
+
+def _xtime(a):
+    a <<= 1
+    return (a ^ 0x11B) if a & 0x100 else a
+
+
+def _build_sbox():
+    # Walk GF(2^8) with the generator 3: p runs over the field and q over
+    # the inverses; the S-box is the affine transform of the inverse
+    sbox = [0x63] * 256
+    p = q = 1
+    while True:
+        p ^= _xtime(p)
+        q ^= q << 1
+        q ^= q << 2
+        q ^= q << 4
+        q &= 0xFF
+        if q & 0x80:
+            q ^= 0x09
+        x = q
+        for shift in (1, 2, 3, 4):
+            x ^= ((q << shift) | (q >> (8 - shift))) & 0xFF
+        sbox[p] = x ^ 0x63
+        if p == 1:
+            return sbox
+
+
+SBOX = _build_sbox()
+
+# TE0[x] is the MixColumns column (2s, s, s, 3s) of s = SBOX[x] as a
+# big-endian word; TE1..TE3 are its byte rotations
+TE0 = [(_xtime(s) << 24) | (s << 16) | (s << 8) | (_xtime(s) ^ s) for s in SBOX]
+TE1 = [((t >> 8) | (t << 24)) & MASK32 for t in TE0]
+TE2 = [((t >> 16) | (t << 16)) & MASK32 for t in TE0]
+TE3 = [((t >> 24) | (t << 8)) & MASK32 for t in TE0]
+
+# Last round (no MixColumns): the S-box byte already in place
+FS0 = [s << 24 for s in SBOX]
+FS1 = [s << 16 for s in SBOX]
+FS2 = [s << 8 for s in SBOX]
+FS3 = SBOX
+
+# Byte lanes of TE0 for bytes.translate: s, 2s and 3s
+LANE_S = bytes(SBOX)
+LANE_2S = bytes(_xtime(s) for s in SBOX)
+LANE_3S = bytes(_xtime(s) ^ s for s in SBOX)
+
+
+def expand_key(key):
+    """Round keys as a flat list of 4 * (Nr + 1) big-endian words"""
+    nk = len(key) // 4
+    if len(key) not in (16, 24, 32):
+        raise ValueError("Invalid key size")
+    nr = nk + 6
+    words = list(struct.unpack(">%dI" % nk, key))
+    rcon = 1
+    for i in range(nk, 4 * (nr + 1)):
+        t = words[i - 1]
+        if i % nk == 0:
+            t = ((t << 8) & MASK32) | (t >> 24)
+            t = FS0[t >> 24] | FS1[(t >> 16) & 255] | FS2[(t >> 8) & 255] | FS3[t & 255]
+            t ^= rcon << 24
+            rcon = _xtime(rcon)
+        elif nk > 6 and i % nk == 4:
+            t = FS0[t >> 24] | FS1[(t >> 16) & 255] | FS2[(t >> 8) & 255] | FS3[t & 255]
+        words.append(words[i - nk] ^ t)
+    return words
+
+
+def _keystream_words(rk, counter, nblocks, out):
+    """Append the keystream words of nblocks blocks from counter (same top 96 bits)"""
+    te0, te1, te2, te3 = TE0, TE1, TE2, TE3
+    fs0, fs1, fs2, fs3 = FS0, FS1, FS2, FS3
+    nr = len(rk) // 4 - 1
+    middle = [tuple(rk[4 * r:4 * r + 4]) for r in range(2, nr)]
+    f0, f1, f2, f3 = rk[4 * nr:4 * nr + 4]
+    extend = out.extend
+
+    # Round 1 of every block shares the lookups of the three top words
+    a0 = (counter >> 96) ^ rk[0]
+    a1 = ((counter >> 64) & MASK32) ^ rk[1]
+    a2 = ((counter >> 32) & MASK32) ^ rk[2]
+    k3 = rk[3]
+    c0 = te0[a0 >> 24] ^ te1[(a1 >> 16) & 255] ^ te2[(a2 >> 8) & 255] ^ rk[4]
+    c1 = te0[a1 >> 24] ^ te1[(a2 >> 16) & 255] ^ te3[a0 & 255] ^ rk[5]
+    c2 = te0[a2 >> 24] ^ te2[(a0 >> 8) & 255] ^ te3[a1 & 255] ^ rk[6]
+    c3 = te1[(a0 >> 16) & 255] ^ te2[(a1 >> 8) & 255] ^ te3[a2 & 255] ^ rk[7]
+
+    low = counter & MASK32
+    for a3 in range(low, low + nblocks):
+        a3 ^= k3
+        s0 = c0 ^ te3[a3 & 255]
+        s1 = c1 ^ te2[(a3 >> 8) & 255]
+        s2 = c2 ^ te1[(a3 >> 16) & 255]
+        s3 = c3 ^ te0[a3 >> 24]
+        for r0, r1, r2, r3 in middle:
+            s0, s1, s2, s3 = (
+                te0[s0 >> 24] ^ te1[(s1 >> 16) & 255] ^ te2[(s2 >> 8) & 255] ^ te3[s3 & 255] ^ r0,
+                te0[s1 >> 24] ^ te1[(s2 >> 16) & 255] ^ te2[(s3 >> 8) & 255] ^ te3[s0 & 255] ^ r1,
+                te0[s2 >> 24] ^ te1[(s3 >> 16) & 255] ^ te2[(s0 >> 8) & 255] ^ te3[s1 & 255] ^ r2,
+                te0[s3 >> 24] ^ te1[(s0 >> 16) & 255] ^ te2[(s1 >> 8) & 255] ^ te3[s2 & 255] ^ r3)
+        extend((
+            (fs0[s0 >> 24] | fs1[(s1 >> 16) & 255] | fs2[(s2 >> 8) & 255] | fs3[s3 & 255]) ^ f0,
+            (fs0[s1 >> 24] | fs1[(s2 >> 16) & 255] | fs2[(s3 >> 8) & 255] | fs3[s0 & 255]) ^ f1,
+            (fs0[s2 >> 24] | fs1[(s3 >> 16) & 255] | fs2[(s0 >> 8) & 255] | fs3[s1 & 255]) ^ f2,
+            (fs0[s3 >> 24] | fs1[(s0 >> 16) & 255] | fs2[(s1 >> 8) & 255] | fs3[s2 & 255]) ^ f3))
+
+
+@functools.lru_cache(maxsize=8)
+def _bulk_masks(nblocks):
+    """Masks over nblocks packed blocks for ShiftRows and the word rotations"""
+    def repeat(pattern):
+        return int.from_bytes(pattern * (16 // len(pattern) * nblocks), "big")
+
+    # ShiftRows: row r of column c comes from column c + r, which is 32 * r
+    # bits lower in the block when c + r < 4 and 32 * (4 - r) bits higher
+    # when it wraps around
+    rows = []
+    for r in range(1, 4):
+        left = bytearray(16)
+        right = bytearray(16)
+        for c in range(4):
+            (left if c >= r else right)[4 * c + r] = 0xFF
+        rows.append((repeat(bytes(left)), 32 * r, repeat(bytes(right)), 32 * (4 - r)))
+    return (repeat(b"\xff\x00\x00\x00"), rows,
+            repeat(b"\xff\xff\xff\x00"), repeat(b"\x00\x00\x00\xff"),
+            repeat(b"\xff\xff\x00\x00"), repeat(b"\x00\x00\xff\xff"))
+
+
+def _keystream_bulk(rk, counter, nblocks):
+    """Keystream of nblocks blocks from counter (same top 96 bits) as bytes"""
+    n = 16 * nblocks
+    row0, ((l1, ls1, r1, rs1), (l2, ls2, r2, rs2), (l3, ls3, r3, rs3)), hi8, lo8, hi16, lo16 = _bulk_masks(nblocks)
+    from_bytes = int.from_bytes
+    s_lane, s2_lane, s3_lane = LANE_S, LANE_2S, LANE_3S
+    nr = len(rk) // 4 - 1
+    round_keys = [from_bytes(struct.pack(">4I", *rk[4 * r:4 * r + 4]) * nblocks, "big")
+                  for r in range(nr + 1)]
+
+    blocks = bytearray(((counter >> 32).to_bytes(12, "big") + bytes(4)) * nblocks)
+    low = counter & MASK32
+    low_words = struct.pack(">%dI" % nblocks, *range(low, low + nblocks))
+    for j in range(4):
+        blocks[12 + j::16] = low_words[j::4]
+
+    state = from_bytes(blocks, "big") ^ round_keys[0]
+    for r in range(1, nr + 1):
+        # ShiftRows first: it commutes with SubBytes
+        state = ((state & row0) | ((state & l1) << ls1) | ((state & r1) >> rs1)
+                 | ((state & l2) << ls2) | ((state & r2) >> rs2)
+                 | ((state & l3) << ls3) | ((state & r3) >> rs3))
+        shifted = state.to_bytes(n, "big")
+        if r == nr:
+            return (from_bytes(shifted.translate(s_lane), "big") ^ round_keys[nr]).to_bytes(n, "big")
+        s = from_bytes(shifted.translate(s_lane), "big")
+        s2 = from_bytes(shifted.translate(s2_lane), "big")
+        s3 = from_bytes(shifted.translate(s3_lane), "big")
+        # Row i of a column is 2s_i ^ 3s_i+1 ^ s_i+2 ^ s_i+3: rotate each
+        # word left by one, two and three bytes
+        s3 = ((s3 << 8) & hi8) | ((s3 >> 24) & lo8)
+        s ^= ((s << 8) & hi8) | ((s >> 24) & lo8)
+        s = ((s << 16) & hi16) | ((s >> 16) & lo16)
+        state = s2 ^ s3 ^ s ^ round_keys[r]
+
+
+def keystream(rk, counter, nblocks):
+    """nblocks keystream blocks from a 128-bit counter (wrapping like pyaes) as bytes"""
+    pieces = []
+    while nblocks:
+        # Stay within one run of the low counter word and one chunk
+        n = min(nblocks, CHUNK_BLOCKS, (1 << 32) - (counter & MASK32))
+        if n >= BULK_MIN_BLOCKS:
+            pieces.append(_keystream_bulk(rk, counter, n))
+        else:
+            words = []
+            _keystream_words(rk, counter, n, words)
+            pieces.append(struct.pack(">%dI" % len(words), *words))
+        counter = (counter + n) % _COUNTER_MODULUS
+        nblocks -= n
+    return pieces[0] if len(pieces) == 1 else b"".join(pieces)
+
+
+def xor_bytes(data, stream):
+    """data XOR stream (same length) as one big-integer operation"""
+    n = len(data)
+    return (int.from_bytes(data, "big") ^ int.from_bytes(stream, "big")).to_bytes(n, "big")
+
+
+class Counter:
+    """A 128-bit CTR counter, like pyaes.Counter"""
+
+    def __init__(self, initial_value=1):
+        self._int = initial_value % _COUNTER_MODULUS
+
+    @property
+    def value(self):
+        """The counter as a list of 16 byte values (big-endian), as in pyaes"""
+        return list(self._int.to_bytes(16, "big"))
+
+    def increment(self):
+        """Increment the counter (overflow rolls back to 0)"""
+        self._int = (self._int + 1) % _COUNTER_MODULUS
+
+
+def _counts_by_one(counter):
+    """True for counters known to step by one: ours and pyaes's own Counter"""
+    cls = type(counter)
+    return cls is Counter or (cls.__module__ == "pyaes.aes" and cls.__qualname__ == "Counter")
+
+
+class AESModeOfOperationCTR:
+    """AES Counter Mode of Operation with pyaes semantics
+
+    counter may be a Counter from this module or a pyaes.Counter; it is
+    advanced by one for every keystream block generated, as in pyaes. Any
+    other counter object (e.g. a pyaes.Counter subclass with its own
+    increment) is read and incremented once per block, like pyaes does.
+    """
+
+    name = "Counter (CTR)"
+
+    def __init__(self, key, counter=None):
+        if counter is None:
+            counter = Counter()
+        self._rk = expand_key(bytes(key))
+        self._counter = counter
+        self._fast = _counts_by_one(counter)
+        self._remaining = b""
+
+    def _keystream(self, nblocks):
+        counter = self._counter
+        if not self._fast:
+            words = []
+            for _ in range(nblocks):
+                _keystream_words(self._rk, int.from_bytes(bytes(counter.value), "big"), 1, words)
+                counter.increment()
+            return struct.pack(">%dI" % len(words), *words)
+
+        start = int.from_bytes(bytes(counter.value), "big")
+        stream = keystream(self._rk, start, nblocks)
+        end = (start + nblocks) % _COUNTER_MODULUS
+        if type(counter) is Counter:
+            counter._int = end
+        else:
+            counter._counter = list(end.to_bytes(16, "big"))
+        return stream
+
+    def encrypt(self, plaintext):
+        n = len(plaintext)
+        stream = self._remaining
+        if n > len(stream):
+            stream += self._keystream((n - len(stream) + 15) // 16)
+        self._remaining = stream[n:]
+        return xor_bytes(plaintext, stream[:n])
+
+    def decrypt(self, crypttext):
+        # AES-CTR is symmetric
+        return self.encrypt(crypttext)
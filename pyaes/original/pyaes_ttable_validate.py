@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+import random
+import pyaes
+
+import pyaes_ttable
+from pyaes_ttable import AESModeOfOperationCTR, BULK_MIN_BLOCKS, CHUNK_BLOCKS, Counter
+from run_benchmark import CLEARTEXT, KEY
+
+
+def validate_aes_implementation():
+    print("Validating pure-Python T-table AES-CTR implementation...")
+
+    if pyaes_ttable.SBOX != list(pyaes.AES.S):
+        raise RuntimeError("S-box differs from pyaes")
+    for key_size in (16, 24, 32):
+        key = bytes(range(key_size))
+        words = pyaes_ttable.expand_key(key)
+        expected = [w for round_key in pyaes.AES(key)._Ke for w in round_key]
+        if words != expected:
+            raise RuntimeError(f"Key schedule differs from pyaes for a {key_size}-byte key")
+    print("✓ S-box and key schedules match pyaes")
+
+    # Test: Main script test data validation
+    print(f"Testing with main script data: {len(CLEARTEXT)} bytes")
+    ct = AESModeOfOperationCTR(KEY).encrypt(CLEARTEXT)
+    if ct != pyaes.AESModeOfOperationCTR(KEY).encrypt(CLEARTEXT):
+        raise RuntimeError("Ciphertext differs from pyaes on the main script data")
+    if AESModeOfOperationCTR(KEY).decrypt(ct) != CLEARTEXT:
+        raise RuntimeError("AES CTR main script data round trip failed")
+    print("✓ Main script data matches pyaes")
+
+    compare_lengths_and_key_sizes()
+    compare_streaming_and_counters()
+
+    print("Validation complete.")
+
+
+def compare_lengths_and_key_sizes():
+    # Lengths on both sides of the bulk threshold and the chunk size
+    print("Comparing lengths and AES-128/192/256 with pyaes...")
+    rng = random.Random(19)
+    bulk_bytes = BULK_MIN_BLOCKS * 16
+    chunk_bytes = CHUNK_BLOCKS * 16
+    for key_size in (16, 24, 32):
+        key = rng.randbytes(key_size)
+        for length in (0, 1, 15, 16, 17, bulk_bytes - 1, bulk_bytes, 1000,
+                       chunk_bytes - 1, chunk_bytes, chunk_bytes + 9):
+            data = rng.randbytes(length)
+            ct = AESModeOfOperationCTR(key).encrypt(data)
+            if ct != pyaes.AESModeOfOperationCTR(key).encrypt(data):
+                raise RuntimeError(f"Mismatch vs pyaes: key_size={key_size} len={length}")
+            if AESModeOfOperationCTR(key).decrypt(ct) != data:
+                raise RuntimeError(f"Round trip failed: key_size={key_size} len={length}")
+
+    for bad in (b"", KEY[:15], KEY + b"x"):
+        try:
+            AESModeOfOperationCTR(bad)
+        except ValueError:
+            continue
+        raise RuntimeError(f"AESModeOfOperationCTR accepted a {len(bad)}-byte key")
+    print("✓ All lengths and key sizes match pyaes")
+
+
+def compare_streaming_and_counters():
+    # Odd-sized calls carry the keystream over, counters carry across
+    # 32-bit words and wrap at 2**128, and counter objects advance like pyaes
+    print("Comparing streamed calls and counter carries with pyaes...")
+    rng = random.Random(23)
+    data = rng.randbytes(3000)
+    cuts = [0, 1, 7, 16, 100, 101, 2000, 3000]
+    for start in (0, 1, 0xFFFFFFFF - 5, (1 << 64) - 3, (1 << 128) - 7):
+        for counter_cls in (Counter, pyaes.Counter):
+            counter = counter_cls(initial_value=start)
+            aes = AESModeOfOperationCTR(KEY, counter)
+            ref_counter = pyaes.Counter(initial_value=start)
+            ref = pyaes.AESModeOfOperationCTR(KEY, ref_counter)
+            for a, b in zip(cuts, cuts[1:]):
+                if aes.encrypt(data[a:b]) != ref.encrypt(data[a:b]):
+                    raise RuntimeError(f"Mismatch vs pyaes: counter={start:#x} after {a} bytes")
+                if counter.value != ref_counter.value:
+                    raise RuntimeError(f"{counter_cls.__module__}.Counter not advanced like pyaes")
+
+    # Counters that do not step by one are used block by block
+    class StepCounter(pyaes.Counter):
+        def increment(self):
+            for _ in range(3):
+                pyaes.Counter.increment(self)
+
+    if (AESModeOfOperationCTR(KEY, StepCounter(7)).encrypt(data)
+            != pyaes.AESModeOfOperationCTR(KEY, StepCounter(7)).encrypt(data)):
+        raise RuntimeError("Mismatch vs pyaes with a custom counter class")
+    print("✓ Streamed calls and counters match pyaes")
+
+
+if __name__ == "__main__":
+    validate_aes_implementation()
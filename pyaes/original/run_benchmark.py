@@ -2,12 +2,17 @@
 """
 Pure-Python Implementation of the AES block-cipher.
 
-Benchmark AES in CTR mode using the pyaes module.
+Benchmark AES in CTR mode using the pyaes module, and the same workload
+with pyaes_ttable, the in-repo pure-Python T-table implementation.
 """
 
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
 import pyperf
 
 import pyaes
+import pyaes_ttable
 
 # 23,000 bytes
 CLEARTEXT = b"This is a test. What could possibly go wrong? " * 500
@@ -47,9 +52,30 @@ def bench_pyaes(loops):
 
     return dt
 
+def bench_pyaes_ttable(loops):
+    range_it = range(loops)
+    t0 = pyperf.perf_counter()
+
+    for loops in range_it:
+        aes = pyaes_ttable.AESModeOfOperationCTR(KEY)
+        ciphertext = aes.encrypt(CLEARTEXT)
+
+        # need to reset IV for decryption
+        aes = pyaes_ttable.AESModeOfOperationCTR(KEY)
+        plaintext = aes.decrypt(ciphertext)
+
+        aes = None
+
+    dt = pyperf.perf_counter() - t0
+    if plaintext != CLEARTEXT:
+        raise Exception("decrypt error!")
+
+    return dt
+
 
 if __name__ == "__main__":
     runner = pyperf.Runner()
     runner.metadata['description'] = ("Pure-Python Implementation "
                                       "of the AES block-cipher")
     runner.bench_time_func('crypto_pyaes', bench_pyaes)
+    runner.bench_time_func('crypto_pyaes_ttable', bench_pyaes_ttable)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Parallel AES-CTR with PyCryptodome, in threads or in processes.
+
+The message is split into chunks of chunk_size bytes. A chunk starting at
+byte offset start uses counter base start // 16, exactly as
+parallel_encrypt_decrypt() in pycryptodome_runbenchmark.py computes it.
+Every chunk therefore encrypts independently, and the result matches one
+sequential CTR pass with the same nonce.
+
+No chunk is copied. Workers get memoryview slices of the input and output
+and write through encrypt(..., output=...).
+    ThreadPoolCTR   PyCryptodome calls its C code through ctypes/cffi,
+                    which releases the GIL, so the threads run in parallel.
+    ProcessPoolCTR  The data sits in a multiprocessing.shared_memory block.
+                    Workers attach to it by name and encrypt their chunks
+                    in place. Only names and offsets cross the process
+                    boundary.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+DEFAULT_CHUNK_SIZE = 32 * 1024  # the 32 KB chunks of pycryptodome_runbenchmark.py
+NONCE = b'\x00' * 8             # 8-byte zero nonce + 64-bit counter
+
+
+def chunk_ranges(length, chunk_size=DEFAULT_CHUNK_SIZE):
+    """(start, end, counter_base) for every chunk of a length-byte message"""
+    if chunk_size <= 0 or chunk_size % 16:
+        raise ValueError("chunk_size must be a positive multiple of 16")
+    return [(start, min(start + chunk_size, length), start // 16)
+            for start in range(0, length, chunk_size)]
+
+
+def _ctr_chunk(key, nonce, src, dst, counter_base):
+    # Imported on first use, so importing this module stays cheap
+    from Crypto.Cipher import AES
+    cipher = AES.new(key, AES.MODE_CTR, nonce=nonce, initial_value=counter_base)
+    cipher.encrypt(src, output=dst)
+
+
+class ThreadPoolCTR:
+    """AES-CTR over chunks of one message in a thread pool"""
+
+    def __init__(self, key, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, nonce=NONCE):
+        """
+        Args:
+            key: 16, 24, or 32 byte key
+            workers: Thread count (None: os.cpu_count())
+            chunk_size: Bytes per task, a multiple of 16
+            nonce: CTR nonce shared by all chunks
+        """
+        chunk_ranges(0, chunk_size)  # validate
+        self.key = key
+        self.nonce = nonce
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(self.workers)
+
+    def encrypt_into(self, data, out):
+        """Encrypt data into the writable buffer out (same length, may be data)"""
+        src, dst = memoryview(data).cast("B"), memoryview(out).cast("B")
+        if len(src) != len(dst):
+            raise ValueError("output must have the same length as the input")
+        futures = [self._executor.submit(_ctr_chunk, self.key, self.nonce,
+                                         src[start:end], dst[start:end], counter_base)
+                   for start, end, counter_base in chunk_ranges(len(src), self.chunk_size)]
+        for future in futures:
+            future.result()
+
+    def encrypt(self, data):
+        """Encrypt data into a new bytearray"""
+        out = bytearray(len(data))
+        self.encrypt_into(data, out)
+        return out
+
+    # CTR mode is symmetric
+    decrypt_into = encrypt_into
+    decrypt = encrypt
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker side of ProcessPoolCTR: the block the worker is attached to
+_attached = None
+
+
+def _ctr_shared_chunk(name, key, nonce, start, end, counter_base):
+    global _attached
+    if _attached is None or _attached.name != name:
+        if _attached is not None:
+            _attached.close()
+        _attached = shared_memory.SharedMemory(name=name)
+    view = _attached.buf[start:end]
+    try:
+        _ctr_chunk(key, nonce, view, view, counter_base)
+    finally:
+        view.release()
+
+
+class ProcessPoolCTR:
+    """AES-CTR over chunks of one message in a process pool, through shared memory"""
+
+    def __init__(self, key, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, nonce=NONCE):
+        """
+        Args:
+            key: 16, 24, or 32 byte key
+            workers: Process count (None: os.cpu_count())
+            chunk_size: Bytes per task, a multiple of 16
+            nonce: CTR nonce shared by all chunks
+        """
+        chunk_ranges(0, chunk_size)  # validate
+        self.key = key
+        self.nonce = nonce
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(self.workers)
+
+    def encrypt_shared(self, shm, length=None):
+        """
+        Encrypt the first length bytes of a SharedMemory block in place
+
+        Args:
+            shm: multiprocessing.shared_memory.SharedMemory holding the data
+            length: Bytes to process (None: the whole block; note that
+                    the block may be larger than requested at creation)
+        """
+        length = shm.size if length is None else length
+        futures = [self._executor.submit(_ctr_shared_chunk, shm.name, self.key, self.nonce,
+                                         start, end, counter_base)
+                   for start, end, counter_base in chunk_ranges(length, self.chunk_size)]
+        for future in futures:
+            future.result()
+
+    def encrypt(self, data):
+        """Encrypt data into a new bytes object (one copy in, one copy out)"""
+        if not data:
+            return b""
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        try:
+            shm.buf[:len(data)] = data
+            self.encrypt_shared(shm, len(data))
+            return bytes(shm.buf[:len(data)])
+        finally:
+            shm.close()
+            shm.unlink()
+
+    # CTR mode is symmetric
+    decrypt_shared = encrypt_shared
+    decrypt = encrypt
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark for parallel PyCryptodome AES-CTR.
+
+Encrypts a large payload with 1..N workers and several chunk sizes, using
+both the thread pool and the shared-memory process pool. One sequential
+AES.new(...).encrypt() over the whole payload is the baseline. Pools and
+buffers are created outside the timed loop. Each run then measures the
+chunked work plus scheduling, not pool startup.
+"""
+
+import os
+import sys, pathlib
+sys.path.insert(0, str(pathlib.Path(__file__).parent.resolve()))
+
+from multiprocessing import shared_memory
+
+import pyperf
+from Crypto.Cipher import AES
+
+from pycryptodome_parallel import NONCE, ProcessPoolCTR, ThreadPoolCTR
+
+# 128-bit key (16 bytes)
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'
+
+DEFAULT_SIZE = "64M"
+DEFAULT_CHUNKS = "32K,256K,1M,4M"
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in _UNITS:
+        return int(text[:-1]) * _UNITS[text[-1]]
+    return int(text)
+
+
+def worker_counts(max_workers):
+    # 1, 2, 4, ... up to and including max_workers
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+    return counts
+
+
+_STATE = {}
+
+
+def get_state(kind, size, workers, chunk):
+    # Built lazily: each pyperf worker process only runs one benchmark
+    key = (kind, size, workers, chunk)
+    if key not in _STATE:
+        for state in _STATE.values():
+            state["close"]()
+        _STATE.clear()
+        if kind == "processes":
+            pool = ProcessPoolCTR(KEY, workers, chunk)
+            shm = shared_memory.SharedMemory(create=True, size=size)
+
+            def close():
+                pool.close()
+                shm.close()
+                shm.unlink()
+
+            pool.encrypt_shared(shm, size)  # start the workers and attach them
+            _STATE[key] = {"run": lambda: pool.encrypt_shared(shm, size), "close": close}
+        else:
+            pool = ThreadPoolCTR(KEY, workers, chunk)
+            payload, output = bytes(size), bytearray(size)
+            _STATE[key] = {"run": lambda: pool.encrypt_into(payload, output), "close": pool.close}
+    return _STATE[key]["run"]
+
+
+def make_bench(kind, size, workers, chunk):
+    def bench_pycryptodome_parallel(loops):
+        run = get_state(kind, size, workers, chunk)
+        range_it = range(loops)
+        t0 = pyperf.perf_counter()
+
+        for _ in range_it:
+            run()
+
+        return pyperf.perf_counter() - t0
+
+    return bench_pycryptodome_parallel
+
+
+def make_bench_sequential(size):
+    def bench_pycryptodome_sequential(loops):
+        payload, output = bytes(size), bytearray(size)
+        range_it = range(loops)
+        t0 = pyperf.perf_counter()
+
+        for _ in range_it:
+            AES.new(KEY, AES.MODE_CTR, nonce=NONCE, initial_value=0).encrypt(payload, output=output)
+
+        return pyperf.perf_counter() - t0
+
+    return bench_pycryptodome_sequential
+
+
+def add_cmdline_args(cmd, args):
+    # Forward our options to the pyperf worker processes
+    cmd.extend(("--size", args.size, "--chunks", args.chunks,
+                "--max-workers", str(args.max_workers), "--kinds", args.kinds))
+
+
+if __name__ == "__main__":
+    runner = pyperf.Runner(add_cmdline_args=add_cmdline_args)
+    runner.argparser.add_argument("--size", default=DEFAULT_SIZE,
+                                  help="Payload size (default: %s)" % DEFAULT_SIZE)
+    runner.argparser.add_argument("--chunks", default=DEFAULT_CHUNKS,
+                                  help="Comma separated chunk sizes (default: %s)" % DEFAULT_CHUNKS)
+    runner.argparser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1,
+                                  help="Largest worker count to measure (default: CPU count)")
+    runner.argparser.add_argument("--kinds", default="threads,processes",
+                                  help="Pool kinds to measure (default: threads,processes)")
+    args = runner.parse_args()
+    runner.metadata['description'] = (
+        "Scaling of chunked PyCryptodome AES-CTR over worker count and chunk size"
+    )
+
+    size = parse_size(args.size)
+    runner.bench_time_func(f"crypto_pycryptodome_ctr_{args.size}_sequential",
+                           make_bench_sequential(size), inner_loops=1)
+    for kind in args.kinds.split(","):
+        for chunk_text in args.chunks.split(","):
+            chunk = parse_size(chunk_text)
+            for workers in worker_counts(args.max_workers):
+                name = f"crypto_pycryptodome_ctr_{args.size}_{kind}_{chunk_text.strip()}_{workers}w"
+                runner.bench_time_func(name, make_bench(kind, size, workers, chunk), inner_loops=1)
@@ -1,6 +1,9 @@
+import os
 from Crypto.Cipher import AES
 import pyaes
 
+from pycryptodome_parallel import NONCE as PARALLEL_NONCE, ProcessPoolCTR, ThreadPoolCTR, chunk_ranges
+
 CLEARTEXT = b"This is a test. What could possibly go wrong? " * 500  # ~23,000 bytes
 KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'  # 128-bit key
 # Use empty nonce to align with pyaes' pure 128-bit counter starting at 0
@@ -28,6 +31,31 @@ def encrypt_decrypt_pyaes(key, data):
 
     return ciphertext, plaintext
 
+def validate_parallel():
+    """Chunked thread/process pools must match one sequential CTR pass"""
+    print("\nTesting parallel thread and process pools...")
+    chunk = 4096
+    for length in (0, 1, chunk - 1, chunk, chunk + 1, 7 * chunk + 5, len(CLEARTEXT)):
+        data = os.urandom(length) if length != len(CLEARTEXT) else CLEARTEXT
+        expected = AES.new(KEY, AES.MODE_CTR, nonce=PARALLEL_NONCE, initial_value=0).encrypt(data)
+        with ThreadPoolCTR(KEY, workers=3, chunk_size=chunk) as pool:
+            if bytes(pool.encrypt(data)) != expected:
+                raise Exception(f"thread pool ciphertext mismatch (len={length})")
+            inplace = bytearray(expected)
+            pool.decrypt_into(inplace, inplace)
+            if inplace != data:
+                raise Exception(f"thread pool in-place decryption failed (len={length})")
+        with ProcessPoolCTR(KEY, workers=2, chunk_size=chunk) as pool:
+            if pool.encrypt(data) != expected or pool.decrypt(expected) != data:
+                raise Exception(f"process pool mismatch (len={length})")
+    try:
+        chunk_ranges(100, 1000)
+    except ValueError:
+        pass
+    else:
+        raise Exception("chunk size that is not a multiple of 16 was accepted")
+    print("\u2713 Thread and process pools match sequential PyCryptodome")
+
 def main():
     print("PyCryptodome vs pyaes AES-CTR Validation")
     print("=" * 40)
@@ -61,6 +89,8 @@ def main():
             print(f"PyCryptodome first 16: {pt_crypto[:16].hex()}")
             print(f"pyaes first 16:       {pt_pyaes[:16].hex()}")
 
+        validate_parallel()
+
     except Exception as e:
         print(f"\u2717 Error during testing: {e}")
         import traceback
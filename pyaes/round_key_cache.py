@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Bounded LRU cache of expanded AES round keys, shared by the backends.
+
+Every AESModeOfOperationCTR construction reruns key expansion, even though
+services typically reuse a small set of keys. The c_aesni, cython_aesni and
+numpy_numba backends look their schedules up here instead, keyed by backend
+name and a keyed BLAKE2b digest of the key (the secret is random per
+process, so raw keys are never held as immutable dict keys), so
+construction for a known key becomes a dictionary lookup and a small copy.
+
+Cached schedules live in mutable buffers (bytearray or numpy arrays). They
+are never handed out directly: get() returns a copy, so an entry can be
+overwritten with zeros the moment it is evicted or the cache is cleared.
+The copy belongs to the caller. Callers that only pass it on to a cipher
+constructor, which copies it again, use construct() (or borrow() around a
+longer computation), which wipes the copy afterwards; that also covers a
+cache of size 0.
+
+A hit costs ~1.5 us (digest, lock, copy and wipe), so the cache only pays
+where expansion is slower than that: the portable C kernels (~9 us) and the
+NumPy engines. The AES-NI and VAES kernels expand a key in ~1 us, so the
+c_aesni and cython_aesni wrappers skip the cache while one of them is active.
+
+The process-wide cache is returned by get_cache(); its size defaults to the
+AES_ROUND_KEY_CACHE_SIZE environment variable (64 entries) and can be
+changed at runtime with resize(). A size of 0 disables caching.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_MAXSIZE = int(os.environ.get("AES_ROUND_KEY_CACHE_SIZE", "64"))
+
+
+def _wipe(schedule):
+    """Overwrite a bytearray / numpy schedule with zeros in place"""
+    if isinstance(schedule, bytearray):
+        schedule[:] = bytes(len(schedule))  # same length: no reallocation
+    else:
+        schedule.fill(0)
+
+
+class RoundKeyCache:
+    """Thread-safe LRU mapping (backend, key) -> expanded round keys"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        if maxsize < 0:
+            raise ValueError("maxsize must be >= 0")
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Keyed once; get() copies the state instead of rekeying per lookup
+        self._hasher = hashlib.blake2b(key=os.urandom(32), digest_size=32)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, backend, key, expand):
+        """
+        Return a copy of the schedule for key, expanding it on a miss
+
+        The caller owns the copy and should _wipe() it when done (see borrow()).
+
+        Args:
+            backend: Namespace for the schedule format (e.g. "c_aesni")
+            key: AES key bytes
+            expand: Callable key -> schedule (bytearray or numpy array)
+        """
+        hasher = self._hasher.copy()
+        hasher.update(key)
+        cache_key = (backend, hasher.digest())
+
+        with self._lock:
+            schedule = self._entries.get(cache_key)
+            if schedule is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return schedule.copy()
+            self.misses += 1
+
+        # Expand outside the lock so slow backends do not serialize lookups
+        schedule = expand(key)
+        if self._maxsize == 0:
+            return schedule
+
+        with self._lock:
+            if cache_key in self._entries:
+                # Another thread expanded the same key first; keep its entry
+                _wipe(schedule)
+                self._entries.move_to_end(cache_key)
+                return self._entries[cache_key].copy()
+            self._entries[cache_key] = schedule
+            self._evict(self._maxsize)
+            return schedule.copy()
+
+    def construct(self, backend, key, expand, factory, *args):
+        """factory(key, *args, schedule=<copy>), wiping the copy afterwards
+
+        For cipher constructors that copy the round keys they are given.
+        """
+        schedule = self.get(backend, key, expand)
+        try:
+            return factory(key, *args, schedule=schedule)
+        finally:
+            _wipe(schedule)
+
+    @contextmanager
+    def borrow(self, backend, key, expand):
+        """get() as a context manager that wipes the copy on exit"""
+        schedule = self.get(backend, key, expand)
+        try:
+            yield schedule
+        finally:
+            _wipe(schedule)
+
+    def resize(self, maxsize):
+        """Change the capacity, evicting least recently used entries"""
+        if maxsize < 0:
+            raise ValueError("maxsize must be >= 0")
+        with self._lock:
+            self._maxsize = maxsize
+            self._evict(maxsize)
+
+    def clear(self):
+        """Wipe and drop every entry (counters are kept)"""
+        with self._lock:
+            self._evict(0)
+
+    def stats(self):
+        """Snapshot of the counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self._maxsize,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def _evict(self, limit):
+        # Caller holds the lock
+        while len(self._entries) > limit:
+            _, schedule = self._entries.popitem(last=False)
+            _wipe(schedule)
+            self.evictions += 1
+
+
+_default_cache = RoundKeyCache()
+
+
+def get_cache():
+    """The process-wide cache shared by all backends"""
+    return _default_cache
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Peak memory and allocations per call of every AES backend and payload size.
+
+The memory side of aes_suite_runbenchmark.py: the same backends, modes,
+sizes and operations (--api into, output preallocated where the backend
+can write into a buffer), plus the calls that return new bytes (--api
+bytes, CTR only). Each combination runs in a fresh interpreter, which
+first makes one unmeasured call (imports, JIT) and then reports:
+
+    max RSS     the process high-water mark, interpreter and JIT included;
+                what a worker doing this operation has to be sized for
+    RSS/call    growth of the high-water mark over a steady call (Linux,
+                /proc/self/clear_refs); freed heap memory is reused, so
+                this is a lower bound
+    peak/call   tracemalloc peak of a call above the memory held before it
+    copies      peak/call over the payload size: payload-sized buffers
+                alive at once (the output itself counts as one)
+    allocs      traced allocations per call, counted as rises in traced
+                memory between bytecode instructions of one traced call
+    buffers     those of at least half the payload
+
+tracemalloc sees Python objects and NumPy arrays. Memory that extension
+modules take from malloc directly only shows in the RSS columns. -o
+writes the rows as JSON, for sizing and for comparing runs:
+
+    python aes_memory_benchmark.py --sizes 16,4K,1M,16M
+    python aes_memory_benchmark.py --backends c_aesni,numpy_numba --api bytes -o memory.json
+"""
+
+import sys, pathlib
+HERE = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(HERE))
+
+import argparse
+import gc
+import json
+import os
+import resource
+import statistics
+import subprocess
+import tracemalloc
+
+from aes_suite_runbenchmark import (
+    DEFAULT_BACKENDS, DEFAULT_SIZES, PURE_PYTHON, SUPPORT, _OPS,
+    backend_available, parse_size, payload_size, supported,
+)
+
+APIS = ("into", "bytes")
+
+
+def _op_bytes(backend, key, payload):
+    # The plain encrypt() returning a new bytes object
+    if backend == "pycryptodome":
+        from Crypto.Cipher import AES
+        return lambda: AES.new(key, AES.MODE_CTR, nonce=b"", initial_value=0).encrypt(payload)
+    if backend == "numpy_numba":
+        from numpy_numba_ttable import aes_ctr_numba_ttable
+        return lambda: aes_ctr_numba_ttable(key, payload, 0)
+    if backend == "c_aesni":
+        import c_aesni_wrapper as w
+        return lambda: w.AESModeOfOperationCTR(key, 0).encrypt(payload)
+    # The suite already measures these through encrypt()
+    return _OPS[backend]("ctr", key, payload, None, 1)
+
+
+def make_op(backend, mode, size, threads, api):
+    payload = b"\x5a" * size  # touched pages, not the shared zero page
+    key = bytes(range(16))
+    if api == "bytes":
+        return _op_bytes(backend, key, payload)
+    return _OPS[backend](mode, key, payload, bytearray(size), threads)
+
+
+# ---------------------------------------------------------------------------
+# Child: measures one combination
+# ---------------------------------------------------------------------------
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def _reset_peak_rss():
+    # "5" resets VmHWM to the current RSS (Linux 4.0+)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class _AllocationCounter:
+    """Trace function counting rises in traced memory between instructions"""
+
+    def __init__(self, buffer_bytes):
+        self.buffer_bytes = buffer_bytes
+        self.allocs = 0
+        self.buffers = 0
+        self.last = tracemalloc.get_traced_memory()[0]
+
+    def __call__(self, frame, event, arg):
+        frame.f_trace_opcodes = True
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self.last:
+            self.allocs += 1
+            if current - self.last >= self.buffer_bytes:
+                self.buffers += 1
+        self.last = current
+        return self
+
+
+def child(backend, mode, size, threads, api, calls):
+    op = make_op(backend, mode, size, threads, api)
+    op()  # warm-up: imports, JIT, first-touch page faults
+    gc.collect()
+
+    rss = []
+    for _ in range(calls):
+        if not _reset_peak_rss():
+            break
+        before = _status_kb("VmRSS")
+        op()
+        rss.append(_status_kb("VmHWM") - before)
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(calls):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        op()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+
+    # One call is enough: the count does not vary, and tracing is slow
+    counter = _AllocationCounter(max(1, size // 2))
+    sys.settrace(counter)
+    op()
+    sys.settrace(None)
+    tracemalloc.stop()
+
+    print(json.dumps({"max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                      "rss_per_call": statistics.median(rss) * 1024 if rss else None,
+                      "peak_per_call": statistics.median(peaks),
+                      "allocs": counter.allocs, "buffers": counter.buffers}))
+
+
+# ---------------------------------------------------------------------------
+# Parent
+# ---------------------------------------------------------------------------
+
+def measure(backend, mode, size, threads, api, calls):
+    out = subprocess.run(
+        [sys.executable, str(pathlib.Path(__file__).resolve()), "--child",
+         ",".join((backend, mode, str(size), str(threads), api)), "--calls", str(calls)],
+        cwd=HERE, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def combinations(args):
+    max_original = parse_size(args.max_original_size)
+    backends = [b.strip() for b in args.backends.split(",")]
+    available = [b for b in backends if backend_available(b)]
+    for backend in backends:
+        if backend not in available:
+            print(f"{backend}: skipped, not installed or built", file=sys.stderr)
+    for api in (a.strip() for a in args.api.split(",")):
+        if api not in APIS:
+            raise SystemExit(f"unknown api {api!r} (choose from {', '.join(APIS)})")
+        for mode in (m.strip() for m in args.modes.split(",")):
+            if mode not in SUPPORT:
+                raise SystemExit(f"unknown mode {mode!r} (choose from {', '.join(SUPPORT)})")
+            for threads in (int(t) for t in args.threads.split(",")):
+                if api == "bytes" and (mode != "ctr" or threads != 1):
+                    continue
+                for size_text in args.sizes.split(","):
+                    size = payload_size(mode, parse_size(size_text))
+                    for backend in available:
+                        if not supported(backend, mode, threads):
+                            continue
+                        if backend in PURE_PYTHON and size > max_original:
+                            continue
+                        yield backend, mode, size, threads, api
+
+
+def _kb(value):
+    return f"{value / 1024:10.1f}" if value is not None else f"{'-':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS,
+                        help="Comma separated backends (default: %(default)s)")
+    parser.add_argument("--modes", default="ctr",
+                        help="Comma separated modes from %s (default: ctr)" % ",".join(SUPPORT))
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="Comma separated payload sizes (default: %(default)s)")
+    parser.add_argument("--threads", default="1", help="Comma separated thread counts (default: 1)")
+    parser.add_argument("--api", default="into,bytes",
+                        help="into: the suite's operations, bytes: encrypt() returning bytes "
+                             "(default: %(default)s)")
+    parser.add_argument("--calls", type=int, default=5, help="Measured calls per process (default: 5)")
+    parser.add_argument("--max-original-size", default="64K",
+                        help="Largest payload given to pyaes and pyaes_ttable (default: 64K)")
+    parser.add_argument("-o", "--output", help="Write the rows as JSON to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        backend, mode, size, threads, api = args.child.split(",")
+        child(backend, mode, int(size), int(threads), api, args.calls)
+        return
+
+    print(f"{'backend':<18} {'api':<5} {'mode':<8} {'threads':>7} {'payload':>10} {'max RSS':>10} "
+          f"{'RSS/call':>10} {'peak/call':>10} {'copies':>7} {'allocs':>8} {'buffers':>7}")
+    print(f"{'':<18} {'':<5} {'':<8} {'':>7} {'bytes':>10} {'MB':>10} {'KB':>10} {'KB':>10}")
+    rows = []
+    for backend, mode, size, threads, api in combinations(args):
+        result = measure(backend, mode, size, threads, api, args.calls)
+        result.update(backend=backend, mode=mode, payload_bytes=size, threads=threads, api=api)
+        rows.append(result)
+        print(f"{backend:<18} {api:<5} {mode:<8} {threads:>7} {size:>10} {result['max_rss'] / 2 ** 20:10.1f} "
+              f"{_kb(result['rss_per_call'])} {_kb(result['peak_per_call'])} "
+              f"{result['peak_per_call'] / size:7.2f} {result['allocs']:>8} {result['buffers']:>7}",
+              flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Startup cost of every AES backend: cold import, key setup and first call.
+
+Short-lived workers pay these once per process, and for them they can
+outweigh steady-state throughput. Every sample is a fresh interpreter that
+times, separately:
+
+    import   importing the backend (extension load, numpy, Crypto, ...)
+    setup    building the first cipher object (key expansion)
+    first    the first encrypt() of a --size payload (JIT, lazy imports)
+    steady   the median of the following calls, for comparison
+
+and records which heavy modules (numpy, numba, Crypto) each phase pulled
+in, so a backend that imports them lazily shows them under "first". The
+process column is the wall time from spawn to exit without the steady
+calls, i.e. what a worker doing one call costs, next to a bare interpreter.
+Numba and fastaes caches are fresh directories per backend: --cache cold
+leaves them empty (JIT compilation, fastaes calibration), --cache warm
+primes them with one unmeasured process first.
+
+    python aes_startup_benchmark.py --runs 5 --size 4K
+    python aes_startup_benchmark.py --backends c_aesni,numpy_numba_jit --cache cold
+"""
+
+import sys, pathlib
+HERE = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(HERE.parent))
+for _subdir in ("original", "c_aesni", "cython_aesni", "pycryptodome", "numpy_numba", "numpy_vectorized"):
+    sys.path.insert(0, str(HERE.parent / _subdir))
+
+import argparse
+import importlib
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+
+DEFAULT_BACKENDS = ("original,pyaes_ttable,pycryptodome,numpy_numba,numpy_numba_jit,numpy_vectorized,"
+                    "c_aesni,cython_aesni,fastaes")
+HEAVY_MODULES = ("numpy", "numba", "Crypto")
+STEADY_CALLS = 20
+
+# 128-bit key (16 bytes)
+KEY = b'\xa1\xf6%\x8c\x87}_\xcd\x89dHE8\xbf\xc9,'
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in _UNITS:
+        return int(text[:-1]) * _UNITS[text[-1]]
+    return int(text)
+
+
+class _FunctionCipher:
+    """encrypt() over a function(key, data, counter) backend"""
+
+    def __init__(self, func, key):
+        self.func = func
+        self.key = key
+
+    def encrypt(self, data):
+        return self.func(self.key, data, 0)
+
+
+# backend -> (module to import, cipher factory, extra environment)
+BACKENDS = {
+    "original": ("pyaes", lambda m: m.AESModeOfOperationCTR(KEY, m.Counter(0)), {}),
+    "pyaes_ttable": ("pyaes_ttable", lambda m: m.AESModeOfOperationCTR(KEY, m.Counter(0)), {}),
+    "pycryptodome": ("Crypto.Cipher.AES", lambda m: m.new(KEY, m.MODE_CTR, nonce=b"", initial_value=0), {}),
+    "numpy_numba": ("numpy_numba_ttable", lambda m: m.AESModeOfOperationCTR(KEY), {}),
+    "numpy_numba_jit": ("numpy_numba_ttable", lambda m: m.AESModeOfOperationCTR(KEY), {"AES_NUMBA_AOT": "0"}),
+    # Key expansion happens inside the function, so it counts as the first call
+    "numpy_vectorized": ("numpy_vectorized", lambda m: _FunctionCipher(m.aes_ctr_numpy, KEY), {}),
+    "c_aesni": ("c_aesni_wrapper", lambda m: m.AESModeOfOperationCTR(KEY, 0), {}),
+    "cython_aesni": ("cython_aesni_wrapper", lambda m: m.AESModeOfOperationCTR(KEY, m.Counter(0)), {}),
+    "fastaes": ("fastaes", lambda m: m.AESModeOfOperationCTR(KEY, m.Counter(0)), {}),
+}
+
+# Module that must be importable for the backend to be measured
+PROBE = {
+    "original": "pyaes",
+    "pyaes_ttable": "pyaes_ttable",
+    "pycryptodome": "Crypto",
+    "numpy_numba": "numba",
+    "numpy_numba_jit": "numba",
+    "numpy_vectorized": "numpy",
+    "c_aesni": "c_aesni",
+    "cython_aesni": "cython_aesni",
+    "fastaes": "fastaes",
+}
+
+
+def _heavy_loaded():
+    return {name for name in HEAVY_MODULES if name in sys.modules}
+
+
+def child(backend, size):
+    module_name, factory, _ = BACKENDS[backend]
+    payload = b"\x5a" * size
+    loaded = {}
+
+    t0 = time.perf_counter()
+    module = importlib.import_module(module_name)
+    t1 = time.perf_counter()
+    loaded["import"] = _heavy_loaded()
+    cipher = factory(module)
+    t2 = time.perf_counter()
+    loaded["setup"] = _heavy_loaded() - loaded["import"]
+    cipher.encrypt(payload)
+    t3 = time.perf_counter()
+    loaded["first"] = _heavy_loaded() - loaded["import"] - loaded["setup"]
+
+    steady = []
+    for _ in range(STEADY_CALLS):
+        t = time.perf_counter()
+        cipher.encrypt(payload)
+        steady.append(time.perf_counter() - t)
+    t4 = time.perf_counter()
+    print(json.dumps({"import": t1 - t0, "setup": t2 - t1, "first": t3 - t2,
+                      "steady": statistics.median(steady), "steady_total": t4 - t3,
+                      "loaded": {phase: sorted(names) for phase, names in loaded.items()}}))
+
+
+def sample(args, env):
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, str(pathlib.Path(__file__).resolve()), *args],
+                         env=env, cwd=HERE, check=True, capture_output=True, text=True).stdout
+    wall = time.perf_counter() - t0
+    return (json.loads(out.splitlines()[-1]) if out.strip() else {}), wall
+
+
+def run_backend(backend, size, runs, cache):
+    samples, walls = [], []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, NUMBA_CACHE_DIR=os.path.join(cache_dir, "numba"),
+                   FASTAES_CACHE_DIR=os.path.join(cache_dir, "fastaes"), **BACKENDS[backend][2])
+        if cache == "warm":
+            sample(["--child", backend, "--size", str(size)], env)
+        for _ in range(runs):
+            if cache == "cold":
+                with tempfile.TemporaryDirectory() as cold_dir:
+                    env = dict(env, NUMBA_CACHE_DIR=os.path.join(cold_dir, "numba"),
+                               FASTAES_CACHE_DIR=os.path.join(cold_dir, "fastaes"))
+                    result, wall = sample(["--child", backend, "--size", str(size)], env)
+            else:
+                result, wall = sample(["--child", backend, "--size", str(size)], env)
+            samples.append(result)
+            walls.append(wall - result["steady_total"])
+
+    med = {k: statistics.median(s[k] for s in samples) for k in ("import", "setup", "first", "steady")}
+    loaded = "  ".join(f"{phase}: {','.join(names)}" for phase, names in samples[0]["loaded"].items() if names)
+    print(f"{backend:<18} {med['import'] * 1e3:8.1f} {med['setup'] * 1e3:8.2f} {med['first'] * 1e3:10.2f} "
+          f"{med['steady'] * 1e6:10.1f} {med['first'] / med['steady']:8.0f}x {statistics.median(walls) * 1e3:8.1f}"
+          f"  {loaded}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS,
+                        help="Comma separated backends (default: %(default)s)")
+    parser.add_argument("--size", default="4K", help="Payload of the timed calls (default: 4K)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per backend (default: 3)")
+    parser.add_argument("--cache", choices=("cold", "warm"), default="warm",
+                        help="Numba/fastaes caches empty or primed (default: warm)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+
+    if args.child:
+        if args.child != "none":
+            child(args.child, size)
+        return
+
+    import importlib.util
+    print(f"{size}-byte calls, {args.runs} fresh processes per backend, {args.cache} caches")
+    print(f"{'backend':<18} {'import':>8} {'setup':>8} {'first call':>10} {'steady':>10} "
+          f"{'first/':>9} {'process':>8}  heavy modules loaded by phase")
+    print(f"{'':<18} {'ms':>8} {'ms':>8} {'ms':>10} {'us':>10} {'steady':>9} {'ms':>8}")
+    walls = [sample(["--child", "none"], dict(os.environ))[1] for _ in range(args.runs)]
+    print(f"{'(interpreter)':<18} {'':>50}{statistics.median(walls) * 1e3:8.1f}")
+    for backend in args.backends.split(","):
+        backend = backend.strip()
+        if backend not in BACKENDS:
+            parser.error(f"unknown backend {backend!r}")
+        try:
+            spec = importlib.util.find_spec(PROBE[backend])
+        except (ImportError, ValueError):
+            spec = None
+        if spec is None:
+            print(f"{backend:<18} skipped: {PROBE[backend]} is not installed or built")
+            continue
+        run_backend(backend, size, args.runs, args.cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tables from the pyperf JSON written by aes_suite_runbenchmark.py.
+
+There is one table per (mode, key bits, threads). Backends are the rows and
+payload sizes the columns. Three tables can be printed:
+
+    gbps     throughput in GB/s (10**9 bytes per second). The n1/2 column is
+             the smallest measured size that reaches half the backend's peak.
+    cpb      CPU cycles per byte at the clock rate recorded in the results
+             (the nominal "cpu MHz" from /proc/cpuinfo), or at --ghz
+    speedup  time of the --baseline backend divided by the row's time
+
+    python aes_suite_report.py suite.json
+    python aes_suite_report.py suite.json --tables speedup --baseline pycryptodome
+"""
+
+import argparse
+import collections
+
+import pyperf
+
+
+def load(path):
+    """({(mode, bits, threads): {backend: {size: mean seconds}}}, cpu MHz or None)"""
+    suite = pyperf.BenchmarkSuite.load(path)
+    groups = collections.defaultdict(lambda: collections.defaultdict(dict))
+    mhz = None
+    for bench in suite.get_benchmarks():
+        meta = bench.get_metadata()
+        if "aes_backend" not in meta:
+            continue
+        key = (meta["aes_mode"], int(meta["aes_key_bits"]), int(meta["aes_threads"]))
+        groups[key][meta["aes_backend"]][int(meta["aes_payload_bytes"])] = bench.mean()
+        mhz = mhz or meta.get("aes_cpu_mhz")
+    return groups, (float(mhz) if mhz else None)
+
+
+def format_size(size):
+    for unit, scale in (("G", 1024 ** 3), ("M", 1024 ** 2), ("K", 1024)):
+        if size >= scale and size % scale == 0:
+            return f"{size // scale}{unit}"
+    return str(size)
+
+
+def half_peak_size(sizes, gbps):
+    """Smallest size reaching half of the best throughput"""
+    peak = max(gbps)
+    for size, rate in zip(sizes, gbps):
+        if rate >= peak / 2:
+            return format_size(size)
+    return "-"
+
+
+def print_table(title, sizes, rows, extra=None):
+    name_width = max([len("backend")] + [len(name) for name, _ in rows])
+    header = f"{'backend':<{name_width}} " + " ".join(f"{format_size(s):>9}" for s in sizes)
+    if extra:
+        header += f" {extra[0]:>6}"
+    print(title)
+    print(header)
+    print("-" * len(header))
+    for name, cells in rows:
+        line = f"{name:<{name_width}} " + " ".join(f"{c:>9}" for c in cells[:len(sizes)])
+        if extra:
+            line += f" {cells[-1]:>6}"
+        print(line)
+    print()
+
+
+def report(groups, tables, baseline, hz):
+    for (mode, bits, threads), backends in sorted(groups.items()):
+        sizes = sorted({size for times in backends.values() for size in times})
+        label = f"{mode.upper()} AES-{bits}, {threads} thread{'s' if threads > 1 else ''}"
+        order = sorted(backends, key=lambda b: -max(s / t for s, t in backends[b].items()))
+
+        if "gbps" in tables:
+            rows = []
+            for name in order:
+                times = backends[name]
+                measured = sorted(times)
+                cells = [f"{size / times[size] / 1e9:.3f}" if size in times else "-" for size in sizes]
+                cells.append(half_peak_size(measured, [s / times[s] / 1e9 for s in measured]))
+                rows.append((name, cells))
+            print_table(f"{label}: GB/s", sizes, rows, extra=("n1/2",))
+
+        if "cpb" in tables:
+            if hz is None:
+                print(f"{label}: cycles/byte skipped (no CPU clock recorded; pass --ghz)\n")
+            else:
+                rows = [(name, [f"{times[size] * hz / size:.2f}" if size in times else "-" for size in sizes])
+                        for name, times in ((n, backends[n]) for n in order)]
+                print_table(f"{label}: cycles/byte at {hz / 1e9:.2f} GHz", sizes, rows)
+
+        if "speedup" in tables:
+            if baseline not in backends:
+                print(f"{label}: speedup skipped ({baseline} was not measured)\n")
+                continue
+            base = backends[baseline]
+            rows = [(name, [f"{base[size] / times[size]:.1f}x" if size in times and size in base else "-"
+                            for size in sizes])
+                    for name, times in ((n, backends[n]) for n in order)]
+            print_table(f"{label}: speedup over {baseline}", sizes, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report tables for aes_suite_runbenchmark.py results")
+    parser.add_argument("json", help="pyperf JSON written with -o")
+    parser.add_argument("--tables", default="gbps,cpb,speedup",
+                        help="Comma separated tables from gbps,cpb,speedup (default: all)")
+    parser.add_argument("--baseline", default="original",
+                        help="Backend the speedup table divides by (default: original)")
+    parser.add_argument("--ghz", type=float,
+                        help="Clock rate for cycles/byte (default: cpu MHz recorded in the results)")
+    args = parser.parse_args()
+
+    groups, mhz = load(args.json)
+    if not groups:
+        raise SystemExit(f"{args.json} has no aes_suite_runbenchmark.py results")
+    hz = args.ghz * 1e9 if args.ghz else (mhz * 1e6 if mhz else None)
+    report(groups, {t.strip() for t in args.tables.split(",")}, args.baseline, hz)
+
+
+if __name__ == "__main__":
+    main()
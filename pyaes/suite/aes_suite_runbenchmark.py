@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+One pyperf suite over every AES backend, payload size, key size, mode and
+thread count.
+
+Each benchmark times one complete operation: building the cipher object
+and processing the whole payload. The output buffer is preallocated when
+the backend can write into one. Its pyperf metadata records the backend,
+mode, key bits, payload bytes and threads. Write the results with pyperf's
+-o option and turn them into GB/s, cycles/byte and speedup tables with
+aes_suite_report.py:
+
+    python aes_suite_runbenchmark.py --sizes 16,1K,64K,1M,16M -o suite.json
+    python aes_suite_report.py suite.json
+
+Combinations a backend does not implement are left out. The pure-Python
+backends, pyaes (original) and pyaes_ttable, are left out above 64 KB
+unless --max-original-size says otherwise: at ~0.4 MB/s a single 1 GB
+pyaes run would take most of an hour.
+"""
+
+import os
+import sys, pathlib
+HERE = pathlib.Path(__file__).parent.resolve()
+sys.path.insert(0, str(HERE.parent))
+for _subdir in ("original", "c_aesni", "cython_aesni", "pycryptodome", "numpy_numba", "numpy_vectorized"):
+    sys.path.insert(0, str(HERE.parent / _subdir))
+
+import importlib.util
+
+import pyperf
+
+DEFAULT_BACKENDS = "original,pyaes_ttable,pycryptodome,numpy_numba,numpy_vectorized,c_aesni,cython_aesni"
+DEFAULT_MODES = "ctr"
+DEFAULT_SIZES = "16,256,4K,64K,1M,16M"
+DEFAULT_KEY_BITS = "128"
+DEFAULT_THREADS = "1"
+
+# mode -> backends implementing it; THREADED lists where threads > 1 exists
+SUPPORT = {
+    "ctr": {"original", "pyaes_ttable", "pycryptodome", "numpy_numba", "numpy_vectorized", "c_aesni", "cython_aesni"},
+    "gcm": {"pycryptodome", "c_aesni"},
+    "ecb": {"original", "pycryptodome", "c_aesni", "cython_aesni"},
+    "cbc-enc": {"original", "pycryptodome", "c_aesni", "cython_aesni"},
+    "cbc-dec": {"original", "pycryptodome", "c_aesni", "cython_aesni"},
+}
+THREADED = {("ctr", "c_aesni"), ("ctr", "cython_aesni"), ("ctr", "pycryptodome"), ("ctr", "numpy_numba")}
+
+# Capped at --max-original-size
+PURE_PYTHON = {"original", "pyaes_ttable"}
+
+# Module that must be importable for the backend to be measured
+PROBE = {
+    "original": "pyaes",
+    "pyaes_ttable": "pyaes_ttable",
+    "pycryptodome": "Crypto",
+    "numpy_numba": "numba",
+    "numpy_vectorized": "numpy",
+    "c_aesni": "c_aesni",
+    "cython_aesni": "cython_aesni",
+}
+
+NONCE = bytes(12)
+IV = bytes(16)
+
+_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    if text[-1] in _UNITS:
+        return int(text[:-1]) * _UNITS[text[-1]]
+    return int(text)
+
+
+def backend_available(backend):
+    try:
+        spec = importlib.util.find_spec(PROBE[backend])
+    except (ImportError, ValueError):
+        return False
+    return spec is not None and spec.origin is not None
+
+
+# ---------------------------------------------------------------------------
+# Operations: make_op() returns a zero-argument callable doing one operation
+# ---------------------------------------------------------------------------
+
+def _op_original(mode, key, payload, out, threads):
+    import pyaes
+    if mode == "ctr":
+        return lambda: pyaes.AESModeOfOperationCTR(key, pyaes.Counter(0)).encrypt(payload)
+    # pyaes block modes take one 16-byte block per call
+    blocks = [payload[i:i + 16] for i in range(0, len(payload), 16)]
+    if mode == "ecb":
+        def op():
+            aes = pyaes.AESModeOfOperationECB(key)
+            return [aes.encrypt(block) for block in blocks]
+    elif mode == "cbc-enc":
+        def op():
+            aes = pyaes.AESModeOfOperationCBC(key, IV)
+            return [aes.encrypt(block) for block in blocks]
+    else:
+        def op():
+            aes = pyaes.AESModeOfOperationCBC(key, IV)
+            return [aes.decrypt(block) for block in blocks]
+    return op
+
+
+def _op_pyaes_ttable(mode, key, payload, out, threads):
+    import pyaes_ttable
+    return lambda: pyaes_ttable.AESModeOfOperationCTR(key, pyaes_ttable.Counter(0)).encrypt(payload)
+
+
+def _op_pycryptodome(mode, key, payload, out, threads):
+    from Crypto.Cipher import AES
+    if mode == "ctr" and threads > 1:
+        from pycryptodome_parallel import ThreadPoolCTR
+        # One chunk per thread, at least 64 KB
+        chunk = max(64 * 1024, (len(payload) // threads + 15) // 16 * 16)
+        pool = ThreadPoolCTR(key, threads, chunk, nonce=b"")
+        return lambda: pool.encrypt_into(payload, out)
+    if mode == "ctr":
+        return lambda: AES.new(key, AES.MODE_CTR, nonce=b"", initial_value=0).encrypt(payload, output=out)
+    if mode == "gcm":
+        return lambda: AES.new(key, AES.MODE_GCM, nonce=NONCE).encrypt_and_digest(payload)
+    if mode == "ecb":
+        return lambda: AES.new(key, AES.MODE_ECB).encrypt(payload, output=out)
+    if mode == "cbc-enc":
+        return lambda: AES.new(key, AES.MODE_CBC, iv=IV).encrypt(payload, output=out)
+    return lambda: AES.new(key, AES.MODE_CBC, iv=IV).decrypt(payload, output=out)
+
+
+def _op_numpy_numba(mode, key, payload, out, threads):
+    if threads > 1:
+        # The ahead-of-time kernel is single-threaded; use the parallel JIT one
+        os.environ["AES_NUMBA_AOT"] = "0"
+    from numpy_numba_ttable import AESModeOfOperationCTR, kernel_name
+    if kernel_name() == "jit":
+        # Only the JIT kernel needs numba (and its thread pool) in the process
+        import numba
+        numba.set_num_threads(threads)
+    return lambda: AESModeOfOperationCTR(key, 0).encrypt_into(payload, out)
+
+
+def _op_numpy_vectorized(mode, key, payload, out, threads):
+    from numpy_vectorized import aes_ctr_numpy
+    return lambda: aes_ctr_numpy(key, payload, 0)
+
+
+def _op_c_aesni(mode, key, payload, out, threads):
+    import c_aesni_wrapper as w
+    if mode == "ctr":
+        return lambda: w.AESModeOfOperationCTR(key, 0, threads=threads).encrypt_into(payload, out)
+    if mode == "gcm":
+        return lambda: w.AESModeOfOperationGCM(key, NONCE).encrypt_and_digest(payload)
+    if mode == "ecb":
+        return lambda: w.AESModeOfOperationECB(key).encrypt(payload)
+    if mode == "cbc-enc":
+        return lambda: w.AESModeOfOperationCBC(key, IV).encrypt(payload)
+    return lambda: w.AESModeOfOperationCBC(key, IV).decrypt(payload)
+
+
+def _op_cython_aesni(mode, key, payload, out, threads):
+    import cython_aesni_wrapper as w
+    if mode == "ctr":
+        return lambda: w.AESModeOfOperationCTR(key, w.Counter(0), threads=threads).encrypt(payload)
+    if mode == "ecb":
+        return lambda: w.AESModeOfOperationECB(key).encrypt(payload)
+    if mode == "cbc-enc":
+        return lambda: w.AESModeOfOperationCBC(key, IV).encrypt(payload)
+    return lambda: w.AESModeOfOperationCBC(key, IV).decrypt(payload)
+
+
+_OPS = {
+    "original": _op_original,
+    "pyaes_ttable": _op_pyaes_ttable,
+    "pycryptodome": _op_pycryptodome,
+    "numpy_numba": _op_numpy_numba,
+    "numpy_vectorized": _op_numpy_vectorized,
+    "c_aesni": _op_c_aesni,
+    "cython_aesni": _op_cython_aesni,
+}
+
+
+def supported(backend, mode, threads):
+    if backend == "numpy_numba" and threads > int(os.environ.get("NUMBA_NUM_THREADS", os.cpu_count())):
+        return False  # Numba's thread pool never grows past NUMBA_NUM_THREADS
+    return backend in SUPPORT[mode] and (threads == 1 or (mode, backend) in THREADED)
+
+
+def payload_size(mode, size):
+    # Block modes take whole blocks
+    return size if mode in ("ctr", "gcm") else max(16, size // 16 * 16)
+
+
+def make_bench(backend, mode, key_bits, size, threads):
+    def bench_aes_suite(loops):
+        # Built inside the pyperf worker, which only runs this benchmark
+        payload = b"\x5a" * size  # touched pages, not the shared zero page
+        out = bytearray(size)
+        op = _OPS[backend](mode, bytes(range(key_bits // 8)), payload, out, threads)
+        op()  # warm-up: imports, JIT, first-touch page faults
+        range_it = range(loops)
+        t0 = pyperf.perf_counter()
+
+        for _ in range_it:
+            op()
+
+        return pyperf.perf_counter() - t0
+
+    return bench_aes_suite
+
+
+def cpu_mhz():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("cpu MHz"):
+                    return float(line.split(":", 1)[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def add_cmdline_args(cmd, args):
+    # Forward our options to the pyperf worker processes
+    cmd.extend(("--backends", args.backends, "--modes", args.modes, "--sizes", args.sizes,
+                "--key-bits", args.key_bits, "--threads", args.threads,
+                "--max-original-size", args.max_original_size))
+
+
+if __name__ == "__main__":
+    runner = pyperf.Runner(add_cmdline_args=add_cmdline_args)
+    parser = runner.argparser
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS,
+                        help="Comma separated backends (default: %s)" % DEFAULT_BACKENDS)
+    parser.add_argument("--modes", default=DEFAULT_MODES,
+                        help="Comma separated modes from %s (default: %s)" % (",".join(SUPPORT), DEFAULT_MODES))
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="Comma separated payload sizes, 16 to 1G (default: %s)" % DEFAULT_SIZES)
+    parser.add_argument("--key-bits", default=DEFAULT_KEY_BITS,
+                        help="Comma separated key sizes from 128,192,256 (default: %s)" % DEFAULT_KEY_BITS)
+    parser.add_argument("--threads", default=DEFAULT_THREADS,
+                        help="Comma separated thread counts (default: %s)" % DEFAULT_THREADS)
+    parser.add_argument("--max-original-size", default="64K",
+                        help="Largest payload given to pyaes and pyaes_ttable (default: 64K)")
+    args = runner.parse_args()
+
+    runner.metadata['description'] = "AES backends over payload size, key size, mode and threads"
+    mhz = cpu_mhz()
+    if mhz:
+        runner.metadata['aes_cpu_mhz'] = mhz
+
+    max_original = parse_size(args.max_original_size)
+    backends = [b.strip() for b in args.backends.split(",")]
+    available = [b for b in backends if backend_available(b)]
+    for mode in (m.strip() for m in args.modes.split(",")):
+        if mode not in SUPPORT:
+            raise SystemExit(f"unknown mode {mode!r} (choose from {', '.join(SUPPORT)})")
+        for key_bits in (int(k) for k in args.key_bits.split(",")):
+            for threads in (int(t) for t in args.threads.split(",")):
+                for size_text in args.sizes.split(","):
+                    size = payload_size(mode, parse_size(size_text))
+                    for backend in available:
+                        if not supported(backend, mode, threads):
+                            continue
+                        if backend in PURE_PYTHON and size > max_original:
+                            continue
+                        name = f"aes_{backend}_{mode}_{key_bits}_{size_text.strip()}_{threads}t"
+                        metadata = {"aes_backend": backend, "aes_mode": mode, "aes_key_bits": key_bits,
+                                    "aes_payload_bytes": size, "aes_threads": threads}
+                        runner.bench_time_func(name, make_bench(backend, mode, key_bits, size, threads),
+                                               inner_loops=1, metadata=metadata)
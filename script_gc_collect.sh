@@ -36,7 +36,8 @@ echo "Dependencies check complete."
 echo "Running pre-optimization benchmarks..."
 
 # Capture the benchmark runtime output to a file
-python3-dbg gc_collect/gc_collect.py > gc_collect_output.txt
+rm -f gc_collect.json
+python3-dbg gc_collect/gc_collect.py -o gc_collect.json > gc_collect_output.txt
 
 # original perf commands for detailed profiling (uncomment as needed)
 perf record -F 99 -g --call-graph dwarf -- python3-dbg gc_collect/gc_collect.py
@@ -69,7 +70,8 @@ perf report --inline > gc_collect_1000_tlb_hit.txt
 echo "Running post-optimization benchmarks for gc_collect_opt.py..."
 
 # Capture the benchmark runtime output to a file
-python3-dbg gc_collect/gc_collect_opt.py > gc_collect_opt_output.txt
+rm -f gc_collect_opt.json
+python3-dbg gc_collect/gc_collect_opt.py -o gc_collect_opt.json > gc_collect_opt_output.txt
 
 # perf commands for detailed profiling 
 perf record -F 99 -g --call-graph dwarf -- python3-dbg gc_collect/gc_collect_opt.py
@@ -122,4 +124,9 @@ improvement_percent=$(bc -l <<< "scale=2; ($original_time_ms - $optimized_time_m
 # Print the final comparison statement, showing both units
 echo "The original benchmark ran for ${original_time_ms} ms and the optimized version for ${optimized_time_us} us, a ${improvement_percent}% improvement."
 
+# Keep both results and flag significant slowdowns against the previous run
+python3-dbg bench_history/bench_history.py record gc_collect.json --suite gc_collect --backend original
+python3-dbg bench_history/bench_history.py record gc_collect_opt.json --suite gc_collect --backend optimized
+python3-dbg bench_history/bench_history.py compare --suite gc_collect
+
 echo "Benchmark process complete. Results can be found in the generated files."